@@ -31,9 +31,23 @@
         logging.error("无法导入Config模块，请确保app/config.py文件存在")
         raise
 
-def create_app():
-    """创建并配置Flask应用"""
+def _init_plugin_manager():
+    """导入插件管理模块并预先检测插件状态，检测结果由库检测器缓存，插件接口首次查询时不必等待"""
+    from app.plugin_manager import get_plugins_status
+    return get_plugins_status()
+
+def create_app(fast_startup=None):
+    """
+    创建并配置Flask应用
+
+    Args:
+        fast_startup (bool, optional): 是否快速启动，默认使用Config.FAST_STARTUP。
+            快速启动时蓝图在首次访问时才导入，微信路径设置、插件管理和微信库检测在后台进行
+    """
     logging.info("开始创建Flask应用...")
+    if fast_startup is None:
+        fast_startup = Config.FAST_STARTUP
+    from app.startup import startup_orchestrator, READY
 
     # 配置 Werkzeug 日志
     werkzeug_logger = logging.getLogger('werkzeug')
@@ -44,27 +58,28 @@ def create_app():
         handler.setLevel(logging.DEBUG)
         handler.flush()
 
-    # 初始化微信相关配置
-    try:
-        logging.info("正在初始化微信相关配置...")
-        from app.wechat_init import initialize as init_wechat
-        init_wechat()
-        logging.info("微信相关配置初始化完成")
-    except ImportError as e:
-        logging.error(f"导入微信初始化模块失败: {str(e)}")
-        logging.warning("将继续创建Flask应用，但微信功能可能不可用")
-    except Exception as e:
-        logging.error(f"初始化微信配置时出错: {str(e)}")
-        logging.warning("将继续创建Flask应用，但微信功能可能不可用")
+    # 初始化微信相关配置（会导入微信自动化库，快速启动时在后台执行）
+    if not fast_startup:
+        try:
+            logging.info("正在初始化微信相关配置...")
+            from app.wechat_init import initialize as init_wechat
+            init_wechat()
+            logging.info("微信相关配置初始化完成")
+        except ImportError as e:
+            logging.error(f"导入微信初始化模块失败: {str(e)}")
+            logging.warning("将继续创建Flask应用，但微信功能可能不可用")
+        except Exception as e:
+            logging.error(f"初始化微信配置时出错: {str(e)}")
+            logging.warning("将继续创建Flask应用，但微信功能可能不可用")
 
-    # 导入插件管理模块，确保它被初始化
-    try:
-        logging.info("正在导入插件管理模块...")
-        from app import plugin_manager
-        logging.info("插件管理模块导入成功")
-    except ImportError as e:
-        logging.error(f"导入插件管理模块失败: {str(e)}")
-        logging.warning("将继续创建Flask应用，但插件功能可能不可用")
+        # 导入插件管理模块，确保它被初始化
+        try:
+            logging.info("正在导入插件管理模块...")
+            _init_plugin_manager()
+            logging.info("插件管理模块导入成功")
+        except ImportError as e:
+            logging.error(f"导入插件管理模块失败: {str(e)}")
+            logging.warning("将继续创建Flask应用，但插件功能可能不可用")
 
     # 创建 Flask 应用
     logging.info("正在创建Flask实例...")
@@ -92,49 +107,171 @@ def create_app():
         logging.error(f"初始化限流器时出错: {str(e)}")
         logging.warning("将继续创建Flask应用，但API限流功能可能不可用")
 
-    # 注册蓝图
+    # 注册蓝图，快速启动时只注册占位路由，蓝图模块在首次访问时导入
+    from app.lazy_blueprints import LazyBlueprintRegistry
+    blueprint_registry = LazyBlueprintRegistry()
+    app.extensions['lazy_blueprints'] = blueprint_registry
     try:
         logging.info("正在注册蓝图...")
-        try:
-            from app.api.routes import api_bp
-            from app.api.admin_routes import admin_bp
-            from app.api.plugin_routes import plugin_bp
-            # 导入新的API蓝图
-            from app.api.chat_routes import chat_bp
-            from app.api.group_routes import group_bp
-            from app.api.friend_routes import friend_bp
-            from app.api.wechat_routes import wechat_bp
-            from app.api.message_operations import message_ops_bp
-            from app.api.moments_routes import moments_bp
-            from app.api.auxiliary_routes import auxiliary_bp
-        except ImportError as e:
-            logging.error(f"导入蓝图模块失败: {str(e)}")
-            logging.error("请确保app/api目录下的所有蓝图文件存在")
-            raise
-
-        app.register_blueprint(api_bp, url_prefix='/api')
-        app.register_blueprint(admin_bp, url_prefix='/api/admin')
-        app.register_blueprint(plugin_bp, url_prefix='/admin/plugins')
-        # 注册新的API蓝图
-        app.register_blueprint(chat_bp, url_prefix='/api/chat')
-        app.register_blueprint(group_bp, url_prefix='/api/group')
-        app.register_blueprint(friend_bp, url_prefix='/api/friend')
-        app.register_blueprint(wechat_bp, url_prefix='/api/wechat')
-        app.register_blueprint(message_ops_bp, url_prefix='/api/message')
-        app.register_blueprint(moments_bp, url_prefix='/api/moments')
-        app.register_blueprint(auxiliary_bp, url_prefix='/api/auxiliary')
+        blueprint_registry.register_all(app, lazy=fast_startup, manifest_file=str(Config.ROUTE_MANIFEST_FILE))
         logging.info("蓝图注册成功")
+    except ImportError as e:
+        logging.error(f"导入蓝图模块失败: {str(e)}")
+        logging.error("请确保app/api目录下的所有蓝图文件存在")
+        raise
     except Exception as e:
         logging.error(f"注册蓝图时出错: {str(e)}")
         logging.error("无法继续创建Flask应用")
         raise
 
+    # 启动临时媒体目录回收
+    if getattr(Config, 'MEDIA_GC_ENABLED', False):
+        try:
+            from app.utils.media_gc import media_gc
+            from app import config_manager
+            media_gc.interval = Config.MEDIA_GC_INTERVAL
+            # wxauto图片/文件保存目录（已重定向到TEMP_DIR）
+            media_gc.add_directory(str(config_manager.TEMP_DIR),
+                                   max_bytes=Config.MEDIA_GC_TEMP_MAX_BYTES,
+                                   max_age_seconds=Config.MEDIA_GC_TEMP_MAX_AGE)
+            # wxauto默认保存目录（未重定向时使用）
+            media_gc.add_directory(os.path.join(os.getcwd(), "wxauto文件"),
+                                   max_bytes=Config.MEDIA_GC_TEMP_MAX_BYTES,
+                                   max_age_seconds=Config.MEDIA_GC_TEMP_MAX_AGE)
+            # 登录二维码目录
+            media_gc.add_directory(os.path.join(os.getcwd(), "wxauto_qrcode"),
+                                   max_bytes=Config.MEDIA_GC_QRCODE_MAX_BYTES,
+                                   max_age_seconds=Config.MEDIA_GC_QRCODE_MAX_AGE)
+            # 上传文件存储目录，分块上传中的会话由存储按UPLOAD_SESSION_MAX_AGE自行清理，
+            # 避免.part被回收而.json保留
+            from app.utils.blob_store import blob_store, UPLOADS_DIR_NAME
+            media_gc.add_directory(blob_store.root,
+                                   max_bytes=Config.MEDIA_GC_BLOB_MAX_BYTES,
+                                   max_age_seconds=Config.MEDIA_GC_BLOB_MAX_AGE,
+                                   exclude=(UPLOADS_DIR_NAME,))
+            media_gc.start()
+        except Exception as e:
+            logging.error(f"启动媒体目录回收失败: {str(e)}")
+
+    # 启动定时发送线程，定时任务日志在该线程中加载
+    if getattr(Config, 'SCHEDULER_ENABLED', False):
+        try:
+            from app.scheduler import scheduler
+            scheduler.start()
+        except Exception as e:
+            logging.error(f"启动定时发送失败: {str(e)}")
+
+    # 请求钩子：多账号、链路追踪、慢请求记录、运行指标和微信连接熔断共用一组before/after/teardown_request
+    import time
+    from flask import g, request, jsonify, Response
+    from app.accounts import (AccountPathMiddleware, ACCOUNT_HEADER, DEFAULT_ACCOUNT,
+                              account_registry, _current_account)
+    from app.slow_requests import slow_request_recorder
+    from app.health import health_monitor, should_fast_fail, unavailable_response, WeChatUnavailableError
+    from app import metrics
+
+    tracing_enabled = Config.TRACING_ENABLED
+    metrics_enabled = Config.METRICS_ENABLED
+    if tracing_enabled:
+        from app.tracing import tracer
+    if metrics_enabled:
+        metrics.register_default_gauges()
+
+    # 多账号：/accounts/<账号>/路径前缀改写为X-WeChat-Account请求头
+    app.wsgi_app = AccountPathMiddleware(app.wsgi_app)
+
+    @app.before_request
+    def before_request_hooks():
+        # 多账号：按请求头切换当前账号，必须最先执行
+        account_id = request.headers.get(ACCOUNT_HEADER) or DEFAULT_ACCOUNT
+        if not account_registry.exists(account_id):
+            return jsonify({'code': 4004, 'message': f'账号不存在: {account_id}', 'data': None}), 404
+        g.account_id = account_id
+        g.account_token = _current_account.set(account_id)
+        g.request_start = time.perf_counter()
+
+        route = request.url_rule.rule if request.url_rule else request.path
+        # 链路追踪：为每个请求分配trace id，随任务传入请求队列并记录界面调用
+        if tracing_enabled:
+            tracer.start_request(f"{request.method} {route}",
+                                 request.headers.get('traceparent'),
+                                 {'http.method': request.method, 'http.route': route})
+        # 慢请求记录：超过路由阈值的请求保存调用栈、排队等待和界面调用耗时
+        slow_request_recorder.begin(request.method, route, request.path)
+
+        # 微信连接熔断：微信断开期间界面操作直接返回503，不再占用队列线程等待超时
+        if health_monitor.is_open() and should_fast_fail(request.path):
+            return unavailable_response()
+
+    @app.after_request
+    def after_request_hooks(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            if metrics_enabled:
+                # 使用路由规则而不是实际路径作为标签，避免路径参数导致标签数量无限增长
+                route = request.url_rule.rule if request.url_rule else '<unmatched>'
+                metrics.observe_request(request.method, route, response.status_code, elapsed)
+            account_registry.record_request(g.account_id, response.status_code, elapsed)
+
+        spans = None
+        if tracing_enabled:
+            span = tracer.current_span()
+            spans = list(span.trace.spans) if span else None
+        slow_request_recorder.end(
+            response.status_code,
+            request.content_length,
+            None if response.is_streamed else response.calculate_content_length(),
+            spans
+        )
+
+        if tracing_enabled:
+            trace_id = tracer.current_trace_id()
+            if trace_id:
+                response.headers['X-Trace-Id'] = trace_id
+            tracer.end_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def teardown_request_hooks(error=None):
+        # 未经after_request的异常请求在这里结束链路
+        if tracing_enabled:
+            tracer.end_request(500 if error else None, str(error) if error else None)
+        token = g.pop('account_token', None)
+        if token is not None:
+            _current_account.reset(token)
+
+    @app.errorhandler(WeChatUnavailableError)
+    def handle_wechat_unavailable(error):
+        return unavailable_response(error.message, error.retry_after)
+
+    # 运行指标：通过/metrics输出Prometheus格式的指标
+    if metrics_enabled:
+        @app.route('/metrics')
+        def prometheus_metrics():
+            """Prometheus格式的运行指标"""
+            if Config.METRICS_REQUIRE_API_KEY and request.headers.get('X-API-Key') not in Config.get_api_keys():
+                return jsonify({'code': 1001, 'message': 'API密钥无效', 'data': None}), 401
+            return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
     # 添加健康检查路由
     @app.route('/health')
     def health_check():
         """健康检查路由"""
         return {'status': 'ok'}
 
+    # 添加就绪检查路由
+    @app.route('/ready')
+    def readiness_check():
+        """就绪检查路由，返回各启动组件的状态，wait参数可等待组件就绪"""
+        from app.startup import readiness
+        body, status = readiness(request.args)
+        response = jsonify(body)
+        response.status_code = status
+        if status != 200:
+            response.headers['Retry-After'] = '1'
+        return response
+
     # 添加根路径重定向到API文档
     @app.route('/')
     def index():
@@ -269,5 +406,31 @@ def get_log_tail():
                 'data': {'logs': [], 'error': str(e)}
             }), 500
 
-    logging.info("Flask应用创建完成")
-    return app
\ No newline at end of file
+    if fast_startup:
+        import threading
+        from app.startup import verify_wechat_library
+
+        def init_wechat_paths():
+            from app.wechat_init import initialize
+            initialize()
+
+        # 由api_service启动时这些组件已在启动编排器中注册，不会重复执行
+        startup_orchestrator.add('wechat_paths', init_wechat_paths, required=False)
+        startup_orchestrator.add('plugin_manager', _init_plugin_manager, required=False)
+        startup_orchestrator.add('library_detection', verify_wechat_library, required=False)
+
+        if Config.LAZY_BLUEPRINT_PRELOAD_DELAY is not None:
+            preload = threading.Timer(Config.LAZY_BLUEPRINT_PRELOAD_DELAY, blueprint_registry.preload, args=(app,))
+            preload.daemon = True
+            preload.start()
+
+    # 不经过api_service启动时（例如直接运行run.py），应用创建完成即视为就绪
+    if 'app' not in startup_orchestrator.get_status()['components']:
+        startup_orchestrator.set_state('app', READY)
+    startup_orchestrator.start()
+
+    if fast_startup:
+        logging.info("Flask应用创建完成（快速启动，其余初始化在后台进行）")
+    else:
+        logging.info("Flask应用创建完成")
+    return app
@@ -0,0 +1,268 @@
+"""
+多账号支持
+每个账号有独立的微信适配器、微信管理器、健康状态、名称索引、群成员缓存、会话快照、
+请求队列和监听消息缓存。请求通过X-WeChat-Account请求头或/accounts/<账号>/路径前缀选择账号，
+未指定时使用默认账号，行为与单账号时一致。
+
+按账号隔离的全局对象用AccountLocal声明，属性访问转发到当前账号的实例，
+原有的 `from app.xxx import yyy` 写法不需要修改。当前账号保存在contextvars中，
+新线程不会继承，启动后台线程时需要用bind_context或use_account传递
+"""
+
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_ACCOUNT = 'default'
+ACCOUNT_HEADER = 'X-WeChat-Account'
+ACCOUNT_PATH_PREFIX = '/accounts/'
+
+_ACCOUNT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_\-]{1,32}$')
+
+_current_account = contextvars.ContextVar('wechat_account', default=DEFAULT_ACCOUNT)
+
+# 所有AccountLocal，删除账号时统一清理
+_account_locals: List['AccountLocal'] = []
+
+
+def current_account_id() -> str:
+    """当前上下文的账号"""
+    return _current_account.get()
+
+
+@contextmanager
+def use_account(account_id: str):
+    """在with块内切换当前账号"""
+    token = _current_account.set(account_id)
+    try:
+        yield
+    finally:
+        _current_account.reset(token)
+
+
+def bind_context(func: Callable) -> Callable:
+    """绑定当前上下文（包括当前账号），用于线程的target"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+    return run
+
+
+class AccountLocal:
+    """
+    按账号隔离的全局对象
+
+    每个账号在首次访问时用factory创建实例，创建时当前账号已切换为该账号，
+    factory中读取的其他AccountLocal也会得到同一账号的实例。
+    特殊方法（例如 in、[]、len）不会被转发，需要先调用get()取得实例。
+    代理自身的属性使用私有名称（_AccountLocal__lock等），
+    wechat_adapter._lock这类访问总是转发到当前账号的实例
+    """
+
+    def __init__(self, factory: Callable[[], object], name: str):
+        object.__setattr__(self, '_AccountLocal__factory', factory)
+        object.__setattr__(self, '_AccountLocal__name', name)
+        object.__setattr__(self, '_AccountLocal__instances', {})
+        object.__setattr__(self, '_AccountLocal__lock', threading.RLock())
+        _account_locals.append(self)
+
+    def get(self, account_id: Optional[str] = None):
+        """获取指定账号（默认为当前账号）的实例"""
+        account_id = account_id or current_account_id()
+        instance = self.__instances.get(account_id)
+        if instance is None:
+            with self.__lock:
+                instance = self.__instances.get(account_id)
+                if instance is None:
+                    with use_account(account_id):
+                        instance = self.__factory()
+                    self.__instances[account_id] = instance
+        return instance
+
+    def peek(self, account_id: str):
+        """获取已创建的实例，不存在时返回None"""
+        return self.__instances.get(account_id)
+
+    def discard(self, account_id: str):
+        with self.__lock:
+            return self.__instances.pop(account_id, None)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get(), name, value)
+
+    def __repr__(self):
+        return f"<AccountLocal {self.__name} accounts={sorted(self.__instances)}>"
+
+
+class AccountPathMiddleware:
+    """
+    WSGI中间件：把 /accounts/<账号>/api/... 改写为 /api/...，并把账号写入请求头
+
+    改写后的前缀加入SCRIPT_NAME，url_for生成的地址仍带有账号前缀
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(ACCOUNT_PATH_PREFIX):
+            account_id, sep, rest = path[len(ACCOUNT_PATH_PREFIX):].partition('/')
+            if account_id and sep:
+                environ['PATH_INFO'] = '/' + rest
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + ACCOUNT_PATH_PREFIX + account_id
+                environ['HTTP_' + ACCOUNT_HEADER.upper().replace('-', '_')] = account_id
+        return self.wsgi_app(environ, start_response)
+
+
+class AccountRegistry:
+    """账号注册表"""
+
+    def __init__(self, accounts: Optional[List[dict]] = None):
+        self._lock = threading.Lock()
+        self._accounts: Dict[str, dict] = {}
+        self._stats: Dict[str, dict] = {}
+        self._add(DEFAULT_ACCOUNT, None, None)
+        for account in accounts or []:
+            try:
+                self.register(account.get('id'), account.get('lib'), account.get('window'))
+            except ValueError as e:
+                from app.unified_logger import logger
+                logger.error(f"配置的账号无效: {str(e)}")
+
+    def _add(self, account_id: str, lib: Optional[str], window: Optional[str]) -> dict:
+        account = {'id': account_id, 'lib': lib, 'window': window, 'registered_at': time.time()}
+        self._accounts[account_id] = account
+        self._stats[account_id] = {'requests': 0, 'errors': 0, 'total_seconds': 0.0, 'last_request_at': None}
+        return account
+
+    def register(self, account_id: str, lib: Optional[str] = None, window: Optional[str] = None) -> dict:
+        """
+        注册账号
+
+        Args:
+            account_id (str): 账号标识，只能包含字母、数字、下划线和短横线
+            lib (str, optional): 使用的微信库，默认与默认账号相同
+            window (str, optional): 微信窗口名（登录的昵称），用于在多开的微信中选择窗口
+
+        Raises:
+            ValueError: 账号标识无效、已存在或库名不支持
+        """
+        if not account_id or not _ACCOUNT_ID_PATTERN.match(str(account_id)):
+            raise ValueError(f"账号标识无效: {account_id}")
+        if lib is not None and lib not in ('wxauto', 'wxautox'):
+            raise ValueError(f"不支持的库名: {lib}")
+        with self._lock:
+            if account_id in self._accounts:
+                raise ValueError(f"账号已存在: {account_id}")
+            return dict(self._add(account_id, lib, window))
+
+    def remove(self, account_id: str):
+        """
+        删除账号，停止其连接监控和请求队列并释放所有按账号隔离的实例
+
+        Raises:
+            KeyError: 账号不存在
+            ValueError: 默认账号不能删除
+        """
+        if account_id == DEFAULT_ACCOUNT:
+            raise ValueError("默认账号不能删除")
+        with self._lock:
+            if account_id not in self._accounts:
+                raise KeyError(account_id)
+            del self._accounts[account_id]
+            self._stats.pop(account_id, None)
+
+        from app.wechat import wechat_manager
+        manager = wechat_manager.peek(account_id)
+        if manager is not None:
+            manager.stop()
+        from app.session_watcher import session_watcher
+        watcher = session_watcher.peek(account_id)
+        if watcher is not None:
+            watcher.stop()
+        from app.api_queue import stop_account_queue
+        stop_account_queue(account_id)
+        for local in _account_locals:
+            local.discard(account_id)
+
+    def exists(self, account_id: str) -> bool:
+        return account_id in self._accounts
+
+    def get(self, account_id: Optional[str] = None) -> Optional[dict]:
+        account = self._accounts.get(account_id or current_account_id())
+        return dict(account) if account else None
+
+    def ids(self) -> List[str]:
+        return list(self._accounts)
+
+    def record_request(self, account_id: str, status_code: int, seconds: float):
+        with self._lock:
+            stats = self._stats.get(account_id)
+            if stats is None:
+                return
+            stats['requests'] += 1
+            if status_code >= 400:
+                stats['errors'] += 1
+            stats['total_seconds'] += seconds
+            stats['last_request_at'] = time.time()
+
+    def get_account_stats(self, account_id: str) -> dict:
+        """账号的配置、连接状态、队列和请求统计"""
+        from app.wechat import wechat_manager
+        from app.health import health_monitor
+        from app.api_queue import get_account_queue_stats
+
+        account = self.get(account_id)
+        if account is None:
+            raise KeyError(account_id)
+        with self._lock:
+            stats = dict(self._stats.get(account_id, {}))
+        requests = stats.get('requests') or 0
+        stats['avg_ms'] = round(stats.pop('total_seconds', 0.0) / requests * 1000, 3) if requests else None
+
+        manager = wechat_manager.peek(account_id)
+        adapter = manager.get_instance() if manager else None
+        health = health_monitor.peek(account_id)
+        from app.api.routes import listen_message_store
+        listen_cache = listen_message_store.peek(account_id) or {}
+        account.update({
+            'initialized': bool(adapter and adapter.get_instance()),
+            'lib': (adapter.get_lib_name() if adapter else None) or account['lib'],
+            'window_name': adapter._cached_window_name if adapter else None,
+            'wechat_state': health.get_state() if health else None,
+            'queue': get_account_queue_stats(account_id),
+            'listening': len(listen_cache),
+            'pending_listen_messages': sum(len(messages) for messages in list(listen_cache.values())),
+            'requests': stats,
+        })
+        return account
+
+    def get_stats(self) -> dict:
+        accounts = {}
+        for account_id in self.ids():
+            try:
+                accounts[account_id] = self.get_account_stats(account_id)
+            except KeyError:
+                # 统计期间被删除
+                continue
+        return {'default': DEFAULT_ACCOUNT, 'accounts': accounts}
+
+
+def _create_default_registry() -> AccountRegistry:
+    try:
+        from app.config import Config
+        return AccountRegistry(Config.WECHAT_ACCOUNTS)
+    except (ImportError, AttributeError):
+        return AccountRegistry()
+
+
+# 全局账号注册表
+account_registry = _create_default_registry()
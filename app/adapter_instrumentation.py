@@ -0,0 +1,331 @@
+"""
+界面调用计时
+可选地包装WeChatAdapter代理的界面方法，把每次调用的耗时、结果、异常类型和参数形状
+（只记录类型和长度，不记录内容）写入固定大小的环形缓冲区，
+用于定位延迟来自ChatWith、SendMsg、文件对话框还是GetAllMessage等操作。
+
+另可把调用轨迹（方法名、参数形状、耗时、结果大小）写入JSONL文件，
+供benchmarks中的回放后端在没有微信客户端的环境中按真实耗时重放。
+
+关闭时不包装任何方法，代理调用没有额外开销
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from app.unified_logger import logger
+
+DEFAULT_BUFFER_SIZE = 2000
+DEFAULT_TRACE_MAX_BYTES = 50 * 1024 * 1024
+
+# 轨迹文件格式版本，回放端据此判断能否解析
+TRACE_FORMAT = 'wxauto-ui-trace'
+TRACE_VERSION = 1
+
+
+def describe_value(value) -> str:
+    """描述参数形状，例如str[12]、list[3]、bool，不包含内容"""
+    type_name = type(value).__name__
+    if isinstance(value, (str, bytes, list, tuple, dict, set)):
+        return f"{type_name}[{len(value)}]"
+    return type_name
+
+
+def describe_arguments(args: tuple, kwargs: dict) -> dict:
+    """描述调用参数的形状"""
+    return {
+        'args': [describe_value(arg) for arg in args],
+        'kwargs': {key: describe_value(value) for key, value in kwargs.items()},
+    }
+
+
+def _percentile(sorted_values: List[float], percent: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(int(len(sorted_values) * percent / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class _TraceWriter:
+    """轨迹文件写入，每次调用一行，超过大小上限后自动停止"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.records = 0
+        self.truncated = False
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8')
+        self._write_line({'format': TRACE_FORMAT, 'version': TRACE_VERSION,
+                          'started': time.time(), 'pid': os.getpid()})
+
+    def _write_line(self, data: dict):
+        line = json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n'
+        self._file.write(line)
+        self._file.flush()
+        self.written += len(line.encode('utf-8'))
+
+    def write(self, record: dict) -> bool:
+        """写入一条调用记录，文件已满时返回False"""
+        with self._lock:
+            if self._file is None or self.truncated:
+                return False
+            if self.written >= self.max_bytes:
+                self.truncated = True
+                logger.warning(f"界面调用轨迹文件已达到上限 {self.max_bytes} 字节，停止写入: {self.path}")
+                return False
+            self._write_line({
+                't': round(record['start'], 6),
+                'm': record['method'],
+                'd': round(record['duration'], 6),
+                'ok': record['ok'],
+                'e': record['exception'],
+                'a': record['shape'],
+                'r': record['result'],
+            })
+            self.records += 1
+            return True
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def get_stats(self) -> dict:
+        return {
+            'file': self.path,
+            'records': self.records,
+            'bytes': self.written,
+            'max_bytes': self.max_bytes,
+            'truncated': self.truncated,
+        }
+
+
+class UiCallRecorder:
+    """界面调用记录器"""
+
+    def __init__(self, enabled: bool = False, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 trace_max_bytes: int = DEFAULT_TRACE_MAX_BYTES):
+        """
+        Args:
+            enabled (bool): 是否启用记录
+            buffer_size (int): 环形缓冲区保留的调用数量
+            trace_max_bytes (int): 轨迹文件大小上限
+        """
+        self.enabled = enabled
+        self.trace_max_bytes = trace_max_bytes
+        # deque的append是原子操作，记录时无需加锁
+        self._records = deque(maxlen=buffer_size)
+        self._started_at = time.time()
+        self._total = 0
+        self._trace: Optional[_TraceWriter] = None
+        self._last_trace_stats: Optional[dict] = None
+
+    def set_enabled(self, enabled: bool):
+        """启用或关闭记录，只影响之后获取的方法"""
+        if enabled != self.enabled:
+            self.enabled = enabled
+            logger.info(f"界面调用计时已{'启用' if enabled else '关闭'}")
+
+    @property
+    def active(self) -> bool:
+        """是否需要包装界面方法"""
+        return self.enabled or self._trace is not None
+
+    def start_trace(self, path: str) -> dict:
+        """
+        开始把调用轨迹写入文件，已有轨迹时先关闭
+
+        Args:
+            path (str): 轨迹文件路径，已存在时覆盖
+
+        Returns:
+            dict: 轨迹状态
+        """
+        self.stop_trace()
+        self._trace = _TraceWriter(path, self.trace_max_bytes)
+        logger.info(f"开始记录界面调用轨迹: {path}")
+        return self._trace.get_stats()
+
+    def stop_trace(self) -> Optional[dict]:
+        """停止记录调用轨迹，返回最终状态"""
+        trace, self._trace = self._trace, None
+        if trace is None:
+            return None
+        trace.close()
+        self._last_trace_stats = trace.get_stats()
+        logger.info(f"停止记录界面调用轨迹: {trace.path}，共 {trace.records} 条")
+        return self._last_trace_stats
+
+    def resize(self, buffer_size: int):
+        """调整环形缓冲区大小，保留最近的记录"""
+        self._records = deque(self._records, maxlen=max(int(buffer_size), 1))
+
+    def clear(self):
+        """清空记录"""
+        self._records.clear()
+        self._total = 0
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """
+        包装界面方法，计时和轨迹都关闭时原样返回
+
+        Args:
+            name (str): 方法名称
+            func (callable): 实际方法
+        """
+        if not self.active:
+            return func
+
+        records = self._records
+        enabled = self.enabled
+
+        def wrapper(*args, **kwargs):
+            start_wall = time.time()
+            start = time.perf_counter()
+            error = None
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                thread = threading.current_thread()
+                record = {
+                    'method': name,
+                    'start': start_wall,
+                    'duration': time.perf_counter() - start,
+                    'ok': error is None,
+                    'exception': type(error).__name__ if error is not None else None,
+                    'shape': describe_arguments(args, kwargs),
+                    'result': describe_value(result) if error is None else None,
+                    'thread_id': thread.ident,
+                    'thread': thread.name,
+                }
+                if enabled:
+                    records.append(record)
+                    self._total += 1
+                trace = self._trace
+                if trace is not None:
+                    trace.write(record)
+        wrapper.__name__ = getattr(func, '__name__', name)
+        wrapper.__doc__ = getattr(func, '__doc__', None)
+        return wrapper
+
+    def get_records(self, method: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """
+        获取最近的调用记录
+
+        Args:
+            method (str, optional): 只返回指定方法
+            limit (int, optional): 最多返回的条数，从最近的开始
+        """
+        records = list(self._records)
+        if method:
+            records = [record for record in records if record['method'] == method]
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        return records
+
+    def summarize(self) -> Dict[str, dict]:
+        """按方法汇总缓冲区内的调用耗时"""
+        durations: Dict[str, List[float]] = {}
+        errors: Dict[str, Dict[str, int]] = {}
+        for record in list(self._records):
+            durations.setdefault(record['method'], []).append(record['duration'])
+            if not record['ok']:
+                method_errors = errors.setdefault(record['method'], {})
+                method_errors[record['exception']] = method_errors.get(record['exception'], 0) + 1
+
+        summary = {}
+        for method, values in durations.items():
+            values.sort()
+            method_errors = errors.get(method, {})
+            summary[method] = {
+                'count': len(values),
+                'errors': sum(method_errors.values()),
+                'exceptions': method_errors,
+                'total_seconds': round(sum(values), 4),
+                'mean': round(sum(values) / len(values), 4),
+                'p50': round(_percentile(values, 50), 4),
+                'p95': round(_percentile(values, 95), 4),
+                'p99': round(_percentile(values, 99), 4),
+                'max': round(values[-1], 4),
+            }
+        return summary
+
+    def get_stats(self) -> dict:
+        """获取记录器状态"""
+        trace = self._trace
+        return {
+            'enabled': self.enabled,
+            'buffer_size': self._records.maxlen,
+            'buffered': len(self._records),
+            'total_recorded': self._total,
+            'trace': dict(trace.get_stats(), active=True) if trace is not None
+            else dict(self._last_trace_stats, active=False) if self._last_trace_stats else None,
+        }
+
+    def export_chrome_trace(self, method: Optional[str] = None) -> dict:
+        """
+        导出Chrome trace格式（可在chrome://tracing或Perfetto中查看）
+
+        每次调用为一个完整事件（ph=X），按线程分行显示
+        """
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for record in self.get_records(method):
+            threads[record['thread_id']] = record['thread']
+            events.append({
+                'name': record['method'],
+                'cat': 'ui' if record['ok'] else 'ui,error',
+                'ph': 'X',
+                'ts': int(record['start'] * 1_000_000),
+                'dur': max(int(record['duration'] * 1_000_000), 1),
+                'pid': pid,
+                'tid': record['thread_id'],
+                'args': {
+                    'ok': record['ok'],
+                    'exception': record['exception'],
+                    'shape': record['shape'],
+                    'result': record['result'],
+                },
+            })
+        for thread_id, thread_name in threads.items():
+            events.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': pid,
+                'tid': thread_id,
+                'args': {'name': thread_name},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def _create_default_recorder() -> UiCallRecorder:
+    try:
+        from app.config import Config
+        recorder = UiCallRecorder(enabled=Config.UI_TIMING_ENABLED, buffer_size=Config.UI_TIMING_BUFFER_SIZE,
+                                  trace_max_bytes=Config.UI_TRACE_MAX_BYTES)
+        if Config.UI_TRACE_ENABLED:
+            try:
+                recorder.start_trace(str(Config.LOGS_DIR / time.strftime('ui_trace_%Y%m%d_%H%M%S.jsonl')))
+            except OSError as e:
+                logger.error(f"创建界面调用轨迹文件失败: {str(e)}")
+        return recorder
+    except (ImportError, AttributeError):
+        return UiCallRecorder()
+
+
+# 全局界面调用记录器
+ui_call_recorder = _create_default_recorder()
@@ -3,7 +3,9 @@
 提供配置重载、服务状态查询等功能
 """
 
-from flask import Blueprint, jsonify, request, g
+import json
+import math
+from flask import Blueprint, jsonify, request, g, Response
 from app.auth import require_api_key
 from app.unified_logger import logger
 import importlib
@@ -56,6 +58,106 @@ def get_stats():
         # 运行时间
         start_time = process.create_time()
         uptime_seconds = int(time.time() - start_time)
+
+        # 媒体目录回收统计
+        try:
+            from app.utils.media_gc import media_gc
+            media_gc_stats = media_gc.get_stats()
+        except Exception as gc_e:
+            logger.debug(f"获取媒体回收统计失败: {str(gc_e)}")
+            media_gc_stats = None
+
+        # 通讯录缓存统计
+        try:
+            from app.wechat_adapter import wechat_adapter
+            directory_cache_stats = wechat_adapter.get_directory_cache_stats()
+        except Exception as cache_e:
+            logger.debug(f"获取通讯录缓存统计失败: {str(cache_e)}")
+            directory_cache_stats = None
+
+        # 群成员缓存统计
+        try:
+            from app.group_member_cache import group_member_cache
+            group_member_cache_stats = group_member_cache.get_stats()
+        except Exception as cache_e:
+            logger.debug(f"获取群成员缓存统计失败: {str(cache_e)}")
+            group_member_cache_stats = None
+
+        # 消息句柄索引统计
+        try:
+            from app.message_index import message_index
+            message_index_stats = message_index.get_stats()
+        except Exception as index_e:
+            logger.debug(f"获取消息句柄索引统计失败: {str(index_e)}")
+            message_index_stats = None
+
+        # 监听消息处理流水线统计
+        try:
+            from app.message_pipeline import message_pipeline
+            message_pipeline_stats = message_pipeline.get_stats()
+        except Exception as pipeline_e:
+            logger.debug(f"获取监听消息处理流水线统计失败: {str(pipeline_e)}")
+            message_pipeline_stats = None
+
+        # 聊天记录增量同步统计
+        try:
+            from app.history_sync import watermarks
+            history_sync_stats = watermarks.get_stats()
+        except Exception as sync_e:
+            logger.debug(f"获取聊天记录同步统计失败: {str(sync_e)}")
+            history_sync_stats = None
+
+        # 会话列表快照统计
+        try:
+            from app.session_watcher import session_watcher
+            session_watcher_stats = session_watcher.get_stats()
+        except Exception as watcher_e:
+            logger.debug(f"获取会话列表快照统计失败: {str(watcher_e)}")
+            session_watcher_stats = None
+
+        # 微信连接健康状态
+        try:
+            from app.health import health_monitor
+            wechat_health_stats = health_monitor.get_stats()
+        except Exception as health_e:
+            logger.debug(f"获取微信连接健康状态失败: {str(health_e)}")
+            wechat_health_stats = None
+
+        # 启动和蓝图加载状态
+        try:
+            from flask import current_app
+            from app.startup import startup_orchestrator
+            registry = current_app.extensions.get('lazy_blueprints')
+            startup_stats = dict(startup_orchestrator.get_status(),
+                                 fast_startup=Config.FAST_STARTUP,
+                                 blueprints=registry.get_stats() if registry else None)
+        except Exception as startup_e:
+            logger.debug(f"获取启动状态失败: {str(startup_e)}")
+            startup_stats = None
+
+        # 幂等键缓存统计
+        try:
+            from app.idempotency import idempotency_cache
+            idempotency_stats = idempotency_cache.get_stats()
+        except Exception as idem_e:
+            logger.debug(f"获取幂等键缓存统计失败: {str(idem_e)}")
+            idempotency_stats = None
+
+        # 多账号统计
+        try:
+            from app.accounts import account_registry
+            account_stats = account_registry.get_stats()
+        except Exception as account_e:
+            logger.debug(f"获取账号统计失败: {str(account_e)}")
+            account_stats = None
+
+        # 定时发送统计
+        try:
+            from app.scheduler import scheduler
+            scheduler_stats = scheduler.get_stats()
+        except Exception as scheduler_e:
+            logger.debug(f"获取定时发送统计失败: {str(scheduler_e)}")
+            scheduler_stats = None
         
         # 返回统计信息
         return jsonify({
@@ -67,7 +169,19 @@ def get_stats():
                 'uptime_seconds': uptime_seconds,
                 'pid': os.getpid(),
                 'threads': len(process.threads()),
-                'connections': len(process.connections())
+                'connections': len(process.connections()),
+                'media_gc': media_gc_stats,
+                'directory_cache': directory_cache_stats,
+                'group_member_cache': group_member_cache_stats,
+                'message_index': message_index_stats,
+                'history_sync': history_sync_stats,
+                'message_pipeline': message_pipeline_stats,
+                'session_watcher': session_watcher_stats,
+                'wechat_health': wechat_health_stats,
+                'startup': startup_stats,
+                'idempotency': idempotency_stats,
+                'accounts': account_stats,
+                'scheduler': scheduler_stats
             }
         })
     except Exception as e:
@@ -77,3 +191,395 @@ def get_stats():
             'message': f'获取统计信息失败: {str(e)}',
             'data': None
         }), 500
+
+@admin_bp.route('/ui-timings', methods=['GET'])
+@require_api_key
+def get_ui_timings():
+    """
+    获取界面调用计时
+
+    查询参数:
+        method: 只返回指定方法的记录
+        limit: 返回的最近记录条数，默认100
+    """
+    try:
+        from app.adapter_instrumentation import ui_call_recorder
+
+        method = request.args.get('method') or None
+        try:
+            limit = max(int(request.args.get('limit', 100)), 0)
+        except (TypeError, ValueError):
+            limit = 100
+
+        return jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': {
+                'status': ui_call_recorder.get_stats(),
+                'summary': ui_call_recorder.summarize(),
+                'records': ui_call_recorder.get_records(method, limit)
+            }
+        })
+    except Exception as e:
+        logger.error(f"获取界面调用计时失败: {str(e)}")
+        return jsonify({
+            'code': 5002,
+            'message': f'获取界面调用计时失败: {str(e)}',
+            'data': None
+        }), 500
+
+@admin_bp.route('/ui-timings', methods=['POST'])
+@require_api_key
+def configure_ui_timings():
+    """
+    启用、关闭或清空界面调用计时，开始或停止记录调用轨迹
+
+    请求体: {"enabled": true, "buffer_size": 2000, "clear": false, "trace": true}
+
+    trace为true时在日志目录新建ui_trace_*.jsonl并开始写入，为false时停止写入
+    """
+    try:
+        from app.adapter_instrumentation import ui_call_recorder
+
+        data = request.get_json(silent=True) or {}
+        if 'buffer_size' in data:
+            ui_call_recorder.resize(int(data['buffer_size']))
+        if data.get('clear'):
+            ui_call_recorder.clear()
+        if 'enabled' in data:
+            ui_call_recorder.set_enabled(bool(data['enabled']))
+        if 'trace' in data:
+            if data['trace']:
+                ui_call_recorder.start_trace(str(Config.LOGS_DIR / time.strftime('ui_trace_%Y%m%d_%H%M%S.jsonl')))
+            else:
+                ui_call_recorder.stop_trace()
+
+        return jsonify({
+            'code': 0,
+            'message': '设置成功',
+            'data': ui_call_recorder.get_stats()
+        })
+    except (TypeError, ValueError):
+        return jsonify({
+            'code': 1002,
+            'message': 'buffer_size参数错误',
+            'data': None
+        }), 400
+    except Exception as e:
+        logger.error(f"设置界面调用计时失败: {str(e)}")
+        return jsonify({
+            'code': 5001,
+            'message': f'设置界面调用计时失败: {str(e)}',
+            'data': None
+        }), 500
+
+@admin_bp.route('/ui-timings/trace', methods=['GET'])
+@require_api_key
+def export_ui_timings_trace():
+    """导出Chrome trace格式的界面调用记录，可在chrome://tracing或Perfetto中打开"""
+    try:
+        from app.adapter_instrumentation import ui_call_recorder
+
+        trace = ui_call_recorder.export_chrome_trace(request.args.get('method') or None)
+        filename = time.strftime('ui-timings-%Y%m%d-%H%M%S.json')
+        return Response(
+            json.dumps(trace, ensure_ascii=False),
+            mimetype='application/json',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    except Exception as e:
+        logger.error(f"导出界面调用记录失败: {str(e)}")
+        return jsonify({
+            'code': 5002,
+            'message': f'导出界面调用记录失败: {str(e)}',
+            'data': None
+        }), 500
+
+@admin_bp.route('/ui-timings/replay-trace', methods=['GET'])
+@require_api_key
+def download_ui_replay_trace():
+    """下载当前（或最近一次）界面调用轨迹文件，用于benchmarks回放"""
+    try:
+        from app.adapter_instrumentation import ui_call_recorder
+
+        trace = ui_call_recorder.get_stats().get('trace')
+        if not trace or not os.path.exists(trace['file']):
+            return jsonify({
+                'code': 4004,
+                'message': '没有可下载的界面调用轨迹',
+                'data': None
+            }), 404
+
+        with open(trace['file'], 'r', encoding='utf-8') as f:
+            content = f.read()
+        return Response(
+            content,
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename={os.path.basename(trace["file"])}'}
+        )
+    except Exception as e:
+        logger.error(f"下载界面调用轨迹失败: {str(e)}")
+        return jsonify({
+            'code': 5002,
+            'message': f'下载界面调用轨迹失败: {str(e)}',
+            'data': None
+        }), 500
+
+@admin_bp.route('/traces', methods=['GET'])
+@require_api_key
+def get_traces():
+    """
+    获取保留的请求链路
+
+    查询参数:
+        min_duration: 只返回耗时不少于该秒数的链路
+        name: 按链路名称（例如/api/message/send）过滤
+        limit: 返回条数，默认50
+    """
+    try:
+        from app.tracing import tracer
+
+        try:
+            min_duration = request.args.get('min_duration')
+            min_duration = float(min_duration) if min_duration else None
+            limit = max(int(request.args.get('limit', 50)), 1)
+        except (TypeError, ValueError):
+            return jsonify({
+                'code': 1002,
+                'message': '参数错误',
+                'data': None
+            }), 400
+
+        return jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': {
+                'status': tracer.get_stats(),
+                'traces': tracer.get_traces(min_duration, request.args.get('name') or None, limit)
+            }
+        })
+    except Exception as e:
+        logger.error(f"获取请求链路失败: {str(e)}")
+        return jsonify({
+            'code': 5002,
+            'message': f'获取请求链路失败: {str(e)}',
+            'data': None
+        }), 500
+
+@admin_bp.route('/traces/<trace_id>', methods=['GET'])
+@require_api_key
+def get_trace_detail(trace_id):
+    """获取单条请求链路的全部span"""
+    from app.tracing import tracer
+
+    trace = tracer.get_trace(trace_id)
+    if not trace:
+        return jsonify({
+            'code': 4004,
+            'message': f'链路不存在或已被淘汰: {trace_id}',
+            'data': None
+        }), 404
+
+    return jsonify({
+        'code': 0,
+        'message': '获取成功',
+        'data': trace
+    })
+
+@admin_bp.route('/traces/export', methods=['GET'])
+@require_api_key
+def export_traces():
+    """导出OTLP JSON格式的请求链路文件，可通过trace_id参数只导出一条"""
+    try:
+        from app.tracing import tracer
+
+        data = tracer.export_otlp(request.args.get('trace_id') or None)
+        filename = time.strftime('traces-%Y%m%d-%H%M%S.json')
+        return Response(
+            json.dumps(data, ensure_ascii=False),
+            mimetype='application/json',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    except Exception as e:
+        logger.error(f"导出请求链路失败: {str(e)}")
+        return jsonify({
+            'code': 5002,
+            'message': f'导出请求链路失败: {str(e)}',
+            'data': None
+        }), 500
+
+@admin_bp.route('/profile', methods=['GET'])
+@require_api_key
+def profile_process():
+    """
+    对API进程进行采样分析，请求在采样结束后返回
+
+    查询参数:
+        seconds: 采样时长，默认10秒，最长60秒
+        hz: 每秒采样次数，默认100
+        thread: 只采样名称以此开头的线程，例如QueueProcessor、WeChatMonitor、LogAggregator
+        format: collapsed（默认，折叠栈文本，可直接生成火焰图）或json（按线程和热点帧汇总）
+
+    采样按墙钟时间进行，等待中的线程同样会被计入，可结合thread参数只看关心的线程
+    """
+    from app.profiler import sampling_profiler, ProfilerBusyError, DEFAULT_HZ
+
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        hz = float(request.args.get('hz', DEFAULT_HZ))
+        if not math.isfinite(seconds) or not math.isfinite(hz):
+            raise ValueError('seconds和hz必须是有限数值')
+    except (TypeError, ValueError):
+        return jsonify({
+            'code': 1002,
+            'message': 'seconds或hz参数错误',
+            'data': None
+        }), 400
+
+    try:
+        result = sampling_profiler.profile(seconds, hz, request.args.get('thread') or None)
+    except ProfilerBusyError as e:
+        return jsonify({
+            'code': 5003,
+            'message': str(e),
+            'data': None
+        }), 409
+    except Exception as e:
+        logger.error(f"采样分析失败: {str(e)}")
+        return jsonify({
+            'code': 5001,
+            'message': f'采样分析失败: {str(e)}',
+            'data': None
+        }), 500
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'code': 0,
+            'message': '采样完成',
+            'data': result.to_dict()
+        })
+
+    return Response(result.collapsed(), mimetype='text/plain; charset=utf-8', headers={
+        'X-Profile-Samples': str(result.samples),
+        'X-Profile-Overhead': str(round(result.overhead, 4))
+    })
+
+@admin_bp.route('/slow-requests', methods=['GET'])
+@require_api_key
+def get_slow_requests():
+    """
+    获取慢请求记录
+
+    查询参数:
+        route: 按路由规则过滤，例如/api/message/send
+        min_duration: 只返回耗时不少于该秒数的记录
+        limit: 返回条数，默认50
+        stacks: 为0时不返回调用栈
+    """
+    try:
+        from app.slow_requests import slow_request_recorder
+
+        try:
+            min_duration = request.args.get('min_duration')
+            min_duration = float(min_duration) if min_duration else None
+            limit = max(int(request.args.get('limit', 50)), 1)
+        except (TypeError, ValueError):
+            return jsonify({
+                'code': 1002,
+                'message': '参数错误',
+                'data': None
+            }), 400
+
+        return jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': {
+                'status': slow_request_recorder.get_stats(),
+                'requests': slow_request_recorder.get_records(
+                    request.args.get('route') or None, min_duration, limit,
+                    request.args.get('stacks') != '0'
+                )
+            }
+        })
+    except Exception as e:
+        logger.error(f"获取慢请求记录失败: {str(e)}")
+        return jsonify({
+            'code': 5002,
+            'message': f'获取慢请求记录失败: {str(e)}',
+            'data': None
+        }), 500
+
+@admin_bp.route('/accounts', methods=['GET'])
+@require_api_key
+def list_accounts():
+    """获取所有账号及其连接状态、队列和请求统计"""
+    try:
+        from app.accounts import account_registry
+        return jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': account_registry.get_stats()
+        })
+    except Exception as e:
+        logger.error(f"获取账号列表失败: {str(e)}")
+        return jsonify({
+            'code': 5002,
+            'message': f'获取账号列表失败: {str(e)}',
+            'data': None
+        }), 500
+
+@admin_bp.route('/accounts', methods=['POST'])
+@require_api_key
+def register_account():
+    """
+    注册账号
+
+    请求体:
+        id: 账号标识，请求时通过X-WeChat-Account请求头或/accounts/<id>/路径前缀指定
+        lib: 使用的微信库，默认与默认账号相同
+        window: 微信窗口名（登录的昵称）
+    """
+    from app.accounts import account_registry
+
+    data = request.get_json(silent=True) or {}
+    try:
+        account = account_registry.register(data.get('id'), data.get('lib'), data.get('window'))
+    except ValueError as e:
+        return jsonify({
+            'code': 1002,
+            'message': str(e),
+            'data': None
+        }), 400
+    logger.info(f"已注册账号: {account['id']}")
+    return jsonify({
+        'code': 0,
+        'message': '注册成功',
+        'data': account
+    })
+
+@admin_bp.route('/accounts/<account_id>', methods=['DELETE'])
+@require_api_key
+def remove_account(account_id):
+    """删除账号，停止其连接监控和请求队列"""
+    from app.accounts import account_registry
+
+    try:
+        account_registry.remove(account_id)
+    except KeyError:
+        return jsonify({
+            'code': 4004,
+            'message': f'账号不存在: {account_id}',
+            'data': None
+        }), 404
+    except ValueError as e:
+        return jsonify({
+            'code': 1002,
+            'message': str(e),
+            'data': None
+        }), 400
+    logger.info(f"已删除账号: {account_id}")
+    return jsonify({
+        'code': 0,
+        'message': '删除成功',
+        'data': {'id': account_id}
+    })
@@ -7,7 +7,9 @@
 from app.auth import require_api_key
 from app.unified_logger import logger
 from app.wechat import wechat_manager
+from app.health import WeChatUnavailableError
 from app.utils.wechat_path_detector import get_best_wechat_path, validate_wechat_path
+from app.utils.media_gc import media_gc
 import base64
 import os
 
@@ -62,6 +64,8 @@ def click_session():
                 'session_name': session_name
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"[wxautox] 点击会话失败: {str(e)}")
         return jsonify({
@@ -140,6 +144,8 @@ def accept_new_friend():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"[wxautox] 接受好友申请失败: {str(e)}")
         return jsonify({
@@ -207,6 +213,8 @@ def reject_new_friend():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"[wxautox] 拒绝好友申请失败: {str(e)}")
         return jsonify({
@@ -293,6 +301,8 @@ def auto_login():
             }
         })
 
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"[wxautox] 自动登录失败: {str(e)}")
         return jsonify({
@@ -377,9 +387,10 @@ def get_login_qrcode():
                     'data': None
                 }), 500
 
-            # 读取二维码图片并转换为base64
-            with open(qrcode_path, 'rb') as f:
-                qrcode_data = f.read()
+            # 读取二维码图片并转换为base64，读取期间固定文件，避免被媒体回收删除
+            with media_gc.pinned(qrcode_path):
+                with open(qrcode_path, 'rb') as f:
+                    qrcode_data = f.read()
 
             # 转换为base64编码
             qrcode_base64 = base64.b64encode(qrcode_data).decode('utf-8')
@@ -414,6 +425,8 @@ def get_login_qrcode():
             except:
                 pass
 
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"[wxautox] 获取登录二维码失败: {str(e)}")
         return jsonify({
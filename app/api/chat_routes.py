@@ -7,10 +7,37 @@
 from app.auth import require_api_key
 from app.unified_logger import logger
 from app.wechat import wechat_manager
+from app.health import WeChatUnavailableError
+from app.name_resolver import clean_group_name
+from app.idempotency import idempotent
+from app.message_index import message_index
+from app import history_sync
 import time
 
 chat_bp = Blueprint('chat', __name__)
 
+
+def _call_chat_method(wx_instance, chat_wnd, method_name, *args, **kwargs):
+    """调用聊天窗口的方法，wxauto库通过适配器调用以处理异常"""
+    lib_name = getattr(wx_instance, '_lib_name', 'wxauto')
+    if lib_name != 'wxautox' and hasattr(wx_instance, '_handle_chat_window_method'):
+        return wx_instance._handle_chat_window_method(chat_wnd, method_name, *args, **kwargs)
+    return getattr(chat_wnd, method_name)(*args, **kwargs)
+
+
+def _format_message(msg):
+    """把消息对象转换为响应中的字典"""
+    return {
+        'type': getattr(msg, 'type', 'unknown'),
+        'content': getattr(msg, 'content', ''),
+        'sender': getattr(msg, 'sender', ''),
+        'id': getattr(msg, 'id', ''),
+        'mtype': getattr(msg, 'mtype', None),
+        'sender_remark': getattr(msg, 'sender_remark', None),
+        'file_path': getattr(msg, 'file_path', None)
+    }
+
+
 @chat_bp.route('/show', methods=['POST'])
 @require_api_key
 def show_chat_window():
@@ -43,6 +70,8 @@ def show_chat_window():
             'message': '显示窗口成功',
             'data': {'who': who}
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"显示聊天窗口失败: {str(e)}")
         return jsonify({
@@ -117,6 +146,8 @@ def load_more_messages():
             'message': '加载更多消息成功',
             'data': {'who': who}
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"加载更多消息失败: {str(e)}")
         return jsonify({
@@ -159,29 +190,13 @@ def get_all_messages():
         chat_wnd = listen[who]
 
         # 获取所有消息
-        lib_name = getattr(wx_instance, '_lib_name', 'wxauto')
-        if lib_name == 'wxautox':
-            messages = chat_wnd.GetAllMessage()
-        else:
-            # wxauto库的处理方式
-            if hasattr(wx_instance, '_handle_chat_window_method'):
-                messages = wx_instance._handle_chat_window_method(chat_wnd, 'GetAllMessage')
-            else:
-                messages = chat_wnd.GetAllMessage()
+        messages = _call_chat_method(wx_instance, chat_wnd, 'GetAllMessage')
+
+        # 记录消息句柄，之后对这些消息的操作不必重新获取消息列表
+        message_index.add_all(who, messages)
 
         # 格式化消息
-        formatted_messages = []
-        for msg in messages:
-            formatted_msg = {
-                'type': getattr(msg, 'type', 'unknown'),
-                'content': getattr(msg, 'content', ''),
-                'sender': getattr(msg, 'sender', ''),
-                'id': getattr(msg, 'id', ''),
-                'mtype': getattr(msg, 'mtype', None),
-                'sender_remark': getattr(msg, 'sender_remark', None),
-                'file_path': getattr(msg, 'file_path', None)
-            }
-            formatted_messages.append(formatted_msg)
+        formatted_messages = [_format_message(msg) for msg in messages]
 
         return jsonify({
             'code': 0,
@@ -191,6 +206,8 @@ def get_all_messages():
                 'messages': formatted_messages
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取所有消息失败: {str(e)}")
         return jsonify({
@@ -199,6 +216,226 @@ def get_all_messages():
             'data': None
         }), 500
 
+def _get_listen_chat(wx_instance, who):
+    """获取监听列表中的聊天窗口，不在监听列表中时返回None"""
+    listen = wx_instance.listen
+    if not listen or who not in listen:
+        return None
+    return listen[who]
+
+
+def _request_watermark(source):
+    """从请求参数中读取水位，since为消息ID，since_hash为消息哈希"""
+    message_id = source.get('since') or None
+    digest = source.get('since_hash') or None
+    if not message_id and not digest:
+        return None
+    return {'id': message_id, 'hash': digest}
+
+
+def _public_watermark(watermark):
+    """响应中的水位，不包含服务端记录的更新时间"""
+    if not watermark:
+        return None
+    return {'id': watermark.get('id'), 'hash': watermark.get('hash')}
+
+
+@chat_bp.route('/sync', methods=['GET'])
+@require_api_key
+def sync_messages():
+    """
+    增量同步聊天记录，只返回比水位更新的消息
+
+    参数：who；since（消息ID）或since_hash（消息哈希，传了since时不使用），不传时使用服务端保存的
+    该consumer（默认default）上一次同步的水位。watermark_found为false表示水位已不在窗口中，
+    返回的是窗口中的全部消息，中间可能有遗漏，可以用previous_watermark调用/sync/backfill回填
+    """
+    wx_instance = wechat_manager.get_instance()
+    if not wx_instance:
+        return jsonify({
+            'code': 2001,
+            'message': '微信未初始化',
+            'data': None
+        }), 400
+
+    who = request.args.get('who')
+    consumer = request.args.get('consumer') or history_sync.DEFAULT_CONSUMER
+
+    if not who:
+        return jsonify({
+            'code': 1002,
+            'message': '缺少必要参数',
+            'data': None
+        }), 400
+
+    try:
+        chat_wnd = _get_listen_chat(wx_instance, who)
+        if chat_wnd is None:
+            return jsonify({
+                'code': 3001,
+                'message': f'聊天窗口 {who} 未在监听列表中',
+                'data': None
+            }), 404
+
+        store = history_sync.watermarks.get()
+        previous = _request_watermark(request.args) or store.get(who, consumer)
+
+        messages = history_sync.dedupe(_call_chat_method(wx_instance, chat_wnd, 'GetAllMessage') or [])
+        message_index.add_all(who, messages)
+
+        new_messages, found = history_sync.delta(messages, previous)
+        watermark = history_sync.make_watermark(messages) or previous
+        store.set(who, watermark, consumer)
+        store.record_sync(found, len(new_messages))
+
+        return jsonify({
+            'code': 0,
+            'message': '同步成功',
+            'data': {
+                'who': who,
+                'messages': [_format_message(msg) for msg in new_messages],
+                'watermark': _public_watermark(watermark),
+                'previous_watermark': _public_watermark(previous),
+                'watermark_found': found,
+                'loaded': len(messages)
+            }
+        })
+    except WeChatUnavailableError:
+        raise
+    except Exception as e:
+        logger.error(f"增量同步聊天记录失败: {str(e)}")
+        return jsonify({
+            'code': 3001,
+            'message': f'同步失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@chat_bp.route('/sync/backfill', methods=['POST'])
+@require_api_key
+def backfill_messages():
+    """
+    回填聊天记录：反复调用LoadMoreMessage向上加载，直到重新看到水位、已加载depth条消息、
+    到达最早的消息或加载max_loads次，返回去重后比水位更新的消息
+
+    请求体：who；since/since_hash（目标水位）或depth（没有水位时最多返回的消息数量）；
+    max_loads（默认和上限为HISTORY_SYNC_MAX_LOADS）；consumer（回填后前移该consumer的水位）
+    """
+    wx_instance = wechat_manager.get_instance()
+    if not wx_instance:
+        return jsonify({
+            'code': 2001,
+            'message': '微信未初始化',
+            'data': None
+        }), 400
+
+    data = request.get_json(silent=True) or {}
+    who = data.get('who')
+    consumer = data.get('consumer') or history_sync.DEFAULT_CONSUMER
+    limit = history_sync.default_max_loads()
+
+    if not who:
+        return jsonify({
+            'code': 1002,
+            'message': '缺少必要参数',
+            'data': None
+        }), 400
+    try:
+        max_loads = int(data.get('max_loads', limit))
+        depth = int(data['depth']) if data.get('depth') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({
+            'code': 1002,
+            'message': 'max_loads和depth必须是整数',
+            'data': None
+        }), 400
+    if not 0 <= max_loads <= limit or (depth is not None and depth < 1):
+        return jsonify({
+            'code': 1002,
+            'message': f'max_loads必须在0到{limit}之间，depth必须大于0',
+            'data': None
+        }), 400
+
+    try:
+        chat_wnd = _get_listen_chat(wx_instance, who)
+        if chat_wnd is None:
+            return jsonify({
+                'code': 3001,
+                'message': f'聊天窗口 {who} 未在监听列表中',
+                'data': None
+            }), 404
+
+        # 服务端保存的水位总是窗口中最新的消息，回填的目标水位由客户端指定（通常是/sync返回的previous_watermark）
+        store = history_sync.watermarks.get()
+        previous = _request_watermark(data)
+        if not previous and depth is None:
+            return jsonify({
+                'code': 1002,
+                'message': '必须指定since、since_hash或depth',
+                'data': None
+            }), 400
+
+        messages = []
+
+        def fetch():
+            messages[:] = _call_chat_method(wx_instance, chat_wnd, 'GetAllMessage') or []
+            return messages
+
+        result = history_sync.backfill(fetch, lambda: _call_chat_method(wx_instance, chat_wnd, 'LoadMoreMessage'),
+                                       previous, max_loads=max_loads, depth=depth)
+        message_index.add_all(who, messages)
+
+        # 只前移水位，回填得到的消息都不晚于窗口中最新的消息
+        watermark = history_sync.make_watermark(messages) or previous
+        store.set(who, watermark, consumer)
+        store.record_backfill(result['loads'])
+        logger.info(f"回填聊天记录 {who}: 加载{result['loads']}次，返回{len(result['messages'])}条，停止原因: {result['reason']}")
+
+        return jsonify({
+            'code': 0,
+            'message': '回填成功',
+            'data': {
+                'who': who,
+                'messages': [_format_message(msg) for msg in result['messages']],
+                'watermark': _public_watermark(watermark),
+                'previous_watermark': _public_watermark(previous),
+                'watermark_found': result['found'],
+                'loads': result['loads'],
+                'loaded': result['loaded'],
+                'reason': result['reason']
+            }
+        })
+    except WeChatUnavailableError:
+        raise
+    except Exception as e:
+        logger.error(f"回填聊天记录失败: {str(e)}")
+        return jsonify({
+            'code': 3001,
+            'message': f'回填失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@chat_bp.route('/sync/reset', methods=['POST'])
+@require_api_key
+def reset_sync_watermark():
+    """删除服务端保存的水位，不传consumer时删除该聊天所有consumer的水位"""
+    data = request.get_json(silent=True) or {}
+    who = data.get('who')
+    if not who:
+        return jsonify({
+            'code': 1002,
+            'message': '缺少必要参数',
+            'data': None
+        }), 400
+    removed = history_sync.watermarks.get().reset(who, data.get('consumer') or None)
+    return jsonify({
+        'code': 0,
+        'message': '重置成功',
+        'data': {'who': who, 'removed': removed}
+    })
+
+
 @chat_bp.route('/close', methods=['POST'])
 @require_api_key
 def close_chat_window():
@@ -249,6 +486,8 @@ def close_chat_window():
             'message': '关闭窗口成功',
             'data': {'who': who}
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"关闭聊天窗口失败: {str(e)}")
         return jsonify({
@@ -309,6 +548,8 @@ def send_emotion():
             'message': '发送表情成功',
             'data': {'who': who, 'emotion_index': emotion_index}
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"发送表情失败: {str(e)}")
         return jsonify({
@@ -375,6 +616,8 @@ def merge_forward():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"合并转发失败: {str(e)}")
         return jsonify({
@@ -436,6 +679,8 @@ def get_dialog():
                 'dialog': str(dialog) if dialog else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取对话框失败: {str(e)}")
         return jsonify({
@@ -510,6 +755,8 @@ def get_top_message():
                 'top_message': formatted_message
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取置顶消息失败: {str(e)}")
         return jsonify({
@@ -520,6 +767,7 @@ def get_top_message():
 
 @chat_bp.route('/send-message', methods=['POST'])
 @require_api_key
+@idempotent
 def send_message():
     """发送消息"""
     wx_instance = wechat_manager.get_instance()
@@ -570,6 +818,8 @@ def send_message():
             }
         })
 
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"发送消息失败: {str(e)}")
         return jsonify({
@@ -580,6 +830,7 @@ def send_message():
 
 @chat_bp.route('/send-file', methods=['POST'])
 @require_api_key
+@idempotent
 def send_file():
     """发送文件"""
     wx_instance = wechat_manager.get_instance()
@@ -638,6 +889,8 @@ def send_file():
             }
         })
 
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"发送文件失败: {str(e)}")
         return jsonify({
@@ -696,12 +949,6 @@ def get_next_new():
                 'data': {'messages': {}}
             })
 
-        # 辅助函数：清理群名中的人数信息
-        def clean_group_name(name):
-            # 匹配群名后面的 (数字) 模式
-            import re
-            return re.sub(r'\s*\(\d+\)$', '', name)
-
         # 格式化消息 - 处理不同库的返回格式
         formatted_messages = {}
 
@@ -930,6 +1177,8 @@ def clean_group_name(name):
             }
         })
 
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取新消息失败: {str(e)}")
         return jsonify({
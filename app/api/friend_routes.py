@@ -7,6 +7,7 @@
 from app.auth import require_api_key
 from app.unified_logger import logger
 from app.wechat import wechat_manager
+from app.health import WeChatUnavailableError
 
 friend_bp = Blueprint('friend', __name__)
 
@@ -64,6 +65,8 @@ def get_friend_details():
                 'friends': friends if friends else []
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取好友详情失败: {str(e)}")
         return jsonify({
@@ -117,6 +120,8 @@ def get_new_friends():
                 'new_friends': formatted_friends
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取新好友申请失败: {str(e)}")
         return jsonify({
@@ -203,6 +208,8 @@ def add_new_friend_alias():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"添加新好友失败: {str(e)}")
         return jsonify({
@@ -273,6 +280,8 @@ def add_new_friend():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"添加新好友失败: {str(e)}")
         return jsonify({
@@ -345,6 +354,8 @@ def manage_friend():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"好友管理失败: {str(e)}")
         return jsonify({
@@ -427,6 +438,8 @@ def add_friend_from_group():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"从群聊添加好友失败: {str(e)}")
         return jsonify({
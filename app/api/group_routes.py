@@ -7,9 +7,33 @@
 from app.auth import require_api_key
 from app.unified_logger import logger
 from app.wechat import wechat_manager
+from app.health import WeChatUnavailableError
+from app.group_member_cache import group_member_cache
+import time
 
 group_bp = Blueprint('group', __name__)
 
+def _load_group_members(wx_instance, who):
+    """切换到群聊页面并从界面获取群成员，供群成员缓存在失效时调用"""
+    # 先切换到群聊页面
+    logger.info(f"切换到群聊页面: {who}")
+    result = wx_instance.ChatWith(who)
+    logger.info(f"切换结果: {result}")
+
+    # 等待页面加载
+    time.sleep(0.5)
+
+    # 直接调用GetGroupMembers
+    members = wx_instance.GetGroupMembers()
+    logger.info(f"获取群成员: {len(members) if members else 0}个")
+    return members
+
+def _parse_refresh(value):
+    """解析refresh参数"""
+    if isinstance(value, bool):
+        return value
+    return str(value or '').lower() in ('1', 'true', 'yes')
+
 @group_bp.route('/add-members', methods=['POST'])
 @require_api_key
 def add_group_members():
@@ -55,6 +79,9 @@ def add_group_members():
         else:
             result = wx_instance.AddGroupMembers(group=group, members=members)
 
+        # 成员已变化，下次查询时重新获取
+        group_member_cache.invalidate(group, '通过接口添加成员')
+
         return jsonify({
             'code': 0,
             'message': '添加群成员成功',
@@ -64,6 +91,8 @@ def add_group_members():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"添加群成员失败: {str(e)}")
         return jsonify({
@@ -88,6 +117,7 @@ def get_group_members():
     if request.method == 'GET':
         # GET方法：从查询参数获取
         who = request.args.get('who')
+        refresh = _parse_refresh(request.args.get('refresh'))
     else:
         # POST方法：从JSON请求体获取
         data = request.get_json()
@@ -99,6 +129,7 @@ def get_group_members():
             }), 400
         # 支持group_name或who参数
         who = data.get('group_name') or data.get('who')
+        refresh = _parse_refresh(data.get('refresh'))
 
     if not who:
         return jsonify({
@@ -140,20 +171,11 @@ def get_group_members():
 
         logger.info(f"检测到的库名称: {lib_name}")
 
-        # 使用正确的方法获取群成员
+        # 优先使用群成员缓存，缓存失效时才切换群聊页面获取
         try:
-            # 先切换到群聊页面
-            logger.info(f"切换到群聊页面: {who}")
-            result = wx_instance.ChatWith(who)
-            logger.info(f"切换结果: {result}")
-
-            # 等待页面加载
-            import time
-            time.sleep(0.5)
-
-            # 直接调用GetGroupMembers
-            members = wx_instance.GetGroupMembers()
-            logger.info(f"获取群成员: {len(members) if members else 0}个")
+            cached = group_member_cache.get_members(
+                who, lambda group: _load_group_members(wx_instance, group), refresh=refresh)
+            members = cached['members']
 
             # 检查结果
             if members is None:
@@ -176,9 +198,14 @@ def get_group_members():
             'message': '获取群成员成功',
             'data': {
                 'group': who,
-                'members': members
+                'members': members,
+                'version': cached['version'],
+                'as_of': cached['as_of'],
+                'cached': cached['cached']
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error("wxautox", f"获取群成员失败: {str(e)}")
         return jsonify({
@@ -187,6 +214,95 @@ def get_group_members():
             'data': None
         }), 500
 
+@group_bp.route('/is-member', methods=['GET', 'POST'])
+@require_api_key
+def is_group_member():
+    """判断是否为群成员，优先使用群成员缓存"""
+    wx_instance = wechat_manager.get_instance()
+    if not wx_instance:
+        return jsonify({
+            'code': 2001,
+            'message': '微信未初始化',
+            'data': None
+        }), 400
+
+    if request.method == 'GET':
+        who = request.args.get('group_name') or request.args.get('who')
+        member = request.args.get('member')
+        refresh = _parse_refresh(request.args.get('refresh'))
+    else:
+        data = request.get_json(silent=True) or {}
+        who = data.get('group_name') or data.get('who')
+        member = data.get('member')
+        refresh = _parse_refresh(data.get('refresh'))
+
+    if not who or not member:
+        return jsonify({
+            'code': 1002,
+            'message': '缺少必要参数：who/group_name 和 member',
+            'data': None
+        }), 400
+
+    if not hasattr(wx_instance, 'GetGroupMembers'):
+        return jsonify({
+            'code': 3001,
+            'message': '当前微信实例不支持获取群成员功能',
+            'data': None
+        }), 400
+
+    try:
+        result = group_member_cache.is_member(
+            who, member, lambda group: _load_group_members(wx_instance, group), refresh=refresh)
+        if result is None:
+            return jsonify({
+                'code': 3001,
+                'message': f'无法获取群 {who} 的成员列表，请确保群聊存在且可访问',
+                'data': None
+            }), 404
+
+        return jsonify({
+            'code': 0,
+            'message': '查询成功',
+            'data': dict(result, group=who, member=member)
+        })
+    except WeChatUnavailableError:
+        raise
+    except Exception as e:
+        logger.error(f"查询群成员失败: {str(e)}")
+        return jsonify({
+            'code': 3001,
+            'message': f'查询群成员失败: {str(e)}',
+            'data': None
+        }), 500
+
+@group_bp.route('/member-diff', methods=['GET'])
+@require_api_key
+def get_group_member_diff():
+    """获取指定版本之后的群成员变化，只读缓存，不访问微信界面"""
+    who = request.args.get('group_name') or request.args.get('who')
+    since = request.args.get('since', 0, type=int)
+
+    if not who:
+        return jsonify({
+            'code': 1002,
+            'message': '缺少必要参数：who 或 group_name',
+            'data': None
+        }), 400
+
+    diff = group_member_cache.diff_since(who, since)
+    if diff is None:
+        return jsonify({
+            'code': 3001,
+            'message': f'群 {who} 的成员尚未缓存，请先调用获取群成员接口',
+            'data': None
+        }), 404
+
+    return jsonify({
+        'code': 0,
+        'message': '获取成功',
+        'data': dict(diff, group=who, since=since)
+    })
+
 @group_bp.route('/remove-members', methods=['POST'])
 @require_api_key
 def remove_group_members():
@@ -223,6 +339,9 @@ def remove_group_members():
         # 调用RemoveGroupMembers方法
         result = wx_instance.RemoveGroupMembers(group=group, members=members)
 
+        # 成员已变化，下次查询时重新获取
+        group_member_cache.invalidate(group, '通过接口移除成员')
+
         return jsonify({
             'code': 0,
             'message': '移除群成员成功',
@@ -232,6 +351,8 @@ def remove_group_members():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error("wxautox", f"移除群成员失败: {str(e)}")
         return jsonify({
@@ -313,6 +434,8 @@ def manage_group():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error("wxautox", f"群聊管理失败: {str(e)}")
         return jsonify({
@@ -353,6 +476,8 @@ def get_recent_groups():
                 'groups': groups if groups else []
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error("wxautox", f"获取最近群聊失败: {str(e)}")
         return jsonify({
@@ -404,6 +529,8 @@ def get_contact_groups():
                 'groups': groups if groups else []
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error("wxautox", f"获取通讯录群聊失败: {str(e)}")
         return jsonify({
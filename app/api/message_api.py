@@ -9,6 +9,7 @@
 from flask import Blueprint, request, jsonify
 from app.auth import require_api_key
 from app.wechat import wechat_manager
+from app.health import WeChatUnavailableError
 import config_manager
 
 # 使用统一日志系统
@@ -294,6 +295,8 @@ def get_next_new_message():
                 'messages': result
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取下一条新消息失败: {str(e)}")
         import traceback
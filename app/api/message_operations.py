@@ -7,6 +7,9 @@
 from app.auth import require_api_key
 from app.unified_logger import logger
 from app.wechat import wechat_manager
+from app.health import WeChatUnavailableError
+from app.utils.media_gc import media_gc, download_dirs
+from app.message_index import message_index
 
 message_ops_bp = Blueprint('message_ops', __name__)
 
@@ -45,13 +48,8 @@ def click_message():
 
         chat_wnd = listen[who]
 
-        # 获取消息
-        messages = chat_wnd.GetAllMessage()
-        target_message = None
-        for msg in messages:
-            if getattr(msg, 'id', '') == message_id:
-                target_message = msg
-                break
+        # 获取消息，优先从消息句柄索引中查找
+        target_message = message_index.find(who, message_id, chat_wnd.GetAllMessage)
 
         if not target_message:
             return jsonify({
@@ -71,8 +69,12 @@ def click_message():
                 'message_id': message_id
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"点击消息失败: {str(e)}")
+        # 消息句柄可能已失效，下次操作时重新获取
+        message_index.invalidate(who, message_id)
         return jsonify({
             'code': 3001,
             'message': f'点击消息失败: {str(e)}',
@@ -115,13 +117,8 @@ def quote_message():
 
         chat_wnd = listen[who]
 
-        # 获取消息
-        messages = chat_wnd.GetAllMessage()
-        target_message = None
-        for msg in messages:
-            if getattr(msg, 'id', '') == message_id:
-                target_message = msg
-                break
+        # 获取消息，优先从消息句柄索引中查找
+        target_message = message_index.find(who, message_id, chat_wnd.GetAllMessage)
 
         if not target_message:
             return jsonify({
@@ -142,8 +139,12 @@ def quote_message():
                 'reply_text': reply_text
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"引用回复失败: {str(e)}")
+        # 消息句柄可能已失效，下次操作时重新获取
+        message_index.invalidate(who, message_id)
         return jsonify({
             'code': 3001,
             'message': f'引用回复失败: {str(e)}',
@@ -186,13 +187,8 @@ def forward_message():
 
         chat_wnd = listen[who]
 
-        # 获取消息
-        messages = chat_wnd.GetAllMessage()
-        target_message = None
-        for msg in messages:
-            if getattr(msg, 'id', '') == message_id:
-                target_message = msg
-                break
+        # 获取消息，优先从消息句柄索引中查找
+        target_message = message_index.find(who, message_id, chat_wnd.GetAllMessage)
 
         if not target_message:
             return jsonify({
@@ -213,8 +209,12 @@ def forward_message():
                 'to_friends': to_friends
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"转发消息失败: {str(e)}")
+        # 消息句柄可能已失效，下次操作时重新获取
+        message_index.invalidate(who, message_id)
         return jsonify({
             'code': 3001,
             'message': f'转发消息失败: {str(e)}',
@@ -265,13 +265,8 @@ def tickle_message():
 
         chat_wnd = listen[who]
 
-        # 获取消息
-        messages = chat_wnd.GetAllMessage()
-        target_message = None
-        for msg in messages:
-            if getattr(msg, 'id', '') == message_id:
-                target_message = msg
-                break
+        # 获取消息，优先从消息句柄索引中查找
+        target_message = message_index.find(who, message_id, chat_wnd.GetAllMessage)
 
         if not target_message:
             return jsonify({
@@ -291,8 +286,12 @@ def tickle_message():
                 'message_id': message_id
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"拍一拍失败: {str(e)}")
+        # 消息句柄可能已失效，下次操作时重新获取
+        message_index.invalidate(who, message_id)
         return jsonify({
             'code': 3001,
             'message': f'拍一拍失败: {str(e)}',
@@ -343,13 +342,8 @@ def delete_message():
 
         chat_wnd = listen[who]
 
-        # 获取消息
-        messages = chat_wnd.GetAllMessage()
-        target_message = None
-        for msg in messages:
-            if getattr(msg, 'id', '') == message_id:
-                target_message = msg
-                break
+        # 获取消息，优先从消息句柄索引中查找
+        target_message = message_index.find(who, message_id, chat_wnd.GetAllMessage)
 
         if not target_message:
             return jsonify({
@@ -360,6 +354,7 @@ def delete_message():
 
         # 删除消息
         target_message.delete()
+        message_index.invalidate(who, message_id)
 
         return jsonify({
             'code': 0,
@@ -369,8 +364,12 @@ def delete_message():
                 'message_id': message_id
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"删除消息失败: {str(e)}")
+        # 消息句柄可能已失效，下次操作时重新获取
+        message_index.invalidate(who, message_id)
         return jsonify({
             'code': 3001,
             'message': f'删除消息失败: {str(e)}',
@@ -413,13 +412,8 @@ def download_message():
 
         chat_wnd = listen[who]
 
-        # 获取消息
-        messages = chat_wnd.GetAllMessage()
-        target_message = None
-        for msg in messages:
-            if getattr(msg, 'id', '') == message_id:
-                target_message = msg
-                break
+        # 获取消息，优先从消息句柄索引中查找
+        target_message = message_index.find(who, message_id, chat_wnd.GetAllMessage)
 
         if not target_message:
             return jsonify({
@@ -428,11 +422,14 @@ def download_message():
                 'data': None
             }), 404
 
-        # 下载文件
-        if save_path:
-            result = target_message.download(save_path)
-        else:
-            result = target_message.download()
+        # 下载文件，下载期间固定目标目录（未指定时为默认保存目录），避免被媒体回收删除
+        with media_gc.pinned(*download_dirs(save_path)):
+            if save_path:
+                result = target_message.download(save_path)
+            else:
+                result = target_message.download()
+        if result:
+            media_gc.touch(str(result))
 
         return jsonify({
             'code': 0,
@@ -444,8 +441,12 @@ def download_message():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"下载失败: {str(e)}")
+        # 消息句柄可能已失效，下次操作时重新获取
+        message_index.invalidate(who, message_id)
         return jsonify({
             'code': 3001,
             'message': f'下载失败: {str(e)}',
@@ -487,13 +488,8 @@ def voice_to_text():
 
         chat_wnd = listen[who]
 
-        # 获取消息
-        messages = chat_wnd.GetAllMessage()
-        target_message = None
-        for msg in messages:
-            if getattr(msg, 'id', '') == message_id:
-                target_message = msg
-                break
+        # 获取消息，优先从消息句柄索引中查找
+        target_message = message_index.find(who, message_id, chat_wnd.GetAllMessage)
 
         if not target_message:
             return jsonify({
@@ -523,8 +519,12 @@ def voice_to_text():
                 'text': text_result
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"语音转文字失败: {str(e)}")
+        # 消息句柄可能已失效，下次操作时重新获取
+        message_index.invalidate(who, message_id)
         return jsonify({
             'code': 3001,
             'message': f'语音转文字失败: {str(e)}',
@@ -567,13 +567,8 @@ def select_message_option():
 
         chat_wnd = listen[who]
 
-        # 获取消息
-        messages = chat_wnd.GetAllMessage()
-        target_message = None
-        for msg in messages:
-            if getattr(msg, 'id', '') == message_id:
-                target_message = msg
-                break
+        # 获取消息，优先从消息句柄索引中查找
+        target_message = message_index.find(who, message_id, chat_wnd.GetAllMessage)
 
         if not target_message:
             return jsonify({
@@ -595,8 +590,12 @@ def select_message_option():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"右键菜单操作失败: {str(e)}")
+        # 消息句柄可能已失效，下次操作时重新获取
+        message_index.invalidate(who, message_id)
         return jsonify({
             'code': 3001,
             'message': f'右键菜单操作失败: {str(e)}',
@@ -7,6 +7,8 @@
 from app.auth import require_api_key
 from app.unified_logger import logger
 from app.wechat import wechat_manager
+from app.health import WeChatUnavailableError
+from app.utils.media_gc import media_gc, download_dirs
 
 moments_bp = Blueprint('moments', __name__)
 
@@ -42,6 +44,8 @@ def open_moments():
                 'moments_window': str(moments_wnd) if moments_wnd else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"进入朋友圈失败: {str(e)}")
         return jsonify({
@@ -114,6 +118,8 @@ def get_moments():
                 'moments': formatted_moments
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取朋友圈内容失败: {str(e)}")
         return jsonify({
@@ -164,8 +170,9 @@ def save_moments_images():
                 'data': None
             }), 400
 
-        # 保存图片
-        result = moments_wnd.SaveImages(moment_index, save_path)
+        # 保存图片，保存期间固定目标目录（未指定时为默认保存目录），避免被媒体回收删除
+        with media_gc.pinned(*download_dirs(save_path)):
+            result = moments_wnd.SaveImages(moment_index, save_path)
 
         return jsonify({
             'code': 0,
@@ -176,6 +183,8 @@ def save_moments_images():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"保存朋友圈图片失败: {str(e)}")
         return jsonify({
@@ -257,6 +266,8 @@ def like_moment():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"点赞失败: {str(e)}")
         return jsonify({
@@ -339,6 +350,8 @@ def comment_moment():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"评论失败: {str(e)}")
         return jsonify({
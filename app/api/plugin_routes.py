@@ -78,6 +78,10 @@ def install_wxauto():
             config = config_manager.load_app_config()
             config['wechat_lib'] = 'wxauto'
             config_manager.save_app_config(config)
+
+            # 安装前的检测结果已失效
+            from app.wechat_lib_detector import detector
+            detector.clear_cache()
             
             return jsonify({
                 'code': 0,
@@ -148,8 +152,10 @@ def upload_wxautox():
         
         logger.info(f"wxautox wheel文件已保存到: {file_path}")
         
-        # 安装wxautox
-        success, message = plugin_manager.install_wxautox(file_path)
+        # 安装wxautox，安装期间固定wheel文件，避免被媒体回收删除
+        from app.utils.media_gc import media_gc
+        with media_gc.pinned(file_path):
+            success, message = plugin_manager.install_wxautox(file_path)
         
         if success:
             return jsonify({
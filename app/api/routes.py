@@ -4,17 +4,27 @@
 from app.wechat import wechat_manager
 from app.system_monitor import get_system_resources
 from app.api_queue import queue_task, get_queue_stats
+from app.idempotency import idempotent
 from app.config import Config
+from app.utils.media_gc import media_gc
+from app.utils.blob_store import blob_store
+from app.group_member_cache import group_member_cache
+from app.message_index import message_index
+from app.message_pipeline import message_pipeline, ListenContext
+from app.name_resolver import name_resolver, clean_group_name
+from app.health import health_monitor, unavailable_response, WeChatUnavailableError
+from app.accounts import AccountLocal, current_account_id
 import os
 import time
+import random
 from typing import Optional, List
 from urllib.parse import quote
 import functools
 
 api_bp = Blueprint('api', __name__)
 
-# 全局消息缓存 - 用于存储回调函数接收到的消息
-_message_cache = {}
+# 全局消息缓存 - 用于存储回调函数接收到的消息，每个账号一个
+listen_message_store = AccountLocal(dict, 'listen_message_store')
 
 # 记录程序启动时间
 start_time = time.time()
@@ -24,8 +34,11 @@
 @api_bp.before_request
 def before_request():
     g.start_time = time.time()
+    # 正常请求按比例采样记录DEBUG日志，慢请求由慢请求记录器单独记录
+    g.log_request = random.random() < Config.REQUEST_LOG_SAMPLE_RATE
     # 记录请求信息，但不记录详细的请求头和请求体
-    logger.info(f"收到请求: {request.method} {request.path}")
+    if g.log_request:
+        logger.debug(f"收到请求: {request.method} {request.path}")
     # 移除旧的日志处理器刷新代码，统一日志管理器会自动处理
 
     # 只在开发环境下记录请求体，且不记录请求头
@@ -44,12 +57,20 @@ def after_request(response):
     if hasattr(g, 'start_time'):
         duration = time.time() - g.start_time
         # 修改日志格式，确保API计数器能够正确识别 - 确保状态码周围有空格
-        logger.info(f"请求处理完成: {request.method} {request.path} - 状态码: {response.status_code} - 耗时: {duration:.2f}秒")
+        # 出错的请求总是记录INFO日志，正常请求按采样结果记录DEBUG日志
+        message = f"请求处理完成: {request.method} {request.path} - 状态码: {response.status_code} - 耗时: {duration:.2f}秒"
+        if response.status_code >= 400:
+            logger.info(message)
+        elif g.get('log_request'):
+            logger.debug(message)
         # 统一日志管理器会自动处理日志刷新
     return response
 
 @api_bp.errorhandler(Exception)
 def handle_error(error):
+    # 蓝图的Exception处理优先于应用的WeChatUnavailableError处理，需要在这里单独返回503
+    if isinstance(error, WeChatUnavailableError):
+        return unavailable_response(error.message, error.retry_after)
     # 记录未捕获的异常
     logger.error(f"未捕获的异常: {str(error)}", exc_info=True)
     return jsonify({
@@ -161,6 +182,7 @@ def format_at_message(message: str, at_list: Optional[List[str]] = None) -> str:
 # 消息相关接口
 @api_bp.route('/message/send', methods=['POST'])
 @require_api_key
+@idempotent
 def send_message():
     # 在队列处理前获取所有请求数据
     try:
@@ -191,6 +213,8 @@ def send_message():
             'message': '服务器内部错误',
             'data': None
         }), 500
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"处理发送消息请求失败: {str(e)}")
         return jsonify({
@@ -216,8 +240,11 @@ def _send_message_task(receiver, message, at_list, clear):
     try:
         formatted_message = format_at_message(message, at_list)
 
+        # 先通过名称索引把接收人解析为规范聊天名称，避免ChatWith切换到名称不一致的窗口
+        target = name_resolver.resolve_receiver(receiver)
+
         # 查找联系人
-        chat_name = wx_instance.ChatWith(receiver)
+        chat_name = wx_instance.ChatWith(target)
         if not chat_name:
             return {
                 'response': {
@@ -229,11 +256,11 @@ def _send_message_task(receiver, message, at_list, clear):
             }
 
         # 确认切换到了正确的聊天窗口
-        if chat_name != receiver:
+        if chat_name != target:
             return {
                 'response': {
                     'code': 3001,
-                    'message': f'联系人匹配错误，期望: {receiver}, 实际: {chat_name}',
+                    'message': f'联系人匹配错误，期望: {target}, 实际: {chat_name}',
                     'data': None
                 },
                 'status_code': 400
@@ -253,6 +280,9 @@ def _send_message_task(receiver, message, at_list, clear):
             },
             'status_code': 200
         }
+    except WeChatUnavailableError:
+        # 熔断期间由应用的错误处理返回503和Retry-After，不按发送失败返回500
+        raise
     except Exception as e:
         logger.error(f"发送消息失败: {str(e)}")
         return {
@@ -266,6 +296,7 @@ def _send_message_task(receiver, message, at_list, clear):
 
 @api_bp.route('/message/send-typing', methods=['POST'])
 @require_api_key
+@idempotent
 def send_typing_message():
     wx_instance = wechat_manager.get_instance()
     if not wx_instance:
@@ -293,8 +324,11 @@ def send_typing_message():
         lib_name = getattr(wx_instance, '_lib_name', 'wxauto')
         logger.debug(f"发送打字消息，当前使用的库: {lib_name}")
 
+        # 先通过名称索引把接收人解析为规范聊天名称，避免ChatWith切换到名称不一致的窗口
+        target = name_resolver.resolve_receiver(receiver)
+
         # 查找联系人
-        chat_name = wx_instance.ChatWith(receiver)
+        chat_name = wx_instance.ChatWith(target)
         if not chat_name:
             return jsonify({
                 'code': 3001,
@@ -303,10 +337,10 @@ def send_typing_message():
             }), 404
 
         # 确认切换到了正确的聊天窗口
-        if chat_name != receiver:
+        if chat_name != target:
             return jsonify({
                 'code': 3001,
-                'message': f'联系人匹配错误，期望: {receiver}, 实际: {chat_name}',
+                'message': f'联系人匹配错误，期望: {target}, 实际: {chat_name}',
                 'data': None
             }), 400
 
@@ -335,6 +369,8 @@ def send_typing_message():
             'message': '发送成功',
             'data': {'message_id': 'success'}
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"发送消息失败: {str(e)}")
         return jsonify({
@@ -345,20 +381,33 @@ def send_typing_message():
 
 @api_bp.route('/message/send-file', methods=['POST'])
 @require_api_key
+@idempotent
 def send_file():
     # 在队列处理前获取所有请求数据
     try:
         data = request.get_json()
         receiver = data.get('receiver')
-        file_paths = data.get('file_paths', [])
+        file_paths = list(data.get('file_paths', []))
+        blob_ids = data.get('blob_ids', [])
 
-        if not receiver or not file_paths:
+        if not receiver or (not file_paths and not blob_ids):
             return jsonify({
                 'code': 1002,
                 'message': '缺少必要参数',
                 'data': None
             }), 400
 
+        # 把已上传文件的blob_id解析为本地路径
+        if blob_ids:
+            blob_paths, missing_blobs = blob_store.resolve_paths(blob_ids)
+            if missing_blobs:
+                return jsonify({
+                    'code': 3003,
+                    'message': '部分文件未上传或已过期',
+                    'data': {'missing_blobs': missing_blobs}
+                }), 404
+            file_paths.extend(blob_paths)
+
         # 将任务加入队列处理
         result = _send_file_task(receiver, file_paths)
 
@@ -373,6 +422,8 @@ def send_file():
             'message': '服务器内部错误',
             'data': None
         }), 500
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"处理发送文件请求失败: {str(e)}")
         return jsonify({
@@ -399,8 +450,11 @@ def _send_file_task(receiver, file_paths):
     success_count = 0
 
     try:
+        # 先通过名称索引把接收人解析为规范聊天名称，避免ChatWith切换到名称不一致的窗口
+        target = name_resolver.resolve_receiver(receiver)
+
         # 查找联系人
-        chat_name = wx_instance.ChatWith(receiver)
+        chat_name = wx_instance.ChatWith(target)
         if not chat_name:
             return {
                 'response': {
@@ -412,32 +466,36 @@ def _send_file_task(receiver, file_paths):
             }
 
         # 确认切换到了正确的聊天窗口
-        if chat_name != receiver:
+        if chat_name != target:
             return {
                 'response': {
                     'code': 3001,
-                    'message': f'联系人匹配错误，期望: {receiver}, 实际: {chat_name}',
+                    'message': f'联系人匹配错误，期望: {target}, 实际: {chat_name}',
                     'data': None
                 },
                 'status_code': 400
             }
 
-        for file_path in file_paths:
-            if not os.path.exists(file_path):
-                failed_files.append({
-                    'path': file_path,
-                    'reason': '文件不存在'
-                })
-                continue
+        # 发送期间固定待发送文件，避免被媒体回收删除
+        with media_gc.pinned(*file_paths):
+            for file_path in file_paths:
+                if not os.path.exists(file_path):
+                    failed_files.append({
+                        'path': file_path,
+                        'reason': '文件不存在'
+                    })
+                    continue
 
-            try:
-                wx_instance.SendFiles(file_path)
-                success_count += 1
-            except Exception as e:
-                failed_files.append({
-                    'path': file_path,
-                    'reason': str(e)
-                })
+                try:
+                    wx_instance.SendFiles(file_path)
+                    success_count += 1
+                except WeChatUnavailableError:
+                    raise
+                except Exception as e:
+                    failed_files.append({
+                        'path': file_path,
+                        'reason': str(e)
+                    })
 
         return {
             'response': {
@@ -450,6 +508,8 @@ def _send_file_task(receiver, file_paths):
             },
             'status_code': 200
         }
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"发送文件失败: {str(e)}")
         return {
@@ -529,12 +589,6 @@ def parse_bool(value):
                 'data': {'messages': {}}
             })
 
-        # 辅助函数：清理群名中的人数信息
-        def clean_group_name(name):
-            # 匹配群名后面的 (数字) 模式
-            import re
-            return re.sub(r'\s*\(\d+\)$', '', name)
-
         # 格式化消息 - 处理不同库的返回格式
         formatted_messages = {}
 
@@ -813,6 +867,7 @@ def add_listen_chat():
             'data': None
         }), 400
 
+    created_cache = False
     try:
         # 获取原始微信实例（绕过WeChatAdapter的复杂处理）
         original_instance = wx_instance._instance if hasattr(wx_instance, '_instance') else wx_instance
@@ -828,33 +883,18 @@ def add_listen_chat():
         if not hasattr(original_instance, '_api_message_cache'):
             original_instance._api_message_cache = {}
 
+        # 回调在微信库的监听线程中执行，只把消息交给处理流水线；提前取得当前账号的缓存，供工作线程写入
+        listen_context = ListenContext(current_account_id(), listen_message_store.get(),
+                                       group_member_cache.get(), message_index.get())
+        # 聊天的缓存在添加监听时创建，流水线只写入仍在监听的聊天
+        created_cache = nickname not in listen_context.message_cache
+        listen_context.message_cache.setdefault(nickname, [])
+
         if lib_name == 'wxautox':
             # wxautox实现
             def message_callback(msg, chat):
-                """wxautox的消息回调函数，统一使用全局缓存"""
-                try:
-                    logger.info(f"wxautox收到消息: {msg}, 来自聊天: {chat}")
-
-                    # 将wxautox消息对象转换为可序列化的字典格式
-                    serializable_msg = {
-                        'type': getattr(msg, 'type', 'unknown'),
-                        'content': getattr(msg, 'content', str(msg)),
-                        'sender': getattr(msg, 'sender', ''),
-                        'id': getattr(msg, 'id', ''),
-                        'mtype': getattr(msg, 'mtype', None),
-                        'sender_remark': getattr(msg, 'sender_remark', None),
-                        'file_path': getattr(msg, 'file_path', None),
-                        'time': getattr(msg, 'time', None)
-                    }
-
-                    # 将消息存储到全局缓存中
-                    if nickname not in _message_cache:
-                        _message_cache[nickname] = []
-                    _message_cache[nickname].append(serializable_msg)
-
-                    logger.info(f"已将消息转换并存储到缓存: {serializable_msg}")
-                except Exception as e:
-                    logger.error(f"回调函数处理消息时出错: {str(e)}")
+                """wxautox的消息回调函数，只放入交接队列，序列化和写入缓存由流水线的工作线程完成"""
+                message_pipeline.submit(listen_context, nickname, msg)
 
             # 调用AddListenChat
             result = original_instance.AddListenChat(nickname=nickname, callback=message_callback)
@@ -874,30 +914,8 @@ def message_callback(msg, chat):
         else:
             # wxauto实现 - 需要提供callback参数
             def message_callback(msg, chat):
-                """wxauto的消息回调函数，接收msg和chat两个参数"""
-                try:
-                    logger.info(f"wxauto收到消息: {msg}, 来自聊天: {chat}")
-
-                    # 将wxauto消息对象转换为可序列化的字典格式
-                    serializable_msg = {
-                        'type': getattr(msg, 'type', 'unknown'),
-                        'content': getattr(msg, 'content', str(msg)),
-                        'sender': getattr(msg, 'sender', ''),
-                        'id': getattr(msg, 'id', ''),
-                        'mtype': getattr(msg, 'mtype', None),
-                        'sender_remark': getattr(msg, 'sender_remark', None),
-                        'file_path': getattr(msg, 'file_path', None),
-                        'time': getattr(msg, 'time', None)
-                    }
-
-                    # 将消息存储到全局缓存中
-                    if nickname not in _message_cache:
-                        _message_cache[nickname] = []
-                    _message_cache[nickname].append(serializable_msg)
-
-                    logger.info(f"已将消息转换并存储到缓存: {serializable_msg}")
-                except Exception as e:
-                    logger.error(f"wxauto回调函数处理消息时出错: {str(e)}")
+                """wxauto的消息回调函数，接收msg和chat两个参数，只放入交接队列"""
+                message_pipeline.submit(listen_context, nickname, msg)
 
             result = original_instance.AddListenChat(nickname, message_callback)
 
@@ -921,6 +939,8 @@ def message_callback(msg, chat):
         })
     except Exception as e:
         logger.error(f"添加监听失败: {str(e)}")
+        if created_cache:
+            listen_message_store.get().pop(nickname, None)
         return jsonify({
             'code': 3001,
             'message': f'添加监听失败: {str(e)}',
@@ -945,16 +965,17 @@ def get_listen_messages():
 
         # 统一从全局消息缓存获取消息
         messages = {}
-        if _message_cache:
-            logger.info(f"缓存中的聊天对象: {list(_message_cache.keys())}")
+        message_cache = listen_message_store.get()
+        if message_cache:
+            logger.info(f"缓存中的聊天对象: {list(message_cache.keys())}")
 
             # 找到第一个有消息的聊天对象
-            for chat_name, msg_list in _message_cache.items():
+            for chat_name, msg_list in message_cache.items():
                 if msg_list:  # 如果有消息
                     messages = {chat_name: msg_list}
                     logger.info(f"返回 {chat_name} 的 {len(msg_list)} 条消息")
                     # 清空缓存（消息已被消费）
-                    _message_cache[chat_name] = []
+                    message_cache[chat_name] = []
                     break
 
         if not messages:
@@ -1014,9 +1035,11 @@ def remove_listen_chat():
             logger.warning(f"{lib_name}库不支持RemoveListenChat方法")
 
         # 从全局缓存中移除
-        if nickname in _message_cache:
-            del _message_cache[nickname]
+        message_cache = listen_message_store.get()
+        if nickname in message_cache:
+            del message_cache[nickname]
             logger.info(f"已从缓存中移除监听对象: {nickname}")
+        message_index.discard_chat(nickname)
 
         return jsonify({
             'code': 0,
@@ -1049,6 +1072,7 @@ def remove_listen_chat():
 
 @api_bp.route('/chat-window/message/send', methods=['POST'])
 @require_api_key
+@idempotent
 def chat_window_send_message():
     wx_instance = wechat_manager.get_instance()
     if not wx_instance:
@@ -1187,6 +1211,7 @@ def chat_window_send_message():
 
 @api_bp.route('/chat-window/message/send-typing', methods=['POST'])
 @require_api_key
+@idempotent
 def chat_window_send_typing_message():
     wx_instance = wechat_manager.get_instance()
     if not wx_instance:
@@ -1277,6 +1302,7 @@ def chat_window_send_typing_message():
 
 @api_bp.route('/chat-window/message/send-file', methods=['POST'])
 @require_api_key
+@idempotent
 def chat_window_send_file():
     wx_instance = wechat_manager.get_instance()
     if not wx_instance:
@@ -1288,15 +1314,27 @@ def chat_window_send_file():
 
     data = request.get_json()
     who = data.get('who')
-    file_paths = data.get('file_paths', [])
+    file_paths = list(data.get('file_paths', []))
+    blob_ids = data.get('blob_ids', [])
 
-    if not who or not file_paths:
+    if not who or (not file_paths and not blob_ids):
         return jsonify({
             'code': 1002,
             'message': '缺少必要参数',
             'data': None
         }), 400
 
+    # 把已上传文件的blob_id解析为本地路径
+    if blob_ids:
+        blob_paths, missing_blobs = blob_store.resolve_paths(blob_ids)
+        if missing_blobs:
+            return jsonify({
+                'code': 3003,
+                'message': '部分文件未上传或已过期',
+                'data': {'missing_blobs': missing_blobs}
+            }), 404
+        file_paths.extend(blob_paths)
+
     try:
         # 检查当前使用的库
         lib_name = getattr(wx_instance, '_lib_name', 'wxauto')
@@ -1325,34 +1363,36 @@ def chat_window_send_file():
         success_count = 0
         failed_files = []
 
-        for file_path in file_paths:
-            if not os.path.exists(file_path):
-                failed_files.append({
-                    'path': file_path,
-                    'reason': '文件不存在'
-                })
-                continue
+        # 发送期间固定待发送文件，避免被媒体回收删除
+        with media_gc.pinned(*file_paths):
+            for file_path in file_paths:
+                if not os.path.exists(file_path):
+                    failed_files.append({
+                        'path': file_path,
+                        'reason': '文件不存在'
+                    })
+                    continue
 
-            try:
-                # 根据不同的库使用不同的处理方法
-                if lib_name == 'wxautox':
-                    # 对于wxautox库，直接调用方法
-                    chat_wnd.SendFiles(file_path)
-                else:
-                    # 对于wxauto库，使用更健壮的处理方法
-                    if hasattr(wx_instance, '_handle_chat_window_method'):
-                        wx_instance._handle_chat_window_method(chat_wnd, 'SendFiles', file_path)
-                    else:
-                        # 如果没有_handle_chat_window_method方法，直接调用
+                try:
+                    # 根据不同的库使用不同的处理方法
+                    if lib_name == 'wxautox':
+                        # 对于wxautox库，直接调用方法
                         chat_wnd.SendFiles(file_path)
+                    else:
+                        # 对于wxauto库，使用更健壮的处理方法
+                        if hasattr(wx_instance, '_handle_chat_window_method'):
+                            wx_instance._handle_chat_window_method(chat_wnd, 'SendFiles', file_path)
+                        else:
+                            # 如果没有_handle_chat_window_method方法，直接调用
+                            chat_wnd.SendFiles(file_path)
 
-                success_count += 1
-            except Exception as e:
-                logger.error(f"发送文件失败: {file_path} - {str(e)}")
-                failed_files.append({
-                    'path': file_path,
-                    'reason': str(e)
-                })
+                    success_count += 1
+                except Exception as e:
+                    logger.error(f"发送文件失败: {file_path} - {str(e)}")
+                    failed_files.append({
+                        'path': file_path,
+                        'reason': str(e)
+                    })
 
         return jsonify({
             'code': 0 if not failed_files else 3001,
@@ -1536,12 +1576,16 @@ def get_group_list():
         }), 400
 
     try:
-        groups = wx_instance.get_group_list()
+        # refresh=1时忽略缓存，重新从微信界面获取
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        groups, as_of, cache_status = wx_instance.get_directory('groups', refresh=refresh)
         return jsonify({
             'code': 0,
             'message': '获取成功',
             'data': {
-                'groups': groups
+                'groups': groups,
+                'as_of': as_of,
+                'cache_status': cache_status
             }
         })
     except Exception as e:
@@ -1616,12 +1660,16 @@ def get_contact_list():
         }), 400
 
     try:
-        contacts = wx_instance.get_friend_list()
+        # refresh=1时忽略缓存，重新从微信界面获取
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        contacts, as_of, cache_status = wx_instance.get_directory('friends', refresh=refresh)
         return jsonify({
             'code': 0,
             'message': '获取成功',
             'data': {
-                'friends': contacts
+                'friends': contacts,
+                'as_of': as_of,
+                'cache_status': cache_status
             }
         })
     except Exception as e:
@@ -1631,14 +1679,90 @@ def get_contact_list():
             'data': None
         }), 500
 
+@api_bp.route('/contacts/resolve', methods=['GET', 'POST'])
+@require_api_key
+def resolve_contacts():
+    """
+    批量解析联系人名称
+
+    基于已缓存的好友、群聊和会话列表，支持精确、备注、昵称、拼音首字母和编辑距离匹配，
+    返回规范聊天名称和候选列表，不会切换微信界面
+    """
+    if request.method == 'GET':
+        names = request.args.getlist('name') or [n for n in request.args.get('names', '').split(',') if n]
+        limit = request.args.get('limit', 5)
+        fuzzy = request.args.get('fuzzy', 'true').lower() not in ('0', 'false', 'no')
+        load = request.args.get('load', 'true').lower() not in ('0', 'false', 'no')
+    else:
+        data = request.get_json(silent=True) or {}
+        names = data.get('names') or ([data['name']] if data.get('name') else [])
+        limit = data.get('limit', 5)
+        fuzzy = bool(data.get('fuzzy', True))
+        load = bool(data.get('load', True))
+
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return jsonify({
+            'code': 1002,
+            'message': f'limit参数错误: {limit}',
+            'data': None
+        }), 400
+
+    if not names or not isinstance(names, list):
+        return jsonify({
+            'code': 1002,
+            'message': '缺少必要参数: names',
+            'data': None
+        }), 400
+
+    try:
+        # 索引为空时从通讯录缓存加载一次（缓存已有数据时不会访问微信界面）
+        if load and name_resolver.is_empty():
+            wx_instance = wechat_manager.get_instance()
+            if wx_instance and getattr(wx_instance, '_instance', None):
+                for kind in ('friends', 'groups'):
+                    try:
+                        wx_instance.get_directory(kind)
+                    except Exception as e:
+                        logger.warning(f"加载名称索引数据失败: {kind} - {str(e)}")
+
+        start = time.perf_counter()
+        results = name_resolver.resolve_many([str(n) for n in names], limit=max(1, min(limit, 50)), fuzzy=fuzzy)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        return jsonify({
+            'code': 0,
+            'message': '解析完成',
+            'data': {
+                'results': results,
+                'resolved_count': sum(1 for r in results if r['name']),
+                'elapsed_ms': round(elapsed_ms, 3),
+                'index': name_resolver.get_stats()
+            }
+        })
+    except Exception as e:
+        logger.error(f"解析联系人名称失败: {str(e)}")
+        return jsonify({
+            'code': 5001,
+            'message': f'解析联系人名称失败: {str(e)}',
+            'data': None
+        }), 500
+
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     wx_instance = wechat_manager.get_instance()
     wx_status = "not_initialized"
     wx_lib = "unknown"
 
+    health = None
     if wx_instance:
-        wx_status = "connected" if wechat_manager.check_connection() else "disconnected"
+        # 使用连接监控和接口调用维护的缓存状态，不在健康检查中访问微信界面
+        health = health_monitor.get_stats()
+        if health['state'] == 'unknown':
+            wx_status = "not_initialized"
+        else:
+            wx_status = "connected" if health['circuit'] == 'closed' else "disconnected"
 
         # 获取当前使用的库名称 - 不依赖微信实例初始化
         try:
@@ -1678,7 +1802,8 @@ def health_check():
             'status': 'ok',
             'wechat_status': wx_status,
             'uptime': int(time.time() - start_time),
-            'wx_lib': wx_lib
+            'wx_lib': wx_lib,
+            'health': health
         }
     })
 
@@ -1932,9 +2057,10 @@ def download_file():
         # 获取文件名
         filename = os.path.basename(file_path)
 
-        # 读取文件内容
-        with open(file_path, 'rb') as f:
-            file_content = f.read()
+        # 读取文件内容，读取期间固定文件，避免被媒体回收删除
+        with media_gc.pinned(file_path):
+            with open(file_path, 'rb') as f:
+                file_content = f.read()
 
         # 设置响应头
         response = Response(
@@ -0,0 +1,129 @@
+"""
+定时发送相关API路由
+创建、查询和取消延迟发送或按间隔重复发送的消息和文件，
+任务属于创建时选择的账号，查询和取消只能操作当前账号的任务
+"""
+
+from flask import Blueprint, jsonify, request
+from app.auth import require_api_key
+from app.idempotency import idempotent
+from app.unified_logger import logger
+from app.accounts import current_account_id
+from app.scheduler import scheduler, ScheduleError
+
+schedule_bp = Blueprint('schedule', __name__)
+
+
+def _error_response(e: ScheduleError):
+    """把定时任务异常转换为统一的错误响应"""
+    return jsonify({
+        'code': e.code,
+        'message': e.message,
+        'data': e.data
+    }), e.status_code
+
+
+@schedule_bp.route('/create', methods=['POST'])
+@require_api_key
+@idempotent
+def create_schedule():
+    """
+    创建定时任务
+
+    请求体与发送接口相同（receiver、message、at_list，或receiver、file_paths、blob_ids），另外支持：
+    run_at（时间戳或ISO 8601时间）或delay（秒）、interval（秒，重复发送）、max_runs、end_at、
+    misfire（skip/late/collapse）、grace（秒）、priority（数值越小越先执行）
+    """
+    try:
+        item = scheduler.create(request.get_json(silent=True))
+        return jsonify({
+            'code': 0,
+            'message': '创建成功',
+            'data': item
+        })
+    except ScheduleError as e:
+        return _error_response(e)
+    except Exception as e:
+        logger.error(f"创建定时任务失败: {str(e)}")
+        return jsonify({
+            'code': 5000,
+            'message': f'创建定时任务失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@schedule_bp.route('/list', methods=['GET'])
+@require_api_key
+def list_schedules():
+    """
+    查询当前账号的定时任务
+
+    默认返回待执行和正在发送的任务，按下次发送时间排序；
+    status为done/failed/missed/cancelled时从最近结束的任务中查询
+    """
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({
+            'code': 1002,
+            'message': 'offset和limit必须是整数',
+            'data': None
+        }), 400
+    if offset < 0 or not 1 <= limit <= 1000:
+        return jsonify({
+            'code': 1002,
+            'message': 'offset不能小于0，limit必须在1到1000之间',
+            'data': None
+        }), 400
+
+    result = scheduler.list(account_id=current_account_id(),
+                            status=request.args.get('status') or None,
+                            receiver=request.args.get('receiver') or None,
+                            offset=offset, limit=limit)
+    return jsonify({
+        'code': 0,
+        'message': '获取成功',
+        'data': result
+    })
+
+
+@schedule_bp.route('/<item_id>', methods=['GET'])
+@require_api_key
+def get_schedule(item_id):
+    """查询定时任务的状态和最近一次发送结果"""
+    item = scheduler.get(item_id, account_id=current_account_id())
+    if item is None:
+        return jsonify({
+            'code': 4004,
+            'message': f'定时任务不存在: {item_id}',
+            'data': None
+        }), 404
+    return jsonify({
+        'code': 0,
+        'message': '获取成功',
+        'data': item
+    })
+
+
+@schedule_bp.route('/cancel', methods=['POST'])
+@require_api_key
+def cancel_schedule():
+    """取消定时任务，已加入请求队列的本次发送不受影响"""
+    data = request.get_json(silent=True) or {}
+    item_id = data.get('id')
+    if not item_id:
+        return jsonify({
+            'code': 1002,
+            'message': '缺少定时任务id',
+            'data': None
+        }), 400
+    try:
+        item = scheduler.cancel(item_id, account_id=current_account_id())
+        return jsonify({
+            'code': 0,
+            'message': '取消成功',
+            'data': item
+        })
+    except ScheduleError as e:
+        return _error_response(e)
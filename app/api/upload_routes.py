@@ -0,0 +1,283 @@
+"""
+文件上传相关API路由
+把文件按SHA-256存入本机内容寻址存储，发送文件接口可通过blob_id引用，
+支持一次性上传和带偏移校验的分块续传
+"""
+
+from flask import Blueprint, jsonify, request, make_response
+from app.auth import require_api_key
+from app.unified_logger import logger
+from app.utils.blob_store import blob_store, BlobStoreError, is_valid_blob_id
+
+upload_bp = Blueprint('upload', __name__)
+
+
+def _error_response(e: BlobStoreError):
+    """把存储异常转换为统一的错误响应"""
+    response = make_response(jsonify({
+        'code': e.code,
+        'message': e.message,
+        'data': e.data
+    }), e.status_code)
+    if e.data and 'offset' in e.data:
+        response.headers['Upload-Offset'] = str(e.data['offset'])
+    return response
+
+
+def _public_info(info: dict) -> dict:
+    """返回给调用方的文件信息，附带本机路径便于兼容file_paths参数"""
+    return {
+        'blob_id': info['blob_id'],
+        'filename': info['filename'],
+        'size': info['size'],
+        'path': info['path'],
+        'deduplicated': info.get('deduplicated', info.get('exists', False)),
+    }
+
+
+@upload_bp.route('/file', methods=['POST'])
+@require_api_key
+def upload_file():
+    """
+    一次性上传文件
+
+    支持两种方式：
+    1. multipart/form-data，文件字段名为file
+    2. 请求体直接为文件内容，通过filename查询参数或X-Filename请求头指定文件名
+
+    可通过sha256参数声明文件哈希，服务端校验不一致时拒绝
+    """
+    try:
+        expected_sha256 = request.args.get('sha256') or request.form.get('sha256')
+
+        if request.files:
+            file = request.files.get('file')
+            if not file or not file.filename:
+                return jsonify({
+                    'code': 1002,
+                    'message': '缺少file文件字段',
+                    'data': None
+                }), 400
+            info = blob_store.put_stream(file.stream, file.filename, expected_sha256)
+        else:
+            filename = request.args.get('filename') or request.headers.get('X-Filename')
+            if not filename:
+                return jsonify({
+                    'code': 1002,
+                    'message': '缺少filename参数',
+                    'data': None
+                }), 400
+            info = blob_store.put_stream(request.stream, filename, expected_sha256)
+
+        return jsonify({
+            'code': 0,
+            'message': '上传成功',
+            'data': _public_info(info)
+        })
+    except BlobStoreError as e:
+        return _error_response(e)
+    except Exception as e:
+        logger.error(f"上传文件失败: {str(e)}", exc_info=True)
+        return jsonify({
+            'code': 4001,
+            'message': f'上传文件失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@upload_bp.route('/blob/<blob_id>', methods=['GET'])
+@require_api_key
+def get_blob(blob_id):
+    """
+    查询文件是否已存在
+
+    调用方可先在本地计算SHA-256并用HEAD请求查询，已存在时跳过上传
+    """
+    if not is_valid_blob_id(blob_id):
+        return jsonify({
+            'code': 1002,
+            'message': 'blob_id格式错误',
+            'data': None
+        }), 400
+
+    info = blob_store.get(blob_id)
+    if not info:
+        return jsonify({
+            'code': 4004,
+            'message': f'文件不存在: {blob_id}',
+            'data': None
+        }), 404
+
+    return jsonify({
+        'code': 0,
+        'message': '获取成功',
+        'data': _public_info(info)
+    })
+
+
+@upload_bp.route('/sessions', methods=['POST'])
+@require_api_key
+def create_upload_session():
+    """
+    创建分块上传会话
+
+    请求体: {"filename": "海报.png", "size": 1048576, "sha256": "..."}
+    声明的sha256已存在时直接返回已有文件，exists为true
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename')
+    size = data.get('size')
+    sha256 = data.get('sha256')
+
+    if not filename:
+        return jsonify({
+            'code': 1002,
+            'message': '缺少必要参数',
+            'data': None
+        }), 400
+
+    try:
+        if size is not None:
+            size = int(size)
+        result = blob_store.create_session(filename, size, sha256)
+        if result.get('exists'):
+            return jsonify({
+                'code': 0,
+                'message': '文件已存在，无需上传',
+                'data': dict(_public_info(result), exists=True)
+            })
+
+        response = make_response(jsonify({
+            'code': 0,
+            'message': '创建上传会话成功',
+            'data': result
+        }), 201)
+        response.headers['Upload-Offset'] = '0'
+        return response
+    except (TypeError, ValueError):
+        return jsonify({
+            'code': 1002,
+            'message': 'size参数错误',
+            'data': None
+        }), 400
+    except BlobStoreError as e:
+        return _error_response(e)
+    except Exception as e:
+        logger.error(f"创建上传会话失败: {str(e)}", exc_info=True)
+        return jsonify({
+            'code': 4001,
+            'message': f'创建上传会话失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@upload_bp.route('/sessions/<upload_id>', methods=['GET'])
+@require_api_key
+def get_upload_session(upload_id):
+    """查询分块上传进度，Upload-Offset响应头为服务端已接收的字节数"""
+    try:
+        session = blob_store.get_session(upload_id)
+        response = make_response(jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': session
+        }))
+        response.headers['Upload-Offset'] = str(session['offset'])
+        return response
+    except BlobStoreError as e:
+        return _error_response(e)
+
+
+@upload_bp.route('/sessions/<upload_id>', methods=['PATCH', 'PUT'])
+@require_api_key
+def upload_chunk(upload_id):
+    """
+    上传一个分块
+
+    请求头Upload-Offset（或查询参数offset）为分块起始偏移，必须等于服务端已接收的字节数，
+    不一致时返回409及当前偏移，调用方从该偏移续传
+    """
+    offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        return jsonify({
+            'code': 1002,
+            'message': '缺少或错误的Upload-Offset',
+            'data': None
+        }), 400
+
+    try:
+        session = blob_store.append_chunk(upload_id, offset, request.stream)
+        response = make_response(jsonify({
+            'code': 0,
+            'message': '分块上传成功',
+            'data': session
+        }))
+        response.headers['Upload-Offset'] = str(session['offset'])
+        return response
+    except BlobStoreError as e:
+        return _error_response(e)
+    except Exception as e:
+        logger.error(f"上传分块失败: {str(e)}", exc_info=True)
+        return jsonify({
+            'code': 4001,
+            'message': f'上传分块失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@upload_bp.route('/sessions/<upload_id>/complete', methods=['POST'])
+@require_api_key
+def complete_upload_session(upload_id):
+    """完成分块上传，校验大小和SHA-256后存入存储"""
+    try:
+        info = blob_store.complete_session(upload_id)
+        return jsonify({
+            'code': 0,
+            'message': '上传成功',
+            'data': _public_info(info)
+        })
+    except BlobStoreError as e:
+        return _error_response(e)
+    except Exception as e:
+        logger.error(f"完成上传失败: {str(e)}", exc_info=True)
+        return jsonify({
+            'code': 4001,
+            'message': f'完成上传失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@upload_bp.route('/sessions/<upload_id>', methods=['DELETE'])
+@require_api_key
+def abort_upload_session(upload_id):
+    """取消分块上传"""
+    try:
+        blob_store.abort_session(upload_id)
+        return jsonify({
+            'code': 0,
+            'message': '已取消上传',
+            'data': {'upload_id': upload_id}
+        })
+    except BlobStoreError as e:
+        return _error_response(e)
+
+
+@upload_bp.route('/stats', methods=['GET'])
+@require_api_key
+def get_upload_stats():
+    """获取文件存储统计信息"""
+    try:
+        return jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': blob_store.get_stats()
+        })
+    except Exception as e:
+        logger.error(f"获取文件存储统计失败: {str(e)}")
+        return jsonify({
+            'code': 5002,
+            'message': f'获取文件存储统计失败: {str(e)}',
+            'data': None
+        }), 500
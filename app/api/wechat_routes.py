@@ -3,10 +3,16 @@
 实现WeChat类的所有方法
 """
 
-from flask import Blueprint, jsonify, request
+import json
+import math
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from app.auth import require_api_key
 from app.unified_logger import logger
 from app.wechat import wechat_manager
+from app.health import WeChatUnavailableError
+from app.group_member_cache import group_member_cache
+from app.name_resolver import name_resolver
+from app.session_watcher import session_watcher
 
 wechat_bp = Blueprint('wechat_extended', __name__)
 
@@ -40,6 +46,13 @@ def get_session():
             }
             formatted_sessions.append(formatted_session)
 
+            # 会话名中的群人数变化或入群/退群提示会使群成员缓存失效
+            group_member_cache.observe_session(formatted_session['name'], formatted_session['content'])
+
+        # 会话名称加入名称解析索引，同时更新会话列表快照
+        name_resolver.update_source('sessions', [s['name'] for s in formatted_sessions])
+        session_watcher.observe(formatted_sessions)
+
         return jsonify({
             'code': 0,
             'message': '获取会话列表成功',
@@ -47,6 +60,8 @@ def get_session():
                 'sessions': formatted_sessions
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取会话列表失败: {str(e)}")
         return jsonify({
@@ -55,6 +70,108 @@ def get_session():
             'data': None
         }), 500
 
+def _parse_since():
+    """解析since参数，缺省或格式错误时视为0（返回完整快照）"""
+    try:
+        return max(int(request.args.get('since', 0)), 0)
+    except (TypeError, ValueError):
+        return 0
+
+@wechat_bp.route('/session-changes', methods=['GET'])
+@require_api_key
+def get_session_changes():
+    """
+    获取会话列表变化
+
+    查询参数:
+        since: 上次返回的version，为0或过旧时返回完整快照（full为true）
+        wait: 没有变化时最长等待的秒数（长轮询），默认0立即返回，最大60
+
+    changed_chats为有未读消息且发生变化的聊天，调用方只需对这些聊天获取新消息
+    """
+    wx_instance = wechat_manager.get_instance()
+    if not wx_instance:
+        return jsonify({
+            'code': 2001,
+            'message': '微信未初始化',
+            'data': None
+        }), 400
+
+    try:
+        wait = float(request.args.get('wait', 0))
+        if not math.isfinite(wait):
+            raise ValueError('wait必须是有限数值')
+    except (TypeError, ValueError):
+        return jsonify({
+            'code': 1002,
+            'message': 'wait参数错误',
+            'data': None
+        }), 400
+    wait = min(max(wait, 0), 60)
+
+    try:
+        since = _parse_since()
+        session_watcher.ensure_started(wx_instance.get_session_snapshot)
+        if wait > 0:
+            result = session_watcher.wait_for_changes(since, wait)
+        else:
+            result = session_watcher.changes_since(since)
+
+        return jsonify({
+            'code': 0,
+            'message': '获取会话变化成功',
+            'data': result
+        })
+    except WeChatUnavailableError:
+        raise
+    except Exception as e:
+        logger.error(f"获取会话变化失败: {str(e)}")
+        return jsonify({
+            'code': 3001,
+            'message': f'获取会话变化失败: {str(e)}',
+            'data': None
+        }), 500
+
+@wechat_bp.route('/session-events', methods=['GET'])
+@require_api_key
+def session_events():
+    """
+    会话列表变化事件流（text/event-stream）
+
+    每次变化推送一条session_change事件，data与session-changes接口相同；
+    断线重连时可通过since参数或Last-Event-ID请求头从上次的版本继续
+    """
+    wx_instance = wechat_manager.get_instance()
+    if not wx_instance:
+        return jsonify({
+            'code': 2001,
+            'message': '微信未初始化',
+            'data': None
+        }), 400
+
+    since = _parse_since()
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    session_watcher.ensure_started(wx_instance.get_session_snapshot)
+
+    def generate():
+        version = since
+        while True:
+            result = session_watcher.wait_for_changes(version, 15)
+            if result['version'] == version:
+                # 保持连接的注释行
+                yield ': keep-alive\n\n'
+                continue
+            version = result['version']
+            payload = json.dumps(result, ensure_ascii=False, default=str)
+            yield f"id: {version}\nevent: session_change\ndata: {payload}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @wechat_bp.route('/send-url-card', methods=['POST'])
 @require_api_key
 def send_url_card():
@@ -101,6 +218,8 @@ def send_url_card():
                 'result': str(result) if result else None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"发送链接卡片失败: {str(e)}")
         return jsonify({
@@ -144,6 +263,8 @@ def chat_with():
                 'result': result
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"打开聊天窗口失败: {str(e)}")
         return jsonify({
@@ -185,6 +306,8 @@ def get_sub_window():
                 'has_window': sub_window is not None
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取子窗口失败: {str(e)}")
         return jsonify({
@@ -225,6 +348,8 @@ def get_all_sub_windows():
                 'sub_windows': formatted_windows
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取所有子窗口失败: {str(e)}")
         return jsonify({
@@ -261,6 +386,8 @@ def start_listening():
             'message': '开始监听成功',
             'data': None
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"开始监听失败: {str(e)}")
         return jsonify({
@@ -293,6 +420,8 @@ def stop_listening():
             'message': '停止监听成功',
             'data': {'remove': remove}
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"停止监听失败: {str(e)}")
         return jsonify({
@@ -322,6 +451,8 @@ def switch_to_chat():
             'message': '切换到聊天页面成功',
             'data': None
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"切换到聊天页面失败: {str(e)}")
         return jsonify({
@@ -351,6 +482,8 @@ def switch_to_contact():
             'message': '切换到联系人页面成功',
             'data': None
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"切换到联系人页面失败: {str(e)}")
         return jsonify({
@@ -391,6 +524,8 @@ def is_online():
                 'online': online
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取在线状态失败: {str(e)}")
         return jsonify({
@@ -442,6 +577,8 @@ def get_my_info():
                 'my_info': formatted_info
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"获取个人信息失败: {str(e)}")
         return jsonify({
@@ -479,6 +616,8 @@ def keep_running():
                 'timeout': timeout
             }
         })
+    except WeChatUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"保持运行设置失败: {str(e)}")
         return jsonify({
@@ -3,15 +3,44 @@
 提供高并发支持和请求队列管理
 """
 
+import contextvars
+import itertools
 import queue
 import threading
 import time
 import traceback
 from functools import wraps
 from app.unified_logger import logger
+from app.metrics import observe_queue_task
+from app.tracing import tracer
+from app.slow_requests import slow_request_recorder
+from app.accounts import DEFAULT_ACCOUNT, current_account_id, use_account
+from app.health import WeChatUnavailableError
 
-# 全局请求队列
-request_queue = queue.Queue()
+# 任务默认优先级，数值越小越先执行
+DEFAULT_PRIORITY = 0
+
+
+class TaskQueue(queue.PriorityQueue):
+    """按优先级出队的任务队列，相同优先级按加入顺序执行"""
+
+    def __init__(self):
+        super().__init__()
+        self._sequence = itertools.count()
+
+    def _put(self, task):
+        super()._put((task.get('priority', DEFAULT_PRIORITY), next(self._sequence), task))
+
+    def _get(self):
+        return super()._get()[2]
+
+
+# 全局请求队列（默认账号）
+request_queue = TaskQueue()
+
+# 其他账号的请求队列，首次使用时创建，{账号: {'queue', 'threads', 'stop_event'}}
+account_queues = {}
+account_queues_lock = threading.Lock()
 
 # 请求计数器
 request_counter = 0
@@ -29,6 +58,10 @@
 # 锁，用于线程安全的计数器更新
 counter_lock = threading.Lock()
 
+# 当前请求的任务观察者，请求超时后仍需跟踪任务结果时设置（例如幂等键），
+# 需要实现 task_finished(task, result_type, result) 和 task_timed_out(task) -> bool
+task_observer = contextvars.ContextVar('task_observer', default=None)
+
 def enqueue_request(func, *args, **kwargs):
     """
     将请求加入队列
@@ -41,6 +74,23 @@ def enqueue_request(func, *args, **kwargs):
     Returns:
         任务ID
     """
+    return submit_task(func, args, kwargs)
+
+def submit_task(func, args=(), kwargs=None, priority=DEFAULT_PRIORITY, deadline=None, observer=None):
+    """
+    将任务加入当前账号的队列，不等待结果
+
+    Args:
+        func: 要执行的函数
+        args (tuple): 位置参数
+        kwargs (dict, optional): 关键字参数
+        priority (int): 优先级，数值越小越先执行
+        deadline (float, optional): 截止时间戳，队列线程取到任务时已超过则不执行，结果为('expired', 原因)
+        observer: 任务观察者，默认使用task_observer的当前值
+
+    Returns:
+        任务
+    """
     global request_counter
     
     with counter_lock:
@@ -52,44 +102,121 @@ def enqueue_request(func, *args, **kwargs):
         'id': task_id,
         'func': func,
         'args': args,
-        'kwargs': kwargs,
+        'kwargs': kwargs or {},
         'result_queue': queue.Queue(),
-        'timestamp': time.time()
+        'timestamp': time.time(),
+        'priority': priority,
+        'deadline': deadline,
+        # 请求的链路上下文，队列线程执行时恢复
+        'trace': tracer.inject(),
+        # 发起请求的线程，慢请求记录用来关联执行任务的队列线程
+        'request_ident': threading.get_ident(),
+        'observer': observer if observer is not None else task_observer.get()
     }
     
-    # 加入队列
-    request_queue.put(task)
+    # 加入当前账号的队列
+    _get_queue(current_account_id()).put(task)
     logger.debug(f"任务 {task_id} 已加入队列")
     
     return task
 
-def queue_processor():
-    """队列处理线程函数"""
+def _get_queue(account_id):
+    """获取账号的请求队列，非默认账号首次使用时启动其队列处理线程"""
+    if account_id == DEFAULT_ACCOUNT:
+        return request_queue
+    entry = account_queues.get(account_id)
+    if entry is None:
+        with account_queues_lock:
+            entry = account_queues.get(account_id)
+            if entry is None:
+                entry = _start_account_queue(account_id)
+    return entry['queue']
+
+def _start_account_queue(account_id):
+    """启动账号的请求队列，同一账号的界面操作只在自己的队列线程中执行"""
+    try:
+        from app.config import Config
+        workers = Config.ACCOUNT_QUEUE_WORKERS
+    except (ImportError, AttributeError):
+        workers = 1
+
+    entry = {'queue': TaskQueue(), 'threads': [], 'stop_event': threading.Event()}
+    for i in range(workers):
+        thread = threading.Thread(target=queue_processor, args=(entry['queue'], account_id, entry['stop_event']),
+                                  daemon=True, name=f"QueueProcessor-{account_id}-{i}")
+        thread.start()
+        entry['threads'].append(thread)
+    account_queues[account_id] = entry
+    logger.info(f"已为账号 {account_id} 启动 {workers} 个队列处理线程")
+    return entry
+
+def stop_account_queue(account_id):
+    """停止账号的队列处理线程，未执行的任务会超时"""
+    with account_queues_lock:
+        entry = account_queues.pop(account_id, None)
+    if entry is None:
+        return
+    entry['stop_event'].set()
+    for thread in entry['threads']:
+        thread.join(timeout=2)
+    logger.info(f"账号 {account_id} 的队列处理线程已停止")
+
+def queue_processor(task_queue=None, account_id=DEFAULT_ACCOUNT, stop_event=None):
+    """
+    队列处理线程函数
+
+    Args:
+        task_queue: 处理的队列，默认为全局请求队列
+        account_id (str): 队列所属的账号，任务在该账号的上下文中执行
+        stop_event: 单独停止该队列的事件
+    """
+    with use_account(account_id):
+        _process_queue(task_queue or request_queue, stop_event)
+
+def _process_queue(task_queue, stop_event):
     global error_counter
     
     logger.info("队列处理线程已启动")
     
-    while queue_running:
+    while queue_running and not (stop_event and stop_event.is_set()):
         try:
             # 从队列获取任务，超时1秒
             try:
-                task = request_queue.get(timeout=1)
+                task = task_queue.get(timeout=1)
             except queue.Empty:
                 continue
                 
             # 处理任务
+            started = time.time()
+            ok = False
+            task_name = getattr(task['func'], '__name__', 'unknown')
+            slow_request_recorder.attach_worker(task.get('request_ident'))
             try:
-                logger.debug(f"处理任务 {task['id']}")
-                result = task['func'](*task['args'], **task['kwargs'])
-                task['result_queue'].put(('success', result))
+                deadline = task.get('deadline')
+                if deadline is not None and started > deadline:
+                    logger.warning(f"任务 {task['id']} 超过截止时间 {started - deadline:.1f} 秒，不再执行")
+                    task['outcome'] = ('expired', f"任务在截止时间前未开始执行（排队 {started - task['timestamp']:.1f} 秒）")
+                else:
+                    logger.debug(f"处理任务 {task['id']}")
+                    with tracer.activate(task.get('trace'), f"queue.{task_name}"):
+                        result = task['func'](*task['args'], **task['kwargs'])
+                    ok = True
+                    task['outcome'] = ('success', result)
+                task['result_queue'].put(task['outcome'])
             except Exception as e:
                 with counter_lock:
                     error_counter += 1
                 logger.error(f"任务 {task['id']} 处理失败: {str(e)}")
                 logger.debug(traceback.format_exc())
-                task['result_queue'].put(('error', str(e)))
+                task['outcome'] = ('error', str(e))
+                # 微信连接不可用时保留原异常，由等待方按503返回
+                task['result_queue'].put(('error', e if isinstance(e, WeChatUnavailableError) else str(e)))
             finally:
-                request_queue.task_done()
+                _notify_observer(task)
+                slow_request_recorder.detach_worker(task.get('request_ident'))
+                task_queue.task_done()
+                # 区分排队等待时间和实际执行时间
+                observe_queue_task(task_name, started - task['timestamp'], time.time() - started, ok)
                 
         except Exception as e:
             with counter_lock:
@@ -99,6 +226,15 @@ def queue_processor():
             
     logger.info("队列处理线程已停止")
 
+def _notify_observer(task):
+    observer = task.get('observer')
+    if observer is None or 'outcome' not in task:
+        return
+    try:
+        observer.task_finished(task, *task['outcome'])
+    except Exception as e:
+        logger.error(f"任务 {task['id']} 的观察者处理结果失败: {str(e)}")
+
 def start_queue_processors():
     """启动队列处理线程"""
     global queue_running, worker_threads
@@ -129,6 +265,8 @@ def stop_queue_processors():
     # 等待所有线程结束
     for thread in worker_threads:
         thread.join(timeout=2)
+    for account_id in list(account_queues):
+        stop_account_queue(account_id)
         
     logger.info("所有队列处理线程已停止")
 
@@ -151,15 +289,32 @@ def wrapper(*args, **kwargs):
             # 等待结果
             try:
                 result_type, result = task['result_queue'].get(timeout=timeout)
-                if result_type == 'error':
-                    raise Exception(result)
-                return result
             except queue.Empty:
-                raise TimeoutError(f"任务 {task['id']} 处理超时")
+                observer = task.get('observer')
+                if observer is None or observer.task_timed_out(task):
+                    raise TimeoutError(f"任务 {task['id']} 处理超时")
+                # 超时的同时任务已经完成
+                result_type, result = task['result_queue'].get()
+            if result_type == 'expired':
+                raise TimeoutError(result)
+            if result_type == 'error':
+                if isinstance(result, WeChatUnavailableError):
+                    raise result
+                raise Exception(result)
+            return result
                 
         return wrapper
     return decorator
 
+def get_account_queue_stats(account_id):
+    """获取账号的队列统计信息"""
+    if account_id == DEFAULT_ACCOUNT:
+        return {'queue_size': request_queue.qsize(), 'worker_threads': len(worker_threads)}
+    entry = account_queues.get(account_id)
+    if entry is None:
+        return {'queue_size': 0, 'worker_threads': 0}
+    return {'queue_size': entry['queue'].qsize(), 'worker_threads': len(entry['threads'])}
+
 def get_queue_stats():
     """获取队列统计信息"""
     return {
@@ -167,7 +322,8 @@ def get_queue_stats():
         'request_count': request_counter,
         'error_count': error_counter,
         'worker_threads': len(worker_threads),
-        'queue_running': queue_running
+        'queue_running': queue_running,
+        'accounts': {account_id: get_account_queue_stats(account_id) for account_id in list(account_queues)}
     }
 
 # 启动队列处理器
@@ -83,43 +83,64 @@ def check_mutex():
         logger.error(traceback.format_exc())
         return True
 
-def check_dependencies():
-    """检查依赖项"""
+def check_python_dependencies():
+    """检查Python依赖项"""
     try:
         # 尝试导入必要的模块
         import flask
         import requests
         import psutil
-        import sys
 
-        # 在打包环境中跳过微信自动化库检测，避免库冲突
-        is_frozen = getattr(sys, 'frozen', False)
-        if is_frozen:
+        logger.info("Python依赖项检查成功")
+        return True
+    except ImportError as e:
+        logger.error(f"依赖项检查失败: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+def check_wechat_libraries():
+    """检查微信自动化库，打包环境中跳过检测，避免库冲突"""
+    try:
+        if getattr(sys, 'frozen', False):
             logger.info("打包环境中跳过微信自动化库检测，避免库冲突")
             logger.info("微信自动化库将在实际使用时进行检测和初始化")
-        else:
-            # 使用统一的库检测器检查微信自动化库
-            from app.wechat_lib_detector import detector
+            return True
 
-            # 检测所有可用的库
-            available_libs = detector.get_available_libraries()
-            if not available_libs:
-                logger.error("没有检测到可用的微信自动化库")
-                logger.error("请安装wxauto或wxautox库: pip install wxauto wxautox")
-                return False
+        # 使用统一的库检测器检查微信自动化库
+        from app.wechat_lib_detector import detector
 
-            logger.info(f"检测到可用的微信自动化库: {', '.join(available_libs)}")
+        # 检测所有可用的库
+        available_libs = detector.get_available_libraries()
+        if not available_libs:
+            logger.error("没有检测到可用的微信自动化库")
+            logger.error("请安装wxauto或wxautox库: pip install wxauto wxautox")
+            return False
 
-            # 显示检测摘要
-            summary = detector.get_detection_summary()
-            logger.info(f"库检测摘要:\n{summary}")
+        logger.info(f"检测到可用的微信自动化库: {', '.join(available_libs)}")
 
-        logger.info("依赖项检查成功")
+        # 显示检测摘要
+        summary = detector.get_detection_summary()
+        logger.info(f"库检测摘要:\n{summary}")
         return True
-    except ImportError as e:
-        logger.error(f"依赖项检查失败: {str(e)}")
+    except Exception as e:
+        logger.error(f"检查微信自动化库时出错: {str(e)}")
         logger.error(traceback.format_exc())
         return False
+
+def check_dependencies():
+    """检查依赖项"""
+    try:
+        if not check_python_dependencies():
+            return False
+
+        from app.config import Config
+        if Config.FAST_STARTUP and not getattr(sys, 'frozen', False):
+            logger.info("快速启动模式，微信自动化库检测由后台启动任务完成")
+        elif not check_wechat_libraries():
+            return False
+
+        logger.info("依赖项检查成功")
+        return True
     except Exception as e:
         logger.error(f"检查依赖项时出错: {str(e)}")
         logger.error(traceback.format_exc())
@@ -148,6 +169,98 @@ def start_queue_processors():
         logger.warning("将继续执行，但某些功能可能不可用")
         return True
 
+def import_create_app():
+    """导入Flask应用创建函数，兼容不同的运行目录"""
+    # 记录当前环境信息
+    logger.info(f"当前工作目录: {os.getcwd()}")
+    logger.info(f"Python路径: {sys.path}")
+
+    # 确保app目录在Python路径中
+    app_dir = os.path.join(os.getcwd(), "app")
+    if os.path.exists(app_dir) and app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+        logger.info(f"已将app目录添加到Python路径: {app_dir}")
+
+    logger.info("正在尝试导入Flask应用创建函数...")
+    try:
+        # 首先尝试从app包导入
+        from app import create_app
+        logger.info("成功从app包导入Flask应用创建函数")
+        return create_app
+    except ImportError as e:
+        logger.warning(f"从app包导入Flask应用创建函数失败: {str(e)}")
+        logger.warning(traceback.format_exc())
+
+    # 尝试直接导入app模块
+    import app
+    logger.info("成功导入app模块")
+    if hasattr(app, 'create_app'):
+        logger.info("成功从app模块中获取create_app函数")
+        return app.create_app
+
+    # 尝试从app.__init__模块导入
+    from app.__init__ import create_app
+    logger.info("成功从app.__init__模块导入create_app函数")
+    return create_app
+
+def register_startup_components(orchestrator, deferred_app):
+    """
+    注册API服务的启动组件
+
+    依赖检查、微信库检测、目录创建互不依赖，并行执行；
+    应用创建只依赖目录，队列在应用创建后启动，微信初始化在所有组件就绪后进行
+    """
+    from app.config import Config
+
+    def ensure_directories():
+        try:
+            from app import config_manager
+        except ImportError:
+            import config_manager
+        config_manager.ensure_dirs()
+
+    def dependencies():
+        if not check_python_dependencies():
+            raise RuntimeError("依赖项检查失败")
+
+    def library_detection():
+        if not check_wechat_libraries():
+            raise RuntimeError("没有检测到可用的微信自动化库")
+        if Config.FAST_STARTUP and not getattr(sys, 'frozen', False):
+            # 快速启动时Config未校验配置的库
+            from app.startup import verify_wechat_library
+            return verify_wechat_library()
+        return {'lib': Config.WECHAT_LIB}
+
+    def queue():
+        # 队列处理器模块由路由模块导入，在应用创建后启动，避免多个线程同时导入互相引用的模块
+        if not start_queue_processors():
+            raise RuntimeError("队列处理器启动失败")
+
+    def create():
+        create_app = import_create_app()
+        logger.info("正在创建Flask应用...")
+        app = create_app()
+        if app.config.get('DEBUG', False):
+            from werkzeug.debug import DebuggedApplication
+            app.debug = True
+            deferred_app.set_app(DebuggedApplication(app, evalex=True))
+        else:
+            deferred_app.set_app(app)
+        logger.info("成功创建Flask应用")
+
+    orchestrator.add('http')
+    orchestrator.add('directories', ensure_directories)
+    orchestrator.add('dependencies', dependencies)
+    orchestrator.add('library_detection', library_detection)
+    orchestrator.add('app', create, depends_on=['directories'])
+    orchestrator.add('queue', queue, depends_on=['app'])
+    if Config.STARTUP_AUTO_INITIALIZE_WECHAT:
+        from app.startup import initialize_wechat
+        # 微信未运行时初始化会失败，不影响服务就绪，可稍后通过/api/wechat/initialize重试
+        orchestrator.add('wechat', initialize_wechat, required=False,
+                         depends_on=['app', 'queue', 'library_detection', 'dependencies'])
+
 def start_api():
     """启动API服务"""
     try:
@@ -160,99 +273,43 @@ def start_api():
             sys.exit(0)
         logger.info("互斥锁检查通过")
 
-        # 检查依赖项
-        logger.info("正在检查依赖项...")
-        if not check_dependencies():
-            logger.error("依赖项检查失败，无法启动API服务")
-            sys.exit(1)
-        logger.info("依赖项检查通过")
+        from werkzeug.serving import make_server
+        from app.config import Config
+        from app.startup import startup_orchestrator, DeferredApp, READY
 
-        # 启动队列处理器
-        logger.info("正在启动队列处理器...")
-        if not start_queue_processors():
-            logger.error("队列处理器启动失败，无法启动API服务")
-            sys.exit(1)
-        logger.info("队列处理器启动成功")
+        host = Config.HOST
+        port = Config.PORT
 
-        # 创建并启动Flask应用
+        # 先监听端口，其余启动组件在后台并行执行，应用创建完成前的请求会等待
+        deferred_app = DeferredApp(timeout=Config.STARTUP_READY_TIMEOUT)
         try:
-            # 记录当前环境信息
-            logger.info(f"当前工作目录: {os.getcwd()}")
-            logger.info(f"Python路径: {sys.path}")
-
-            # 确保app目录在Python路径中
-            app_dir = os.path.join(os.getcwd(), "app")
-            if os.path.exists(app_dir) and app_dir not in sys.path:
-                sys.path.insert(0, app_dir)
-                logger.info(f"已将app目录添加到Python路径: {app_dir}")
-
-            # 导入Flask应用创建函数
-            logger.info("正在尝试导入Flask应用创建函数...")
-            try:
-                # 首先尝试从app包导入
-                from app import create_app
-                logger.info("成功从app包导入Flask应用创建函数")
-            except ImportError as e:
-                logger.warning(f"从app包导入Flask应用创建函数失败: {str(e)}")
-                logger.warning(traceback.format_exc())
-
-                # 尝试直接导入
-                try:
-                    import create_app
-                    logger.info("成功直接导入Flask应用创建函数")
-                except ImportError:
-                    # 尝试直接导入app模块
-                    try:
-                        import app
-                        logger.info("成功导入app模块")
-
-                        # 尝试从app模块中获取create_app函数
-                        if hasattr(app, 'create_app'):
-                            create_app = app.create_app
-                            logger.info("成功从app模块中获取create_app函数")
-                        else:
-                            # 尝试从app.__init__模块导入
-                            try:
-                                from app.__init__ import create_app
-                                logger.info("成功从app.__init__模块导入create_app函数")
-                            except ImportError:
-                                logger.error("app模块中没有create_app函数")
-                                sys.exit(1)
-                    except ImportError as e:
-                        logger.error(f"导入app模块失败: {str(e)}")
-                        logger.error(traceback.format_exc())
-                        sys.exit(1)
-
-            # 创建应用
-            logger.info("正在创建Flask应用...")
-            app = create_app()
-            logger.info("成功创建Flask应用")
-
-            # 获取配置信息
-            host = app.config.get('HOST', '0.0.0.0')
-            port = app.config.get('PORT', 5000)
-            debug = app.config.get('DEBUG', False)
-
-            logger.info(f"正在启动Flask应用...")
-            logger.info(f"监听地址: {host}:{port}")
-            logger.info(f"调试模式: {debug}")
-
-            # 禁用 werkzeug 的重新加载器，避免可能的端口冲突
-            app.run(
-                host=host,
-                port=port,
-                debug=debug,
-                use_reloader=False,
-                threaded=True
-            )
-        except ImportError as e:
-            logger.error(f"导入Flask应用创建函数失败: {str(e)}")
-            logger.error(traceback.format_exc())
-            sys.exit(1)
+            server = make_server(host, port, deferred_app, threaded=True)
         except Exception as e:
-            logger.error(f"启动Flask应用时出错: {str(e)}")
+            logger.error(f"监听端口 {host}:{port} 失败: {str(e)}")
             logger.error(traceback.format_exc())
             sys.exit(1)
+        startup_orchestrator.set_state('http', READY, detail={'host': host, 'port': port})
+        logger.info(f"监听地址: {host}:{port}")
+
+        register_startup_components(startup_orchestrator, deferred_app)
+        startup_orchestrator.start()
+
+        def shutdown_on_failure():
+            # 必需组件失败时与原来一样退出
+            startup_orchestrator.wait()
+            failed = startup_orchestrator.failed_components()
+            if failed:
+                logger.error(f"启动组件失败: {', '.join(failed)}，无法启动API服务")
+                server.shutdown()
+
+        import threading
+        threading.Thread(target=shutdown_on_failure, daemon=True, name="StartupWatcher").start()
+
+        server.serve_forever()
+        if startup_orchestrator.failed_components():
+            sys.exit(1)
+    except SystemExit:
+        raise
     except Exception as e:
         logger.error(f"API服务启动过程中发生未捕获的异常: {str(e)}")
         logger.error(traceback.format_exc())
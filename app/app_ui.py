@@ -1144,16 +1144,11 @@ def start_api_service(self):
             # 更新UI中的监听地址显示
             self.api_address.config(text=f"0.0.0.0:{port}")
 
-            # 等待服务启动完成
-            time.sleep(2)
-
             # 自动初始化微信
             self.add_log("正在自动初始化微信...")
 
-            # 使用线程执行初始化，避免阻塞UI
-            # 延迟1秒执行初始化，确保API服务已完全启动
-            self.root.after(1000, lambda: threading.Thread(target=self._initialize_wechat_thread, args=(port,),
-                                                           daemon=True).start())
+            # 使用线程执行初始化，避免阻塞UI，线程中先等待API服务就绪
+            threading.Thread(target=self._initialize_wechat_thread, args=(port,), daemon=True).start()
 
         except Exception as e:
             messagebox.showerror("启动失败", f"启动API服务失败: {str(e)}")
@@ -1554,8 +1549,59 @@ def check_wechat_connection(self):
         # 使用线程执行HTTP请求，避免阻塞UI
         threading.Thread(target=self._check_wechat_connection_thread, daemon=True).start()
 
+    def _wait_for_api_ready(self, port, timeout=30):
+        """
+        等待API服务就绪
+
+        Returns:
+            dict: /ready返回的启动状态，API服务不支持就绪检查或超时返回None
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline and self.api_running:
+            try:
+                response = requests.get(
+                    f"http://localhost:{port}/ready",
+                    params={"wait": 5, "components": "app,wechat"},
+                    timeout=10
+                )
+                if response.status_code == 404:
+                    return None
+                data = response.json().get("data") or {}
+                if data.get("settled"):
+                    return data
+            except (requests.RequestException, ValueError):
+                # 端口尚未监听
+                time.sleep(0.2)
+        return None
+
+    def _on_wechat_initialized(self, window_name):
+        """微信初始化成功后更新UI"""
+        self.add_log("微信自动初始化成功")
+
+        # 在主线程中更新UI
+        self.root.after(0, lambda: self.wechat_status.config(text="已连接", style="Green.TLabel"))
+
+        # 无论如何都显示窗口名称（如果有）
+        if window_name:
+            # 更新窗口名称标签
+            self.root.after(0, lambda wn=window_name: self.wechat_window_name.config(text=wn,
+                                                                                     foreground="orange"))
+        else:
+            # 窗口名称为空，设置为空字符串
+            self.root.after(0, lambda: self.wechat_window_name.config(text=""))
+
     def _initialize_wechat_thread(self, port):
         """在线程中执行微信初始化"""
+        # 等待API服务就绪，服务启动时已在后台初始化微信的，直接使用初始化结果
+        readiness = self._wait_for_api_ready(port)
+        if readiness is None:
+            self.add_log("等待API服务就绪超时，直接尝试初始化微信")
+        else:
+            wechat = readiness.get("components", {}).get("wechat", {})
+            if wechat.get("state") == "ready":
+                self._on_wechat_initialized((wechat.get("detail") or {}).get("window_name", ""))
+                return
+
         # 最多尝试3次
         max_retries = 3
         retry_delay = 2  # 秒
@@ -1572,25 +1618,9 @@ def _initialize_wechat_thread(self, port):
 
                 if response.status_code == 200 and response.json().get("code") == 0:
                     init_data = response.json()
-                    self.add_log("微信自动初始化成功")
 
                     # 获取微信窗口名称
-                    window_name = init_data.get("data", {}).get("window_name", "")
-
-                    # 在主线程中更新UI
-                    self.root.after(0, lambda: self.wechat_status.config(text="已连接", style="Green.TLabel"))
-
-                    # 无论如何都显示窗口名称（如果有）
-                    if window_name:
-                        # 更新窗口名称标签
-                        self.root.after(0, lambda wn=window_name: self.wechat_window_name.config(text=wn,
-                                                                                                 foreground="orange"))
-                        # self.add_log(f"已连接到微信窗口: {window_name}")
-                    else:
-                        # 窗口名称为空，设置为空字符串
-                        self.root.after(0, lambda: self.wechat_window_name.config(text=""))
-
-
+                    self._on_wechat_initialized(init_data.get("data", {}).get("window_name", ""))
 
                     # 初始化成功，退出重试循环
                     # 不要立即检查微信连接状态，等待下一个定时检查周期
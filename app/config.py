@@ -22,6 +22,10 @@
         config_manager = None
 
 class Config:
+    # 快速启动：蓝图在首次访问时才导入，微信库检测等耗时初始化在后台进行
+    # 可通过环境变量WXAUTO_FAST_STARTUP=1或配置文件fast_startup开启
+    FAST_STARTUP = os.environ.get('WXAUTO_FAST_STARTUP', '').lower() in ('1', 'true', 'yes')
+
     # 从配置文件或环境变量加载配置
     if config_manager:
         # 确保目录存在
@@ -29,36 +33,45 @@ class Config:
 
         # 加载应用配置
         app_config = config_manager.load_app_config()
+        FAST_STARTUP = FAST_STARTUP or bool(app_config.get('fast_startup', False))
 
         # Flask配置
         PORT = app_config.get('port', 5000)
 
+        # 多账号配置，[{"id": "账号标识", "lib": "wxautox", "window": "微信昵称"}]，默认账号始终存在
+        WECHAT_ACCOUNTS = app_config.get('accounts', [])
+
         # 微信库选择配置
         configured_lib = app_config.get('wechat_lib', 'wxauto').lower()
 
-        # 验证配置的库是否可用
-        try:
-            from app.wechat_lib_detector import detector
-            valid, message = detector.validate_library_choice(configured_lib)
-            if valid:
-                WECHAT_LIB = configured_lib
-            else:
-                # 如果配置的库不可用，尝试获取推荐的库
-                recommended = detector.get_library_switch_recommendation(configured_lib)
-                if recommended:
-                    WECHAT_LIB = recommended
-                    print(f"警告: 配置的库 '{configured_lib}' 不可用，自动切换到 '{recommended}'")
-                else:
-                    WECHAT_LIB = 'wxauto'  # 默认值
-                    print(f"警告: 没有可用的微信自动化库，使用默认值 'wxauto'")
-        except Exception as e:
-            # 如果检测失败，使用配置值
+        if FAST_STARTUP:
+            # 检测wxautox可能需要启动子进程，快速启动时先使用配置值，由后台任务校验
             WECHAT_LIB = configured_lib
-            print(f"库检测失败，使用配置值: {e}")
+        else:
+            # 验证配置的库是否可用
+            try:
+                from app.wechat_lib_detector import detector
+                valid, message = detector.validate_library_choice(configured_lib)
+                if valid:
+                    WECHAT_LIB = configured_lib
+                else:
+                    # 如果配置的库不可用，尝试获取推荐的库
+                    recommended = detector.get_library_switch_recommendation(configured_lib)
+                    if recommended:
+                        WECHAT_LIB = recommended
+                        print(f"警告: 配置的库 '{configured_lib}' 不可用，自动切换到 '{recommended}'")
+                    else:
+                        WECHAT_LIB = 'wxauto'  # 默认值
+                        print(f"警告: 没有可用的微信自动化库，使用默认值 'wxauto'")
+            except Exception as e:
+                # 如果检测失败，使用配置值
+                WECHAT_LIB = configured_lib
+                print(f"库检测失败，使用配置值: {e}")
     else:
         # 如果无法导入config_manager，则使用默认值
         PORT = 5000
         WECHAT_LIB = 'wxauto'
+        WECHAT_ACCOUNTS = []
 
     @staticmethod
     def get_api_keys():
@@ -105,10 +118,116 @@ def get_current_log_file():
         return str(Config.LOGS_DIR / log_filename)
 
     # 微信监控配置
-    WECHAT_CHECK_INTERVAL = 60  # 连接检查间隔（秒）
+    WECHAT_CHECK_INTERVAL = 60  # 连接稳定时的最大检查间隔（秒）
+    WECHAT_CHECK_MIN_INTERVAL = 10  # 出错后的最小检查间隔（秒）
     WECHAT_AUTO_RECONNECT = True  # 自动重连
-    WECHAT_RECONNECT_DELAY = 30  # 重连延迟（秒）
-    WECHAT_MAX_RETRY = 3  # 最大重试次数
+    WECHAT_RECONNECT_DELAY = 5  # 重连初始延迟（秒），之后按指数退避并加入随机抖动
+    WECHAT_RECONNECT_MAX_DELAY = 300  # 重连最大延迟（秒），重连不设次数上限
+    WECHAT_MAX_RETRY = 3  # 连续重连失败超过该次数后降低日志级别，继续按最大延迟重连
+
+    # 通讯录缓存配置
+    DIRECTORY_CACHE_TTL = 300  # 好友/群聊列表缓存有效期（秒）
+    DIRECTORY_CACHE_MAX_STALE = 3600  # 超过有效期后仍可先返回旧数据并后台刷新的时间（秒）
+    GROUP_MEMBER_CACHE_TTL = 600  # 群成员缓存有效期（秒），群人数变化或入群/退群消息会使其提前失效
+
+    # 消息句柄索引配置
+    MESSAGE_INDEX_ENABLED = True  # 消息操作（引用、转发、下载等）是否先从消息句柄索引中查找，未命中才重新获取消息列表
+    MESSAGE_INDEX_MAX_MESSAGES = 2000  # 每个聊天保留的消息句柄数量
+    MESSAGE_INDEX_MAX_CHATS = 200  # 保留消息句柄的聊天数量
+    MESSAGE_INDEX_NEGATIVE_TTL = 2.0  # 重新获取后仍找不到的消息ID在该时间（秒）内直接返回未找到
+
+    # 聊天记录增量同步配置
+    HISTORY_SYNC_MAX_LOADS = 20  # 回填时最多调用LoadMoreMessage的次数（也是请求中max_loads的上限）
+    HISTORY_SYNC_MAX_WATERMARKS = 1000  # 服务端保存的同步水位数量（consumer和聊天的组合），超过后淘汰最久未使用的
+
+    # 监听消息处理流水线配置
+    MESSAGE_PIPELINE_ENABLED = True  # 监听回调只把消息放入交接队列，由工作线程处理；关闭后在监听线程中直接处理
+    MESSAGE_PIPELINE_WORKERS = 2  # 工作线程数，同一聊天的消息总是由同一个线程按顺序处理
+    MESSAGE_PIPELINE_QUEUE_SIZE = 10000  # 交接队列总容量，已满时丢弃新消息并计数
+    MESSAGE_PIPELINE_STAGES = ['normalize', 'dedup', 'media', 'archive', 'fanout']  # 按顺序执行的处理阶段
+    MESSAGE_PIPELINE_DEDUP_SIZE = 10000  # dedup阶段记住的最近消息ID数量
+
+    # 运行指标配置
+    METRICS_ENABLED = True  # 是否提供/metrics接口（Prometheus文本格式）
+    METRICS_REQUIRE_API_KEY = True  # /metrics是否需要X-API-Key（listener_buffer_messages以聊天名称为标签，默认不对外公开）
+
+    # 界面调用计时配置
+    UI_TIMING_ENABLED = False  # 是否记录每次界面调用的耗时明细，可通过/api/admin/ui-timings动态开关
+    UI_TIMING_BUFFER_SIZE = 2000  # 保留的界面调用记录数量
+    UI_TRACE_ENABLED = False  # 启动时把界面调用轨迹写入logs/ui_trace_*.jsonl，供benchmarks回放
+    UI_TRACE_MAX_BYTES = 50 * 1024 * 1024  # 轨迹文件大小上限，超过后停止写入
+
+    # 链路追踪配置
+    TRACING_ENABLED = True  # 是否记录请求链路（HTTP线程、请求队列、界面调用）
+    TRACING_SLOW_THRESHOLD = 2.0  # 超过该耗时（秒）的请求链路总是保留
+    TRACING_SAMPLE_RATE = 0.05  # 其余请求链路的保留比例，出错的请求总是保留
+    TRACING_BUFFER_SIZE = 200  # 内存中保留的链路数量
+
+    # 慢请求记录配置
+    SLOW_REQUEST_THRESHOLD = 3.0  # 默认慢请求阈值（秒）
+    REQUEST_LOG_SAMPLE_RATE = 0.1  # 正常请求写入日志的比例，慢请求和出错的请求总是记录
+    SLOW_REQUEST_ROUTE_THRESHOLDS = {  # 按路由规则单独设置阈值，None表示不记录（例如长轮询和事件流）
+        '/api/message/send-file': 20.0,
+        '/api/chat-window/message/send-file': 20.0,
+        '/api/upload/file': 30.0,
+        '/api/upload/sessions/<upload_id>': 30.0,
+        '/api/wechat/session-changes': None,
+        '/api/wechat/session-events': None,
+        '/api/admin/profile': None,
+    }
+
+    # 快速启动配置
+    LAZY_BLUEPRINT_PRELOAD_DELAY = 3.0  # 快速启动后在后台预加载其余蓝图的延迟（秒），None表示只在首次访问时加载
+    ROUTE_MANIFEST_FILE = API_DIR / "route_manifest.json"  # 蓝图路由清单缓存，源码未变化时跳过扫描
+
+    # 启动编排配置
+    STARTUP_AUTO_INITIALIZE_WECHAT = True  # API服务启动时在后台初始化微信，结果通过/ready的wechat组件查询
+    STARTUP_READY_TIMEOUT = 30.0  # 应用创建完成前到达的请求最多等待的时间（秒）
+
+    # 多账号配置
+    ACCOUNT_QUEUE_WORKERS = 1  # 非默认账号的队列处理线程数，同一微信窗口的界面操作串行执行
+
+    # 幂等键配置（发送类接口的Idempotency-Key请求头）
+    IDEMPOTENCY_CACHE_SIZE = 10000  # 最多保留的幂等键数量
+    IDEMPOTENCY_TTL = 24 * 3600  # 成功结果的保留时间（秒），期间相同的请求直接返回缓存的响应
+    IDEMPOTENCY_WAIT_TIMEOUT = 60  # 重复请求等待进行中的任务的最长时间（秒），超过后返回409
+
+    # 定时发送配置（/api/schedule）
+    SCHEDULER_ENABLED = True  # 是否启动定时发送线程
+    SCHEDULE_STORE_FILE = API_DIR / "schedules_{port}.jsonl"  # 定时任务日志，每个API进程（端口）一个文件
+    SCHEDULE_MAX_PENDING = 100000  # 最多保留的待执行定时任务数
+    SCHEDULE_MISFIRE_POLICY = 'collapse'  # 错过计划时间的默认策略：skip不再发送，late逐次补发，collapse多次错过只补发一次
+    SCHEDULE_MAX_CATCHUP = 10  # late策略下重复发送的任务最多补发的次数，更早的错过计为missed
+    SCHEDULE_MISFIRE_GRACE = 60  # 晚于计划时间不超过该值（秒）时视为按时发送；skip策略下也是请求队列中的截止时间
+    SCHEDULE_MIN_INTERVAL = 10  # 重复发送的最小间隔（秒）
+    SCHEDULE_HISTORY_SIZE = 1000  # 内存中保留的已结束定时任务数量
+
+    # 网关配置（main.py --service gateway）
+    GATEWAY_PORT = 5080  # 网关监听端口，客户端只需要访问该端口
+    GATEWAY_WORKER_HOST = '127.0.0.1'  # API工作进程的默认地址
+    GATEWAY_WORKERS = [5000]  # API工作进程端口，或{"port": 5001, "accounts": ["sales"]}表示由该进程的默认账号承担的账号
+    GATEWAY_DISCOVERY_INTERVAL = 5.0  # 探测工作进程存活状态和账号列表的间隔（秒）
+    GATEWAY_POOL_SIZE = 16  # 每个工作进程保留的空闲长连接数
+    GATEWAY_TIMEOUT = 120.0  # 转发请求的超时时间（秒），需要大于发送文件等慢接口的耗时
+
+    # 会话列表快照配置
+    SESSION_WATCH_MIN_INTERVAL = 1.0  # 会话列表有变化时的轮询间隔（秒）
+    SESSION_WATCH_MAX_INTERVAL = 15.0  # 会话列表长时间无变化时的最大轮询间隔（秒）
+    SESSION_WATCH_IDLE_TIMEOUT = 300  # 超过该时间无人读取会话变化时暂停轮询（秒）
+
+    # 媒体目录回收配置
+    MEDIA_GC_ENABLED = True  # 是否启用临时媒体目录自动回收
+    MEDIA_GC_INTERVAL = 300  # 回收间隔（秒）
+    MEDIA_GC_TEMP_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 临时目录容量上限：2GB
+    MEDIA_GC_TEMP_MAX_AGE = 3 * 24 * 3600  # 临时目录文件最长保留：3天
+    MEDIA_GC_QRCODE_MAX_BYTES = 20 * 1024 * 1024  # 二维码目录容量上限：20MB
+    MEDIA_GC_QRCODE_MAX_AGE = 3600  # 二维码最长保留：1小时
+    MEDIA_GC_BLOB_MAX_BYTES = 5 * 1024 * 1024 * 1024  # 上传文件存储容量上限：5GB
+    MEDIA_GC_BLOB_MAX_AGE = 7 * 24 * 3600  # 上传文件最长保留（按最后使用时间）：7天
+
+    # 文件上传配置
+    UPLOAD_MAX_BYTES = 500 * 1024 * 1024  # 单个上传文件大小上限：500MB
+    UPLOAD_SESSION_MAX_AGE = 24 * 3600  # 未完成的分块上传会话最长保留（按最后一次写入）：1天
 
 
 # 创建一个动态属性描述符，用于API_KEYS
@@ -0,0 +1,212 @@
+"""
+通讯录目录缓存
+缓存好友列表、群聊列表等需要滚动整个通讯录界面才能获取的数据，
+支持TTL过期、并发请求合并（single-flight）以及过期数据先返回再后台刷新（stale-while-revalidate）
+"""
+
+import time
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+from app.accounts import bind_context
+from app.unified_logger import logger
+
+try:
+    import pythoncom
+except ImportError:
+    pythoncom = None
+
+
+class DirectoryCache:
+    """
+    单个目录数据的缓存
+
+    数据按年龄分为三档：
+    - 小于ttl：直接返回缓存（hit）
+    - 介于ttl和max_stale之间：直接返回旧数据，同时在后台刷新（stale）
+    - 超过max_stale或没有数据：同步刷新后返回（miss）
+
+    同一时刻最多只有一次刷新在执行，其余调用方等待并共享这次刷新的结果
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any], ttl: float = 300, max_stale: float = 3600,
+                 on_refresh: Optional[Callable[[Any, float], None]] = None):
+        """
+        Args:
+            name (str): 缓存名称，用于日志和统计
+            loader (callable): 加载数据的函数
+            ttl (float): 数据保持新鲜的时间（秒）
+            max_stale (float): 允许返回过期数据的最长时间（秒）
+            on_refresh (callable, optional): 刷新成功后以(数据, 时间戳)调用，用于更新派生索引
+        """
+        self.name = name
+        self._loader = loader
+        self._on_refresh = on_refresh
+        self.ttl = ttl
+        self.max_stale = max(max_stale, ttl)
+
+        self._value = None
+        self._as_of = None
+        self._lock = threading.Lock()
+        self._refresh_done = None  # 正在进行的刷新，完成时set
+        self._refresh_error = None
+        self._generation = 0
+
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._background_refreshes = 0
+        self._errors = 0
+        self._last_refresh_duration = None
+        self._last_error = None
+
+    def get(self, force_refresh: bool = False, timeout: Optional[float] = None) -> Tuple[Any, float, str]:
+        """
+        获取数据
+
+        Args:
+            force_refresh (bool): 是否忽略缓存强制重新加载
+            timeout (float, optional): 等待刷新完成的最长时间（秒）
+
+        Returns:
+            tuple: (数据, 数据获取时间戳, 状态)，状态为hit/stale/miss/refresh
+        """
+        with self._lock:
+            age = None if self._as_of is None else time.time() - self._as_of
+            if not force_refresh and age is not None:
+                if age < self.ttl:
+                    self._hits += 1
+                    return self._value, self._as_of, 'hit'
+                if age < self.max_stale:
+                    self._stale_hits += 1
+                    self._start_refresh_locked(background=True)
+                    return self._value, self._as_of, 'stale'
+
+            self._misses += 1
+            done = self._start_refresh_locked(background=False)
+
+        if done is None:
+            # 当前线程负责刷新
+            self._refresh()
+        elif not done.wait(timeout):
+            raise TimeoutError(f"等待{self.name}刷新超时")
+
+        with self._lock:
+            if self._refresh_error is not None and (self._as_of is None or force_refresh):
+                raise self._refresh_error
+            return self._value, self._as_of, 'refresh' if force_refresh else 'miss'
+
+    def invalidate(self):
+        """清空缓存，下次访问时重新加载"""
+        with self._lock:
+            self._value = None
+            self._as_of = None
+            self._generation += 1
+        logger.debug(f"{self.name}缓存已清空")
+
+    def peek(self) -> Tuple[Any, Optional[float]]:
+        """返回当前缓存的数据和时间戳，不触发加载"""
+        with self._lock:
+            return self._value, self._as_of
+
+    def get_stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self._hits + self._stale_hits + self._misses
+            return {
+                'name': self.name,
+                'ttl': self.ttl,
+                'max_stale': self.max_stale,
+                'cached': self._as_of is not None,
+                'as_of': self._as_of,
+                'age_seconds': None if self._as_of is None else round(time.time() - self._as_of, 1),
+                'size': len(self._value) if isinstance(self._value, (list, dict)) else None,
+                'hits': self._hits,
+                'stale_hits': self._stale_hits,
+                'misses': self._misses,
+                'hit_rate': round((self._hits + self._stale_hits) / total, 4) if total else None,
+                'refreshes': self._refreshes,
+                'background_refreshes': self._background_refreshes,
+                'refreshing': self._refresh_done is not None,
+                'errors': self._errors,
+                'last_error': self._last_error,
+                'last_refresh_duration': self._last_refresh_duration,
+            }
+
+    def _start_refresh_locked(self, background: bool):
+        """
+        在持有锁的情况下登记一次刷新
+
+        Returns:
+            已有刷新在进行时返回其完成事件；否则登记新的刷新并返回None，
+            后台刷新时会直接启动线程
+        """
+        if self._refresh_done is not None:
+            return self._refresh_done
+
+        self._refresh_done = threading.Event()
+        self._refresh_error = None
+        if background:
+            self._background_refreshes += 1
+            thread = threading.Thread(target=bind_context(self._background_refresh), daemon=True,
+                                      name=f"DirectoryRefresh-{self.name}")
+            thread.start()
+            return self._refresh_done
+        return None
+
+    def _background_refresh(self):
+        """后台刷新线程，UI自动化调用需要在本线程初始化COM环境"""
+        if pythoncom is not None:
+            try:
+                pythoncom.CoInitialize()
+            except Exception:
+                pass
+        try:
+            self._refresh()
+        finally:
+            if pythoncom is not None:
+                try:
+                    pythoncom.CoUninitialize()
+                except Exception:
+                    pass
+
+    def _refresh(self):
+        """执行一次加载并唤醒所有等待者"""
+        with self._lock:
+            generation = self._generation
+        start = time.time()
+        value = None
+        error = None
+        try:
+            value = self._loader()
+        except Exception as e:
+            error = e
+            logger.error(f"刷新{self.name}失败: {str(e)}")
+
+        with self._lock:
+            duration = time.time() - start
+            self._last_refresh_duration = round(duration, 3)
+            self._refreshes += 1
+            if error is None:
+                # 刷新期间缓存被清空（例如重新登录）时，丢弃旧账号的数据
+                if generation == self._generation:
+                    self._value = value
+                    self._as_of = time.time()
+                    logger.debug(f"{self.name}已刷新，耗时 {duration:.2f}秒")
+            else:
+                self._errors += 1
+                self._last_error = str(error)
+            self._refresh_error = error
+            done = self._refresh_done
+            self._refresh_done = None
+            stored = error is None and generation == self._generation
+            as_of = self._as_of
+
+        if stored and self._on_refresh is not None:
+            try:
+                self._on_refresh(value, as_of)
+            except Exception as e:
+                logger.error(f"{self.name}刷新回调失败: {str(e)}")
+        if done is not None:
+            done.set()
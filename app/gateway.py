@@ -0,0 +1,665 @@
+"""
+API网关
+多个API工作进程（通常每个微信账号一个进程，各自用AppMutex锁定自己的端口）前面的统一入口。
+网关定期探测配置的端口，记录每个工作进程的存活状态和已注册的账号，并为每个工作进程保留长连接池。
+
+路由规则:
+    1. X-Gateway-Worker请求头指定了工作进程（地址或端口）时直接转发，用于管理接口
+    2. 指定了账号（X-WeChat-Account请求头或/accounts/<账号>/路径前缀）时转发到拥有该账号的工作进程
+    3. 未指定账号的监听消息轮询（/api/message/listen/get）转发到所有工作进程并合并结果
+    4. 其余请求按接收方（receiver/who/nickname/group_name）在存活的工作进程间做一致性哈希，
+       同一接收方的发送、监听和查询总是落在同一个工作进程上；没有接收方的请求轮流转发
+
+/health和/metrics汇总所有工作进程的状态和指标，指标增加worker标签；
+/health按后台探测的结果回答，账号归属等详细信息和/metrics需要X-API-Key
+"""
+
+import hashlib
+import http.client
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from app.accounts import ACCOUNT_HEADER, ACCOUNT_PATH_PREFIX, DEFAULT_ACCOUNT
+from app.metrics import MetricsRegistry
+from app.unified_logger import logger
+
+UP = 'up'
+DOWN = 'down'
+UNKNOWN = 'unknown'
+
+WORKER_HEADER = 'X-Gateway-Worker'
+
+# 工作进程不可用的错误码
+WORKER_UNAVAILABLE_CODE = 5005
+
+# 按接收方哈希时读取的参数，依次查找
+ROUTING_KEYS = ('receiver', 'who', 'nickname', 'group_name')
+
+# 未指定账号时合并所有工作进程结果的监听消息轮询接口
+MERGED_LISTEN_PATHS = ('/api/message/listen/get', '/api/chat/listen/get')
+
+# 不转发的逐跳请求头
+_HOP_BY_HOP = frozenset(('connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+                         'te', 'trailers', 'transfer-encoding', 'upgrade', 'host'))
+
+# 复用的空闲连接已被工作进程关闭时出现的错误，此时请求没有被处理，可以换新连接重试
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class RoutingError(Exception):
+    """无法为请求选择工作进程"""
+
+    def __init__(self, message: str, code: int = 4004, status: int = 404):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.status = status
+
+
+class GatewayWorker:
+    """一个API工作进程及其长连接池"""
+
+    def __init__(self, host: str, port: int, accounts: Iterable[str] = (), pool_size: int = 16,
+                 timeout: float = 120.0):
+        """
+        Args:
+            host (str): 工作进程地址
+            port (int): 工作进程端口
+            accounts (list): 由该进程的默认账号承担的账号，转发时去掉账号请求头和路径前缀
+            pool_size (int): 保留的空闲连接数
+            timeout (float): 转发请求的超时时间（秒）
+        """
+        self.host = host
+        self.port = port
+        self.name = f'{host}:{port}'
+        self.static_accounts = set(accounts)
+        self.accounts = set()
+        self.state = UNKNOWN
+        self.error = None
+        self.last_seen = None
+        self.inflight = 0
+        self.connections_created = 0
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+
+    def add_inflight(self, delta: int):
+        """调整正在转发的请求数，多个请求线程同时调用"""
+        with self._lock:
+            self.inflight += delta
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            with self._lock:
+                self.connections_created += 1
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def _release(self, conn: http.client.HTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def open(self, method: str, path: str, body: Optional[bytes] = None,
+             headers: Optional[dict] = None) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """发送请求并返回连接和响应，读取完响应后需要调用finish"""
+        for attempt in range(2):
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                return conn, conn.getresponse()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused or attempt:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+
+    def finish(self, conn: http.client.HTTPConnection, response: http.client.HTTPResponse):
+        """响应读取完毕，连接可复用时放回连接池"""
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[dict] = None) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """发送请求并读取完整响应"""
+        conn, response = self.open(method, path, body, headers)
+        try:
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+        self.finish(conn, response)
+        return response.status, response.getheaders(), data
+
+    def mark_up(self, accounts: Iterable[str]):
+        if self.state != UP:
+            logger.info(f"工作进程 {self.name} 已上线")
+        self.state = UP
+        self.error = None
+        self.accounts = set(accounts)
+        self.last_seen = time.time()
+
+    def mark_down(self, error: str):
+        if self.state != DOWN:
+            logger.warning(f"工作进程 {self.name} 不可用: {error}")
+        self.state = DOWN
+        self.error = error
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def to_dict(self) -> dict:
+        return {
+            'state': self.state,
+            'error': self.error,
+            'accounts': sorted(self.accounts | self.static_accounts),
+            'last_seen': self.last_seen,
+            'inflight': self.inflight,
+            'idle_connections': self._pool.qsize(),
+            'connections_created': self.connections_created,
+        }
+
+
+def _rendezvous(key: str, workers: List[GatewayWorker]) -> GatewayWorker:
+    """最高随机权重哈希，工作进程上下线时只有落在该进程上的接收方会改变路由"""
+    return max(workers, key=lambda worker: hashlib.blake2b(
+        f'{worker.name}|{key}'.encode('utf-8'), digest_size=8).digest())
+
+
+def _add_label(line: str, name: str, value: str) -> str:
+    """在一行Prometheus样本中加入标签"""
+    label = f'{name}="{value}"'
+    brace = line.find('{')
+    space = line.find(' ')
+    if brace != -1 and (space == -1 or brace < space):
+        rest = line[brace + 1:]
+        return f'{line[:brace]}{{{label}{"" if rest.startswith("}") else ","}{rest}'
+    return f'{line[:space]}{{{label}}}{line[space:]}'
+
+
+def merge_prometheus(texts: List[Tuple[str, str]]) -> str:
+    """
+    合并多个工作进程的Prometheus文本，同名指标的样本放在一起并加上worker标签
+
+    Args:
+        texts (list): [(工作进程名, 指标文本)]
+    """
+    families: Dict[str, dict] = {}
+    for worker, text in texts:
+        family_name = None
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            if line.startswith('#'):
+                parts = line.split(' ', 3)
+                if len(parts) >= 3 and parts[1] in ('HELP', 'TYPE'):
+                    family_name = parts[2]
+                    families.setdefault(family_name, {'meta': {}, 'samples': []})['meta'].setdefault(parts[1], line)
+                continue
+            sample_name = line.split('{', 1)[0].split(' ', 1)[0]
+            # 直方图的_bucket/_sum/_count样本属于前面TYPE声明的指标
+            name = family_name if family_name and sample_name.startswith(family_name) else sample_name
+            families.setdefault(name, {'meta': {}, 'samples': []})['samples'].append(_add_label(line, 'worker', worker))
+
+    lines = []
+    for family in families.values():
+        lines.extend(family['meta'][kind] for kind in ('HELP', 'TYPE') if kind in family['meta'])
+        lines.extend(family['samples'])
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+class Gateway:
+    """网关WSGI应用"""
+
+    def __init__(self, workers: List[GatewayWorker], api_key: Optional[str] = None,
+                 discovery_interval: float = 5.0, api_keys: Optional[Iterable[str]] = None,
+                 metrics_require_api_key: bool = True):
+        """
+        Args:
+            workers (list): 工作进程
+            api_key (str, optional): 探测账号列表和抓取指标时使用的API密钥
+            discovery_interval (float): 探测间隔（秒）
+            api_keys (list, optional): 查看/health详细信息和/metrics时接受的API密钥，默认只接受api_key
+            metrics_require_api_key (bool): /metrics是否需要API密钥
+        """
+        self.workers = workers
+        self.api_key = api_key
+        self.api_keys = set(api_keys if api_keys is not None else ([api_key] if api_key else []))
+        self.metrics_require_api_key = metrics_require_api_key
+        self.discovery_interval = discovery_interval
+        self.started_at = time.time()
+        self.discovered_at = None
+        self._account_owners: Dict[str, GatewayWorker] = {}
+        self._duplicate_accounts: Dict[str, List[str]] = {}
+        self._round_robin = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=max(len(workers) * 4, 4), thread_name_prefix='GatewayFanOut')
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.metrics = MetricsRegistry('wxauto_gateway')
+        self._requests_total = self.metrics.counter(
+            'requests_total', '网关转发的请求数', ('worker', 'route', 'status'))
+        self._request_duration = self.metrics.histogram(
+            'request_duration_seconds', '网关转发耗时（包括工作进程的处理时间）', ('worker',))
+        self.metrics.gauge('worker_up', '工作进程是否存活',
+                           lambda: {(w.name,): 1 if w.state == UP else 0 for w in self.workers}, ('worker',))
+        self.metrics.gauge('worker_inflight', '正在转发到工作进程的请求数',
+                           lambda: {(w.name,): w.inflight for w in self.workers}, ('worker',))
+        self.metrics.gauge('pool_idle_connections', '连接池中的空闲连接数',
+                           lambda: {(w.name,): w._pool.qsize() for w in self.workers}, ('worker',))
+
+    # ---- 工作进程发现 ----
+
+    def start(self):
+        """探测一次工作进程，然后在后台定期探测"""
+        self.discover()
+        self._thread = threading.Thread(target=self._discovery_loop, daemon=True, name='GatewayDiscovery')
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._executor.shutdown(wait=False)
+        for worker in self.workers:
+            worker.close()
+
+    def _discovery_loop(self):
+        while not self._stop_event.wait(self.discovery_interval):
+            try:
+                self.discover()
+            except Exception as e:
+                logger.error(f"探测工作进程失败: {str(e)}")
+
+    def discover(self):
+        """探测所有工作进程的存活状态和账号列表，并更新账号归属"""
+        list(self._executor.map(self._probe, self.workers))
+
+        owners: Dict[str, GatewayWorker] = {}
+        duplicates: Dict[str, List[str]] = {}
+        for worker in self.workers:
+            for account in sorted(worker.static_accounts | worker.accounts):
+                owner = owners.setdefault(account, worker)
+                if owner is not worker:
+                    duplicates.setdefault(account, [owner.name]).append(worker.name)
+        for account, names in duplicates.items():
+            if self._duplicate_accounts.get(account) != names:
+                logger.warning(f"账号 {account} 同时由多个工作进程承担: {', '.join(names)}，使用 {names[0]}")
+        self._account_owners = owners
+        self._duplicate_accounts = duplicates
+        self.discovered_at = time.time()
+
+    def _probe(self, worker: GatewayWorker):
+        try:
+            status, _, _ = worker.request('GET', '/health')
+            if status != 200:
+                raise RuntimeError(f"/health返回{status}")
+        except Exception as e:
+            worker.mark_down(str(e))
+            return
+
+        accounts = worker.accounts
+        if self.api_key:
+            try:
+                status, _, data = worker.request('GET', '/api/admin/accounts', headers={'X-API-Key': self.api_key})
+                if status == 200:
+                    accounts = set(json.loads(data)['data']['accounts']) - {DEFAULT_ACCOUNT}
+            except Exception as e:
+                # 账号列表获取失败不影响存活状态，沿用上次的结果
+                logger.debug(f"获取工作进程 {worker.name} 的账号列表失败: {str(e)}")
+        worker.mark_up(accounts)
+
+    def _live_workers(self) -> List[GatewayWorker]:
+        return [worker for worker in self.workers if worker.state != DOWN]
+
+    # ---- 路由 ----
+
+    def _find_worker(self, value: str) -> Optional[GatewayWorker]:
+        for worker in self.workers:
+            if value in (worker.name, str(worker.port)):
+                return worker
+        return None
+
+    @staticmethod
+    def _routing_key(method: str, query: str, body: bytes, content_type: str) -> Optional[str]:
+        params = {}
+        if method in ('POST', 'PUT', 'PATCH') and body and 'json' in content_type:
+            try:
+                params = json.loads(body)
+            except ValueError:
+                params = {}
+        if not isinstance(params, dict) or not params:
+            params = {key: values[0] for key, values in parse_qs(query).items()}
+        for key in ROUTING_KEYS:
+            value = params.get(key)
+            if value:
+                return str(value)
+        return None
+
+    def route(self, method: str, path: str, query: str, headers: dict, body: bytes,
+              content_type: str = '') -> Tuple[GatewayWorker, str, str, bool]:
+        """
+        选择工作进程
+
+        Returns:
+            tuple: (工作进程, 路由方式, 转发路径, 是否去掉账号请求头)
+
+        Raises:
+            RoutingError: 指定的工作进程或账号不存在，或没有存活的工作进程
+        """
+        pinned = headers.get(WORKER_HEADER.lower())
+        if pinned:
+            worker = self._find_worker(pinned)
+            if worker is None:
+                raise RoutingError(f'工作进程不存在: {pinned}')
+            return worker, 'pinned', path, False
+
+        account = headers.get(ACCOUNT_HEADER.lower())
+        forward_path = path
+        if path.startswith(ACCOUNT_PATH_PREFIX):
+            account_id, sep, rest = path[len(ACCOUNT_PATH_PREFIX):].partition('/')
+            if account_id and sep:
+                account, forward_path = account_id, '/' + rest
+        if account and account != DEFAULT_ACCOUNT:
+            worker = self._account_owners.get(account)
+            if worker is None:
+                raise RoutingError(f'账号不存在: {account}')
+            if account in worker.accounts:
+                return worker, 'account', path, False
+            # 由工作进程的默认账号承担的账号
+            return worker, 'account', forward_path, True
+
+        workers = self._live_workers()
+        if not workers:
+            raise RoutingError('没有可用的工作进程', WORKER_UNAVAILABLE_CODE, 503)
+        key = self._routing_key(method, query, body, content_type)
+        if key:
+            return _rendezvous(key, workers), 'hash', path, False
+        return workers[next(self._round_robin) % len(workers)], 'round_robin', path, False
+
+    # ---- WSGI ----
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO') or '/'
+        method = environ.get('REQUEST_METHOD', 'GET')
+        if path == '/health' and method == 'GET':
+            body, status = self.health(detail=self._authorized(environ))
+            return self._respond_json(start_response, body, status)
+        if path == '/metrics' and method == 'GET':
+            # 汇总的指标包含各工作进程的聊天名称标签，与工作进程的/metrics一样需要API密钥
+            if self.metrics_require_api_key and not self._authorized(environ):
+                return self._respond_json(start_response, {'code': 1001, 'message': 'API密钥无效', 'data': None},
+                                          401)
+            payload = self.render_metrics().encode('utf-8')
+            start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+                                      ('Content-Length', str(len(payload)))])
+            return [payload]
+
+        from werkzeug.wsgi import get_input_stream
+        body = get_input_stream(environ).read()
+        query = environ.get('QUERY_STRING', '')
+        headers = {key[5:].replace('_', '-').lower(): value for key, value in environ.items()
+                   if key.startswith('HTTP_')}
+
+        account = headers.get(ACCOUNT_HEADER.lower())
+        if (path in MERGED_LISTEN_PATHS and method == 'GET' and not headers.get(WORKER_HEADER.lower())
+                and (not account or account == DEFAULT_ACCOUNT)):
+            return self._merge_listen(environ, start_response, path, query)
+
+        for attempt in range(2):
+            try:
+                worker, route, forward_path, drop_account = self.route(
+                    method, path, query, headers, body, environ.get('CONTENT_TYPE', ''))
+            except RoutingError as e:
+                return self._respond_json(start_response, {'code': e.code, 'message': e.message, 'data': None},
+                                          e.status)
+            url = forward_path + ('?' + query if query else '')
+            # 哈希和轮流转发的请求在连接被拒绝时（请求未发出）换一个工作进程重试一次
+            retry = not attempt and route in ('hash', 'round_robin')
+            result = self._forward(worker, route, environ, start_response, method, url, body, drop_account, retry)
+            if result is not None:
+                return result
+
+    def _authorized(self, environ) -> bool:
+        """没有配置API密钥时不校验"""
+        return not self.api_keys or environ.get('HTTP_X_API_KEY') in self.api_keys
+
+    @staticmethod
+    def _forward_headers(environ, drop_account: bool = False) -> dict:
+        headers = {}
+        for key, value in environ.items():
+            if not key.startswith('HTTP_'):
+                continue
+            name = key[5:].replace('_', '-').title()
+            lowered = name.lower()
+            if lowered in _HOP_BY_HOP or lowered == WORKER_HEADER.lower():
+                continue
+            if drop_account and lowered == ACCOUNT_HEADER.lower():
+                continue
+            headers[name] = value
+        if environ.get('CONTENT_TYPE'):
+            headers['Content-Type'] = environ['CONTENT_TYPE']
+        remote = environ.get('REMOTE_ADDR')
+        if remote:
+            forwarded = headers.get('X-Forwarded-For')
+            headers['X-Forwarded-For'] = f'{forwarded}, {remote}' if forwarded else remote
+        return headers
+
+    def _forward(self, worker: GatewayWorker, route: str, environ, start_response, method: str, url: str,
+                 body: bytes, drop_account: bool, retry: bool = False):
+        """转发请求，retry为True且连接被拒绝时返回None"""
+        headers = self._forward_headers(environ, drop_account)
+        start = time.perf_counter()
+        worker.add_inflight(1)
+        try:
+            conn, response = worker.open(method, url, body if body or method not in ('GET', 'HEAD') else None,
+                                         headers)
+        except (OSError, http.client.HTTPException) as e:
+            worker.add_inflight(-1)
+            worker.mark_down(str(e))
+            if retry and isinstance(e, ConnectionRefusedError):
+                return None
+            self._requests_total.inc(worker.name, route, '502')
+            return self._respond_json(start_response, {
+                'code': WORKER_UNAVAILABLE_CODE,
+                'message': f'工作进程不可用: {worker.name}',
+                'data': {'worker': worker.name, 'error': str(e)}
+            }, 502)
+
+        response_headers = [(name, value) for name, value in response.getheaders()
+                            if name.lower() not in _HOP_BY_HOP]
+        response_headers.append((WORKER_HEADER, worker.name))
+        status_line = f'{response.status} {response.reason}'
+        self._requests_total.inc(worker.name, route, str(response.status))
+
+        if (response.getheader('Content-Type') or '').startswith('text/event-stream'):
+            # 事件流逐块转发，连接不放回连接池
+            start_response(status_line, response_headers)
+
+            def stream():
+                try:
+                    while True:
+                        chunk = response.read1(8192)
+                        if not chunk:
+                            return
+                        yield chunk
+                finally:
+                    conn.close()
+                    worker.add_inflight(-1)
+            return stream()
+
+        try:
+            data = response.read()
+        except Exception as e:
+            conn.close()
+            worker.add_inflight(-1)
+            return self._respond_json(start_response, {
+                'code': WORKER_UNAVAILABLE_CODE,
+                'message': f'读取工作进程响应失败: {str(e)}',
+                'data': {'worker': worker.name}
+            }, 502)
+        worker.finish(conn, response)
+        worker.add_inflight(-1)
+        self._request_duration.observe(time.perf_counter() - start, worker.name)
+        start_response(status_line, response_headers)
+        return [data]
+
+    def _fetch(self, worker: GatewayWorker, method: str, url: str, headers: dict) -> Tuple[Optional[int], bytes, str]:
+        try:
+            status, _, data = worker.request(method, url, headers=headers)
+            return status, data, ''
+        except (OSError, http.client.HTTPException) as e:
+            worker.mark_down(str(e))
+            return None, b'', str(e)
+
+    def _merge_listen(self, environ, start_response, path: str, query: str):
+        """把监听消息轮询转发到所有工作进程，按聊天对象合并消息"""
+        workers = self._live_workers()
+        if not workers:
+            return self._respond_json(start_response, {
+                'code': WORKER_UNAVAILABLE_CODE, 'message': '没有可用的工作进程', 'data': None}, 503)
+        headers = self._forward_headers(environ)
+        url = path + ('?' + query if query else '')
+        results = list(self._executor.map(lambda worker: self._fetch(worker, 'GET', url, headers), workers))
+
+        merged: Dict[str, list] = {}
+        errors = {}
+        first_failure = None
+        for worker, (status, data, error) in zip(workers, results):
+            try:
+                payload = json.loads(data) if data else None
+            except ValueError:
+                payload = None
+            self._requests_total.inc(worker.name, 'merge', str(status or 502))
+            if status == 200 and isinstance(payload, dict) and payload.get('code') == 0:
+                for chat, messages in ((payload.get('data') or {}).get('messages') or {}).items():
+                    merged.setdefault(chat, []).extend(messages)
+                continue
+            errors[worker.name] = error or (payload or {}).get('message') or f'HTTP {status}'
+            if first_failure is None and status is not None and payload is not None:
+                first_failure = (payload, status)
+
+        if len(errors) == len(workers):
+            # 所有工作进程都失败时返回第一个错误，例如微信未初始化
+            body, status = first_failure or ({
+                'code': WORKER_UNAVAILABLE_CODE, 'message': '没有可用的工作进程', 'data': None}, 502)
+            return self._respond_json(start_response, dict(body, data=dict(body.get('data') or {}, errors=errors)),
+                                      status)
+        data = {'messages': merged}
+        if errors:
+            data['errors'] = errors
+        return self._respond_json(start_response, {
+            'code': 0,
+            'message': '获取消息成功' if merged else '没有新消息',
+            'data': data
+        }, 200)
+
+    @staticmethod
+    def _respond_json(start_response, body: dict, status: int):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        reason = http.client.responses.get(status, '')
+        start_response(f'{status} {reason}', [('Content-Type', 'application/json'),
+                                               ('Content-Length', str(len(payload)))])
+        return [payload]
+
+    # ---- 汇总 ----
+
+    def health(self, detail: bool = True) -> Tuple[dict, int]:
+        """
+        按最近一次后台探测的结果返回汇总的健康状态，不在请求中探测工作进程
+
+        Args:
+            detail (bool): 是否包含工作进程的账号、连接池和账号归属，未通过API密钥校验的请求只返回存活状态
+        """
+        up = sum(1 for worker in self.workers if worker.state == UP)
+        status = 'ok' if up == len(self.workers) else ('degraded' if up else 'down')
+        body = {
+            'status': status,
+            'uptime': round(time.time() - self.started_at, 3),
+            'discovered_at': self.discovered_at,
+        }
+        if detail:
+            body.update({
+                'workers': {worker.name: worker.to_dict() for worker in self.workers},
+                'accounts': {account: worker.name for account, worker in sorted(self._account_owners.items())},
+                'duplicate_accounts': dict(self._duplicate_accounts),
+            })
+        else:
+            body['workers'] = {'up': up, 'total': len(self.workers)}
+        return body, 200 if up else 503
+
+    def render_metrics(self) -> str:
+        """网关自身的指标加上所有存活工作进程的指标"""
+        headers = {'X-API-Key': self.api_key} if self.api_key else {}
+        workers = [worker for worker in self.workers if worker.state == UP]
+        results = list(self._executor.map(lambda worker: self._fetch(worker, 'GET', '/metrics', headers), workers))
+        texts = [(worker.name, data.decode('utf-8', errors='replace'))
+                 for worker, (status, data, _) in zip(workers, results) if status == 200]
+        return self.metrics.render() + merge_prometheus(texts)
+
+
+def create_gateway(workers: Optional[list] = None) -> Gateway:
+    """
+    按配置创建网关
+
+    Args:
+        workers (list, optional): 工作进程端口，或{'port', 'host', 'accounts'}，默认为Config.GATEWAY_WORKERS
+    """
+    from app.config import Config
+
+    gateway_workers = []
+    for entry in Config.GATEWAY_WORKERS if workers is None else workers:
+        if not isinstance(entry, dict):
+            entry = {'port': entry}
+        gateway_workers.append(GatewayWorker(
+            entry.get('host') or Config.GATEWAY_WORKER_HOST,
+            int(entry['port']),
+            entry.get('accounts') or (),
+            pool_size=Config.GATEWAY_POOL_SIZE,
+            timeout=Config.GATEWAY_TIMEOUT,
+        ))
+    api_keys = Config.get_api_keys()
+    return Gateway(gateway_workers, api_keys[0] if api_keys else None, Config.GATEWAY_DISCOVERY_INTERVAL,
+                   api_keys=api_keys, metrics_require_api_key=Config.METRICS_REQUIRE_API_KEY)
+
+
+def start_gateway(port: Optional[int] = None, workers: Optional[list] = None):
+    """启动网关服务（main.py --service gateway）"""
+    from werkzeug.serving import make_server
+    from app.config import Config
+
+    logger.set_lib_name("Gateway")
+    gateway = create_gateway(workers)
+    if not gateway.workers:
+        logger.error("没有配置工作进程，请设置GATEWAY_WORKERS或使用--workers参数")
+        sys.exit(1)
+
+    port = port or Config.GATEWAY_PORT
+    try:
+        server = make_server(Config.HOST, port, gateway, threaded=True)
+    except Exception as e:
+        logger.error(f"监听端口 {Config.HOST}:{port} 失败: {str(e)}")
+        sys.exit(1)
+
+    gateway.start()
+    logger.info(f"API网关监听地址: {Config.HOST}:{port}，工作进程: "
+                f"{', '.join(f'{w.name}({w.state})' for w in gateway.workers)}")
+    try:
+        server.serve_forever()
+    finally:
+        gateway.stop()
@@ -0,0 +1,344 @@
+"""
+群成员缓存
+按群名缓存GetGroupMembers的结果，提供O(1)的成员判断和按版本号的增量差异查询。
+缓存在以下情况失效：
+- GetAllGroups或会话列表中看到的群人数发生变化
+- 收到入群、退群、移出群聊等系统消息
+- 超过有效期
+"""
+
+import re
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.accounts import AccountLocal
+from app.unified_logger import logger
+
+# 群名末尾的人数，例如"测试群 (25)"
+GROUP_COUNT_PATTERN = re.compile(r'^(.*?)\s*\((\d+)\)$')
+
+# 群成员变化相关的系统消息
+MEMBER_CHANGE_PATTERN = re.compile(
+    r'加入了?群聊|加入群聊|移出了?群聊|退出了?群聊|移出群聊|撤销了.*邀请|joined the group|left the group|removed .* from the group',
+    re.IGNORECASE
+)
+
+# 每个群保留的差异记录数量
+DEFAULT_HISTORY_SIZE = 50
+
+
+def split_group_count(chat_name: str) -> Tuple[str, Optional[int]]:
+    """
+    拆分群名和人数
+
+    Args:
+        chat_name (str): 可能带有人数后缀的群名
+
+    Returns:
+        tuple: (群名, 人数)，没有人数后缀时人数为None
+    """
+    if not chat_name:
+        return chat_name, None
+    match = GROUP_COUNT_PATTERN.match(chat_name.strip())
+    if match:
+        return match.group(1), int(match.group(2))
+    return chat_name, None
+
+
+def _member_key(member: Any) -> str:
+    """成员的唯一标识，兼容字符串和字典两种返回格式"""
+    if isinstance(member, dict):
+        return str(member.get('name') or member.get('nickname') or member.get('remark') or member)
+    return str(member)
+
+
+class _GroupEntry:
+    """单个群的缓存条目"""
+
+    __slots__ = ('members', 'member_set', 'version', 'fetched_at', 'observed_count',
+                 'stale', 'stale_reason', 'history', 'lock')
+
+    def __init__(self, history_size: int):
+        self.members: List[Any] = []
+        self.member_set = set()
+        self.version = 0
+        self.fetched_at = None
+        self.observed_count = None
+        self.stale = True
+        self.stale_reason = '未加载'
+        self.history = deque(maxlen=history_size)  # (版本号, 新增成员, 移除成员)
+        self.lock = threading.Lock()  # 保证同一群同时只有一次界面获取
+
+
+class GroupMemberCache:
+    """群成员缓存"""
+
+    def __init__(self, ttl: float = 600, history_size: int = DEFAULT_HISTORY_SIZE):
+        """
+        Args:
+            ttl (float): 缓存有效期（秒），人数变化和系统消息会使缓存提前失效
+            history_size (int): 每个群保留的差异记录数量
+        """
+        self.ttl = ttl
+        self.history_size = history_size
+        self._entries: Dict[str, _GroupEntry] = {}
+        self._session_previews: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._loads = 0
+        self._invalidations = 0
+
+    def get_members(self, group: str, loader: Callable[[str], Optional[list]],
+                    refresh: bool = False) -> dict:
+        """
+        获取群成员，缓存有效时不访问微信界面
+
+        Args:
+            group (str): 群名
+            loader (callable): 缓存失效时调用loader(group)从界面获取成员列表
+            refresh (bool): 是否强制重新获取
+
+        Returns:
+            dict: {'members', 'version', 'as_of', 'cached'}，loader返回None时members为None
+        """
+        entry = self._get_entry(group)
+        if not refresh and self._is_fresh(entry):
+            self._hits += 1
+            return self._snapshot(entry, cached=True)
+
+        with entry.lock:
+            # 等锁期间其他请求可能已经刷新完成
+            if not refresh and self._is_fresh(entry):
+                self._hits += 1
+                return self._snapshot(entry, cached=True)
+
+            self._misses += 1
+            members = loader(group)
+            if members is None:
+                return {'members': None, 'version': entry.version, 'as_of': entry.fetched_at, 'cached': False}
+            self._apply(group, entry, list(members))
+            return self._snapshot(entry, cached=False)
+
+    def is_member(self, group: str, member: str, loader: Callable[[str], Optional[list]],
+                  refresh: bool = False) -> Optional[dict]:
+        """
+        判断是否为群成员
+
+        Args:
+            group (str): 群名
+            member (str): 成员名称
+            loader (callable): 缓存失效时的加载函数
+            refresh (bool): 是否强制重新获取
+
+        Returns:
+            dict: {'is_member', 'version', 'as_of', 'cached'}，无法获取成员列表时返回None
+        """
+        result = self.get_members(group, loader, refresh)
+        if result['members'] is None:
+            return None
+        entry = self._get_entry(group)
+        return {
+            'is_member': member in entry.member_set,
+            'version': result['version'],
+            'as_of': result['as_of'],
+            'cached': result['cached'],
+        }
+
+    def diff_since(self, group: str, since_version: int) -> Optional[dict]:
+        """
+        获取指定版本之后的成员变化
+
+        Args:
+            group (str): 群名
+            since_version (int): 调用方已知的版本号
+
+        Returns:
+            dict: {'version', 'added', 'removed', 'full'}；
+                  差异记录已被淘汰或版本号无效时full为True，并返回完整成员列表；
+                  群未加载过时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(group)
+        if entry is None or entry.fetched_at is None:
+            return None
+
+        with entry.lock:
+            current = entry.version
+            if since_version == current:
+                return {'version': current, 'added': [], 'removed': [], 'full': False,
+                        'stale': entry.stale}
+
+            oldest = entry.history[0][0] if entry.history else None
+            if since_version > current or oldest is None or since_version < oldest - 1:
+                return {'version': current, 'members': list(entry.members), 'added': [],
+                        'removed': [], 'full': True, 'stale': entry.stale}
+
+            added = {}
+            removed = {}
+            for version, version_added, version_removed in entry.history:
+                if version <= since_version:
+                    continue
+                for key, member in version_added:
+                    if key in removed:
+                        removed.pop(key)
+                    else:
+                        added[key] = member
+                for key, member in version_removed:
+                    if key in added:
+                        added.pop(key)
+                    else:
+                        removed[key] = member
+            return {'version': current, 'added': list(added.values()),
+                    'removed': list(removed.values()), 'full': False, 'stale': entry.stale}
+
+    def observe_member_count(self, group: str, count: Optional[int]):
+        """
+        记录在群列表或会话列表中看到的群人数，人数变化时使缓存失效
+
+        Args:
+            group (str): 群名
+            count (int): 群人数
+        """
+        if not group or count is None:
+            return
+        with self._lock:
+            entry = self._entries.get(group)
+        if entry is None:
+            return
+        previous = entry.observed_count
+        entry.observed_count = count
+        if previous is not None and previous != count:
+            self.invalidate(group, f'群人数变化: {previous} -> {count}')
+
+    def observe_message(self, chat_name: str, msg_type: Optional[str], content: Optional[str]):
+        """
+        根据收到的消息判断群成员是否可能变化
+
+        Args:
+            chat_name (str): 聊天名称，可能带人数后缀
+            msg_type (str): 消息类型
+            content (str): 消息内容
+        """
+        group, count = split_group_count(chat_name)
+        self.observe_member_count(group, count)
+        if msg_type in ('sys', 'system') and content and MEMBER_CHANGE_PATTERN.search(content):
+            self.invalidate(group, f'系统消息: {content[:50]}')
+
+    def observe_session(self, chat_name: str, preview: Optional[str]):
+        """
+        根据会话列表中的名称和最后一条消息预览判断群成员是否可能变化
+
+        同一条预览在多次获取会话列表时会重复出现，只在预览变化时处理一次
+
+        Args:
+            chat_name (str): 会话名称，可能带人数后缀
+            preview (str): 最后一条消息的预览
+        """
+        group, count = split_group_count(chat_name)
+        self.observe_member_count(group, count)
+        if not preview:
+            return
+        with self._lock:
+            if self._session_previews.get(group) == preview:
+                return
+            self._session_previews[group] = preview
+        if MEMBER_CHANGE_PATTERN.search(preview):
+            self.invalidate(group, f'会话提示: {preview[:50]}')
+
+    def invalidate(self, group: Optional[str] = None, reason: str = '手动失效'):
+        """
+        使缓存失效，保留版本号和差异记录，下次访问时重新获取并计算差异
+
+        Args:
+            group (str, optional): 群名，不指定时使全部缓存失效
+            reason (str): 失效原因
+        """
+        with self._lock:
+            entries = [self._entries.get(group)] if group else list(self._entries.values())
+        for entry in entries:
+            if entry is not None and not entry.stale:
+                entry.stale = True
+                entry.stale_reason = reason
+                self._invalidations += 1
+        if group:
+            logger.debug(f"群成员缓存失效: {group} - {reason}")
+
+    def clear(self):
+        """清空全部缓存，例如切换账号时"""
+        with self._lock:
+            self._entries.clear()
+            self._session_previews.clear()
+
+    def get_stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            entries = dict(self._entries)
+        total = self._hits + self._misses
+        return {
+            'ttl': self.ttl,
+            'groups': len(entries),
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': round(self._hits / total, 4) if total else None,
+            'loads': self._loads,
+            'invalidations': self._invalidations,
+            'stale_groups': sum(1 for entry in entries.values() if entry.stale),
+        }
+
+    def _get_entry(self, group: str) -> _GroupEntry:
+        with self._lock:
+            entry = self._entries.get(group)
+            if entry is None:
+                entry = _GroupEntry(self.history_size)
+                self._entries[group] = entry
+            return entry
+
+    def _is_fresh(self, entry: _GroupEntry) -> bool:
+        return (not entry.stale and entry.fetched_at is not None
+                and time.time() - entry.fetched_at < self.ttl)
+
+    def _snapshot(self, entry: _GroupEntry, cached: bool) -> dict:
+        return {
+            'members': entry.members,
+            'version': entry.version,
+            'as_of': entry.fetched_at,
+            'cached': cached,
+        }
+
+    def _apply(self, group: str, entry: _GroupEntry, members: list):
+        """写入新获取的成员列表，有变化时递增版本号并记录差异"""
+        new_keys = {_member_key(member): member for member in members}
+        old_keys = {_member_key(member): member for member in entry.members}
+
+        if entry.fetched_at is None or new_keys.keys() != old_keys.keys():
+            added = [(key, member) for key, member in new_keys.items() if key not in old_keys]
+            removed = [(key, member) for key, member in old_keys.items() if key not in new_keys]
+            entry.version += 1
+            if entry.fetched_at is not None:
+                entry.history.append((entry.version, added, removed))
+                logger.info(f"群 {group} 成员变化: 新增 {len(added)} 人, 移除 {len(removed)} 人, 版本 {entry.version}")
+            else:
+                entry.history.clear()
+
+        entry.members = members
+        entry.member_set = set(new_keys.keys())
+        entry.fetched_at = time.time()
+        entry.stale = False
+        entry.stale_reason = None
+        self._loads += 1
+
+
+def _create_default_cache() -> GroupMemberCache:
+    try:
+        from app.config import Config
+        return GroupMemberCache(ttl=Config.GROUP_MEMBER_CACHE_TTL)
+    except (ImportError, AttributeError):
+        return GroupMemberCache()
+
+
+# 全局群成员缓存，每个账号一个实例
+group_member_cache = AccountLocal(_create_default_cache, 'group_member_cache')
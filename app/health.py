@@ -0,0 +1,348 @@
+"""
+微信连接健康状态
+汇总连接监控的主动探测结果和实际接口调用的成败，维护缓存的健康状态，
+并在微信不可用时熔断界面操作，使请求立即返回503，而不是占用队列线程直到超时
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from app.accounts import AccountLocal
+from app.unified_logger import logger
+
+# 健康状态
+STATE_UNKNOWN = 'unknown'
+STATE_HEALTHY = 'healthy'
+STATE_DEGRADED = 'degraded'
+STATE_DOWN = 'down'
+
+# 熔断器状态
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+
+# 连续多少次调用失败后立即触发一次主动探测
+DEFAULT_FAILURE_THRESHOLD = 3
+
+# 统计被动健康度的最近调用数量
+OUTCOME_WINDOW = 50
+
+# 微信断开时需要熔断的界面操作接口前缀
+UI_PATH_PREFIXES = (
+    '/api/message/',
+    '/api/chat-window/',
+    '/api/chat/',
+    '/api/group/',
+    '/api/friend/',
+    '/api/wechat/',
+    '/api/moments/',
+    '/api/auxiliary/',
+    '/api/contact/',
+)
+
+# 不访问界面或需要在断开时仍可用的接口
+EXEMPT_PATHS = {
+    '/api/wechat/initialize',
+    '/api/wechat/status',
+    '/api/wechat/session-changes',
+    '/api/wechat/session-events',
+    '/api/group/member-diff',
+}
+
+
+class WeChatUnavailableError(Exception):
+    """微信连接不可用，熔断期间调用界面操作时抛出"""
+
+    def __init__(self, message: str = '微信连接不可用', retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class HealthMonitor:
+    """
+    微信连接健康状态机
+
+    - 主动探测（连接监控的check_connection）决定熔断器开合：探测失败时打开，成功时关闭
+    - 实际调用的成败作为被动健康信号：近期有成功调用时监控可以跳过探测，
+      连续失败时立即唤醒监控进行探测
+    - 探测间隔自适应：出错后回到最小间隔，稳定后逐步放大到最大间隔
+    """
+
+    def __init__(self, min_interval: float = 10, max_interval: float = 60,
+                 reconnect_base_delay: float = 5, reconnect_max_delay: float = 300,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD):
+        """
+        Args:
+            min_interval (float): 最小探测间隔（秒）
+            max_interval (float): 最大探测间隔（秒）
+            reconnect_base_delay (float): 重连初始延迟（秒）
+            reconnect_max_delay (float): 重连最大延迟（秒）
+            failure_threshold (int): 连续调用失败多少次后触发主动探测
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = max(reconnect_max_delay, reconnect_base_delay)
+        self.failure_threshold = failure_threshold
+
+        self._lock = threading.Lock()
+        self._state = STATE_UNKNOWN
+        self._circuit = CIRCUIT_CLOSED
+        self._state_since = time.time()
+        self._interval = min_interval
+        self._probe_trigger: Optional[Callable[[], None]] = None
+
+        self._last_probe = None
+        self._last_probe_ok = None
+        self._last_success = None
+        self._last_failure = None
+        self._last_error = None
+        self._consecutive_failures = 0
+        self._reconnect_attempts = 0
+        self._next_retry_at = None
+        self._outcomes = deque(maxlen=OUTCOME_WINDOW)
+
+        self._probes = 0
+        self._skipped_probes = 0
+        self._rejected_calls = 0
+        self._circuit_opens = 0
+
+    def set_probe_trigger(self, trigger: Callable[[], None]):
+        """设置立即唤醒连接监控的回调"""
+        self._probe_trigger = trigger
+
+    def record_probe(self, ok: bool, error: Optional[str] = None):
+        """
+        记录一次主动探测结果
+
+        Args:
+            ok (bool): 探测是否成功
+            error (str, optional): 失败原因
+        """
+        now = time.time()
+        with self._lock:
+            self._probes += 1
+            self._last_probe = now
+            self._last_probe_ok = ok
+            if ok:
+                self._last_success = now
+                self._consecutive_failures = 0
+                self._reconnect_attempts = 0
+                self._next_retry_at = None
+                # 稳定时逐步放大探测间隔
+                self._interval = min(self._interval * 2, self.max_interval)
+                self._set_state_locked(STATE_HEALTHY)
+                if self._circuit == CIRCUIT_OPEN:
+                    self._circuit = CIRCUIT_CLOSED
+                    logger.info("微信连接已恢复，熔断器关闭")
+            else:
+                self._last_failure = now
+                self._last_error = error
+                self._interval = self.min_interval
+                self._set_state_locked(STATE_DOWN)
+                if self._circuit == CIRCUIT_CLOSED:
+                    self._circuit = CIRCUIT_OPEN
+                    self._circuit_opens += 1
+                    logger.warning(f"微信连接不可用，熔断界面操作: {error or '连接检查失败'}")
+
+    def record_success(self, operation: Optional[str] = None):
+        """记录一次成功的界面调用"""
+        now = time.time()
+        with self._lock:
+            self._last_success = now
+            self._consecutive_failures = 0
+            self._outcomes.append(True)
+            if self._state in (STATE_UNKNOWN, STATE_DEGRADED):
+                self._set_state_locked(STATE_HEALTHY)
+
+    def record_failure(self, operation: Optional[str] = None, error: Optional[str] = None):
+        """
+        记录一次失败的界面调用
+
+        调用失败可能只是业务错误（例如找不到聊天），因此不直接打开熔断器，
+        连续失败达到阈值时唤醒连接监控立即探测
+        """
+        now = time.time()
+        trigger = None
+        with self._lock:
+            self._last_failure = now
+            self._last_error = f"{operation}: {error}" if operation else error
+            self._consecutive_failures += 1
+            self._outcomes.append(False)
+            self._interval = self.min_interval
+            if self._consecutive_failures >= self.failure_threshold and self._state != STATE_DOWN:
+                self._set_state_locked(STATE_DEGRADED)
+                trigger = self._probe_trigger
+        if trigger is not None:
+            trigger()
+
+    def allow_call(self) -> bool:
+        """熔断器关闭时允许界面调用"""
+        with self._lock:
+            if self._circuit == CIRCUIT_OPEN:
+                self._rejected_calls += 1
+                return False
+            return True
+
+    def is_open(self) -> bool:
+        """熔断器是否打开"""
+        return self._circuit == CIRCUIT_OPEN
+
+    def retry_after(self) -> int:
+        """建议调用方重试的等待秒数"""
+        with self._lock:
+            if self._next_retry_at:
+                return max(int(self._next_retry_at - time.time()) + 1, 1)
+            return max(int(self._interval), 1)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """
+        包装界面调用：熔断时直接抛出WeChatUnavailableError，否则记录调用成败
+
+        Args:
+            name (str): 方法名称
+            func (callable): 实际方法
+        """
+        def wrapper(*args, **kwargs):
+            if not self.allow_call():
+                raise WeChatUnavailableError(f'微信连接不可用，已暂停调用 {name}', self.retry_after())
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self.record_failure(name, str(e))
+                raise
+            self.record_success(name)
+            return result
+        wrapper.__name__ = getattr(func, '__name__', name)
+        wrapper.__doc__ = getattr(func, '__doc__', None)
+        return wrapper
+
+    def should_probe(self) -> bool:
+        """
+        是否需要主动探测
+
+        熔断器关闭且最近一个探测间隔内有成功调用时，说明连接正常，跳过探测以减少界面访问
+        """
+        with self._lock:
+            if self._circuit == CIRCUIT_OPEN or self._consecutive_failures:
+                return True
+            if self._last_success is not None and time.time() - self._last_success < self._interval:
+                self._skipped_probes += 1
+                return False
+            return True
+
+    def next_probe_delay(self) -> float:
+        """下一次探测前的等待时间（秒）"""
+        with self._lock:
+            return self._interval
+
+    def next_reconnect_delay(self) -> float:
+        """
+        下一次重连前的等待时间，指数退避并加入随机抖动，没有次数上限
+
+        Returns:
+            float: 等待秒数
+        """
+        with self._lock:
+            self._reconnect_attempts += 1
+            ceiling = min(self.reconnect_max_delay,
+                          self.reconnect_base_delay * (2 ** min(self._reconnect_attempts - 1, 16)))
+            # 一半固定、一半随机，避免多个实例同时重连
+            delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+            self._next_retry_at = time.time() + delay
+            return delay
+
+    @property
+    def reconnect_attempts(self) -> int:
+        return self._reconnect_attempts
+
+    def get_state(self) -> str:
+        """当前健康状态"""
+        return self._state
+
+    def get_stats(self) -> dict:
+        """获取健康状态详情"""
+        with self._lock:
+            now = time.time()
+            outcomes = list(self._outcomes)
+            return {
+                'state': self._state,
+                'state_since': self._state_since,
+                'circuit': self._circuit,
+                'probe_interval': self._interval,
+                'last_probe': self._last_probe,
+                'last_probe_ok': self._last_probe_ok,
+                'last_success': self._last_success,
+                'last_failure': self._last_failure,
+                'last_error': self._last_error,
+                'seconds_since_success': None if self._last_success is None else round(now - self._last_success, 1),
+                'consecutive_failures': self._consecutive_failures,
+                'success_rate': round(sum(outcomes) / len(outcomes), 4) if outcomes else None,
+                'reconnect_attempts': self._reconnect_attempts,
+                'next_retry_at': self._next_retry_at,
+                'probes': self._probes,
+                'skipped_probes': self._skipped_probes,
+                'rejected_calls': self._rejected_calls,
+                'circuit_opens': self._circuit_opens,
+            }
+
+    def _set_state_locked(self, state: str):
+        if state != self._state:
+            logger.debug(f"微信连接状态: {self._state} -> {state}")
+            self._state = state
+            self._state_since = time.time()
+
+
+def should_fast_fail(path: str) -> bool:
+    """
+    判断请求是否需要在熔断期间直接返回503
+
+    Args:
+        path (str): 请求路径
+    """
+    if path in EXEMPT_PATHS:
+        return False
+    return path.startswith(UI_PATH_PREFIXES)
+
+
+def unavailable_response(message: str = '微信连接不可用，请稍后重试', retry_after: Optional[float] = None):
+    """
+    微信连接不可用时的503响应，带Retry-After
+
+    Args:
+        message (str): 错误信息
+        retry_after (float, optional): 建议重试的秒数，默认按当前账号的熔断状态计算
+    """
+    from flask import jsonify
+
+    if retry_after is None:
+        retry_after = health_monitor.retry_after()
+    response = jsonify({
+        'code': 2003,
+        'message': message,
+        'data': {
+            'wechat_state': health_monitor.get_state(),
+            'retry_after': retry_after
+        }
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _create_default_monitor() -> HealthMonitor:
+    try:
+        from app.config import Config
+        return HealthMonitor(min_interval=Config.WECHAT_CHECK_MIN_INTERVAL,
+                             max_interval=Config.WECHAT_CHECK_INTERVAL,
+                             reconnect_base_delay=Config.WECHAT_RECONNECT_DELAY,
+                             reconnect_max_delay=Config.WECHAT_RECONNECT_MAX_DELAY)
+    except (ImportError, AttributeError):
+        return HealthMonitor()
+
+
+# 全局健康状态，每个账号一个实例
+health_monitor = AccountLocal(_create_default_monitor, 'health_monitor')
@@ -0,0 +1,215 @@
+"""
+聊天记录增量同步
+按水位（客户端最后看到的消息ID或消息哈希）只返回比水位更新的消息，
+水位已滚出当前窗口时可以回填：反复调用LoadMoreMessage向上加载，直到重新看到水位或达到加载次数/消息数量上限。
+
+- 服务端按账号、消费者和聊天保存最近一次同步的水位，客户端可以不自己保存水位
+- 消息按ID去重，没有ID的消息按哈希去重
+- 微信重新加载窗口后消息ID可能变化，客户端可以只传消息哈希（类型、发送者、内容），按哈希匹配水位
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from app.accounts import AccountLocal
+
+DEFAULT_MAX_WATERMARKS = 1000
+DEFAULT_MAX_LOADS = 20
+DEFAULT_CONSUMER = 'default'
+
+
+def message_hash(msg: Any) -> str:
+    """按消息类型、发送者和内容计算的哈希，消息ID失效时用于匹配水位"""
+    raw = '\x1f'.join(str(getattr(msg, name, '') or '') for name in ('type', 'sender', 'content'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def message_key(msg: Any) -> str:
+    """去重使用的键：优先使用消息ID，没有ID时使用消息哈希"""
+    message_id = getattr(msg, 'id', None)
+    return f"id:{message_id}" if message_id else f"hash:{message_hash(msg)}"
+
+
+def dedupe(messages: Iterable[Any]) -> List[Any]:
+    """按消息ID去重，保留第一次出现的位置"""
+    seen = set()
+    result = []
+    for msg in messages:
+        key = message_key(msg)
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append(msg)
+    return result
+
+
+def make_watermark(messages: List[Any]) -> Optional[dict]:
+    """以最新一条消息作为水位"""
+    if not messages:
+        return None
+    newest = messages[-1]
+    return {'id': getattr(newest, 'id', None) or None, 'hash': message_hash(newest)}
+
+
+def locate(messages: List[Any], watermark: Optional[dict]) -> Optional[int]:
+    """
+    查找水位消息在列表中的位置
+
+    水位有消息ID时只按ID从新到旧查找：内容相同的消息可能有多条，按哈希匹配可能匹配到错误的位置而遗漏消息；
+    只有哈希时（例如窗口重新加载后消息ID已变化）按哈希查找，取最新的一条
+
+    Returns:
+        int: 水位消息的下标，找不到时返回None
+    """
+    if not watermark:
+        return None
+    message_id = watermark.get('id')
+    if message_id:
+        for position in range(len(messages) - 1, -1, -1):
+            if getattr(messages[position], 'id', None) == message_id:
+                return position
+        return None
+    digest = watermark.get('hash')
+    if digest:
+        for position in range(len(messages) - 1, -1, -1):
+            if message_hash(messages[position]) == digest:
+                return position
+    return None
+
+
+def delta(messages: List[Any], watermark: Optional[dict]) -> Tuple[List[Any], Optional[bool]]:
+    """
+    返回比水位更新的消息
+
+    Returns:
+        tuple: (消息列表, 是否找到水位)；没有水位时返回全部消息和None，
+               找不到水位时返回全部消息和False，中间可能有遗漏，需要回填
+    """
+    if not watermark:
+        return messages, None
+    position = locate(messages, watermark)
+    if position is None:
+        return messages, False
+    return messages[position + 1:], True
+
+
+def backfill(fetch: Callable[[], Iterable[Any]], load_more: Callable[[], Any], watermark: Optional[dict],
+             max_loads: int = DEFAULT_MAX_LOADS, depth: Optional[int] = None) -> dict:
+    """
+    向上加载历史消息，直到重新看到水位、已加载的消息数量达到depth、加载不到更多消息或达到max_loads次
+
+    Args:
+        fetch (callable): 获取窗口中已加载的全部消息，通常为聊天窗口的GetAllMessage
+        load_more (callable): 向上加载一页历史消息，通常为聊天窗口的LoadMoreMessage
+        watermark (dict, optional): 目标水位，没有水位时只按depth和max_loads加载
+        max_loads (int): 最多调用load_more的次数
+        depth (int, optional): 已加载的消息数量达到该值后停止
+
+    Returns:
+        dict: messages（去重后比水位更新的消息）、found、loads、loaded、reason
+    """
+    messages = dedupe(fetch() or [])
+    loads = 0
+    while True:
+        if watermark and locate(messages, watermark) is not None:
+            reason = 'watermark'
+            break
+        if depth is not None and len(messages) >= depth:
+            reason = 'depth'
+            break
+        if loads >= max_loads:
+            reason = 'max_loads'
+            break
+        load_more()
+        loads += 1
+        loaded = dedupe(fetch() or [])
+        if len(loaded) <= len(messages):
+            # 已经到顶，没有更早的消息
+            messages = loaded
+            reason = 'exhausted'
+            break
+        messages = loaded
+
+    new_messages, found = delta(messages, watermark)
+    if depth is not None and not watermark:
+        new_messages = new_messages[-depth:]
+    return {'messages': new_messages, 'found': found, 'loads': loads,
+            'loaded': len(messages), 'reason': reason}
+
+
+class WatermarkStore:
+    """按账号保存每个消费者在每个聊天中的同步水位，超过数量上限时淘汰最久未使用的水位"""
+
+    def __init__(self, max_watermarks: int = DEFAULT_MAX_WATERMARKS):
+        self.max_watermarks = max_watermarks
+        self._marks: 'OrderedDict[Tuple[str, str], dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'syncs': 0, 'initial': 0, 'found': 0, 'gaps': 0, 'returned': 0,
+                      'backfills': 0, 'backfill_loads': 0}
+
+    def get(self, chat: str, consumer: str = DEFAULT_CONSUMER) -> Optional[dict]:
+        with self._lock:
+            mark = self._marks.get((consumer, chat))
+            if mark is not None:
+                self._marks.move_to_end((consumer, chat))
+            return dict(mark) if mark is not None else None
+
+    def set(self, chat: str, watermark: Optional[dict], consumer: str = DEFAULT_CONSUMER):
+        if not watermark:
+            return
+        with self._lock:
+            self._marks[(consumer, chat)] = dict(watermark, updated_at=time.time())
+            self._marks.move_to_end((consumer, chat))
+            while len(self._marks) > self.max_watermarks:
+                self._marks.popitem(last=False)
+
+    def reset(self, chat: str, consumer: Optional[str] = None) -> int:
+        """删除水位，consumer为空时删除该聊天所有消费者的水位，返回删除的数量"""
+        with self._lock:
+            keys = [key for key in self._marks if key[1] == chat and (consumer is None or key[0] == consumer)]
+            for key in keys:
+                del self._marks[key]
+        return len(keys)
+
+    def record_sync(self, found: Optional[bool], returned: int):
+        with self._lock:
+            self.stats['syncs'] += 1
+            self.stats['returned'] += returned
+            if found is None:
+                self.stats['initial'] += 1
+            elif found:
+                self.stats['found'] += 1
+            else:
+                self.stats['gaps'] += 1
+
+    def record_backfill(self, loads: int):
+        with self._lock:
+            self.stats['backfills'] += 1
+            self.stats['backfill_loads'] += loads
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, watermarks=len(self._marks), max_watermarks=self.max_watermarks)
+
+
+def _create_default_store() -> WatermarkStore:
+    try:
+        from app.config import Config
+        return WatermarkStore(max_watermarks=Config.HISTORY_SYNC_MAX_WATERMARKS)
+    except (ImportError, AttributeError):
+        return WatermarkStore()
+
+
+def default_max_loads() -> int:
+    try:
+        from app.config import Config
+        return Config.HISTORY_SYNC_MAX_LOADS
+    except (ImportError, AttributeError):
+        return DEFAULT_MAX_LOADS
+
+
+# 全局水位存储，每个账号一个
+watermarks = AccountLocal(_create_default_store, 'history_sync')
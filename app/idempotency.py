@@ -0,0 +1,256 @@
+"""
+幂等键
+发送类接口支持Idempotency-Key请求头：同一API密钥、账号、接口路径、幂等键和请求体的请求只执行一次。
+
+- 首个请求执行任务，并发到达的重复请求等待同一个任务的结果
+- 任务成功后结果缓存一段时间，之后的重复请求直接返回缓存的响应，不再操作微信界面
+- 队列任务超时后任务仍会继续执行，此时条目保持进行中，重试的请求等待任务完成而不是再发送一次
+- 失败的响应不缓存，可以用同一个键重试
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Optional, Tuple
+
+from app.accounts import current_account_id
+from app.api_queue import task_observer
+from app.health import WeChatUnavailableError
+from app.unified_logger import logger
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+MAX_KEY_LENGTH = 255
+
+# 相同幂等键的请求仍在处理中
+IN_PROGRESS_CODE = 1003
+
+
+class _Entry:
+    """一个幂等键对应的任务"""
+
+    __slots__ = ('key', 'created_at', 'completed_at', 'response', 'cacheable', 'deferred',
+                 'task_outcome', 'joined', 'replayed', '_event', '_lock')
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.created_at = time.time()
+        self.completed_at = None
+        # (响应体, 状态码, Content-Type)
+        self.response: Optional[Tuple[bytes, int, str]] = None
+        self.cacheable = False
+        self.deferred = False
+        self.task_outcome = None
+        self.joined = 0
+        self.replayed = 0
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: float) -> bool:
+        return self._event.wait(timeout)
+
+    # 队列任务观察者接口，见api_queue.task_observer
+
+    def task_finished(self, task, result_type, result):
+        with self._lock:
+            self.task_outcome = (result_type, result)
+            deferred = self.deferred
+        if deferred:
+            logger.info(f"幂等键 {self.key[3]} 的任务 {task['id']} 在请求超时后完成")
+            idempotency_cache.complete(self, *_response_from_task(result_type, result))
+
+    def task_timed_out(self, task) -> bool:
+        """请求等待超时，任务结果改由task_finished写入；任务已完成时返回False"""
+        with self._lock:
+            if self.task_outcome is not None:
+                return False
+            self.deferred = True
+            return True
+
+
+def _response_from_task(result_type, result) -> Tuple[bytes, int, str]:
+    """把队列任务的结果转换为响应，与发送接口处理队列结果的方式一致"""
+    if result_type == 'success' and isinstance(result, dict) and 'response' in result and 'status_code' in result:
+        body, status = result['response'], result['status_code']
+    elif result_type == 'success':
+        body, status = {'code': 3001, 'message': '服务器内部错误', 'data': None}, 500
+    else:
+        body, status = {'code': 3001, 'message': f'处理请求失败: {result}', 'data': None}, 500
+    return json.dumps(body, ensure_ascii=False).encode('utf-8'), status, 'application/json'
+
+
+class IdempotencyCache:
+    """有容量上限和有效期的幂等键缓存"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0):
+        """
+        Args:
+            max_entries (int): 最多保留的条目数，超过后淘汰最早的条目
+            ttl (float): 成功结果的保留时间（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[tuple, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'executed': 0, 'joined': 0, 'replayed': 0, 'deferred_completed': 0, 'evicted': 0}
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        # 进行中的条目超过有效期仍未完成（例如队列已停止）也视为过期
+        if entry.done:
+            return now - entry.completed_at > self.ttl
+        return now - entry.created_at > self.ttl
+
+    def begin(self, key: tuple) -> Tuple[_Entry, bool]:
+        """
+        获取幂等键对应的条目
+
+        Returns:
+            tuple: (条目, 是否由调用方执行任务)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                if entry.done:
+                    entry.replayed += 1
+                    self.stats['replayed'] += 1
+                else:
+                    entry.joined += 1
+                    self.stats['joined'] += 1
+                return entry, False
+
+            entry = _Entry(key)
+            self._entries[key] = entry
+            self.stats['executed'] += 1
+            self._evict_locked(now)
+            return entry, True
+
+    def complete(self, entry: _Entry, body: bytes, status: int, content_type: str):
+        """写入响应并唤醒等待的重复请求，失败的响应不缓存"""
+        with self._lock:
+            if entry.done:
+                return
+            entry.response = (body, status, content_type)
+            entry.cacheable = 200 <= status < 300
+            entry.completed_at = time.time()
+            if entry.deferred:
+                self.stats['deferred_completed'] += 1
+            if not entry.cacheable and self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+            entry._event.set()
+
+    def _evict_locked(self, now: float):
+        # 先清理过期条目，再按插入顺序淘汰
+        for key in [key for key, entry in self._entries.items() if self._expired(entry, now)]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evicted'] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            pending = sum(1 for entry in self._entries.values() if not entry.done)
+            return dict(self.stats, entries=len(self._entries), pending=pending,
+                        max_entries=self.max_entries, ttl=self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _body_hash(request) -> str:
+    """请求体摘要，JSON请求体按键排序后计算，不受字段顺序和空白影响"""
+    data = request.get_json(silent=True)
+    if data is not None:
+        raw = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    else:
+        raw = request.get_data()
+    return hashlib.sha256(raw).hexdigest()
+
+
+def idempotent(func):
+    """
+    发送类接口的幂等键装饰器，放在require_api_key之后
+
+    没有Idempotency-Key请求头时直接执行接口
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        from flask import current_app, jsonify, request
+
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            return func(*args, **kwargs)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return jsonify({
+                'code': 1002,
+                'message': f'{IDEMPOTENCY_HEADER}长度不能超过{MAX_KEY_LENGTH}',
+                'data': None
+            }), 400
+
+        # 不同接口的请求体可能相同，接口路径也作为键的一部分，避免共用缓存的结果
+        key = (request.headers.get('X-API-Key'), current_account_id(), request.path,
+               idempotency_key, _body_hash(request))
+        entry, owner = idempotency_cache.begin(key)
+
+        if not owner:
+            from app.config import Config
+            if not entry.wait(Config.IDEMPOTENCY_WAIT_TIMEOUT):
+                response = jsonify({
+                    'code': IN_PROGRESS_CODE,
+                    'message': '相同幂等键的请求仍在处理中，请稍后重试',
+                    'data': {'idempotency_key': idempotency_key}
+                })
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+            body, status, content_type = entry.response
+            response = current_app.response_class(body, status=status, content_type=content_type)
+            response.headers[REPLAYED_HEADER] = 'true'
+            return response
+
+        token = task_observer.set(entry)
+        try:
+            response = current_app.make_response(func(*args, **kwargs))
+        except Exception as e:
+            if entry.deferred:
+                # 队列任务超时但仍在执行，结果由任务完成时写入
+                raise
+            # 等待中的重复请求收到与本次请求相同的错误码，微信连接不可用时为503
+            code, status = (2003, 503) if isinstance(e, WeChatUnavailableError) else (3001, 500)
+            idempotency_cache.complete(entry, json.dumps({
+                'code': code, 'message': f'处理请求失败: {str(e)}', 'data': None
+            }, ensure_ascii=False).encode('utf-8'), status, 'application/json')
+            raise
+        finally:
+            task_observer.reset(token)
+
+        if entry.deferred:
+            # 队列任务超时但仍在执行，结果由任务完成时写入，重试的请求等待该结果
+            return response
+        idempotency_cache.complete(entry, response.get_data(), response.status_code, response.content_type)
+        return response
+    return wrapper
+
+
+def _create_default_cache() -> IdempotencyCache:
+    try:
+        from app.config import Config
+        return IdempotencyCache(Config.IDEMPOTENCY_CACHE_SIZE, Config.IDEMPOTENCY_TTL)
+    except (ImportError, AttributeError):
+        return IdempotencyCache()
+
+
+# 全局幂等键缓存
+idempotency_cache = _create_default_cache()
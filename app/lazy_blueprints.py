@@ -0,0 +1,310 @@
+"""
+蓝图延迟加载
+快速启动时不导入蓝图模块，而是用ast扫描源码得到路由规则，先注册只占位的路由，
+某个蓝图的路由第一次被访问时才导入模块，把真实视图函数和蓝图级钩子装到应用上。
+
+路由模块会间接导入pythoncom、psutil、微信库检测器等较重的依赖，延迟导入后
+进程启动到/health可用只需要加载Flask本身。源码不可用（例如打包环境）时回退为立即注册
+"""
+
+import ast
+import importlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.unified_logger import logger
+
+# (模块, 蓝图变量名, URL前缀)，顺序与注册顺序一致
+BLUEPRINTS = (
+    ('app.api.routes', 'api_bp', '/api'),
+    ('app.api.admin_routes', 'admin_bp', '/api/admin'),
+    ('app.api.plugin_routes', 'plugin_bp', '/admin/plugins'),
+    ('app.api.chat_routes', 'chat_bp', '/api/chat'),
+    ('app.api.group_routes', 'group_bp', '/api/group'),
+    ('app.api.friend_routes', 'friend_bp', '/api/friend'),
+    ('app.api.wechat_routes', 'wechat_bp', '/api/wechat'),
+    ('app.api.message_operations', 'message_ops_bp', '/api/message'),
+    ('app.api.moments_routes', 'moments_bp', '/api/moments'),
+    ('app.api.auxiliary_routes', 'auxiliary_bp', '/api/auxiliary'),
+    ('app.api.upload_routes', 'upload_bp', '/api/upload'),
+    ('app.api.schedule_routes', 'schedule_bp', '/api/schedule'),
+)
+
+# 路由清单缓存格式版本
+MANIFEST_VERSION = 1
+
+RouteSpec = Tuple[str, str, dict]  # (规则, 端点函数名, route()的其他参数)
+
+
+def _join_rule(url_prefix: str, rule: str) -> str:
+    """与Flask注册蓝图时拼接URL前缀的方式一致"""
+    if rule:
+        return '/'.join((url_prefix.rstrip('/'), rule.lstrip('/')))
+    return url_prefix
+
+
+def _module_path(module_name: str) -> str:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(root, *module_name.split('.')) + '.py'
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, SyntaxError):
+        return None
+
+
+def scan_blueprint(path: str, bp_attr: str) -> Tuple[str, List[RouteSpec]]:
+    """
+    从源码中提取蓝图名称和路由，不导入模块
+
+    只识别 name = Blueprint('名称', ...) 和 @name.route('规则', methods=[...], endpoint=...) 两种写法
+
+    Returns:
+        tuple: (蓝图名称, 路由列表)
+
+    Raises:
+        ValueError: 源码中找不到蓝图定义，或路由参数不是常量
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    bp_name = None
+    routes: List[RouteSpec] = []
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Call):
+            targets = [t.id for t in node.targets if isinstance(t, ast.Name)]
+            func = node.value.func
+            if bp_attr in targets and getattr(func, 'id', getattr(func, 'attr', None)) == 'Blueprint':
+                bp_name = _literal(node.value.args[0]) if node.value.args else None
+
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator in node.decorator_list:
+            if not (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute)
+                    and decorator.func.attr == 'route' and isinstance(decorator.func.value, ast.Name)
+                    and decorator.func.value.id == bp_attr):
+                continue
+            rule = _literal(decorator.args[0]) if decorator.args else None
+            options = {kw.arg: _literal(kw.value) for kw in decorator.keywords}
+            if not isinstance(rule, str) or any(value is None for value in options.values()):
+                raise ValueError(f"{path}:{node.lineno} 路由参数不是常量")
+            endpoint = options.pop('endpoint', None) or node.name
+            if options.get('methods'):
+                options['methods'] = list(options['methods'])
+            routes.append((rule, endpoint, options))
+
+    if not bp_name:
+        raise ValueError(f"{path} 中找不到蓝图 {bp_attr}")
+    return bp_name, routes
+
+
+class RouteManifest:
+    """路由清单缓存，按源码文件的修改时间和大小判断是否需要重新扫描"""
+
+    def __init__(self, cache_file: Optional[str] = None):
+        self.cache_file = cache_file
+        self._entries: Dict[str, dict] = {}
+        self._dirty = False
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self._entries = data.get('modules', {})
+            except (OSError, ValueError) as e:
+                logger.debug(f"读取路由清单缓存失败: {str(e)}")
+
+    def get(self, module_name: str, bp_attr: str) -> Tuple[str, List[RouteSpec]]:
+        path = _module_path(module_name)
+        stat = os.stat(path)
+        key = f"{module_name}:{bp_attr}"
+        entry = self._entries.get(key)
+        if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            return entry['name'], [tuple(route) for route in entry['routes']]
+
+        bp_name, routes = scan_blueprint(path, bp_attr)
+        self._entries[key] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'name': bp_name, 'routes': routes}
+        self._dirty = True
+        return bp_name, routes
+
+    def save(self):
+        if not self.cache_file or not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': MANIFEST_VERSION, 'modules': self._entries}, f, ensure_ascii=False)
+            self._dirty = False
+        except OSError as e:
+            logger.debug(f"保存路由清单缓存失败: {str(e)}")
+
+
+class LazyBlueprint:
+    """一个延迟加载的蓝图"""
+
+    def __init__(self, module_name: str, bp_attr: str, url_prefix: str, name: str, routes: List[RouteSpec]):
+        self.module_name = module_name
+        self.bp_attr = bp_attr
+        self.url_prefix = url_prefix
+        self.name = name
+        self.routes = routes
+        self.loaded = False
+        self.load_seconds = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def endpoint(self, function_name: str) -> str:
+        return f"{self.name}.{function_name}"
+
+    def load(self, app):
+        """导入蓝图模块并把真实视图和钩子装到应用上，只执行一次"""
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            start = time.perf_counter()
+            try:
+                self._install(app)
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"加载蓝图 {self.module_name} 失败: {str(e)}")
+                raise
+            self.load_seconds = time.perf_counter() - start
+            self.loaded = True
+            logger.info(f"蓝图 {self.name} 已加载，耗时 {self.load_seconds * 1000:.1f}ms")
+
+    def _install(self, app):
+        from flask import Flask
+
+        module = importlib.import_module(self.module_name)
+        blueprint = getattr(module, self.bp_attr)
+
+        # 先注册到临时应用上，再把结果搬到正式应用，避免在处理请求后调用Flask的setup方法
+        staging = Flask(app.import_name)
+        staging.register_blueprint(blueprint, url_prefix=self.url_prefix)
+
+        known = {(self.endpoint(func), _join_rule(self.url_prefix, rule)) for rule, func, _ in self.routes}
+        for rule in staging.url_map.iter_rules():
+            if not rule.endpoint.startswith(f"{self.name}."):
+                continue
+            if (rule.endpoint, rule.rule) not in known:
+                # 源码扫描没有识别出的路由（例如动态注册），直接补到路由表
+                logger.warning(f"蓝图 {self.name} 的路由 {rule.rule} 未在路由清单中，首次加载后补充注册")
+                app.url_map.add(rule.empty())
+
+        for endpoint, view in staging.view_functions.items():
+            if endpoint.startswith(f"{self.name}."):
+                app.view_functions[endpoint] = view
+
+        for registry in ('before_request_funcs', 'after_request_funcs', 'teardown_request_funcs',
+                         'url_value_preprocessors', 'url_default_functions', 'template_context_processors'):
+            funcs = getattr(staging, registry).get(self.name)
+            if funcs:
+                getattr(app, registry).setdefault(self.name, []).extend(funcs)
+
+        handlers = staging.error_handler_spec.get(self.name)
+        if handlers:
+            target = app.error_handler_spec.setdefault(self.name, {})
+            for code, mapping in handlers.items():
+                target.setdefault(code, {}).update(mapping)
+
+        app.blueprints[blueprint.name] = blueprint
+
+
+class LazyBlueprintRegistry:
+    """管理应用上的延迟加载蓝图"""
+
+    def __init__(self):
+        self.blueprints: Dict[str, LazyBlueprint] = {}
+        self.eager: List[str] = []
+        self.registered_at = None
+
+    def register_all(self, app, lazy: bool = True, manifest_file: Optional[str] = None):
+        """
+        注册BLUEPRINTS中的所有蓝图
+
+        Args:
+            app: Flask应用
+            lazy (bool): 是否延迟加载，False时与原来一样立即导入并注册
+            manifest_file (str, optional): 路由清单缓存文件
+        """
+        manifest = RouteManifest(manifest_file) if lazy else None
+        for module_name, bp_attr, url_prefix in BLUEPRINTS:
+            if lazy:
+                try:
+                    bp_name, routes = manifest.get(module_name, bp_attr)
+                except (OSError, SyntaxError, ValueError) as e:
+                    logger.warning(f"无法扫描 {module_name} 的路由，改为立即加载: {str(e)}")
+                else:
+                    self._register_stubs(app, LazyBlueprint(module_name, bp_attr, url_prefix, bp_name, routes))
+                    continue
+
+            module = importlib.import_module(module_name)
+            app.register_blueprint(getattr(module, bp_attr), url_prefix=url_prefix)
+            self.eager.append(module_name)
+
+        if manifest:
+            manifest.save()
+        self.registered_at = time.time()
+
+        if self.blueprints:
+            @app.before_request
+            def load_lazy_blueprint():
+                # 应用级钩子先于蓝图级钩子执行，这里加载后蓝图自己的before_request也能在本次请求中生效
+                from flask import request
+                lazy_bp = self.blueprints.get(request.blueprint) if request.blueprint else None
+                if lazy_bp is not None and not lazy_bp.loaded:
+                    lazy_bp.load(app)
+
+    def _register_stubs(self, app, lazy_bp: LazyBlueprint):
+        self.blueprints[lazy_bp.name] = lazy_bp
+        stubs = {}
+        for rule, function_name, options in lazy_bp.routes:
+            endpoint = lazy_bp.endpoint(function_name)
+            # 同一视图可能有多条路由，需要共用一个占位视图
+            if endpoint not in stubs:
+                stubs[endpoint] = self._make_stub(app, lazy_bp, endpoint)
+            app.add_url_rule(_join_rule(lazy_bp.url_prefix, rule), endpoint=endpoint,
+                             view_func=stubs[endpoint], **options)
+
+    @staticmethod
+    def _make_stub(app, lazy_bp: LazyBlueprint, endpoint: str):
+        def lazy_view(**kwargs):
+            # 正常情况下before_request已完成加载，此处只是兜底
+            lazy_bp.load(app)
+            view = app.view_functions[endpoint]
+            if view is lazy_view:
+                raise RuntimeError(f"蓝图 {lazy_bp.name} 中没有视图 {endpoint}")
+            return view(**kwargs)
+        lazy_view.__name__ = endpoint.rsplit('.', 1)[-1]
+        return lazy_view
+
+    def preload(self, app):
+        """加载所有尚未加载的蓝图，供启动后在后台预热"""
+        for lazy_bp in list(self.blueprints.values()):
+            try:
+                lazy_bp.load(app)
+            except Exception:
+                # 错误已记录，首次请求时会再次尝试
+                pass
+
+    def get_stats(self) -> dict:
+        return {
+            'eager': list(self.eager),
+            'lazy': {
+                name: {
+                    'module': lazy_bp.module_name,
+                    'routes': len(lazy_bp.routes),
+                    'loaded': lazy_bp.loaded,
+                    'load_ms': round(lazy_bp.load_seconds * 1000, 1) if lazy_bp.load_seconds is not None else None,
+                    'error': lazy_bp.error,
+                }
+                for name, lazy_bp in self.blueprints.items()
+            },
+        }
@@ -0,0 +1,229 @@
+"""
+消息句柄索引
+按聊天缓存消息ID到消息对象的映射，引用、转发、下载等消息操作不必每次都调用GetAllMessage
+重新枚举聊天窗口中的全部消息控件。
+
+- 监听回调收到的消息和GetAllMessage的结果写入索引，每个聊天只保留最近的消息
+- 命中时先检查消息控件是否仍然存在，被删除或已从窗口中移除的消息视为未命中
+- 未命中时才重新获取一次消息列表；同一聊天同时只有一次重新获取，
+  刚重新获取过仍找不到的ID在短时间内直接返回未找到，不再重复获取
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+
+from app.accounts import AccountLocal
+from app.unified_logger import logger
+
+DEFAULT_MAX_MESSAGES = 2000
+DEFAULT_MAX_CHATS = 200
+DEFAULT_NEGATIVE_TTL = 2.0
+
+# 每个聊天记录的未找到ID数量
+MAX_MISSES = 100
+
+
+def is_alive(msg: Any) -> bool:
+    """消息对象对应的界面控件是否仍然存在，无法判断时视为存在"""
+    control = getattr(msg, 'control', None)
+    exists = getattr(control, 'Exists', None)
+    if exists is None:
+        return True
+    try:
+        return bool(exists(0, 0))
+    except Exception:
+        return False
+
+
+class _ChatEntry:
+    """单个聊天的索引"""
+
+    __slots__ = ('messages', 'misses', 'scanned_at', 'scan_lock')
+
+    def __init__(self):
+        self.messages: 'OrderedDict[str, Any]' = OrderedDict()
+        self.misses: 'OrderedDict[str, float]' = OrderedDict()  # 重新获取后仍未找到的ID -> 时间
+        self.scanned_at = 0.0
+        self.scan_lock = threading.Lock()  # 保证同一聊天同时只有一次重新获取
+
+
+class MessageIndex:
+    """消息句柄索引"""
+
+    def __init__(self, max_messages: int = DEFAULT_MAX_MESSAGES, max_chats: int = DEFAULT_MAX_CHATS,
+                 negative_ttl: float = DEFAULT_NEGATIVE_TTL, enabled: bool = True):
+        """
+        Args:
+            max_messages (int): 每个聊天保留的消息数量，超过后淘汰最早加入的消息
+            max_chats (int): 保留的聊天数量，超过后淘汰最久未使用的聊天
+            negative_ttl (float): 重新获取后仍未找到的ID在该时间（秒）内直接返回未找到
+            enabled (bool): 关闭后每次查找都重新获取消息列表
+        """
+        self.max_messages = max_messages
+        self.max_chats = max_chats
+        self.negative_ttl = negative_ttl
+        self.enabled = enabled
+        self._chats: 'OrderedDict[str, _ChatEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale': 0, 'misses': 0, 'scans': 0, 'scan_seconds': 0.0,
+                      'negative_hits': 0, 'indexed': 0}
+
+    def _entry(self, chat: str) -> _ChatEntry:
+        """获取聊天的索引，调用方持有self._lock"""
+        entry = self._chats.get(chat)
+        if entry is None:
+            entry = self._chats[chat] = _ChatEntry()
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat)
+        return entry
+
+    def _put(self, entry: _ChatEntry, msg: Any):
+        message_id = getattr(msg, 'id', None)
+        if not message_id:
+            return
+        entry.messages[message_id] = msg
+        entry.messages.move_to_end(message_id)
+        entry.misses.pop(message_id, None)
+        self.stats['indexed'] += 1
+
+    def _trim(self, entry: _ChatEntry):
+        while len(entry.messages) > self.max_messages:
+            entry.messages.popitem(last=False)
+
+    # ---- 写入 ----
+
+    def add(self, chat: str, msg: Any):
+        """记录一条消息，在监听回调中调用"""
+        if not chat:
+            return
+        with self._lock:
+            entry = self._entry(chat)
+            self._put(entry, msg)
+            self._trim(entry)
+
+    def add_all(self, chat: str, messages: Iterable[Any]):
+        """记录GetAllMessage的结果，只保留最近的消息"""
+        if not chat:
+            return
+        messages = list(messages or [])
+        with self._lock:
+            entry = self._entry(chat)
+            for msg in messages[-self.max_messages:]:
+                self._put(entry, msg)
+            self._trim(entry)
+
+    def invalidate(self, chat: str, message_id: str):
+        """移除一条消息，例如消息已删除或对其操作失败"""
+        with self._lock:
+            entry = self._chats.get(chat)
+            if entry is not None:
+                entry.messages.pop(message_id, None)
+
+    def discard_chat(self, chat: str):
+        """移除聊天的索引，例如移除监听时"""
+        with self._lock:
+            self._chats.pop(chat, None)
+
+    def clear(self):
+        with self._lock:
+            self._chats.clear()
+
+    # ---- 查找 ----
+
+    def _lookup(self, chat: str, message_id: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._chats.get(chat)
+            msg = entry.messages.get(message_id) if entry is not None else None
+        if msg is None:
+            return None
+        if is_alive(msg):
+            return msg
+        self.stats['stale'] += 1
+        self.invalidate(chat, message_id)
+        return None
+
+    def find(self, chat: str, message_id: str, fetch: Callable[[], Iterable[Any]]) -> Optional[Any]:
+        """
+        查找消息对象
+
+        Args:
+            chat (str): 聊天名称
+            message_id (str): 消息ID
+            fetch (callable): 重新获取消息列表的函数，通常为聊天窗口的GetAllMessage
+
+        Returns:
+            消息对象，找不到时返回None
+        """
+        if not self.enabled:
+            return self._scan(chat, message_id, fetch, index=False)
+
+        msg = self._lookup(chat, message_id)
+        if msg is not None:
+            self.stats['hits'] += 1
+            return msg
+
+        with self._lock:
+            entry = self._entry(chat)
+        requested_at = time.time()
+        with entry.scan_lock:
+            # 等待期间其他请求可能已经重新获取过
+            if entry.scanned_at >= requested_at:
+                msg = self._lookup(chat, message_id)
+                if msg is not None:
+                    self.stats['hits'] += 1
+                    return msg
+            missed_at = entry.misses.get(message_id)
+            if missed_at is not None and time.time() - missed_at < self.negative_ttl:
+                self.stats['negative_hits'] += 1
+                return None
+            self.stats['misses'] += 1
+            msg = self._scan(chat, message_id, fetch, index=True)
+            entry.scanned_at = time.time()
+            if msg is None:
+                entry.misses[message_id] = entry.scanned_at
+                while len(entry.misses) > MAX_MISSES:
+                    entry.misses.popitem(last=False)
+            return msg
+
+    def _scan(self, chat: str, message_id: str, fetch: Callable[[], Iterable[Any]], index: bool) -> Optional[Any]:
+        started = time.time()
+        messages = list(fetch() or [])
+        self.stats['scans'] += 1
+        self.stats['scan_seconds'] += time.time() - started
+        if index:
+            self.add_all(chat, messages)
+        # 操作的通常是最近的消息，从后往前找
+        for msg in reversed(messages):
+            if getattr(msg, 'id', '') == message_id:
+                return msg
+        logger.debug(f"聊天 {chat} 的 {len(messages)} 条消息中未找到消息ID: {message_id}")
+        return None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            chats = len(self._chats)
+            messages = sum(len(entry.messages) for entry in self._chats.values())
+        lookups = self.stats['hits'] + self.stats['misses'] + self.stats['negative_hits']
+        return dict(self.stats, scan_seconds=round(self.stats['scan_seconds'], 3),
+                    hit_rate=round(self.stats['hits'] / lookups, 4) if lookups else None,
+                    chats=chats, messages=messages, enabled=self.enabled,
+                    max_messages=self.max_messages, max_chats=self.max_chats)
+
+
+def _create_default_index() -> MessageIndex:
+    try:
+        from app.config import Config
+        return MessageIndex(max_messages=Config.MESSAGE_INDEX_MAX_MESSAGES,
+                            max_chats=Config.MESSAGE_INDEX_MAX_CHATS,
+                            negative_ttl=Config.MESSAGE_INDEX_NEGATIVE_TTL,
+                            enabled=Config.MESSAGE_INDEX_ENABLED)
+    except (ImportError, AttributeError):
+        return MessageIndex()
+
+
+# 全局消息句柄索引，每个账号一个
+message_index = AccountLocal(_create_default_index, 'message_index')
@@ -0,0 +1,308 @@
+"""
+监听消息处理流水线
+监听回调在微信库的监听线程中执行，只把原始消息对象放入有界的交接队列后立即返回，
+序列化、去重、媒体路径处理、写入缓存等工作由独立的工作线程按配置的阶段依次执行，不拖慢微信库的监听循环。
+
+- 按聊天分配工作线程，同一聊天的消息按收到的顺序处理
+- 交接队列已满时丢弃新消息并计数，不阻塞监听线程
+- 每个阶段的耗时、队列深度和丢弃次数通过/metrics和/api/admin/stats提供
+
+内置阶段（MESSAGE_PIPELINE_STAGES）：
+    normalize  把消息对象转换为可序列化的字典
+    dedup      按消息ID丢弃最近处理过的重复消息
+    media      把消息中的文件路径转换为绝对路径，并通知媒体目录回收按最近访问排序
+    archive    记录消息句柄，写入监听消息缓存（/api/message/listen/get读取），已移除监听的聊天的消息在此丢弃
+    fanout     通知其他关注消息的组件，例如入群/退群消息使群成员缓存失效，以及register_subscriber注册的订阅者
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from app.metrics import observe_pipeline_message, observe_pipeline_stage
+from app.unified_logger import logger
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_DEDUP_SIZE = 10000
+DEFAULT_STAGES = ('normalize', 'dedup', 'media', 'archive', 'fanout')
+
+# 丢弃消息时每隔多少次输出一次警告
+DROP_WARNING_EVERY = 1000
+
+
+class ListenContext:
+    """一个监听对象的处理目标，在添加监听时按当前账号取得，工作线程中不再依赖当前账号"""
+
+    __slots__ = ('account_id', 'message_cache', 'member_cache', 'message_index')
+
+    def __init__(self, account_id: str, message_cache: dict, member_cache: Any, message_index: Any):
+        self.account_id = account_id
+        self.message_cache = message_cache
+        self.member_cache = member_cache
+        self.message_index = message_index
+
+
+class PipelineItem:
+    """流水线中的一条消息"""
+
+    __slots__ = ('context', 'chat', 'msg', 'received_at', 'data')
+
+    def __init__(self, context: ListenContext, chat: str, msg: Any, received_at: float):
+        self.context = context
+        self.chat = chat
+        self.msg = msg
+        self.received_at = received_at
+        self.data: Optional[dict] = None
+
+
+# ---- 内置阶段，返回False表示丢弃该消息，后续阶段不再执行 ----
+
+def normalize_stage(pipeline: 'MessagePipeline', item: PipelineItem):
+    msg = item.msg
+    item.data = {
+        'type': getattr(msg, 'type', 'unknown'),
+        'content': getattr(msg, 'content', str(msg)),
+        'sender': getattr(msg, 'sender', ''),
+        'id': getattr(msg, 'id', ''),
+        'mtype': getattr(msg, 'mtype', None),
+        'sender_remark': getattr(msg, 'sender_remark', None),
+        'file_path': getattr(msg, 'file_path', None),
+        'time': getattr(msg, 'time', None)
+    }
+
+
+def dedup_stage(pipeline: 'MessagePipeline', item: PipelineItem):
+    message_id = item.data.get('id') if item.data else getattr(item.msg, 'id', None)
+    if not message_id:
+        return True
+    return pipeline.remember(item.context.account_id, item.chat, message_id)
+
+
+def media_stage(pipeline: 'MessagePipeline', item: PipelineItem):
+    file_path = item.data.get('file_path') if item.data else None
+    if not file_path or not isinstance(file_path, str):
+        return True
+    file_path = os.path.abspath(file_path)
+    item.data['file_path'] = file_path
+    # 刚收到的文件在客户端读取前不应被优先回收
+    from app.utils.media_gc import media_gc
+    media_gc.touch(file_path)
+    return True
+
+
+def archive_stage(pipeline: 'MessagePipeline', item: PipelineItem):
+    context = item.context
+    # 添加监听时创建聊天的缓存，移除监听时删除；移除后仍在队列中的消息直接丢弃，不重新创建缓存
+    messages = context.message_cache.get(item.chat)
+    if messages is None:
+        return False
+    # 先记录消息句柄，客户端读取到消息后立即引用、转发时可以直接命中
+    if context.message_index is not None:
+        context.message_index.add(item.chat, item.msg)
+    if item.data is not None:
+        messages.append(item.data)
+
+
+def fanout_stage(pipeline: 'MessagePipeline', item: PipelineItem):
+    data = item.data or {}
+    if item.context.member_cache is not None:
+        # 入群/退群系统消息会使群成员缓存失效
+        item.context.member_cache.observe_message(item.chat, data.get('type'), data.get('content'))
+    for subscriber in list(pipeline.subscribers):
+        try:
+            subscriber(item)
+        except Exception as e:
+            logger.error(f"消息订阅者处理 {item.chat} 的消息失败: {str(e)}")
+
+
+STAGES: Dict[str, Callable[['MessagePipeline', PipelineItem], Optional[bool]]] = {
+    'normalize': normalize_stage,
+    'dedup': dedup_stage,
+    'media': media_stage,
+    'archive': archive_stage,
+    'fanout': fanout_stage,
+}
+
+
+def register_stage(name: str, func: Callable[['MessagePipeline', PipelineItem], Optional[bool]]):
+    """注册自定义阶段，之后可以在MESSAGE_PIPELINE_STAGES中按名称使用"""
+    STAGES[name] = func
+
+
+class MessagePipeline:
+    """监听消息处理流水线"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 stages=DEFAULT_STAGES, dedup_size: int = DEFAULT_DEDUP_SIZE, enabled: bool = True):
+        """
+        Args:
+            workers (int): 工作线程数，同一聊天的消息总是由同一个线程处理
+            queue_size (int): 交接队列的总容量，平均分配给各工作线程
+            stages (list): 按顺序执行的阶段名称
+            dedup_size (int): 去重时记住的最近消息ID数量
+            enabled (bool): 关闭后在监听回调中直接执行各阶段（原来的处理方式）
+        """
+        self.workers = max(int(workers), 1)
+        self.queue_size = max(int(queue_size), self.workers)
+        self.dedup_size = dedup_size
+        self.enabled = enabled
+        self.stages: List[str] = []
+        for name in stages:
+            if name in STAGES:
+                self.stages.append(name)
+            else:
+                logger.warning(f"未知的消息处理阶段，已忽略: {name}")
+        self.subscribers: List[Callable[[PipelineItem], Any]] = []
+        self._queues = [queue.Queue(maxsize=self.queue_size // self.workers) for _ in range(self.workers)]
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._seen: 'OrderedDict[tuple, None]' = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'submitted': 0, 'processed': 0, 'filtered': 0, 'dropped': 0, 'errors': 0}
+        self._stage_stats = {name: {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'filtered': 0}
+                             for name in self.stages}
+
+    # ---- 监听线程 ----
+
+    def submit(self, context: ListenContext, chat: str, msg: Any) -> bool:
+        """
+        在监听回调中调用，只放入交接队列，不做其他处理
+
+        Returns:
+            bool: 队列已满被丢弃时返回False
+        """
+        item = PipelineItem(context, chat, msg, time.time())
+        if not self.enabled:
+            self._process(item)
+            return True
+        if not self._threads:
+            self.start()
+        try:
+            self._queues[hash(chat) % self.workers].put_nowait(item)
+        except queue.Full:
+            with self._stats_lock:
+                self.stats['dropped'] += 1
+                dropped = self.stats['dropped']
+            observe_pipeline_message('dropped')
+            if dropped % DROP_WARNING_EVERY == 1:
+                logger.warning(f"监听消息交接队列已满，已丢弃 {dropped} 条消息（最近一条来自 {chat}）")
+            return False
+        with self._stats_lock:
+            self.stats['submitted'] += 1
+        return True
+
+    # ---- 工作线程 ----
+
+    def start(self):
+        """启动工作线程，首次提交消息时自动调用"""
+        with self._start_lock:
+            if self._threads:
+                return
+            for index, handoff in enumerate(self._queues):
+                thread = threading.Thread(target=self._run, args=(handoff,), daemon=True,
+                                          name=f"MessagePipeline-{index}")
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"监听消息处理流水线已启动: {self.workers} 个工作线程，阶段: {', '.join(self.stages)}")
+
+    def _run(self, handoff: queue.Queue):
+        while True:
+            item = handoff.get()
+            try:
+                self._process(item)
+            finally:
+                handoff.task_done()
+
+    def _process(self, item: PipelineItem):
+        observe_pipeline_stage('handoff', time.time() - item.received_at)
+        for name in self.stages:
+            started = time.perf_counter()
+            try:
+                keep = STAGES[name](self, item)
+            except Exception as e:
+                with self._stats_lock:
+                    self.stats['errors'] += 1
+                observe_pipeline_message('error')
+                logger.error(f"处理 {item.chat} 的消息时阶段 {name} 出错: {str(e)}")
+                return
+            finally:
+                elapsed = time.perf_counter() - started
+                observe_pipeline_stage(name, elapsed)
+                with self._stats_lock:
+                    stage = self._stage_stats[name]
+                    stage['count'] += 1
+                    stage['seconds'] += elapsed
+                    stage['max_seconds'] = max(stage['max_seconds'], elapsed)
+            if keep is False:
+                # 阶段丢弃了消息，例如dedup阶段遇到重复消息
+                with self._stats_lock:
+                    self.stats['filtered'] += 1
+                    self._stage_stats[name]['filtered'] += 1
+                observe_pipeline_message('filtered')
+                return
+        with self._stats_lock:
+            self.stats['processed'] += 1
+        observe_pipeline_message('processed')
+
+    def remember(self, account_id: str, chat: str, message_id: str) -> bool:
+        """记录消息ID，最近处理过时返回False"""
+        key = (account_id, chat, message_id)
+        with self._seen_lock:
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                return False
+            self._seen[key] = None
+            while len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+        return True
+
+    def register_subscriber(self, subscriber: Callable[[PipelineItem], Any]):
+        """注册订阅者，在fanout阶段收到每条处理完成的消息"""
+        self.subscribers.append(subscriber)
+
+    def depth(self) -> int:
+        """交接队列中等待处理的消息数"""
+        return sum(handoff.qsize() for handoff in self._queues)
+
+    def wait_idle(self, timeout: float = 5.0) -> bool:
+        """等待交接队列中的消息处理完成，用于测试和停止前"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(handoff.unfinished_tasks == 0 for handoff in self._queues):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stages = {
+                name: {'count': stage['count'],
+                       'mean_ms': round(stage['seconds'] / stage['count'] * 1000, 3) if stage['count'] else None,
+                       'max_ms': round(stage['max_seconds'] * 1000, 3),
+                       'filtered': stage['filtered']}
+                for name, stage in self._stage_stats.items()
+            }
+            stats = dict(self.stats)
+        return dict(stats, enabled=self.enabled, workers=self.workers, queue_size=self.queue_size,
+                    depth=self.depth(), stages=stages, subscribers=len(self.subscribers))
+
+
+def _create_default_pipeline() -> MessagePipeline:
+    try:
+        from app.config import Config
+        return MessagePipeline(workers=Config.MESSAGE_PIPELINE_WORKERS,
+                               queue_size=Config.MESSAGE_PIPELINE_QUEUE_SIZE,
+                               stages=Config.MESSAGE_PIPELINE_STAGES,
+                               dedup_size=Config.MESSAGE_PIPELINE_DEDUP_SIZE,
+                               enabled=Config.MESSAGE_PIPELINE_ENABLED)
+    except (ImportError, AttributeError):
+        return MessagePipeline()
+
+
+# 全局监听消息处理流水线，所有账号共用，账号相关的目标在ListenContext中
+message_pipeline = _create_default_pipeline()
@@ -0,0 +1,349 @@
+"""
+运行指标
+以Prometheus文本格式输出请求数、接口耗时分布、队列等待和处理耗时、界面操作耗时等指标。
+
+记录指标时不争用全局锁：每个线程写入自己的分片，只在首次写入时登记一次分片，
+抓取时再汇总所有分片，已结束线程的分片会被合并后释放
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.unified_logger import logger
+
+# 默认耗时分桶（秒），覆盖从毫秒级接口到数十秒的界面操作
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 新建分片达到该数量后才开始合并已结束线程的分片
+MIN_SHARDS_BEFORE_FOLD = 64
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _ShardedStore:
+    """
+    按线程分片的存储，写入只访问当前线程的分片
+
+    服务器为每个请求创建线程，已结束线程的分片在新建分片数翻倍时合并，
+    分片数量不超过存活线程数的两倍，不依赖/metrics被抓取
+    """
+
+    def __init__(self, merge: Callable[[dict, LabelValues, object], None]):
+        self._merge = merge
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live: List[Tuple[threading.Thread, dict]] = []
+        self._retired: dict = {}
+        self._fold_at = MIN_SHARDS_BEFORE_FOLD
+
+    def shard(self) -> dict:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._lock:
+                self._live.append((threading.current_thread(), shard))
+                if len(self._live) >= self._fold_at:
+                    self._fold_dead()
+                    self._fold_at = max(MIN_SHARDS_BEFORE_FOLD, len(self._live) * 2)
+        return shard
+
+    def _fold_dead(self):
+        """把已结束线程的分片合并到_retired，调用方持有self._lock"""
+        live = []
+        for thread, shard in self._live:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, value in shard.items():
+                    self._merge(self._retired, key, value)
+        self._live = live
+
+    def collect(self) -> dict:
+        """汇总所有分片，同时合并已结束线程的分片"""
+        with self._lock:
+            self._fold_dead()
+            live = self._live
+            result = {}
+            for key, value in self._retired.items():
+                self._merge(result, key, value)
+            shards = [shard for _, shard in live]
+
+        for shard in shards:
+            for key, value in list(shard.items()):
+                self._merge(result, key, value)
+        return result
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._store = _ShardedStore(self._merge)
+
+    @staticmethod
+    def _merge(target: dict, key: LabelValues, value: float):
+        target[key] = target.get(key, 0) + value
+
+    def inc(self, *labelvalues, amount: float = 1):
+        shard = self._store.shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self._store.collect().items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """耗时分布直方图"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._store = _ShardedStore(self._merge)
+
+    @staticmethod
+    def _merge(target: dict, key: LabelValues, value: list):
+        existing = target.get(key)
+        if existing is None:
+            target[key] = list(value)
+        else:
+            for i, v in enumerate(value):
+                existing[i] += v
+
+    def observe(self, value: float, *labelvalues):
+        shard = self._store.shard()
+        data = shard.get(labelvalues)
+        if data is None:
+            # 各分桶计数（非累计） + 超出最大分桶的计数 + 总和 + 次数
+            data = [0] * (len(self.buckets) + 3)
+            shard[labelvalues] = data
+        data[bisect.bisect_left(self.buckets, value)] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, data in sorted(self._store.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), data):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(round(data[-2], 6))}')
+            lines.append(f'{self.name}_count{labels} {data[-1]}')
+        return lines
+
+
+class Gauge:
+    """抓取时通过回调读取当前值的仪表"""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], object],
+                 labelnames: Tuple[str, ...] = ()):
+        """
+        Args:
+            callback (callable): 无标签时返回数值，有标签时返回{标签值元组: 数值}
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.debug(f"读取指标 {self.name} 失败: {str(e)}")
+            return []
+        if value is None:
+            return []
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        if isinstance(value, dict):
+            for key, v in sorted(value.items()):
+                key = key if isinstance(key, tuple) else (key,)
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(float(v))}')
+        else:
+            lines.append(f'{self.name} {_format_value(float(value))}')
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, prefix: str = 'wxauto'):
+        self.prefix = prefix
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(f'{self.prefix}_{name}', documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(f'{self.prefix}_{name}', documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], object],
+              labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(f'{self.prefix}_{name}', documentation, callback, labelnames))
+
+    def render(self) -> str:
+        """输出Prometheus文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    'http_requests_total', 'HTTP请求数', ('method', 'route', 'status'))
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'HTTP请求处理耗时', ('method', 'route'))
+queue_wait_duration = registry.histogram(
+    'queue_wait_seconds', '任务在请求队列中的等待时间', ('task',))
+queue_service_duration = registry.histogram(
+    'queue_service_seconds', '任务在队列线程中的执行时间', ('task',))
+queue_tasks_total = registry.counter(
+    'queue_tasks_total', '队列任务数', ('task', 'result'))
+ui_operation_duration = registry.histogram(
+    'ui_operation_duration_seconds', '微信界面操作耗时', ('method',))
+ui_operation_errors_total = registry.counter(
+    'ui_operation_errors_total', '微信界面操作失败次数', ('method',))
+message_pipeline_stage_duration = registry.histogram(
+    'message_pipeline_stage_seconds', '监听消息处理流水线各阶段耗时（handoff为在交接队列中的等待时间）', ('stage',))
+message_pipeline_messages_total = registry.counter(
+    'message_pipeline_messages_total', '监听消息处理流水线的消息数', ('result',))
+
+
+def observe_request(method: str, route: str, status: int, duration: float):
+    """记录一次HTTP请求"""
+    http_requests_total.inc(method, route, str(status))
+    http_request_duration.observe(duration, method, route)
+
+
+def observe_queue_task(task: str, wait: float, service: float, ok: bool):
+    """记录一次队列任务的等待时间和执行时间"""
+    queue_wait_duration.observe(wait, task)
+    queue_service_duration.observe(service, task)
+    queue_tasks_total.inc(task, 'success' if ok else 'error')
+
+
+def observe_pipeline_stage(stage: str, duration: float):
+    """记录监听消息处理流水线一个阶段的耗时"""
+    message_pipeline_stage_duration.observe(duration, stage)
+
+
+def observe_pipeline_message(result: str):
+    """记录监听消息的处理结果：processed、filtered、dropped、error"""
+    message_pipeline_messages_total.inc(result)
+
+
+def time_ui_call(method: str, func: Callable) -> Callable:
+    """
+    包装界面操作，记录耗时和失败次数
+
+    Args:
+        method (str): 方法名称，例如ChatWith、SendMsg
+        func (callable): 实际方法
+    """
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            ui_operation_errors_total.inc(method)
+            raise
+        finally:
+            ui_operation_duration.observe(time.perf_counter() - start, method)
+    wrapper.__name__ = getattr(func, '__name__', method)
+    wrapper.__doc__ = getattr(func, '__doc__', None)
+    return wrapper
+
+
+def register_default_gauges():
+    """注册队列、监听缓冲区、日志聚合等运行状态仪表，各模块在抓取时才导入"""
+
+    def queue_size():
+        from app.api_queue import request_queue
+        return request_queue.qsize()
+
+    def queue_workers():
+        from app.api_queue import worker_threads
+        return sum(1 for thread in worker_threads if thread.is_alive())
+
+    def listener_buffers():
+        from app.api.routes import listen_message_store
+        buffers = {}
+        for chat_name, messages in list(listen_message_store.get().items()):
+            buffers[(chat_name,)] = len(messages)
+        return buffers
+
+    def listener_buffered_total():
+        from app.api.routes import listen_message_store
+        from app.wechat_adapter import wechat_adapter
+        total = sum(len(messages) for messages in list(listen_message_store.get().values()))
+        # 直接读取实例属性，避免经__getattr__代理到微信实例
+        adapter_cache = wechat_adapter.get().__dict__.get('_message_cache') or {}
+        total += sum(len(messages) for messages in list(adapter_cache.values()))
+        return total
+
+    def pipeline_depth():
+        from app.message_pipeline import message_pipeline
+        return message_pipeline.depth()
+
+    def logger_pending():
+        from app.unified_logger import unified_logger
+        return len(unified_logger.aggregator.entries)
+
+    def wechat_circuit_open():
+        from app.health import health_monitor
+        return 1 if health_monitor.is_open() else 0
+
+    registry.gauge('queue_size', '请求队列中等待的任务数', queue_size)
+    registry.gauge('queue_workers', '存活的队列处理线程数', queue_workers)
+    registry.gauge('listener_buffer_messages', '各监听对象缓存的未读取消息数', listener_buffers, ('chat',))
+    registry.gauge('listener_buffered_messages_total', '监听缓存中未读取的消息总数', listener_buffered_total)
+    registry.gauge('message_pipeline_queue_depth', '监听消息交接队列中等待处理的消息数', pipeline_depth)
+    registry.gauge('logger_aggregation_entries', '日志聚合器中等待合并输出的条目数', logger_pending)
+    registry.gauge('wechat_circuit_open', '微信连接熔断器是否打开', wechat_circuit_open)
@@ -0,0 +1,420 @@
+"""
+联系人名称解析
+基于已缓存的好友、群聊和会话列表建立名称索引，在调用ChatWith之前把调用方传入的
+接收人解析为微信中显示的规范聊天名称，减少因名称不一致导致的发送失败和界面重试。
+
+支持的匹配方式（按优先级）：
+- exact: 与规范名称完全一致
+- remark / nickname: 与备注名或昵称一致
+- normalized: 忽略大小写、空白、全半角和群人数后缀后一致
+- pinyin: 拼音首字母一致（需要安装pypinyin）
+- fuzzy: 编辑距离相近，先用二元组倒排索引筛选候选再计算编辑距离
+"""
+
+import re
+import time
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.accounts import AccountLocal
+from app.unified_logger import logger
+
+try:
+    from pypinyin import lazy_pinyin, Style
+    PINYIN_AVAILABLE = True
+except ImportError:
+    PINYIN_AVAILABLE = False
+
+# 群名末尾的人数，例如"测试群 (25)"
+GROUP_COUNT_SUFFIX = re.compile(r'\s*\(\d+\)$')
+
+_WHITESPACE = re.compile(r'\s+')
+_ASCII_LETTERS = re.compile(r'^[a-z]+$')
+
+# 可以直接用于发送的匹配方式，其余方式只作为候选返回
+CONFIDENT_MATCHES = ('exact', 'remark', 'nickname', 'normalized')
+
+# 发送前可以替换接收人的匹配方式：只有与规范名称本身一致（去掉人数后缀、空白和大小写）时才替换，
+# 备注和昵称可能来自过期的缓存，按它们替换后发送前的核对也会以替换后的名称为准，可能发给其他联系人
+SUBSTITUTE_MATCHES = ('exact', 'normalized')
+
+# 模糊匹配时参与编辑距离计算的最大候选数
+MAX_FUZZY_CANDIDATES = 16
+
+
+def clean_group_name(name: str) -> str:
+    """
+    去掉群名末尾的人数信息
+
+    Args:
+        name (str): 群名，例如"测试群 (25)"
+
+    Returns:
+        str: 不带人数的群名
+    """
+    if not name:
+        return name
+    return GROUP_COUNT_SUFFIX.sub('', name)
+
+
+def normalize_name(name: str) -> str:
+    """统一全半角、大小写和空白，并去掉群人数后缀"""
+    if not name:
+        return ''
+    name = unicodedata.normalize('NFKC', clean_group_name(str(name).strip()))
+    return _WHITESPACE.sub('', name).lower()
+
+
+def _bigrams(text: str) -> set:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+# 不超过该长度的名称按单字筛选模糊匹配候选，更长的按二元组筛选
+SHORT_NAME_LENGTH = 4
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """计算编辑距离，超过limit时提前返回limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            current.append(value)
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class _NameEntry:
+    """索引中的一个聊天对象"""
+
+    __slots__ = ('name', 'kind', 'nickname', 'remark')
+
+    def __init__(self, name: str, kind: str, nickname: Optional[str] = None, remark: Optional[str] = None):
+        self.name = name
+        self.kind = kind
+        self.nickname = nickname
+        self.remark = remark
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'nickname': self.nickname,
+            'remark': self.remark,
+        }
+
+
+class _NameIndex:
+    """不可变的名称索引，重建时整体替换，查询时无需加锁"""
+
+    def __init__(self, entries: Iterable[_NameEntry], initials_cache: Dict[str, str]):
+        self.entries: Dict[str, _NameEntry] = {}
+        self.by_remark: Dict[str, List[str]] = defaultdict(list)
+        self.by_nickname: Dict[str, List[str]] = defaultdict(list)
+        self.by_normalized: Dict[str, List[str]] = defaultdict(list)
+        self.by_initials: Dict[str, List[str]] = defaultdict(list)
+        self.by_bigram: Dict[str, List[str]] = defaultdict(list)
+        self.by_char: Dict[str, List[str]] = defaultdict(list)
+        self.normalized: Dict[str, str] = {}
+
+        for entry in entries:
+            # 好友优先于群聊和会话，同名时保留先加入的条目
+            if entry.name in self.entries:
+                continue
+            self.entries[entry.name] = entry
+            if entry.remark:
+                self.by_remark[entry.remark].append(entry.name)
+            if entry.nickname:
+                self.by_nickname[entry.nickname].append(entry.name)
+
+            keys = {normalize_name(entry.name)}
+            for alias in (entry.remark, entry.nickname):
+                if alias:
+                    keys.add(normalize_name(alias))
+            keys.discard('')
+            # 每个倒排列表中同一名称只出现一次，便于直接计数共享的片段数
+            entry_bigrams = set()
+            entry_chars = set()
+            for key in keys:
+                self.by_normalized[key].append(entry.name)
+                entry_bigrams.update(_bigrams(key))
+                if len(key) <= SHORT_NAME_LENGTH + 1:
+                    entry_chars.update(key)
+            for gram in entry_bigrams:
+                self.by_bigram[gram].append(entry.name)
+            for char in entry_chars:
+                self.by_char[char].append(entry.name)
+            self.normalized[entry.name] = normalize_name(entry.name)
+
+            if PINYIN_AVAILABLE:
+                for alias in {entry.name, entry.remark, entry.nickname}:
+                    if not alias:
+                        continue
+                    initials = initials_cache.get(alias)
+                    if initials is None:
+                        initials = _pinyin_initials(alias)
+                        initials_cache[alias] = initials
+                    if initials:
+                        self.by_initials[initials].append(entry.name)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _pinyin_initials(name: str) -> str:
+    """获取名称的拼音首字母，非汉字字符保留字母数字"""
+    try:
+        parts = lazy_pinyin(clean_group_name(name), style=Style.FIRST_LETTER, errors=lambda chars: list(chars))
+    except Exception:
+        return ''
+    return ''.join(part for part in parts if part.isalnum()).lower()
+
+
+class NameResolver:
+    """联系人名称解析器"""
+
+    # 不同来源的优先级，同名时前面的来源优先
+    SOURCE_ORDER = ('friends', 'groups', 'sessions')
+
+    def __init__(self):
+        self._sources: Dict[str, List[_NameEntry]] = {}
+        self._source_as_of: Dict[str, float] = {}
+        self._initials_cache: Dict[str, str] = {}
+        self._index = _NameIndex([], self._initials_cache)
+        self._lock = threading.Lock()
+
+        self._lookups = 0
+        self._resolved = 0
+        self._last_build_duration = None
+
+    def update_source(self, source: str, items: Optional[Iterable], as_of: Optional[float] = None):
+        """
+        用新的列表替换某个来源并重建索引
+
+        Args:
+            source (str): 来源名称，friends/groups/sessions
+            items: 列表元素可以是名称字符串，或包含name/nickname/remark字段的字典
+            as_of (float, optional): 数据获取时间
+        """
+        kind = {'friends': 'friend', 'groups': 'group', 'sessions': 'session'}.get(source, source)
+        entries = []
+        for item in items or []:
+            entry = self._to_entry(item, kind)
+            if entry:
+                entries.append(entry)
+
+        with self._lock:
+            self._source_as_of[source] = as_of or time.time()
+            previous = self._sources.get(source)
+            if previous is not None and [e.to_dict() for e in previous] == [e.to_dict() for e in entries]:
+                # 内容未变化（例如重复获取会话列表），无需重建
+                return
+            self._sources[source] = entries
+            self._rebuild_locked()
+
+    def resolve(self, query: str, limit: int = 5, fuzzy: bool = True) -> dict:
+        """
+        解析单个名称
+
+        Args:
+            query (str): 调用方传入的名称
+            limit (int): 最多返回的候选数量
+            fuzzy (bool): 是否进行拼音和编辑距离匹配
+
+        Returns:
+            dict: {'query', 'name', 'match_type', 'confident', 'ambiguous', 'candidates'}
+                  name为唯一且可信的匹配结果，否则为None
+        """
+        self._lookups += 1
+        index = self._index
+        candidates: List[Tuple[str, str, float]] = []  # (名称, 匹配方式, 相似度)
+        seen = set()
+
+        def add(names, match_type, score):
+            for name in names:
+                if name not in seen:
+                    seen.add(name)
+                    candidates.append((name, match_type, score))
+
+        query = (query or '').strip()
+        if query:
+            if query in index.entries:
+                add([query], 'exact', 1.0)
+            cleaned = clean_group_name(query)
+            if cleaned != query and cleaned in index.entries:
+                add([cleaned], 'exact', 1.0)
+            add(index.by_remark.get(query, ()), 'remark', 1.0)
+            add(index.by_nickname.get(query, ()), 'nickname', 1.0)
+
+            normalized = normalize_name(query)
+            if not candidates and normalized:
+                add(index.by_normalized.get(normalized, ()), 'normalized', 0.95)
+
+            if fuzzy and not candidates and normalized:
+                if PINYIN_AVAILABLE and _ASCII_LETTERS.match(normalized):
+                    add(index.by_initials.get(normalized, ()), 'pinyin', 0.8)
+                if len(candidates) < limit:
+                    for name, score in self._fuzzy(index, normalized, limit):
+                        add([name], 'fuzzy', score)
+
+        candidates.sort(key=lambda item: -item[2])
+        candidates = candidates[:max(limit, 1)]
+
+        best = candidates[0] if candidates else None
+        confident_matches = [c for c in candidates if c[1] in CONFIDENT_MATCHES]
+        ambiguous = len(confident_matches) > 1 or (not confident_matches and len(candidates) > 1)
+        if best and best[1] == 'exact':
+            # 与规范名称完全一致时直接采用，即使其他联系人的昵称或备注也相同
+            resolved = best[0]
+        elif len(confident_matches) == 1:
+            resolved = confident_matches[0][0]
+        else:
+            resolved = None
+        if resolved:
+            self._resolved += 1
+
+        return {
+            'query': query,
+            'name': resolved,
+            'match_type': best[1] if best else None,
+            'confident': resolved is not None,
+            'ambiguous': ambiguous,
+            'candidates': [
+                dict(index.entries[name].to_dict(), match_type=match_type, score=round(score, 3))
+                for name, match_type, score in candidates
+            ],
+        }
+
+    def resolve_many(self, queries: Iterable[str], limit: int = 5, fuzzy: bool = True) -> List[dict]:
+        """批量解析名称"""
+        return [self.resolve(query, limit=limit, fuzzy=fuzzy) for query in queries]
+
+    def resolve_receiver(self, receiver: str) -> str:
+        """
+        在调用ChatWith之前把接收人解析为规范聊天名称
+
+        只有唯一的精确或规范化匹配才会替换，备注、昵称匹配和其他情况原样返回，由ChatWith自行搜索
+
+        Args:
+            receiver (str): 调用方传入的接收人
+
+        Returns:
+            str: 规范聊天名称或原始接收人
+        """
+        if not receiver or not len(self._index):
+            return receiver
+        result = self.resolve(receiver, limit=2, fuzzy=False)
+        if result['name'] and result['name'] != receiver and result['match_type'] in SUBSTITUTE_MATCHES:
+            logger.debug(f"接收人 {receiver} 解析为 {result['name']} ({result['match_type']})")
+            return result['name']
+        return receiver
+
+    def clear(self):
+        """清空全部来源，例如切换账号时"""
+        with self._lock:
+            self._sources.clear()
+            self._source_as_of.clear()
+            self._rebuild_locked()
+
+    def is_empty(self) -> bool:
+        """索引是否为空"""
+        return not len(self._index)
+
+    def get_stats(self) -> dict:
+        """获取解析器统计信息"""
+        with self._lock:
+            sources = {name: {'count': len(entries), 'as_of': self._source_as_of.get(name)}
+                       for name, entries in self._sources.items()}
+        return {
+            'names': len(self._index),
+            'sources': sources,
+            'lookups': self._lookups,
+            'resolved': self._resolved,
+            'pinyin_available': PINYIN_AVAILABLE,
+            'last_build_duration': self._last_build_duration,
+        }
+
+    def _fuzzy(self, index: _NameIndex, normalized: str, limit: int) -> List[Tuple[str, float]]:
+        """二元组筛选候选后按编辑距离排序"""
+        max_distance = max(1, len(normalized) // 3)
+        if len(normalized) <= SHORT_NAME_LENGTH:
+            # 短名称替换一个字就会破坏大部分二元组，改为按单字筛选
+            grams = set(normalized)
+            threshold = max(1, len(grams) - max_distance)
+            postings_index = index.by_char
+        else:
+            # 至少共享一半的二元组
+            grams = _bigrams(normalized)
+            threshold = max(1, len(grams) // 2)
+            postings_index = index.by_bigram
+        if not grams:
+            return []
+
+        # Counter在C层完成计数，比逐个名称求交集快一个数量级
+        shared = Counter(chain.from_iterable(postings_index.get(gram, ()) for gram in grams))
+        min_len = len(normalized) - max_distance
+        max_len = len(normalized) + max_distance
+        candidates = [
+            name for name, count in shared.most_common()
+            if count >= threshold and min_len <= len(index.normalized[name]) <= max_len
+        ][:MAX_FUZZY_CANDIDATES]
+
+        results = []
+        for name in candidates:
+            distance = _edit_distance(normalized, index.normalized[name], max_distance)
+            if distance <= max_distance:
+                score = 1 - distance / max(len(normalized), len(index.normalized[name]), 1)
+                results.append((name, min(score, 0.9)))
+        results.sort(key=lambda item: -item[1])
+        return results[:limit]
+
+    def _rebuild_locked(self):
+        start = time.time()
+        entries = []
+        for source in self.SOURCE_ORDER:
+            entries.extend(self._sources.get(source, ()))
+        for source, source_entries in self._sources.items():
+            if source not in self.SOURCE_ORDER:
+                entries.extend(source_entries)
+        self._index = _NameIndex(entries, self._initials_cache)
+        self._last_build_duration = round(time.time() - start, 4)
+        logger.debug(f"名称索引已重建: {len(self._index)} 个名称, 耗时 {self._last_build_duration}秒")
+
+    @staticmethod
+    def _to_entry(item, kind: str) -> Optional[_NameEntry]:
+        if isinstance(item, str):
+            name = clean_group_name(item.strip()) if kind != 'friend' else item.strip()
+            return _NameEntry(name, kind) if name else None
+        if isinstance(item, dict):
+            nickname = item.get('nickname') or item.get('name')
+            remark = item.get('remark') or None
+            # 微信聊天窗口标题优先显示备注名
+            name = remark or nickname
+            if not name:
+                return None
+            if kind != 'friend':
+                name = clean_group_name(str(name))
+            return _NameEntry(str(name), kind, nickname=nickname, remark=remark)
+        name = getattr(item, 'name', None)
+        if name:
+            return _NameEntry(clean_group_name(str(name)), kind)
+        return None
+
+
+# 全局名称解析器
+name_resolver = AccountLocal(NameResolver, 'name_resolver')
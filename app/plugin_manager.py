@@ -20,12 +20,18 @@ def check_wxauto_status():
         bool: 是否已安装
     """
     try:
-        # 尝试导入pip安装的wxauto包
-        import wxauto
-        logger.info("成功导入wxauto库")
-        return True
-    except ImportError as e:
-        logger.warning(f"无法导入wxauto库: {str(e)}")
+        # 使用统一的库检测器，检测结果会持久化，避免每次查询状态都导入wxauto
+        from app.wechat_lib_detector import detector
+
+        available, details = detector.detect_wxauto()
+        if available:
+            logger.info(f"wxauto库检测成功: {details}")
+            return True
+        else:
+            logger.warning(f"无法导入wxauto库: {details}")
+            return False
+    except Exception as e:
+        logger.warning(f"检查wxauto库时出错: {str(e)}")
         return False
 
 def check_wxautox_status():
@@ -72,6 +78,10 @@ def install_wxautox():
         if result.returncode == 0:
             logger.info("wxautox库安装成功")
 
+            # 安装前的检测结果已失效
+            from app.wechat_lib_detector import detector
+            detector.clear_cache()
+
             # 尝试导入验证
             try:
                 import wxautox
@@ -140,6 +150,13 @@ def get_wxautox_version():
     Returns:
         str: 版本号，如果未安装则返回None
     """
+    from app.wechat_lib_detector import detector
+
+    # 优先从安装信息读取，避免在进程内导入wxautox
+    version = detector.get_library_version('wxautox')
+    if version:
+        return version
+
     try:
         import wxautox
         version = getattr(wxautox, 'VERSION', '未知版本')
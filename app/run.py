@@ -50,6 +50,9 @@ def check_dependencies():
     if is_frozen:
         logger.info("打包环境中跳过库检测，避免库冲突")
         logger.info(f"配置的微信库: {wechat_lib}，将在实际使用时进行检测和初始化")
+    elif Config.FAST_STARTUP:
+        logger.info("快速启动模式，微信库检测由后台启动任务完成")
+        return
     else:
         # 使用统一的库检测器
         from app.wechat_lib_detector import detector
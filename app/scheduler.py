@@ -0,0 +1,677 @@
+"""
+定时发送
+按计划时间发送文本消息或文件，支持延迟发送和按固定间隔重复发送。
+
+- 待执行的任务保存在内存中的最小堆里，创建、取消和取出到期任务都是O(log n)
+  （取消只删除索引，堆中的旧条目在出堆时跳过，旧条目过多时整体重建）
+- 任务的变化追加写入JSONL日志，启动时重放恢复，日志行数远多于待执行任务时压缩
+- 到期的任务带着优先级和截止时间加入所属账号的请求队列，与普通请求共用队列线程
+- 错过计划时间（服务停止、定时线程被阻塞或请求队列积压）时按任务的策略处理：
+  skip 超过宽限时间后不再发送；late 逐次补发错过的发送，最多补发最近max_catchup次；collapse 多次错过只补发一次（默认）
+"""
+
+import heapq
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.accounts import current_account_id, use_account
+from app.unified_logger import logger
+
+MISFIRE_POLICIES = ('skip', 'late', 'collapse')
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+MISSED = 'missed'
+CANCELLED = 'cancelled'
+
+# 定时线程的最长等待时间（秒），避免系统时间调整后长时间不检查
+MAX_WAIT = 30.0
+
+# late策略默认最多补发的次数，更早的错过视为missed
+DEFAULT_MAX_CATCHUP = 10
+
+# 日志行数超过 max(待执行任务数 * COMPACT_RATIO, COMPACT_MIN_LINES) 时压缩
+COMPACT_RATIO = 2
+COMPACT_MIN_LINES = 10000
+
+
+class ScheduleError(Exception):
+    """定时任务操作失败"""
+
+    def __init__(self, message: str, code: int = 1002, status_code: int = 400, data: Optional[dict] = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.status_code = status_code
+        self.data = data
+
+
+def parse_time(value) -> float:
+    """
+    解析计划时间
+
+    Args:
+        value: Unix时间戳（秒），或ISO 8601格式的时间字符串（不带时区时按本机时区）
+
+    Raises:
+        ScheduleError: 格式无效
+    """
+    timestamp = None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        timestamp = float(value)
+    elif isinstance(value, str):
+        try:
+            timestamp = float(value)
+        except ValueError:
+            try:
+                timestamp = datetime.fromisoformat(value.strip().replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                pass
+    if timestamp is None or not _valid_timestamp(timestamp):
+        raise ScheduleError(f"时间格式无效: {value}")
+    return timestamp
+
+
+def _valid_timestamp(timestamp: float) -> bool:
+    try:
+        datetime.fromtimestamp(timestamp)
+        return True
+    except (OverflowError, OSError, ValueError):
+        return False
+
+
+class _Occurrence:
+    """一次发送，作为请求队列的任务观察者接收执行结果"""
+
+    __slots__ = ('scheduler', 'item_id', 'scheduled_at')
+
+    def __init__(self, scheduler: 'Scheduler', item_id: str, scheduled_at: float):
+        self.scheduler = scheduler
+        self.item_id = item_id
+        self.scheduled_at = scheduled_at
+
+    def task_finished(self, task, result_type, result):
+        self.scheduler._finish(self, result_type, result)
+
+    def task_timed_out(self, task) -> bool:
+        # 没有请求在等待结果
+        return True
+
+
+def _execute(item: dict):
+    """在账号的队列线程中执行发送，返回与发送接口相同格式的结果"""
+    from app.api.routes import _send_message_task, _send_file_task
+
+    if item['kind'] == 'text':
+        return _send_message_task.__wrapped__(item['receiver'], item['message'], item.get('at_list') or [], "1")
+
+    file_paths = list(item.get('file_paths') or [])
+    if item.get('blob_ids'):
+        from app.utils.blob_store import blob_store
+        blob_paths, missing_blobs = blob_store.resolve_paths(item['blob_ids'])
+        if missing_blobs:
+            return {
+                'response': {
+                    'code': 3003,
+                    'message': '部分文件未上传或已过期',
+                    'data': {'missing_blobs': missing_blobs}
+                },
+                'status_code': 404
+            }
+        file_paths.extend(blob_paths)
+    return _send_file_task.__wrapped__(item['receiver'], file_paths)
+
+
+class Scheduler:
+    """定时发送调度器"""
+
+    def __init__(self, store_file: Optional[str] = None, max_pending: int = 100000,
+                 default_misfire: str = 'collapse', misfire_grace: float = 60.0,
+                 min_interval: float = 10.0, history_size: int = 1000,
+                 max_catchup: int = DEFAULT_MAX_CATCHUP):
+        """
+        Args:
+            store_file (str, optional): JSONL日志路径，不指定时只保存在内存中
+            max_pending (int): 最多保留的待执行任务数
+            default_misfire (str): 未指定时使用的错过计划时间策略
+            misfire_grace (float): 默认宽限时间（秒），晚于计划时间不超过该值时视为按时
+            min_interval (float): 重复发送的最小间隔（秒）
+            history_size (int): 内存中保留的已结束任务数量
+            max_catchup (int): late策略下重复发送的任务最多补发的次数
+        """
+        self.store_file = store_file
+        self.max_pending = max_pending
+        self.default_misfire = default_misfire
+        self.misfire_grace = misfire_grace
+        self.min_interval = min_interval
+        self.max_catchup = max(int(max_catchup), 1)
+
+        self._items: Dict[str, dict] = {}
+        # (计划时间, 优先级, 序号, 任务ID)，序号与_heap_seq不一致的条目已失效
+        self._heap: List[Tuple[float, int, int, str]] = []
+        self._heap_seq: Dict[str, int] = {}
+        self._sequence = 0
+        self._history: 'OrderedDict[str, dict]' = OrderedDict()
+        self._history_size = history_size
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._loaded = threading.Event()
+        self._journal = None
+        self._journal_lines = 0
+
+        self.stats = {'fired': 0, 'sent': 0, 'failed': 0, 'missed': 0, 'expired': 0, 'collapsed': 0,
+                      'compactions': 0, 'write_errors': 0}
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        """启动定时线程，日志在定时线程中加载"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Scheduler")
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+        with self._cond:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+
+    def wait_loaded(self, timeout: float = 30.0) -> bool:
+        """等待日志加载完成，未启动时视为已加载"""
+        if not self._running:
+            return True
+        return self._loaded.wait(timeout)
+
+    # ---- 操作 ----
+
+    def create(self, spec: dict) -> dict:
+        """
+        创建定时任务
+
+        Args:
+            spec (dict): 任务参数
+                - receiver (str): 接收人
+                - message (str) / at_list (list): 发送文本消息
+                - file_paths (list) / blob_ids (list): 发送文件，与message二选一
+                - run_at: 首次发送时间（时间戳或ISO 8601字符串），或用delay指定延迟秒数，都不指定时立即发送
+                - interval (float, optional): 重复发送的间隔（秒）
+                - max_runs (int, optional): 最多发送次数
+                - end_at (optional): 重复发送的截止时间
+                - misfire (str, optional): 错过计划时间的策略，skip/late/collapse
+                - grace (float, optional): 宽限时间（秒）
+                - priority (int, optional): 请求队列中的优先级，数值越小越先执行
+
+        Returns:
+            dict: 任务
+
+        Raises:
+            ScheduleError: 参数无效或待执行的任务已达上限
+        """
+        item = self._validate(spec)
+        self.wait_loaded()
+        with self._cond:
+            if len(self._items) >= self.max_pending:
+                raise ScheduleError(f"待执行的定时任务已达上限（{self.max_pending}）", code=5003, status_code=503)
+            self._items[item['id']] = item
+            self._push(item)
+            self._append({'op': 'put', 'item': item})
+            self._cond.notify()
+        return dict(item)
+
+    def cancel(self, item_id: str, account_id: Optional[str] = None) -> dict:
+        """
+        取消定时任务
+
+        Raises:
+            ScheduleError: 任务不存在或正在发送
+        """
+        self.wait_loaded()
+        with self._cond:
+            item = self._items.get(item_id)
+            if item is None or (account_id is not None and item['account'] != account_id):
+                raise ScheduleError(f"定时任务不存在: {item_id}", code=4004, status_code=404)
+            if item['status'] == RUNNING:
+                raise ScheduleError(f"定时任务正在发送，无法取消: {item_id}", code=3002, status_code=409)
+            item['status'] = CANCELLED
+            self._retire(item)
+        logger.info(f"已取消定时任务 {item_id}")
+        return dict(item)
+
+    def get(self, item_id: str, account_id: Optional[str] = None) -> Optional[dict]:
+        self.wait_loaded()
+        with self._cond:
+            item = self._items.get(item_id) or self._history.get(item_id)
+            if item is None or (account_id is not None and item['account'] != account_id):
+                return None
+            return dict(item)
+
+    def list(self, account_id: Optional[str] = None, status: Optional[str] = None,
+             receiver: Optional[str] = None, offset: int = 0, limit: int = 100) -> dict:
+        """
+        查询定时任务，按下次发送时间排序
+
+        Args:
+            status (str, optional): 只返回该状态的任务，已结束的任务从最近的历史记录中查询
+        """
+        self.wait_loaded()
+        with self._cond:
+            if status in (None, PENDING, RUNNING):
+                candidates = list(self._items.values())
+            else:
+                candidates = list(self._history.values())
+        matched = [item for item in candidates
+                   if (account_id is None or item['account'] == account_id)
+                   and (status is None or item['status'] == status)
+                   and (receiver is None or item['receiver'] == receiver)]
+        if status in (None, PENDING, RUNNING):
+            page = heapq.nsmallest(offset + limit, matched, key=lambda item: (item['next_run_at'] or 0, item['id']))
+        else:
+            page = sorted(matched, key=lambda item: item['finished_at'] or 0, reverse=True)[:offset + limit]
+        return {'items': [dict(item) for item in page[offset:]], 'total': len(matched)}
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            self._drop_stale()
+            next_run_at = self._heap[0][0] if self._heap else None
+            return dict(self.stats, pending=len(self._items), heap_size=len(self._heap),
+                        history=len(self._history), journal_lines=self._journal_lines,
+                        store_file=self.store_file, loaded=self._loaded.is_set(),
+                        running=self._running, next_run_at=next_run_at)
+
+    # ---- 参数校验 ----
+
+    def _validate(self, spec: dict) -> dict:
+        if not isinstance(spec, dict):
+            raise ScheduleError("请求体必须是JSON对象")
+        receiver = spec.get('receiver')
+        if not receiver or not isinstance(receiver, str):
+            raise ScheduleError("缺少接收人receiver")
+
+        message = spec.get('message')
+        file_paths = spec.get('file_paths') or []
+        blob_ids = spec.get('blob_ids') or []
+        if message and (file_paths or blob_ids):
+            raise ScheduleError("message与file_paths/blob_ids只能指定一种")
+        if message:
+            kind = 'text'
+        elif file_paths or blob_ids:
+            kind = 'file'
+            if not isinstance(file_paths, list) or not isinstance(blob_ids, list):
+                raise ScheduleError("file_paths和blob_ids必须是数组")
+        else:
+            raise ScheduleError("缺少发送内容message或file_paths/blob_ids")
+
+        now = time.time()
+        if spec.get('run_at') is not None:
+            run_at = parse_time(spec['run_at'])
+        else:
+            try:
+                run_at = now + float(spec.get('delay') or 0)
+            except (TypeError, ValueError):
+                run_at = None
+            if run_at is None or not _valid_timestamp(run_at):
+                raise ScheduleError(f"delay无效: {spec.get('delay')}")
+
+        interval = spec.get('interval')
+        if interval is not None:
+            try:
+                interval = float(interval)
+            except (TypeError, ValueError):
+                raise ScheduleError(f"interval无效: {interval}")
+            if not math.isfinite(interval) or interval < self.min_interval:
+                raise ScheduleError(f"重复发送间隔不能小于{self.min_interval}秒")
+
+        max_runs = spec.get('max_runs')
+        if max_runs is not None:
+            if not isinstance(max_runs, int) or isinstance(max_runs, bool) or max_runs < 1:
+                raise ScheduleError("max_runs必须是正整数")
+        end_at = parse_time(spec['end_at']) if spec.get('end_at') is not None else None
+        if end_at is not None and end_at < run_at:
+            raise ScheduleError("end_at不能早于首次发送时间")
+
+        misfire = spec.get('misfire') or self.default_misfire
+        if misfire not in MISFIRE_POLICIES:
+            raise ScheduleError(f"misfire必须是{'/'.join(MISFIRE_POLICIES)}之一")
+        try:
+            grace = float(spec['grace']) if spec.get('grace') is not None else self.misfire_grace
+            priority = int(spec.get('priority') or 0)
+        except (TypeError, ValueError):
+            raise ScheduleError("grace或priority无效")
+        if not math.isfinite(grace):
+            raise ScheduleError("grace无效")
+
+        return {
+            'id': uuid.uuid4().hex[:16],
+            'account': current_account_id(),
+            'kind': kind,
+            'receiver': receiver,
+            'message': message if kind == 'text' else None,
+            'at_list': list(spec.get('at_list') or []) if kind == 'text' else [],
+            'file_paths': list(file_paths),
+            'blob_ids': list(blob_ids),
+            'next_run_at': run_at,
+            'interval': interval,
+            'max_runs': max_runs,
+            'end_at': end_at,
+            'misfire': misfire,
+            'grace': max(0.0, grace),
+            'priority': priority,
+            'status': PENDING,
+            'runs': 0,
+            'sent': 0,
+            'failed': 0,
+            'missed': 0,
+            'created_at': now,
+            'last_run_at': None,
+            'last_result': None,
+            'finished_at': None,
+        }
+
+    # ---- 堆 ----
+
+    def _push(self, item: dict):
+        self._sequence += 1
+        self._heap_seq[item['id']] = self._sequence
+        heapq.heappush(self._heap, (item['next_run_at'], item['priority'], self._sequence, item['id']))
+
+    def _is_stale(self, entry) -> bool:
+        return self._heap_seq.get(entry[3]) != entry[2]
+
+    def _drop_stale(self):
+        while self._heap and self._is_stale(self._heap[0]):
+            heapq.heappop(self._heap)
+        # 取消的任务留下的旧条目过多时重建堆
+        if len(self._heap) > 2 * len(self._heap_seq) + 1000:
+            self._heap = [entry for entry in self._heap if not self._is_stale(entry)]
+            heapq.heapify(self._heap)
+
+    def _retire(self, item: dict):
+        """任务结束：移出待执行任务，加入历史记录并写入日志"""
+        item['finished_at'] = time.time()
+        self._items.pop(item['id'], None)
+        self._heap_seq.pop(item['id'], None)
+        self._history[item['id']] = item
+        while len(self._history) > self._history_size:
+            self._history.popitem(last=False)
+        self._append({'op': 'del', 'id': item['id'], 'status': item['status']})
+
+    # ---- 定时线程 ----
+
+    def _run(self):
+        try:
+            self._load()
+        except Exception as e:
+            logger.error(f"加载定时任务失败: {str(e)}")
+        finally:
+            self._loaded.set()
+
+        while True:
+            due = []
+            with self._cond:
+                while self._running and not due:
+                    self._drop_stale()
+                    if not self._heap:
+                        self._cond.wait(MAX_WAIT)
+                        continue
+                    delay = self._heap[0][0] - time.time()
+                    if delay > 0:
+                        self._cond.wait(min(delay, MAX_WAIT))
+                        continue
+                    now = time.time()
+                    while self._heap and self._heap[0][0] <= now:
+                        entry = heapq.heappop(self._heap)
+                        if not self._is_stale(entry):
+                            due.extend(self._plan(self._items[entry[3]], now))
+                if not self._running:
+                    return
+            for item, scheduled_at, deadline in due:
+                self._dispatch(item, scheduled_at, deadline)
+
+    def _plan(self, item: dict, now: float) -> list:
+        """
+        处理一个到期的任务：按错过计划时间的策略决定本次是否发送，并安排下一次发送
+
+        Returns:
+            list: [(任务快照, 本次对应的计划时间, 队列截止时间)]，不发送时为空
+        """
+        scheduled_at = item['next_run_at']
+        interval = item['interval']
+        grace = item['grace']
+        policy = item['misfire']
+
+        # late策略只补发最近max_catchup次，避免长时间停止后逐次补发大量消息，
+        # 也避免在持有self._cond时逐次处理全部错过的发送
+        if interval and policy == 'late' and now - scheduled_at > grace:
+            last_due = min(now, item['end_at']) if item['end_at'] is not None else now
+            dropped = int((last_due - scheduled_at) // interval) + 1 - self.max_catchup
+            if dropped > 0:
+                item['missed'] += dropped
+                self.stats['missed'] += dropped
+                logger.warning(f"定时任务 {item['id']} 错过 {dropped + self.max_catchup} 次发送，"
+                               f"策略 late，只补发最近 {self.max_catchup} 次")
+                scheduled_at += dropped * interval
+
+        # 重复发送的任务多次错过时，skip和collapse只看最近一次应发送的时间
+        latest, earlier = scheduled_at, 0
+        if interval and policy != 'late' and now - scheduled_at > grace:
+            earlier = int((now - scheduled_at) // interval)
+            latest = scheduled_at + earlier * interval
+        fire_at = latest
+        if policy == 'skip' and now - latest > grace:
+            fire_at = None
+
+        if policy == 'skip':
+            missed = earlier + (1 if fire_at is None else 0)
+            item['missed'] += missed
+            self.stats['missed'] += missed
+        elif policy == 'collapse':
+            self.stats['collapsed'] += earlier
+        if now - scheduled_at > grace:
+            logger.warning(f"定时任务 {item['id']} 错过计划时间 "
+                           f"{datetime.fromtimestamp(scheduled_at).isoformat(timespec='seconds')}，"
+                           f"策略 {policy}，{'补发' if fire_at is not None else '不再发送'}")
+
+        if fire_at is not None:
+            item['runs'] += 1
+            item['last_run_at'] = now
+            self.stats['fired'] += 1
+
+        # 下一次发送
+        next_run_at = latest + interval if interval else None
+        if next_run_at is not None:
+            if item['max_runs'] is not None and item['runs'] >= item['max_runs']:
+                next_run_at = None
+            elif item['end_at'] is not None and next_run_at > item['end_at']:
+                next_run_at = None
+
+        if next_run_at is not None:
+            item['next_run_at'] = next_run_at
+            self._push(item)
+            self._append({'op': 'put', 'item': item})
+        elif fire_at is not None:
+            # 最后一次发送，等待结果后结束
+            item['status'] = RUNNING
+            self._heap_seq.pop(item['id'], None)
+            self._append({'op': 'put', 'item': item})
+        else:
+            item['status'] = MISSED
+            self._retire(item)
+
+        if fire_at is None:
+            return []
+        deadline = fire_at + grace if policy == 'skip' else None
+        return [(dict(item), fire_at, deadline)]
+
+    def _dispatch(self, item: dict, scheduled_at: float, deadline: Optional[float]):
+        """把一次发送加入账号的请求队列"""
+        from app.accounts import account_registry
+        from app.api_queue import submit_task
+
+        occurrence = _Occurrence(self, item['id'], scheduled_at)
+        if not account_registry.exists(item['account']):
+            self._finish(occurrence, 'error', f"账号不存在: {item['account']}")
+            return
+        try:
+            with use_account(item['account']):
+                submit_task(_execute, (item,), priority=item['priority'], deadline=deadline, observer=occurrence)
+        except Exception as e:
+            self._finish(occurrence, 'error', str(e))
+
+    def _finish(self, occurrence: _Occurrence, result_type: str, result):
+        """记录一次发送的结果，在队列线程中调用"""
+        if result_type == 'success' and isinstance(result, dict) and 'response' in result:
+            response = result['response'] or {}
+            ok = result.get('status_code') == 200 and response.get('code') == 0
+            outcome = {'ok': ok, 'code': response.get('code'), 'message': response.get('message')}
+        elif result_type == 'expired':
+            ok = False
+            outcome = {'ok': False, 'code': None, 'message': result, 'expired': True}
+        else:
+            ok = False
+            outcome = {'ok': False, 'code': None, 'message': str(result)}
+        outcome['scheduled_at'] = occurrence.scheduled_at
+        outcome['finished_at'] = time.time()
+
+        with self._cond:
+            if result_type == 'expired':
+                self.stats['expired'] += 1
+            else:
+                self.stats['sent' if ok else 'failed'] += 1
+            item = self._items.get(occurrence.item_id)
+            active = item is not None
+            if not active:
+                # 并行执行的多次发送中较早的一次晚于最后一次完成，或任务已取消
+                item = self._history.get(occurrence.item_id)
+                if item is None:
+                    return
+            if result_type == 'expired':
+                item['missed'] += 1
+            else:
+                item['sent' if ok else 'failed'] += 1
+            if not active:
+                return
+            item['last_result'] = outcome
+            if item['status'] == RUNNING:
+                item['status'] = DONE if ok else (MISSED if result_type == 'expired' else FAILED)
+                self._retire(item)
+            else:
+                self._append({'op': 'put', 'item': item})
+        if not ok:
+            logger.warning(f"定时任务 {occurrence.item_id} 发送失败: {outcome['message']}")
+
+    # ---- 持久化 ----
+
+    def _load(self):
+        if not self.store_file or not os.path.exists(self.store_file):
+            return
+        started = time.time()
+        items: Dict[str, dict] = {}
+        lines = 0
+        with open(self.store_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程退出时写了一半的行
+                    continue
+                if record.get('op') == 'put':
+                    items[record['item']['id']] = record['item']
+                elif record.get('op') == 'del':
+                    items.pop(record.get('id'), None)
+
+        with self._cond:
+            for item in items.values():
+                if item['status'] == RUNNING:
+                    # 停止时正在发送，无法确定是否已发送，不再重发
+                    item['status'] = FAILED
+                    item['last_result'] = {'ok': False, 'code': None, 'message': '服务停止时正在发送，结果未知'}
+                    item['finished_at'] = time.time()
+                    self._history[item['id']] = item
+                    continue
+                self._items[item['id']] = item
+                self._sequence += 1
+                self._heap_seq[item['id']] = self._sequence
+                self._heap.append((item['next_run_at'], item['priority'], self._sequence, item['id']))
+            heapq.heapify(self._heap)
+            self._journal_lines = lines
+            if lines > len(self._items):
+                self._compact()
+        logger.info(f"已加载 {len(self._items)} 个定时任务，耗时 {time.time() - started:.2f}秒")
+
+    def _append(self, record: dict):
+        """追加一条日志，调用方持有self._cond"""
+        if not self.store_file:
+            return
+        try:
+            if self._journal is None:
+                os.makedirs(os.path.dirname(self.store_file) or '.', exist_ok=True)
+                self._journal = open(self.store_file, 'a', encoding='utf-8')
+            self._journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._journal.flush()
+            self._journal_lines += 1
+        except Exception as e:
+            self.stats['write_errors'] += 1
+            logger.error(f"写入定时任务日志失败: {str(e)}")
+            return
+        if self._journal_lines > max(len(self._items) * COMPACT_RATIO, COMPACT_MIN_LINES):
+            self._compact()
+
+    def _compact(self):
+        """只保留待执行任务的最新状态，调用方持有self._cond"""
+        if not self.store_file:
+            return
+        temp_file = self.store_file + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.store_file) or '.', exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                for item in self._items.values():
+                    f.write(json.dumps({'op': 'put', 'item': item}, ensure_ascii=False) + '\n')
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            os.replace(temp_file, self.store_file)
+            self._journal_lines = len(self._items)
+            self.stats['compactions'] += 1
+        except Exception as e:
+            self.stats['write_errors'] += 1
+            logger.error(f"压缩定时任务日志失败: {str(e)}")
+
+
+def _create_default_scheduler() -> Scheduler:
+    try:
+        from app.config import Config
+        # 网关模式下每个API工作进程使用自己的文件，避免同一任务被多个进程执行
+        store_file = str(Config.SCHEDULE_STORE_FILE).format(port=Config.PORT)
+        return Scheduler(store_file=store_file,
+                         max_pending=Config.SCHEDULE_MAX_PENDING,
+                         default_misfire=Config.SCHEDULE_MISFIRE_POLICY,
+                         misfire_grace=Config.SCHEDULE_MISFIRE_GRACE,
+                         min_interval=Config.SCHEDULE_MIN_INTERVAL,
+                         history_size=Config.SCHEDULE_HISTORY_SIZE,
+                         max_catchup=Config.SCHEDULE_MAX_CATCHUP)
+    except (ImportError, AttributeError):
+        return Scheduler()
+
+
+# 全局定时发送调度器
+scheduler = _create_default_scheduler()
@@ -0,0 +1,376 @@
+"""
+会话列表快照服务
+按自适应间隔轮询会话列表，保留最近一次快照并与上一次比较，
+计算新会话、未读数变化、内容变化和位置上移等差异，按版本号对外提供。
+调用方只需对发生变化的聊天调用GetNextNewMessage，不必反复拉取完整会话列表
+"""
+
+import math
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from app.accounts import AccountLocal, bind_context
+from app.unified_logger import logger
+
+try:
+    import pythoncom
+except ImportError:
+    pythoncom = None
+
+# 轮询间隔范围（秒）：有变化时回到最小间隔，无变化时逐步放大
+DEFAULT_MIN_INTERVAL = 1.0
+DEFAULT_MAX_INTERVAL = 15.0
+BACKOFF_FACTOR = 1.5
+
+# 超过该时间没有调用方读取差异时暂停轮询（秒）
+DEFAULT_IDLE_TIMEOUT = 300
+
+# 保留的差异记录数量
+DEFAULT_HISTORY_SIZE = 500
+
+
+def normalize_sessions(raw) -> List[dict]:
+    """
+    把不同库返回的会话列表统一为[{name, unread, position, content, time}]
+
+    兼容GetSessionList返回的{名称: 未读数}字典、名称列表，以及GetSession返回的会话对象列表
+    """
+    sessions = []
+    if raw is None:
+        return sessions
+    if isinstance(raw, dict):
+        items = [(name, {'unread': count}) for name, count in raw.items()]
+    else:
+        items = []
+        for item in raw:
+            if isinstance(item, str):
+                items.append((item, {}))
+            elif isinstance(item, dict):
+                items.append((item.get('name', ''), item))
+            else:
+                items.append((getattr(item, 'name', ''), {
+                    'unread': getattr(item, 'new_count', 0),
+                    'content': getattr(item, 'content', None),
+                    'time': getattr(item, 'time', None),
+                }))
+
+    for position, (name, info) in enumerate(items):
+        if not name:
+            continue
+        try:
+            unread = int(info.get('unread', info.get('new_count', 0)) or 0)
+        except (TypeError, ValueError):
+            unread = 0
+        sessions.append({
+            'name': str(name),
+            'unread': unread,
+            'position': position,
+            'content': info.get('content'),
+            'time': info.get('time'),
+        })
+    return sessions
+
+
+def diff_sessions(previous: Dict[str, dict], current: List[dict]) -> List[dict]:
+    """
+    计算两次快照之间的差异
+
+    Args:
+        previous (dict): 上一次快照，名称 -> 会话
+        current (list): 本次快照
+
+    Returns:
+        list: 变化列表，每项包含type（new/unread/changed/moved/removed）和会话当前状态
+    """
+    changes = []
+    current_names = set()
+    for session in current:
+        name = session['name']
+        current_names.add(name)
+        old = previous.get(name)
+        if old is None:
+            changes.append(dict(session, type='new', prev_unread=0, prev_position=None))
+            continue
+        if session['unread'] != old['unread']:
+            changes.append(dict(session, type='unread', prev_unread=old['unread'], prev_position=old['position']))
+        elif session['content'] is not None and (session['content'] != old['content'] or session['time'] != old['time']):
+            changes.append(dict(session, type='changed', prev_unread=old['unread'], prev_position=old['position']))
+        elif session['position'] < old['position']:
+            # 只报告位置上移的会话：有新动态的会话会被顶到前面，其余会话随之下移不算变化
+            changes.append(dict(session, type='moved', prev_unread=old['unread'], prev_position=old['position']))
+    for name, old in previous.items():
+        if name not in current_names:
+            changes.append(dict(old, type='removed', prev_unread=old['unread'], prev_position=old['position']))
+    return changes
+
+
+class SessionWatcher:
+    """会话列表快照服务"""
+
+    def __init__(self, min_interval: float = DEFAULT_MIN_INTERVAL, max_interval: float = DEFAULT_MAX_INTERVAL,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, history_size: int = DEFAULT_HISTORY_SIZE):
+        """
+        Args:
+            min_interval (float): 最小轮询间隔（秒）
+            max_interval (float): 最大轮询间隔（秒）
+            idle_timeout (float): 无人读取时暂停轮询的时间（秒）
+            history_size (int): 保留的差异记录数量
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_timeout = idle_timeout
+
+        self._fetcher: Optional[Callable[[], object]] = None
+        self._snapshot: Dict[str, dict] = {}
+        self._ordered: List[dict] = []
+        self._version = 0
+        # 最近一次reset时的版本号，不晚于该版本的调用方需要重新获取完整快照
+        self._reset_version = 0
+        self._snapshot_at = None
+        self._history = deque(maxlen=history_size)  # (版本号, 时间戳, 变化列表)
+        self._condition = threading.Condition()
+        self._interval = min_interval
+        self._last_access = 0.0
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+        self._polls = 0
+        self._errors = 0
+        self._last_poll_duration = None
+
+    def ensure_started(self, fetcher: Callable[[], object]):
+        """
+        设置会话列表获取函数并在需要时启动轮询线程
+
+        Args:
+            fetcher (callable): 返回会话列表的函数
+        """
+        self._fetcher = fetcher
+        self._touch()
+        if self._thread and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            # 轮询线程沿用启动时的账号
+            self._thread = threading.Thread(target=bind_context(self._run), daemon=True, name="SessionWatcher")
+            self._thread.start()
+        logger.info("会话列表快照服务已启动")
+
+    def stop(self):
+        """停止轮询线程"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def observe(self, raw_sessions) -> int:
+        """
+        记录一次外部获取到的会话列表（例如连接检查或会话列表接口），与轮询结果同等处理
+
+        Args:
+            raw_sessions: 任意格式的会话列表
+
+        Returns:
+            int: 当前版本号
+        """
+        return self._apply(normalize_sessions(raw_sessions))
+
+    def changes_since(self, since: int) -> dict:
+        """
+        获取指定版本之后的变化，同一会话的多次变化合并为最新状态
+
+        Args:
+            since (int): 调用方已知的版本号
+
+        Returns:
+            dict: {'version', 'changes', 'changed_chats', 'full', 'sessions'(仅full时)}
+        """
+        self._touch()
+        with self._condition:
+            version = self._version
+            oldest = self._history[0][0] if self._history else None
+            if since >= version:
+                return self._result(version, [], full=False)
+            if since <= self._reset_version or oldest is None or since < oldest - 1:
+                # 首次调用、快照在调用方上次读取后被重置或差异记录已被淘汰，返回完整快照
+                result = self._result(version, [], full=True)
+                result['sessions'] = list(self._ordered)
+                return result
+
+            merged: Dict[str, dict] = {}
+            for entry_version, _, changes in self._history:
+                if entry_version <= since:
+                    continue
+                for change in changes:
+                    first = merged.get(change['name'])
+                    if first is not None:
+                        # 保留最早的prev_*，类型以最终状态为准
+                        change = dict(change, prev_unread=first['prev_unread'],
+                                      prev_position=first['prev_position'])
+                        if first['type'] == 'new' and change['type'] != 'removed':
+                            change['type'] = 'new'
+                    merged[change['name']] = change
+            return self._result(version, list(merged.values()), full=False)
+
+    def wait_for_changes(self, since: int, timeout: float) -> dict:
+        """
+        阻塞等待版本号超过since，超时后返回空变化
+
+        Args:
+            since (int): 调用方已知的版本号
+            timeout (float): 最长等待时间（秒）
+
+        Raises:
+            ValueError: timeout不是有限数值
+        """
+        if not math.isfinite(timeout):
+            # NaN与0比较总为False，会一直以NaN超时等待，导致空转
+            raise ValueError('timeout必须是有限数值')
+        self._touch()
+        deadline = time.time() + timeout
+        with self._condition:
+            while self._version <= since:
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._stop_event.is_set():
+                    break
+                self._condition.wait(remaining)
+        return self.changes_since(since)
+
+    def reset(self):
+        """
+        清空快照和差异记录，例如切换账号时
+
+        版本号继续递增；since不晚于重置时版本号的调用方在新快照建立后读取到完整快照（full为true），
+        新快照建立前读取到的是空的完整快照
+        """
+        with self._condition:
+            self._reset_version = self._version
+            self._snapshot = {}
+            self._ordered = []
+            self._snapshot_at = None
+            self._history.clear()
+        self.poll_now()
+
+    def poll_now(self):
+        """立即触发一次轮询"""
+        self._interval = self.min_interval
+        self._wake_event.set()
+
+    def get_stats(self) -> dict:
+        """获取快照服务统计信息"""
+        with self._condition:
+            return {
+                'running': bool(self._thread and self._thread.is_alive()),
+                'version': self._version,
+                'sessions': len(self._ordered),
+                'snapshot_at': self._snapshot_at,
+                'interval': round(self._interval, 2),
+                'idle': self._is_idle(),
+                'polls': self._polls,
+                'errors': self._errors,
+                'last_poll_duration': self._last_poll_duration,
+                'history': len(self._history),
+            }
+
+    def _result(self, version: int, changes: List[dict], full: bool) -> dict:
+        return {
+            'version': version,
+            'snapshot_at': self._snapshot_at,
+            'full': full,
+            'changes': changes,
+            # 有未读消息且发生变化的聊天，调用方只需对这些聊天获取新消息
+            'changed_chats': [c['name'] for c in changes
+                              if c['type'] != 'removed' and c['unread'] > 0],
+        }
+
+    def _apply(self, sessions: List[dict]) -> int:
+        with self._condition:
+            baseline = self._snapshot_at is None
+            for session in sessions:
+                # GetSessionList只有未读数，沿用GetSession获取到的预览，避免来源交替时误报内容变化
+                old = self._snapshot.get(session['name'])
+                if session['content'] is None and old is not None:
+                    session['content'] = old['content']
+                    session['time'] = old['time']
+            # 第一次快照只建立基线
+            changes = [] if baseline else diff_sessions(self._snapshot, sessions)
+            self._snapshot = {s['name']: s for s in sessions}
+            self._ordered = sessions
+            self._snapshot_at = time.time()
+            if changes or baseline:
+                self._version += 1
+                self._history.append((self._version, self._snapshot_at, changes))
+                self._condition.notify_all()
+            if changes:
+                self._interval = self.min_interval
+            return self._version
+
+    def _touch(self):
+        was_idle = self._is_idle()
+        self._last_access = time.time()
+        if was_idle:
+            self._interval = self.min_interval
+            self._wake_event.set()
+
+    def _is_idle(self) -> bool:
+        return time.time() - self._last_access > self.idle_timeout
+
+    def _run(self):
+        """轮询线程，UI自动化调用需要在本线程初始化COM环境"""
+        if pythoncom is not None:
+            try:
+                pythoncom.CoInitialize()
+            except Exception:
+                pass
+
+        while not self._stop_event.is_set():
+            if self._is_idle():
+                # 没有调用方时不访问微信界面，等待下次读取唤醒
+                self._wake_event.wait(self.max_interval)
+                self._wake_event.clear()
+                continue
+
+            version_before = self._version
+            start = time.time()
+            try:
+                fetcher = self._fetcher
+                raw = fetcher() if fetcher else None
+                if raw is not None:
+                    self._apply(normalize_sessions(raw))
+                self._polls += 1
+            except Exception as e:
+                self._errors += 1
+                logger.debug(f"轮询会话列表失败: {str(e)}")
+            self._last_poll_duration = round(time.time() - start, 3)
+
+            if self._version == version_before:
+                self._interval = min(self._interval * BACKOFF_FACTOR, self.max_interval)
+
+            self._wake_event.wait(self._interval)
+            self._wake_event.clear()
+
+        if pythoncom is not None:
+            try:
+                pythoncom.CoUninitialize()
+            except Exception:
+                pass
+
+
+def _create_default_watcher() -> SessionWatcher:
+    try:
+        from app.config import Config
+        return SessionWatcher(min_interval=Config.SESSION_WATCH_MIN_INTERVAL,
+                              max_interval=Config.SESSION_WATCH_MAX_INTERVAL,
+                              idle_timeout=Config.SESSION_WATCH_IDLE_TIMEOUT)
+    except (ImportError, AttributeError):
+        return SessionWatcher()
+
+
+# 全局会话列表快照服务，每个账号一个实例
+session_watcher = AccountLocal(_create_default_watcher, 'session_watcher')
@@ -0,0 +1,293 @@
+"""
+慢请求记录
+按路由配置耗时阈值，请求超过阈值时由看门狗线程抓取处理线程（以及执行任务的队列线程）
+当时的调用栈，请求结束后把路径、排队等待、界面调用耗时、请求和响应大小等信息
+写入内存中的有限记录和按大小轮转的JSONL文件
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+from app.unified_logger import logger
+
+DEFAULT_THRESHOLD = 3.0
+DEFAULT_STORE_SIZE = 200
+DEFAULT_MAX_FILE_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+# 看门狗检查间隔（秒）
+WATCHDOG_INTERVAL = 0.25
+
+# 抓取调用栈的最大帧数
+MAX_STACK_FRAMES = 40
+
+
+def _format_stack(ident: int) -> Optional[List[str]]:
+    frame = sys._current_frames().get(ident)
+    if frame is None:
+        return None
+    lines = traceback.format_stack(frame, limit=MAX_STACK_FRAMES)
+    return [line.rstrip() for line in lines]
+
+
+class _InFlight:
+    """进行中的请求"""
+
+    __slots__ = ('method', 'route', 'path', 'start', 'threshold', 'thread_name', 'worker',
+                 'stack', 'worker_stack', 'captured_at')
+
+    def __init__(self, method: str, route: str, path: str, threshold: float):
+        self.method = method
+        self.route = route
+        self.path = path
+        self.start = time.time()
+        self.threshold = threshold
+        self.thread_name = threading.current_thread().name
+        self.worker = None  # 正在执行该请求任务的队列线程
+        self.stack = None
+        self.worker_stack = None
+        self.captured_at = None
+
+
+class SlowRequestRecorder:
+    """慢请求记录器"""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, route_thresholds: Optional[Dict[str, Optional[float]]] = None,
+                 log_file: Optional[str] = None, store_size: int = DEFAULT_STORE_SIZE,
+                 max_file_bytes: int = DEFAULT_MAX_FILE_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT):
+        """
+        Args:
+            threshold (float): 默认耗时阈值（秒）
+            route_thresholds (dict, optional): 路由规则 -> 阈值，阈值为None表示不记录该路由（例如长轮询）
+            log_file (str, optional): JSONL文件路径，不指定时只保存在内存中
+            store_size (int): 内存中保留的记录数量
+            max_file_bytes (int): JSONL文件轮转大小
+            backup_count (int): 保留的轮转文件数量
+        """
+        self.threshold = threshold
+        self.route_thresholds = dict(route_thresholds or {})
+        self.log_file = log_file
+        self.max_file_bytes = max_file_bytes
+        self.backup_count = backup_count
+
+        self._records = deque(maxlen=store_size)
+        self._in_flight: Dict[int, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._watchdog = None
+        self._running = False
+
+        self._total = 0
+        self._slow = 0
+        self._write_errors = 0
+
+    def threshold_for(self, route: str) -> Optional[float]:
+        """获取路由的阈值，None表示不记录"""
+        if route in self.route_thresholds:
+            return self.route_thresholds[route]
+        return self.threshold
+
+    # ---- 请求生命周期 ----
+
+    def begin(self, method: str, route: str, path: str):
+        """在当前线程开始跟踪一个请求"""
+        threshold = self.threshold_for(route)
+        if threshold is None:
+            return
+        entry = _InFlight(method, route, path, threshold)
+        with self._lock:
+            self._in_flight[threading.get_ident()] = entry
+        self._ensure_watchdog()
+
+    def attach_worker(self, request_ident: Optional[int]):
+        """队列线程开始执行某个请求的任务时调用，慢请求会同时抓取该线程的调用栈"""
+        if request_ident is None:
+            return
+        with self._lock:
+            entry = self._in_flight.get(request_ident)
+            if entry is not None:
+                entry.worker = threading.get_ident()
+
+    def detach_worker(self, request_ident: Optional[int]):
+        """队列线程执行完任务时调用"""
+        if request_ident is None:
+            return
+        with self._lock:
+            entry = self._in_flight.get(request_ident)
+            if entry is not None and entry.worker == threading.get_ident():
+                entry.worker = None
+
+    def end(self, status_code: int, request_bytes: Optional[int] = None,
+            response_bytes: Optional[int] = None, spans: Optional[list] = None) -> Optional[dict]:
+        """
+        结束当前线程的请求，超过阈值时保存记录
+
+        Args:
+            status_code (int): 响应状态码
+            request_bytes (int, optional): 请求体大小
+            response_bytes (int, optional): 响应体大小
+            spans (list, optional): 该请求的链路span，用于提取排队等待和界面调用耗时
+
+        Returns:
+            dict: 慢请求记录，未超过阈值时返回None
+        """
+        with self._lock:
+            entry = self._in_flight.pop(threading.get_ident(), None)
+        if entry is None:
+            return None
+
+        self._total += 1
+        duration = time.time() - entry.start
+        if duration < entry.threshold:
+            return None
+
+        self._slow += 1
+        queue_wait = None
+        ui_calls = []
+        for span in spans or []:
+            if span.duration is None:
+                continue
+            if span.name == 'queue.wait':
+                queue_wait = round((queue_wait or 0) + span.duration, 4)
+            elif span.name.startswith('ui.'):
+                ui_calls.append({
+                    'method': span.name[3:],
+                    'duration': round(span.duration, 4),
+                    'ok': span.status_message is None,
+                    'offset': round((span.start_ns / 1e9) - entry.start, 4),
+                })
+
+        record = {
+            'time': entry.start,
+            'method': entry.method,
+            'route': entry.route,
+            'path': entry.path,
+            'status': status_code,
+            'duration': round(duration, 4),
+            'threshold': entry.threshold,
+            'queue_wait': queue_wait,
+            'ui_calls': ui_calls,
+            'request_bytes': request_bytes,
+            'response_bytes': response_bytes,
+            'thread': entry.thread_name,
+            'trace_id': spans[0].trace.trace_id if spans else None,
+            'stack_captured_at': None if entry.captured_at is None else round(entry.captured_at - entry.start, 3),
+            'stack': entry.stack,
+            'worker_stack': entry.worker_stack,
+        }
+        self._records.append(record)
+        self._write(record)
+        logger.warning(f"慢请求: {entry.method} {entry.path} - 状态码: {status_code} - 耗时: {duration:.2f}秒"
+                       f"（阈值 {entry.threshold}秒）")
+        return record
+
+    # ---- 查询 ----
+
+    def get_records(self, route: Optional[str] = None, min_duration: Optional[float] = None,
+                    limit: int = 50, include_stacks: bool = True) -> List[dict]:
+        """获取最近的慢请求记录，按时间从新到旧"""
+        result = []
+        for record in reversed(list(self._records)):
+            if route and record['route'] != route:
+                continue
+            if min_duration is not None and record['duration'] < min_duration:
+                continue
+            if not include_stacks:
+                record = {k: v for k, v in record.items() if k not in ('stack', 'worker_stack')}
+            result.append(record)
+            if len(result) >= limit:
+                break
+        return result
+
+    def get_stats(self) -> dict:
+        """获取记录器统计信息"""
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return {
+            'threshold': self.threshold,
+            'route_thresholds': self.route_thresholds,
+            'log_file': self.log_file,
+            'in_flight': in_flight,
+            'requests': self._total,
+            'slow_requests': self._slow,
+            'stored': len(self._records),
+            'write_errors': self._write_errors,
+        }
+
+    # ---- 看门狗 ----
+
+    def _ensure_watchdog(self):
+        if self._running:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._watchdog = threading.Thread(target=self._watch, daemon=True, name="SlowRequestWatchdog")
+            self._watchdog.start()
+
+    def _watch(self):
+        """请求刚超过阈值时抓取调用栈，此时仍能看到请求卡在哪里"""
+        while self._running:
+            time.sleep(WATCHDOG_INTERVAL)
+            now = time.time()
+            with self._lock:
+                due = [(ident, entry) for ident, entry in self._in_flight.items()
+                       if entry.captured_at is None and now - entry.start >= entry.threshold]
+            for ident, entry in due:
+                entry.captured_at = now
+                try:
+                    entry.stack = _format_stack(ident)
+                    if entry.worker is not None:
+                        entry.worker_stack = _format_stack(entry.worker)
+                except Exception as e:
+                    logger.debug(f"抓取慢请求调用栈失败: {str(e)}")
+
+    # ---- 文件 ----
+
+    def _write(self, record: dict):
+        if not self.log_file:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._file_lock:
+            try:
+                os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+                if os.path.exists(self.log_file) and os.path.getsize(self.log_file) + len(line) > self.max_file_bytes:
+                    self._rotate()
+                with open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except Exception as e:
+                self._write_errors += 1
+                logger.debug(f"写入慢请求日志失败: {str(e)}")
+
+    def _rotate(self):
+        """slow_requests.jsonl -> .1 -> .2 ...，超出数量的最旧文件被删除"""
+        for index in range(self.backup_count, 0, -1):
+            source = f"{self.log_file}.{index - 1}" if index > 1 else self.log_file
+            target = f"{self.log_file}.{index}"
+            if os.path.exists(source):
+                if os.path.exists(target):
+                    os.remove(target)
+                os.replace(source, target)
+        if self.backup_count <= 0 and os.path.exists(self.log_file):
+            os.remove(self.log_file)
+
+
+def _create_default_recorder() -> SlowRequestRecorder:
+    try:
+        from app.config import Config
+        return SlowRequestRecorder(threshold=Config.SLOW_REQUEST_THRESHOLD,
+                                   route_thresholds=Config.SLOW_REQUEST_ROUTE_THRESHOLDS,
+                                   log_file=str(Config.LOGS_DIR / 'slow_requests.jsonl'))
+    except (ImportError, AttributeError):
+        return SlowRequestRecorder()
+
+
+# 全局慢请求记录器
+slow_request_recorder = _create_default_recorder()
@@ -0,0 +1,326 @@
+"""
+启动编排
+把服务启动拆成有依赖关系的组件（依赖检查、库检测、目录创建、队列、应用创建、微信初始化等），
+互不依赖的组件在各自线程中并行执行，HTTP端口可以在其余组件完成前先监听。
+各组件的状态通过/ready接口查询，调用方据此等待就绪，不再使用固定的sleep
+"""
+
+import json
+import math
+import threading
+import time
+from http import HTTPStatus
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.unified_logger import logger
+
+PENDING = 'pending'
+RUNNING = 'running'
+READY = 'ready'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+# 调用方请求的组件没有注册时的状态，例如关闭了自动初始化微信
+ABSENT = 'absent'
+
+SETTLED_STATES = (READY, FAILED, SKIPPED, ABSENT)
+
+# 启动期间的错误码
+STARTING_CODE = 5004
+
+
+class StartupComponent:
+    """一个启动组件"""
+
+    def __init__(self, name: str, func: Optional[Callable] = None, depends_on: Iterable[str] = (),
+                 required: bool = True, delay: Optional[float] = None):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on)
+        self.required = required
+        self.delay = delay
+        self.state = PENDING
+        self.error = None
+        self.detail = None
+        self.started_at = None
+        self.finished_at = None
+        self.launched = False
+
+    def to_dict(self) -> dict:
+        seconds = None
+        if self.started_at is not None:
+            seconds = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            'state': self.state,
+            'required': self.required,
+            'depends_on': list(self.depends_on),
+            'seconds': seconds,
+            'error': self.error,
+            'detail': self.detail,
+        }
+
+
+class StartupOrchestrator:
+    """按依赖关系并行执行启动组件，并记录每个组件的状态"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+        self.started = False
+        self._components: Dict[str, StartupComponent] = {}
+        self._condition = threading.Condition()
+
+    def add(self, name: str, func: Optional[Callable] = None, depends_on: Iterable[str] = (),
+            required: bool = True, delay: Optional[float] = None) -> StartupComponent:
+        """
+        注册组件，同名组件已存在时直接返回已有的组件
+
+        Args:
+            name (str): 组件名
+            func (callable, optional): 组件的启动函数，返回dict时作为组件详情；为None时由外部调用set_state更新状态
+            depends_on (list): 依赖的组件，全部就绪后才执行，任一依赖失败则跳过
+            required (bool): 是否为必需组件，所有必需组件就绪后服务才算就绪
+            delay (float, optional): 依赖就绪后延迟执行的秒数
+        """
+        with self._condition:
+            component = self._components.get(name)
+            if component is None:
+                component = StartupComponent(name, func, depends_on, required, delay)
+                self._components[name] = component
+                self._condition.notify_all()
+            return component
+
+    def set_state(self, name: str, state: str, error: Optional[str] = None, detail: Optional[dict] = None):
+        """更新组件状态，组件不存在时按外部组件注册"""
+        with self._condition:
+            component = self._components.get(name) or self.add(name)
+            now = time.time()
+            if state == RUNNING or component.started_at is None:
+                component.started_at = now
+            if state in SETTLED_STATES:
+                component.finished_at = now
+            component.state = state
+            component.error = error
+            if detail is not None:
+                component.detail = detail
+            if self.ready_at is None and self._is_ready_locked():
+                self.ready_at = now
+                logger.info(f"服务启动完成，耗时 {now - self.started_at:.2f}秒")
+            self._condition.notify_all()
+
+    def start(self):
+        """为尚未执行的组件启动线程，可以多次调用"""
+        with self._condition:
+            self.started = True
+            pending = [c for c in self._components.values() if c.func is not None and not c.launched]
+            for component in pending:
+                component.launched = True
+            self._condition.notify_all()
+        for component in pending:
+            threading.Thread(target=self._run, args=(component,), daemon=True,
+                             name=f"Startup-{component.name}").start()
+
+    def _run(self, component: StartupComponent):
+        with self._condition:
+            # 等待依赖全部结束
+            self._condition.wait_for(lambda: all(
+                self._state_locked(dep) in SETTLED_STATES for dep in component.depends_on))
+            blocked = [dep for dep in component.depends_on if self._state_locked(dep) not in (READY, ABSENT)]
+        if blocked:
+            self.set_state(component.name, SKIPPED, f"依赖的组件未就绪: {', '.join(blocked)}")
+            logger.warning(f"启动组件 {component.name} 已跳过，依赖的组件未就绪: {', '.join(blocked)}")
+            return
+
+        if component.delay:
+            time.sleep(component.delay)
+
+        self.set_state(component.name, RUNNING)
+        try:
+            result = component.func()
+        except Exception as e:
+            self.set_state(component.name, FAILED, str(e))
+            log = logger.error if component.required else logger.warning
+            log(f"启动组件 {component.name} 失败: {str(e)}")
+            return
+        self.set_state(component.name, READY, detail=result if isinstance(result, dict) else None)
+        logger.info(f"启动组件 {component.name} 已就绪，耗时 {component.to_dict()['seconds']}秒")
+
+    def _state_locked(self, name: str) -> str:
+        component = self._components.get(name)
+        if component is None:
+            # 开始执行后仍未注册的组件视为不存在，开始执行前则可能尚未注册
+            return ABSENT if self.started else PENDING
+        return component.state
+
+    def _targets_locked(self, names: Optional[Iterable[str]]) -> List[str]:
+        if names:
+            return list(names)
+        return [c.name for c in self._components.values() if c.required]
+
+    def _is_ready_locked(self, names: Optional[Iterable[str]] = None) -> bool:
+        if not self.started:
+            return False
+        return all(self._state_locked(name) == READY for name in self._targets_locked(names))
+
+    def _is_settled_locked(self, names: Optional[Iterable[str]] = None) -> bool:
+        if not self.started and not names:
+            return False
+        states = [self._state_locked(name) for name in self._targets_locked(names)]
+        # 必需组件失败后不会再就绪，不必等待其余组件
+        failed = any(self._components[name].required and state in (FAILED, SKIPPED)
+                     for name, state in zip(self._targets_locked(names), states) if name in self._components)
+        return failed or all(state in SETTLED_STATES for state in states)
+
+    def is_ready(self, names: Optional[Iterable[str]] = None) -> bool:
+        with self._condition:
+            return self._is_ready_locked(names)
+
+    def wait(self, names: Optional[Iterable[str]] = None, timeout: Optional[float] = None) -> bool:
+        """
+        等待组件结束
+
+        Args:
+            names (list, optional): 要等待的组件，默认为所有必需组件
+            timeout (float, optional): 超时时间（秒）
+
+        Returns:
+            bool: 组件是否全部就绪
+        """
+        names = list(names) if names else None
+        with self._condition:
+            self._condition.wait_for(lambda: self._is_settled_locked(names), timeout)
+            return self._is_ready_locked(names)
+
+    def failed_components(self) -> List[str]:
+        with self._condition:
+            return [c.name for c in self._components.values() if c.required and c.state in (FAILED, SKIPPED)]
+
+    def get_status(self, names: Optional[Iterable[str]] = None) -> dict:
+        names = list(names) if names else None
+        with self._condition:
+            components = {name: component.to_dict() for name, component in self._components.items()}
+            for name in names or []:
+                if name not in components:
+                    components[name] = {'state': self._state_locked(name), 'required': False}
+            return {
+                'ready': self._is_ready_locked(names),
+                'settled': self._is_settled_locked(names),
+                'uptime': round(time.time() - self.started_at, 3),
+                'ready_after': round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+                'components': components,
+            }
+
+
+def readiness(args) -> tuple:
+    """
+    /ready接口的响应
+
+    Args:
+        args: 查询参数，wait为最长等待秒数（最多30秒），components为逗号分隔的组件名，默认所有必需组件
+
+    Returns:
+        tuple: (响应数据, HTTP状态码)
+    """
+    names = [name.strip() for name in (args.get('components') or '').split(',') if name.strip()] or None
+    try:
+        wait = float(args.get('wait') or 0)
+        if not math.isfinite(wait):
+            raise ValueError('wait必须是有限数值')
+    except ValueError:
+        return {'code': 1002, 'message': 'wait参数错误', 'data': None}, 400
+    wait = min(max(wait, 0), 30)
+    if wait:
+        startup_orchestrator.wait(names, wait)
+    status = startup_orchestrator.get_status(names)
+    if status['ready']:
+        return {'code': 0, 'message': '服务已就绪', 'data': status}, 200
+    return {'code': STARTING_CODE, 'message': '服务正在启动', 'data': status}, 503
+
+
+class DeferredApp:
+    """
+    在Flask应用创建完成前先行监听端口的WSGI应用
+
+    /ready直接由启动编排器回答，其他请求等待应用创建完成后转发，超时返回503
+    """
+
+    def __init__(self, component: str = 'app', timeout: float = 30.0):
+        self.component = component
+        self.timeout = timeout
+        self.app = None
+        self._ready = threading.Event()
+
+    def set_app(self, app):
+        self.app = app
+        self._ready.set()
+
+    def __call__(self, environ, start_response):
+        if self.app is None and environ.get('PATH_INFO') != '/ready':
+            self._ready.wait(self.timeout)
+        if self.app is not None:
+            return self.app(environ, start_response)
+
+        from urllib.parse import parse_qs
+        args = {key: values[0] for key, values in parse_qs(environ.get('QUERY_STRING', '')).items()}
+        if environ.get('PATH_INFO') == '/ready':
+            body, status = readiness(args)
+        else:
+            body, status = {'code': STARTING_CODE, 'message': '服务正在启动',
+                            'data': startup_orchestrator.get_status()}, 503
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        start_response(f"{status} {HTTPStatus(status).phrase.upper()}", [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(payload))),
+            ('Retry-After', '1'),
+        ])
+        return [payload]
+
+
+def verify_wechat_library():
+    """
+    校验配置的微信库是否可用，不可用时切换到推荐的库
+
+    与Config中非快速启动时的校验逻辑一致，只在微信实例尚未初始化时修改适配器使用的库
+    """
+    from app.config import Config
+    from app.wechat_lib_detector import detector
+
+    configured_lib = Config.WECHAT_LIB
+    valid, message = detector.validate_library_choice(configured_lib)
+    if valid:
+        logger.info(f"微信库 {configured_lib} 检测通过")
+        return {'lib': configured_lib}
+
+    recommended = detector.get_library_switch_recommendation(configured_lib) or 'wxauto'
+    logger.warning(f"配置的库 '{configured_lib}' 不可用（{message}），自动切换到 '{recommended}'")
+    Config.WECHAT_LIB = recommended
+
+    from app.wechat_adapter import wechat_adapter
+    # 与WeChatAdapter.initialize()使用同一把锁，避免在初始化过程中修改请求的库
+    adapter = wechat_adapter.get()
+    with adapter._lock:
+        if not adapter._initialized:
+            adapter._requested_lib_name = recommended
+    return {'lib': recommended, 'configured': configured_lib}
+
+
+def initialize_wechat():
+    """在启动线程中初始化微信实例，与/api/wechat/initialize相同"""
+    import pythoncom
+    from app.wechat import wechat_manager
+
+    pythoncom.CoInitialize()
+    try:
+        if not wechat_manager.initialize():
+            raise RuntimeError("微信初始化失败")
+        window_name = ""
+        try:
+            window_name = wechat_manager.get_instance().get_window_name() or ""
+        except Exception as e:
+            logger.warning(f"获取窗口名称失败: {str(e)}")
+        return {'window_name': window_name}
+    finally:
+        pythoncom.CoUninitialize()
+
+
+# 全局启动编排器
+startup_orchestrator = StartupOrchestrator()
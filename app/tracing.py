@@ -0,0 +1,437 @@
+"""
+请求链路追踪
+在before_request中为每个请求分配trace id，随任务字典传入请求队列，并记录微信界面调用，
+从而区分一次请求的耗时花在排队、ChatWith还是发送上。
+
+请求结束后按耗时决定是否保留：慢请求和出错的请求总是保留，其余按比例采样。
+保留的链路放在内存环形缓冲区中，可导出为OTLP JSON文件离线分析，不需要外部采集器
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from app.unified_logger import logger
+
+SERVICE_NAME = 'wxauto-http-api'
+
+# OTLP span kind
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+# OTLP status code
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+def _new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+
+def _new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def parse_traceparent(header: Optional[str]):
+    """
+    解析W3C traceparent请求头，调用方已有trace id时沿用
+
+    Returns:
+        tuple: (trace_id, parent_span_id)，格式不正确时返回(None, None)
+    """
+    if not header:
+        return None, None
+    parts = header.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None, None
+    if parts[1] == '0' * 32:
+        return None, None
+    return parts[1], parts[2]
+
+
+class Span:
+    """一个耗时区间"""
+
+    __slots__ = ('trace', 'span_id', 'parent_span_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'status_message', 'thread')
+
+    def __init__(self, trace: 'Trace', name: str, parent_span_id: Optional[str],
+                 kind: int = SPAN_KIND_INTERNAL, start_ns: Optional[int] = None,
+                 attributes: Optional[dict] = None):
+        self.trace = trace
+        self.span_id = _new_span_id()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.status = STATUS_OK
+        self.status_message = None
+        self.thread = threading.current_thread().name
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    def end(self, end_ns: Optional[int] = None):
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_span_id,
+            'name': self.name,
+            'start': self.start_ns / 1e9,
+            'duration': None if self.duration is None else round(self.duration, 6),
+            'status': 'error' if self.status == STATUS_ERROR else 'ok',
+            'status_message': self.status_message,
+            'thread': self.thread,
+            'attributes': self.attributes,
+        }
+
+
+class Trace:
+    """一次请求的全部span"""
+
+    def __init__(self, trace_id: str, name: str, remote_parent_span_id: Optional[str] = None):
+        self.trace_id = trace_id
+        self.spans: List[Span] = []  # list.append是原子操作，跨线程追加span无需加锁
+        self.root = self.new_span(name, remote_parent_span_id, kind=SPAN_KIND_SERVER)
+
+    def new_span(self, name: str, parent_span_id: Optional[str], kind: int = SPAN_KIND_INTERNAL,
+                 start_ns: Optional[int] = None, attributes: Optional[dict] = None) -> Span:
+        span = Span(self, name, parent_span_id, kind, start_ns, attributes)
+        self.spans.append(span)
+        return span
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.root.duration
+
+    def summary(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.root.name,
+            'start': self.root.start_ns / 1e9,
+            'duration': None if self.duration is None else round(self.duration, 6),
+            'status': 'error' if self.root.status == STATUS_ERROR else 'ok',
+            'spans': len(self.spans),
+            'attributes': self.root.attributes,
+        }
+
+    def to_dict(self) -> dict:
+        result = self.summary()
+        result['spans'] = [span.to_dict() for span in sorted(self.spans, key=lambda s: s.start_ns)]
+        return result
+
+
+class Tracer:
+    """链路追踪器"""
+
+    def __init__(self, enabled: bool = True, slow_threshold: float = 2.0,
+                 sample_rate: float = 0.05, buffer_size: int = 200):
+        """
+        Args:
+            enabled (bool): 是否启用
+            slow_threshold (float): 超过该耗时（秒）的请求总是保留
+            sample_rate (float): 其余请求的保留比例
+            buffer_size (int): 保留的链路数量
+        """
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+        self._traces = deque(maxlen=buffer_size)
+        self._local = threading.local()
+
+        self._started = 0
+        self._kept_slow = 0
+        self._kept_error = 0
+        self._kept_sampled = 0
+
+    # ---- 当前线程的上下文 ----
+
+    def current_span(self) -> Optional[Span]:
+        """当前线程正在进行的span"""
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    def current_trace_id(self) -> Optional[str]:
+        span = self.current_span()
+        return span.trace.trace_id if span else None
+
+    def _push(self, span: Span):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = []
+            self._local.stack = stack
+        stack.append(span)
+
+    def _pop(self, span: Span):
+        stack = getattr(self._local, 'stack', None)
+        if stack and stack[-1] is span:
+            stack.pop()
+        elif stack and span in stack:
+            stack.remove(span)
+
+    # ---- 请求生命周期 ----
+
+    def start_request(self, name: str, traceparent: Optional[str] = None,
+                      attributes: Optional[dict] = None) -> Optional[Span]:
+        """
+        开始一个请求的链路，绑定到当前线程
+
+        Args:
+            name (str): 链路名称，例如"POST /api/message/send"
+            traceparent (str, optional): 调用方传入的W3C traceparent
+            attributes (dict, optional): 根span属性
+        """
+        if not self.enabled:
+            return None
+        # 同一线程上一个请求异常退出时可能残留上下文
+        self._local.stack = []
+        trace_id, remote_parent = parse_traceparent(traceparent)
+        trace = Trace(trace_id or _new_trace_id(), name, remote_parent)
+        if attributes:
+            trace.root.attributes.update(attributes)
+        self._push(trace.root)
+        self._started += 1
+        return trace.root
+
+    def end_request(self, status_code: Optional[int] = None, error: Optional[str] = None):
+        """结束当前线程的请求链路，并按耗时和结果决定是否保留"""
+        stack = getattr(self._local, 'stack', None)
+        if not stack:
+            return
+        root = stack[0]
+        self._local.stack = []
+        if root.end_ns is None:
+            root.end()
+        if status_code is not None:
+            root.set_attribute('http.status_code', status_code)
+        if error:
+            root.set_error(error)
+        elif status_code is not None and status_code >= 500:
+            root.set_error(f'HTTP {status_code}')
+        self._keep(root.trace)
+
+    def _keep(self, trace: Trace):
+        duration = trace.duration or 0
+        if duration >= self.slow_threshold:
+            self._kept_slow += 1
+        elif trace.root.status == STATUS_ERROR:
+            self._kept_error += 1
+        elif random.random() < self.sample_rate:
+            self._kept_sampled += 1
+        else:
+            return
+        self._traces.append(trace)
+        if duration >= self.slow_threshold:
+            logger.debug(f"慢请求链路 {trace.trace_id}: {trace.root.name} 耗时 {duration:.2f}秒")
+
+    # ---- span ----
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[dict] = None):
+        """
+        在当前链路下记录一个子span，没有进行中的链路时不记录
+
+        用法:
+            with tracer.span('ChatWith', {'who.length': 3}):
+                ...
+        """
+        parent = self.current_span()
+        if parent is None:
+            yield None
+            return
+        span = parent.trace.new_span(name, parent.span_id, attributes=attributes)
+        self._push(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set_error(f"{type(e).__name__}: {str(e)[:200]}")
+            raise
+        finally:
+            span.end()
+            self._pop(span)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """
+        包装界面方法，在有进行中的链路时记录为子span
+
+        Args:
+            name (str): 方法名称
+            func (callable): 实际方法
+        """
+        if not self.enabled:
+            return func
+
+        def wrapper(*args, **kwargs):
+            if self.current_span() is None:
+                return func(*args, **kwargs)
+            with self.span(f'ui.{name}'):
+                return func(*args, **kwargs)
+        wrapper.__name__ = getattr(func, '__name__', name)
+        wrapper.__doc__ = getattr(func, '__doc__', None)
+        return wrapper
+
+    # ---- 跨线程传递 ----
+
+    def inject(self) -> Optional[dict]:
+        """获取当前上下文，放入任务字典随任务传到队列线程"""
+        span = self.current_span()
+        if span is None:
+            return None
+        return {'span': span, 'enqueued_ns': time.time_ns()}
+
+    @contextmanager
+    def activate(self, context: Optional[dict], name: str):
+        """
+        在队列线程中恢复请求的上下文，记录排队等待和执行两个span
+
+        Args:
+            context (dict): inject()的返回值
+            name (str): 执行span名称
+        """
+        if not context:
+            yield None
+            return
+        parent = context['span']
+        trace = parent.trace
+        now = time.time_ns()
+        wait_span = trace.new_span('queue.wait', parent.span_id, start_ns=context['enqueued_ns'])
+        wait_span.end(now)
+
+        previous = getattr(self._local, 'stack', None)
+        self._local.stack = [parent]
+        try:
+            with self.span(name) as span:
+                yield span
+        finally:
+            self._local.stack = previous if previous is not None else []
+
+    # ---- 查询和导出 ----
+
+    def get_traces(self, min_duration: Optional[float] = None, name: Optional[str] = None,
+                   limit: int = 50) -> List[dict]:
+        """获取保留的链路摘要，按时间从新到旧"""
+        result = []
+        for trace in reversed(list(self._traces)):
+            if min_duration is not None and (trace.duration or 0) < min_duration:
+                continue
+            if name and name not in trace.root.name:
+                continue
+            result.append(trace.summary())
+            if len(result) >= limit:
+                break
+        return result
+
+    def get_trace(self, trace_id: str) -> Optional[dict]:
+        """获取单条链路的全部span"""
+        for trace in list(self._traces):
+            if trace.trace_id == trace_id:
+                return trace.to_dict()
+        return None
+
+    def export_otlp(self, trace_id: Optional[str] = None) -> dict:
+        """
+        导出为OTLP JSON格式（与OpenTelemetry Collector的文件导出格式一致）
+
+        Args:
+            trace_id (str, optional): 只导出指定链路
+        """
+        spans = []
+        for trace in list(self._traces):
+            if trace_id and trace.trace_id != trace_id:
+                continue
+            for span in trace.spans:
+                if span.end_ns is None:
+                    continue
+                item = {
+                    'traceId': trace.trace_id,
+                    'spanId': span.span_id,
+                    'name': span.name,
+                    'kind': span.kind,
+                    'startTimeUnixNano': str(span.start_ns),
+                    'endTimeUnixNano': str(span.end_ns),
+                    'attributes': [_otlp_attribute(key, value) for key, value in span.attributes.items()]
+                                  + [_otlp_attribute('thread.name', span.thread)],
+                    'status': {'code': span.status},
+                }
+                if span.parent_span_id:
+                    item['parentSpanId'] = span.parent_span_id
+                if span.status_message:
+                    item['status']['message'] = span.status_message
+                spans.append(item)
+
+        return {
+            'resourceSpans': [{
+                'resource': {
+                    'attributes': [
+                        _otlp_attribute('service.name', SERVICE_NAME),
+                        _otlp_attribute('process.pid', os.getpid()),
+                    ]
+                },
+                'scopeSpans': [{
+                    'scope': {'name': 'app.tracing'},
+                    'spans': spans,
+                }]
+            }]
+        }
+
+    def get_stats(self) -> dict:
+        """获取追踪器统计信息"""
+        return {
+            'enabled': self.enabled,
+            'slow_threshold': self.slow_threshold,
+            'sample_rate': self.sample_rate,
+            'buffer_size': self._traces.maxlen,
+            'buffered': len(self._traces),
+            'started': self._started,
+            'kept_slow': self._kept_slow,
+            'kept_error': self._kept_error,
+            'kept_sampled': self._kept_sampled,
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def _create_default_tracer() -> Tracer:
+    try:
+        from app.config import Config
+        return Tracer(enabled=Config.TRACING_ENABLED,
+                      slow_threshold=Config.TRACING_SLOW_THRESHOLD,
+                      sample_rate=Config.TRACING_SAMPLE_RATE,
+                      buffer_size=Config.TRACING_BUFFER_SIZE)
+    except (ImportError, AttributeError):
+        return Tracer()
+
+
+# 全局链路追踪器
+tracer = _create_default_tracer()
@@ -163,7 +163,8 @@ def __init__(self):
         
         # 启动聚合处理线程
         self._running = True
-        self._aggregation_thread = threading.Thread(target=self._process_aggregation, daemon=True)
+        self._aggregation_thread = threading.Thread(target=self._process_aggregation, daemon=True,
+                                                    name="LogAggregator")
         self._aggregation_thread.start()
     
     def add_ui_handler(self, handler: Callable[[str], None]):
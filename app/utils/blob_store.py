@@ -0,0 +1,595 @@
+"""
+内容寻址文件存储
+按SHA-256存储上传的文件，相同内容只保存一份；支持带偏移校验的分块续传，
+发送文件接口可直接通过blob_id引用已上传的文件，无需调用方事先把文件拷贝到本机
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 流式读写的块大小
+CHUNK_SIZE = 1024 * 1024
+
+# blob_id格式：64位小写十六进制SHA-256
+_BLOB_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# 上传会话ID格式
+_UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# 分块上传会话所在的子目录，不由媒体回收器回收，过期会话由存储自行清理
+UPLOADS_DIR_NAME = '.uploads'
+
+# 默认的上传会话最长保留时间（秒），按最后一次写入计算
+DEFAULT_SESSION_MAX_AGE = 24 * 3600
+
+# 清理过期上传会话的最短间隔（秒）
+SESSION_SWEEP_INTERVAL = 600
+
+# 文件名中不允许出现的字符（Windows）
+_INVALID_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+class BlobStoreError(Exception):
+    """存储操作失败"""
+
+    def __init__(self, message: str, code: int = 4001, status_code: int = 400, data: Optional[dict] = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.status_code = status_code
+        self.data = data
+
+
+def is_valid_blob_id(blob_id: str) -> bool:
+    """判断blob_id格式是否合法"""
+    return bool(blob_id) and bool(_BLOB_ID_PATTERN.match(blob_id))
+
+
+def sanitize_filename(filename: Optional[str]) -> str:
+    """
+    清理文件名，去掉路径部分和非法字符
+
+    微信发送文件时会显示原始文件名，因此保留中文等字符，只替换Windows不允许的字符
+
+    Args:
+        filename (str): 原始文件名
+
+    Returns:
+        str: 可安全用于保存的文件名
+    """
+    name = os.path.basename((filename or '').replace('\\', '/'))
+    name = _INVALID_FILENAME_CHARS.sub('_', name).strip(' .')
+    return name[:200] or 'file'
+
+
+class BlobStore:
+    """
+    内容寻址文件存储
+
+    目录结构:
+        <root>/<sha256>/<文件名>      已完成的文件，每个目录只有一个文件
+        <root>/.uploads/<id>.part     分块上传中的数据
+        <root>/.uploads/<id>.json     分块上传会话信息
+    """
+
+    def __init__(self, root: str, max_bytes: Optional[int] = None,
+                 session_max_age: Optional[float] = DEFAULT_SESSION_MAX_AGE):
+        """
+        Args:
+            root (str): 存储根目录
+            max_bytes (int, optional): 单个文件大小上限（字节）
+            session_max_age (float, optional): 未完成的上传会话最长保留时间（秒），None表示不清理
+        """
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.session_max_age = session_max_age
+        self._uploads_dir = os.path.join(self.root, UPLOADS_DIR_NAME)
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        # 分块上传会话的增量哈希状态，服务重启后丢失时在完成阶段重新计算
+        self._hashers: Dict[str, 'hashlib._Hash'] = {}
+        # 每个会话一把锁，保证同一会话的分块按顺序写入
+        self._session_locks: Dict[str, threading.Lock] = {}
+
+        self._stats = {
+            'uploads': 0,
+            'deduplicated': 0,
+            'bytes_received': 0,
+            'bytes_stored': 0,
+            'expired_sessions': 0,
+        }
+
+    def ensure_dirs(self):
+        """确保存储目录存在"""
+        os.makedirs(self._uploads_dir, exist_ok=True)
+
+    # ---------- 查询 ----------
+
+    def get(self, blob_id: str) -> Optional[dict]:
+        """
+        获取已存储文件的信息
+
+        Args:
+            blob_id (str): 文件SHA-256
+
+        Returns:
+            dict: 文件信息，不存在时返回None
+        """
+        path = self.get_path(blob_id)
+        if not path:
+            return None
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        return {
+            'blob_id': blob_id,
+            'filename': os.path.basename(path),
+            'size': size,
+            'path': path,
+        }
+
+    def get_path(self, blob_id: str) -> Optional[str]:
+        """
+        获取已存储文件的本地路径
+
+        Args:
+            blob_id (str): 文件SHA-256
+
+        Returns:
+            str: 文件路径，不存在时返回None
+        """
+        if not is_valid_blob_id(blob_id):
+            return None
+        blob_dir = os.path.join(self.root, blob_id)
+        try:
+            with os.scandir(blob_dir) as it:
+                for entry in it:
+                    if entry.is_file():
+                        return entry.path
+        except OSError:
+            pass
+        return None
+
+    def resolve_paths(self, blob_ids: List[str]) -> Tuple[List[str], List[dict]]:
+        """
+        批量把blob_id解析为本地路径
+
+        Args:
+            blob_ids (list): blob_id列表
+
+        Returns:
+            tuple: (路径列表, 无法解析的blob_id及原因列表)
+        """
+        paths = []
+        missing = []
+        for blob_id in blob_ids or []:
+            path = self.get_path(blob_id)
+            if path:
+                self.touch(path)
+                paths.append(path)
+            else:
+                missing.append({
+                    'blob_id': blob_id,
+                    'reason': 'blob_id格式错误' if not is_valid_blob_id(blob_id) else '文件不存在或已过期'
+                })
+        return paths, missing
+
+    # ---------- 一次性上传 ----------
+
+    def put_stream(self, stream: BinaryIO, filename: str, expected_sha256: Optional[str] = None) -> dict:
+        """
+        从流中读取并存储文件，边读边计算哈希，不在内存中缓存整个文件
+
+        Args:
+            stream: 可读的二进制流
+            filename (str): 原始文件名
+            expected_sha256 (str, optional): 调用方声明的SHA-256，不一致时拒绝
+
+        Returns:
+            dict: 文件信息，包含deduplicated字段
+        """
+        self.ensure_dirs()
+        tmp_path = os.path.join(self._uploads_dir, f"{uuid.uuid4().hex}.tmp")
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if self.max_bytes is not None and size > self.max_bytes:
+                        raise BlobStoreError(f'文件大小超过{self.max_bytes // (1024 * 1024)}MB限制',
+                                             code=4002, status_code=413)
+                    f.write(chunk)
+                    hasher.update(chunk)
+            self._stats['bytes_received'] += size
+            return self._commit(tmp_path, hasher.hexdigest(), size, filename, expected_sha256)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    # ---------- 分块上传 ----------
+
+    def create_session(self, filename: str, total_size: Optional[int] = None,
+                       expected_sha256: Optional[str] = None) -> dict:
+        """
+        创建分块上传会话
+
+        如果声明的SHA-256已存在，直接返回已有文件信息，调用方无需再上传
+
+        Args:
+            filename (str): 原始文件名
+            total_size (int, optional): 文件总大小
+            expected_sha256 (str, optional): 文件SHA-256
+
+        Returns:
+            dict: 会话信息，或已存在文件的信息（exists为True）
+        """
+        if expected_sha256:
+            expected_sha256 = expected_sha256.lower()
+            if not is_valid_blob_id(expected_sha256):
+                raise BlobStoreError('sha256格式错误', code=1002)
+            existing = self.get(expected_sha256)
+            if existing:
+                self.touch(existing['path'])
+                self._stats['deduplicated'] += 1
+                existing['exists'] = True
+                return existing
+
+        if total_size is not None:
+            if total_size < 0:
+                raise BlobStoreError('size参数错误', code=1002)
+            if self.max_bytes is not None and total_size > self.max_bytes:
+                raise BlobStoreError(f'文件大小超过{self.max_bytes // (1024 * 1024)}MB限制',
+                                     code=4002, status_code=413)
+
+        self.ensure_dirs()
+        if self.session_max_age is not None and time.time() - self._last_sweep > SESSION_SWEEP_INTERVAL:
+            self._last_sweep = time.time()
+            self.expire_sessions(self.session_max_age)
+        upload_id = uuid.uuid4().hex
+        session = {
+            'upload_id': upload_id,
+            'filename': sanitize_filename(filename),
+            'total_size': total_size,
+            'sha256': expected_sha256,
+            'offset': 0,
+            'created_at': time.time(),
+        }
+        open(self._part_path(upload_id), 'wb').close()
+        self._write_session(session)
+        with self._lock:
+            self._hashers[upload_id] = hashlib.sha256()
+        session['exists'] = False
+        return session
+
+    def get_session(self, upload_id: str) -> dict:
+        """
+        获取分块上传会话，offset以磁盘上已写入的字节数为准
+
+        Args:
+            upload_id (str): 会话ID
+
+        Returns:
+            dict: 会话信息
+        """
+        session = self._read_session(upload_id)
+        try:
+            session['offset'] = os.path.getsize(self._part_path(upload_id))
+        except OSError:
+            raise BlobStoreError(f'上传会话不存在: {upload_id}', code=4004, status_code=404)
+        return session
+
+    def append_chunk(self, upload_id: str, offset: int, stream: BinaryIO) -> dict:
+        """
+        向会话追加一个分块
+
+        offset必须等于服务端已接收的字节数，否则返回409和当前offset，
+        调用方据此从正确位置续传
+
+        Args:
+            upload_id (str): 会话ID
+            offset (int): 本分块在文件中的起始偏移
+            stream: 分块数据流
+
+        Returns:
+            dict: 更新后的会话信息
+        """
+        with self._get_session_lock(upload_id):
+            session = self.get_session(upload_id)
+            current = session['offset']
+            if offset != current:
+                raise BlobStoreError(f'偏移量不匹配，期望: {current}, 实际: {offset}',
+                                     code=4003, status_code=409, data={'offset': current})
+
+            with self._lock:
+                hasher = self._hashers.get(upload_id)
+            # 服务重启后哈希状态丢失，且已有数据时，完成阶段再整体重新计算
+            if hasher is None and current == 0:
+                hasher = hashlib.sha256()
+                with self._lock:
+                    self._hashers[upload_id] = hasher
+
+            total_size = session.get('total_size')
+            # 本分块开始前的哈希状态，分块失败时与截断后的文件一起恢复
+            snapshot = hasher.copy() if hasher is not None else None
+            written = 0
+            try:
+                with open(self._part_path(upload_id), 'ab') as f:
+                    while True:
+                        chunk = stream.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        new_size = current + written + len(chunk)
+                        if (total_size is not None and new_size > total_size) or \
+                                (self.max_bytes is not None and new_size > self.max_bytes):
+                            raise BlobStoreError('上传数据超过声明的文件大小', code=4002, status_code=413,
+                                                 data={'offset': current})
+                        # 先写入再计入哈希，写入失败（例如磁盘已满）时哈希中不包含未落盘的数据
+                        f.write(chunk)
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        written += len(chunk)
+            except Exception:
+                # 丢弃本分块已写入的部分，保持offset与哈希状态一致，调用方可以从原offset重试
+                self._rollback_chunk(upload_id, current, snapshot)
+                raise
+
+            self._stats['bytes_received'] += written
+            session['offset'] = current + written
+            return session
+
+    def _rollback_chunk(self, upload_id: str, offset: int, snapshot):
+        """把.part截断到分块开始前的offset并恢复哈希状态，无法截断时完成阶段整体重新计算哈希"""
+        try:
+            with open(self._part_path(upload_id), 'r+b') as f:
+                f.truncate(offset)
+        except OSError as e:
+            logger.warning(f"回滚上传会话 {upload_id} 的分块失败: {str(e)}")
+            snapshot = None
+        with self._lock:
+            if snapshot is not None:
+                self._hashers[upload_id] = snapshot
+            else:
+                self._hashers.pop(upload_id, None)
+
+    def complete_session(self, upload_id: str) -> dict:
+        """
+        完成分块上传，校验大小和哈希后移入存储
+
+        Args:
+            upload_id (str): 会话ID
+
+        Returns:
+            dict: 文件信息，包含deduplicated字段
+        """
+        with self._get_session_lock(upload_id):
+            session = self.get_session(upload_id)
+            part_path = self._part_path(upload_id)
+            size = session['offset']
+            if session.get('total_size') is not None and size != session['total_size']:
+                raise BlobStoreError(f"上传未完成，已接收: {size}, 总大小: {session['total_size']}",
+                                     code=4003, status_code=409, data={'offset': size})
+
+            with self._lock:
+                hasher = self._hashers.pop(upload_id, None)
+            if hasher is not None:
+                digest = hasher.hexdigest()
+            else:
+                digest = self._hash_file(part_path)
+
+            try:
+                result = self._commit(part_path, digest, size, session['filename'], session.get('sha256'))
+            except BlobStoreError:
+                self._discard_session(upload_id)
+                raise
+            self._discard_session(upload_id)
+            return result
+
+    def abort_session(self, upload_id: str):
+        """取消分块上传会话"""
+        with self._get_session_lock(upload_id):
+            self._read_session(upload_id)
+            with self._lock:
+                self._hashers.pop(upload_id, None)
+            self._discard_session(upload_id)
+
+    def expire_sessions(self, max_age_seconds: float) -> int:
+        """
+        删除超过max_age_seconds没有写入的上传会话，.part和.json一起删除
+
+        正在写入或完成的会话（持有会话锁）跳过
+
+        Returns:
+            int: 删除的会话数
+        """
+        threshold = time.time() - max_age_seconds
+        try:
+            names = os.listdir(self._uploads_dir)
+        except OSError:
+            return 0
+
+        expired = 0
+        for name in names:
+            upload_id, ext = os.path.splitext(name)
+            if ext != '.json' or not _UPLOAD_ID_PATTERN.match(upload_id):
+                continue
+            lock = self._get_session_lock(upload_id)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                last_write = 0.0
+                for path in (self._part_path(upload_id), self._session_path(upload_id)):
+                    try:
+                        last_write = max(last_write, os.path.getmtime(path))
+                    except OSError:
+                        pass
+                if last_write >= threshold:
+                    continue
+                with self._lock:
+                    self._hashers.pop(upload_id, None)
+                self._discard_session(upload_id)
+                expired += 1
+            finally:
+                lock.release()
+        if expired:
+            self._stats['expired_sessions'] += expired
+            logger.info(f"已清理 {expired} 个过期的上传会话")
+        return expired
+
+    # ---------- 统计 ----------
+
+    def touch(self, path: str):
+        """更新文件访问时间，供按访问时间回收的媒体回收器使用"""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def get_stats(self) -> dict:
+        """获取存储统计信息"""
+        blob_count = 0
+        total_bytes = 0
+        pending = 0
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.name == UPLOADS_DIR_NAME:
+                        try:
+                            pending = sum(1 for name in os.listdir(entry.path) if name.endswith('.json'))
+                        except OSError:
+                            pass
+                        continue
+                    path = self.get_path(entry.name)
+                    if path:
+                        blob_count += 1
+                        try:
+                            total_bytes += os.path.getsize(path)
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        stats = dict(self._stats)
+        stats.update({
+            'root': self.root,
+            'blob_count': blob_count,
+            'total_bytes': total_bytes,
+            'pending_uploads': pending,
+        })
+        return stats
+
+    # ---------- 内部方法 ----------
+
+    def _commit(self, src_path: str, digest: str, size: int, filename: str,
+                expected_sha256: Optional[str]) -> dict:
+        """把已写入临时文件的数据移入存储，内容已存在时直接复用"""
+        if expected_sha256 and expected_sha256.lower() != digest:
+            raise BlobStoreError(f'SHA-256校验失败，声明: {expected_sha256}, 实际: {digest}',
+                                 code=4005, data={'sha256': digest})
+
+        self._stats['uploads'] += 1
+        with self._lock:
+            existing = self.get_path(digest)
+            if existing:
+                self._stats['deduplicated'] += 1
+                self.touch(existing)
+                deduplicated = True
+                path = existing
+            else:
+                blob_dir = os.path.join(self.root, digest)
+                os.makedirs(blob_dir, exist_ok=True)
+                path = os.path.join(blob_dir, sanitize_filename(filename))
+                shutil.move(src_path, path)
+                self._stats['bytes_stored'] += size
+                deduplicated = False
+
+        logger.info(f"文件已存储: {digest} ({size}字节){'，内容已存在' if deduplicated else ''}")
+        return {
+            'blob_id': digest,
+            'filename': os.path.basename(path),
+            'size': size,
+            'path': path,
+            'deduplicated': deduplicated,
+        }
+
+    def _hash_file(self, path: str) -> str:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self._uploads_dir, f"{upload_id}.part")
+
+    def _session_path(self, upload_id: str) -> str:
+        return os.path.join(self._uploads_dir, f"{upload_id}.json")
+
+    def _read_session(self, upload_id: str) -> dict:
+        if not upload_id or not _UPLOAD_ID_PATTERN.match(upload_id):
+            raise BlobStoreError(f'上传会话不存在: {upload_id}', code=4004, status_code=404)
+        try:
+            with open(self._session_path(upload_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise BlobStoreError(f'上传会话不存在: {upload_id}', code=4004, status_code=404)
+
+    def _write_session(self, session: dict):
+        with open(self._session_path(session['upload_id']), 'w', encoding='utf-8') as f:
+            json.dump(session, f, ensure_ascii=False)
+
+    def _discard_session(self, upload_id: str):
+        for path in (self._part_path(upload_id), self._session_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._session_locks.pop(upload_id, None)
+
+    def _get_session_lock(self, upload_id: str) -> threading.Lock:
+        if not upload_id or not _UPLOAD_ID_PATTERN.match(upload_id):
+            raise BlobStoreError(f'上传会话不存在: {upload_id}', code=4004, status_code=404)
+        with self._lock:
+            lock = self._session_locks.get(upload_id)
+            if lock is None:
+                lock = threading.Lock()
+                self._session_locks[upload_id] = lock
+            return lock
+
+
+def _create_default_store() -> BlobStore:
+    try:
+        from app.config_manager import API_DIR
+        root = API_DIR / "blobs"
+    except ImportError:
+        root = os.path.join("data", "api", "blobs")
+    try:
+        from app.config import Config
+        max_bytes = getattr(Config, 'UPLOAD_MAX_BYTES', None)
+        session_max_age = getattr(Config, 'UPLOAD_SESSION_MAX_AGE', DEFAULT_SESSION_MAX_AGE)
+    except ImportError:
+        max_bytes = None
+        session_max_age = DEFAULT_SESSION_MAX_AGE
+    return BlobStore(str(root), max_bytes=max_bytes, session_max_age=session_max_age)
+
+
+# 全局文件存储
+blob_store = _create_default_store()
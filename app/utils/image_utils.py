@@ -5,10 +5,11 @@
 
 import os
 import time
-import glob
 import logging
 from pathlib import Path
 
+from app.utils.media_watcher import MediaFileWatcher
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -21,66 +22,60 @@
     os.path.join(os.getcwd(), "data", "api", "temp")
 ]
 
-def find_actual_image_path(expected_path, created_after=None, max_wait_seconds=3):
+# 微信图片的默认文件名前缀，用于时间戳不完全匹配时的模糊查找
+WECHAT_IMAGE_PREFIX = "微信图片_"
+
+# 全局媒体文件监听器，首次查找时启动
+media_watcher = MediaFileWatcher(POSSIBLE_SAVE_LOCATIONS)
+
+def find_actual_image_path(expected_path, created_after=None, max_wait_seconds=3, exclude=None):
     """
     查找图片的实际保存路径
-    
+
+    通过后台媒体文件监听器按文件名查找，文件出现时立即返回，
+    不再对各个目录反复glob轮询
+
     Args:
         expected_path (str): wxauto返回的预期路径
         created_after (float, optional): 文件创建时间必须晚于此时间戳
         max_wait_seconds (int, optional): 最长等待时间（秒）
-        
+        exclude (set, optional): 需要排除的路径，避免多条消息匹配到同一个文件
+
     Returns:
         str: 实际的文件路径，如果找不到则返回原始路径
     """
     if not expected_path:
         logger.warning("预期路径为空")
         return expected_path
-    
+
     # 如果文件存在于预期位置，直接返回
     if os.path.exists(expected_path) and os.path.getsize(expected_path) > 0:
         logger.debug(f"文件存在于预期位置: {expected_path}")
         return expected_path
-    
+
     # 设置创建时间过滤器
     if created_after is None:
         created_after = time.time() - 60  # 默认查找最近60秒内创建的文件
-    
-    # 获取文件名
+
+    # 获取文件名，并确保预期目录也在监听范围内
     file_name = os.path.basename(expected_path)
-    
-    # 等待一段时间，看文件是否会出现
-    end_time = time.time() + max_wait_seconds
-    while time.time() < end_time:
-        # 检查预期位置
-        if os.path.exists(expected_path) and os.path.getsize(expected_path) > 0:
-            logger.debug(f"文件已出现在预期位置: {expected_path}")
-            return expected_path
-        
-        # 检查其他可能的位置
-        for location in POSSIBLE_SAVE_LOCATIONS:
-            if not os.path.exists(location):
-                continue
-                
-            # 精确匹配文件名
-            exact_path = os.path.join(location, file_name)
-            if os.path.exists(exact_path) and os.path.getsize(exact_path) > 0:
-                file_time = os.path.getmtime(exact_path)
-                if file_time >= created_after:
-                    logger.info(f"文件找到于替代位置: {exact_path}")
-                    return exact_path
-            
-            # 查找相似文件名（时间戳可能不完全匹配）
-            pattern = os.path.join(location, "微信图片_*.jpg")
-            for file_path in glob.glob(pattern):
-                file_time = os.path.getmtime(file_path)
-                if file_time >= created_after:
-                    logger.info(f"找到可能匹配的文件: {file_path}")
-                    return file_path
-        
-        # 短暂等待后重试
-        time.sleep(0.5)
-    
+    expected_dir = os.path.dirname(expected_path)
+    if expected_dir:
+        media_watcher.watch_directory(expected_dir)
+
+    actual_path = media_watcher.wait_for(
+        file_name,
+        created_after=created_after,
+        timeout=max_wait_seconds,
+        fallback_prefix=WECHAT_IMAGE_PREFIX,
+        fallback_suffixes=('.jpg',),
+        exclude=exclude
+    )
+    if actual_path:
+        if actual_path != expected_path:
+            logger.info(f"文件找到于替代位置: {actual_path}")
+        return actual_path
+
     # 如果找不到，记录警告并返回原始路径
     logger.warning(f"无法找到文件的实际位置，返回预期路径: {expected_path}")
     return expected_path
@@ -126,7 +121,10 @@ def process_image_paths(messages):
     
     # 记录开始时间
     start_time = time.time()
-    
+
+    # 已分配给前面消息的文件，避免同一批次的多张图片匹配到同一个文件
+    claimed_paths = set()
+
     # 处理每个聊天的消息
     for chat_name, msg_list in messages.items():
         for i, msg in enumerate(msg_list):
@@ -140,8 +138,10 @@ def process_image_paths(messages):
                 # 检查内容是否为图片路径
                 if "微信图片_" in msg.content and (msg.content.endswith(".jpg") or msg.content.endswith(".png")):
                     # 验证实际保存位置
-                    actual_path = find_actual_image_path(msg.content, created_after=start_time)
-                    
+                    actual_path = find_actual_image_path(msg.content, created_after=start_time,
+                                                         exclude=claimed_paths)
+                    claimed_paths.add(actual_path)
+
                     # 更新消息内容
                     if actual_path != msg.content:
                         logger.info(f"更新图片路径: {msg.content} -> {actual_path}")
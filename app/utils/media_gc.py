@@ -0,0 +1,406 @@
+"""
+媒体目录垃圾回收工具
+按目录配置容量上限和最长保留时间，后台定期清理临时图片、文件和二维码，
+优先淘汰最久未被访问的文件；正在被请求使用的文件通过引用计数固定，不会被删除
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 默认清理间隔（秒）
+DEFAULT_GC_INTERVAL = 300
+
+# 新写入文件的保护期（秒），避免删除正在写入或刚返回给调用方的文件
+DEFAULT_GRACE_SECONDS = 120
+
+
+class DirectoryBudget:
+    """单个目录的回收预算"""
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None,
+                 max_age_seconds: Optional[float] = None, recursive: bool = True,
+                 exclude: Iterable[str] = ()):
+        """
+        Args:
+            path (str): 目录路径
+            max_bytes (int, optional): 目录总大小上限（字节），None表示不限制
+            max_age_seconds (float, optional): 文件最长保留时间（秒），按最后访问时间计算，None表示不限制
+            recursive (bool): 是否包含子目录
+            exclude (list): 不回收的子目录（相对于path），由其他组件自行管理
+        """
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.recursive = recursive
+        self.exclude = frozenset(os.path.join(self.path, name) for name in exclude)
+
+        # 最近一次回收的统计
+        self.last_run = None
+        self.file_count = 0
+        self.total_bytes = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.skipped_pinned = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'path': self.path,
+            'max_bytes': self.max_bytes,
+            'max_age_seconds': self.max_age_seconds,
+            'file_count': self.file_count,
+            'total_bytes': self.total_bytes,
+            'evicted_files': self.evicted_files,
+            'evicted_bytes': self.evicted_bytes,
+            'skipped_pinned': self.skipped_pinned,
+            'exclude': sorted(self.exclude),
+            'last_run': self.last_run,
+        }
+
+
+class MediaGarbageCollector:
+    """
+    媒体目录垃圾回收器
+
+    每个目录独立执行两步回收：
+    1. 删除最后访问时间超过max_age_seconds的文件
+    2. 目录总大小仍超过max_bytes时，按最后访问时间从旧到新删除，直到低于上限
+
+    最后访问时间取文件atime、mtime与进程内记录的访问时间（touch）三者的最大值，
+    以兼容关闭了atime更新的文件系统
+    """
+
+    def __init__(self, interval: float = DEFAULT_GC_INTERVAL,
+                 grace_seconds: float = DEFAULT_GRACE_SECONDS):
+        """
+        Args:
+            interval (float): 后台清理间隔（秒）
+            grace_seconds (float): 新文件保护期（秒）
+        """
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+
+        self._budgets: Dict[str, DirectoryBudget] = {}
+        self._pins: Dict[str, int] = {}
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._runs = 0
+        self._total_evicted_files = 0
+        self._total_evicted_bytes = 0
+        self._errors = 0
+        self._last_duration = None
+
+    def add_directory(self, path: str, max_bytes: Optional[int] = None,
+                      max_age_seconds: Optional[float] = None, recursive: bool = True,
+                      exclude: Iterable[str] = ()):
+        """
+        添加需要回收的目录，同一目录重复添加时更新其预算
+
+        Args:
+            path (str): 目录路径
+            max_bytes (int, optional): 目录总大小上限（字节）
+            max_age_seconds (float, optional): 文件最长保留时间（秒）
+            recursive (bool): 是否包含子目录
+            exclude (list): 不回收的子目录名称（相对于path），例如上传存储的.uploads
+        """
+        budget = DirectoryBudget(path, max_bytes, max_age_seconds, recursive, exclude)
+        with self._lock:
+            self._budgets[budget.path] = budget
+        logger.debug(f"媒体回收目录: {budget.path}, 上限: {max_bytes}字节, 保留: {max_age_seconds}秒")
+
+    def start(self):
+        """启动后台回收线程"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="MediaGC")
+            self._thread.start()
+        logger.info(f"媒体目录回收线程已启动，间隔: {self.interval}秒")
+
+    def stop(self):
+        """停止后台回收线程"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout=5)
+        self._thread = None
+
+    def pin(self, path: str):
+        """
+        固定文件或目录，固定期间其下的文件不会被回收，可重复调用（引用计数）
+
+        Args:
+            path (str): 文件或目录路径
+        """
+        if not path:
+            return
+        key = os.path.abspath(path)
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, path: str):
+        """
+        释放一次固定
+
+        Args:
+            path (str): 文件或目录路径
+        """
+        if not path:
+            return
+        key = os.path.abspath(path)
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+        # 释放时视为一次访问，刚用完的文件不应立即被淘汰
+        self.touch(path)
+
+    @contextmanager
+    def pinned(self, *paths: Optional[str]):
+        """
+        在with块内固定一个或多个路径
+
+        Args:
+            *paths: 文件或目录路径，None和空字符串会被忽略
+        """
+        valid_paths = [p for p in paths if p]
+        for p in valid_paths:
+            self.pin(p)
+        try:
+            yield
+        finally:
+            for p in valid_paths:
+                self.unpin(p)
+
+    def touch(self, path: str):
+        """
+        记录文件在进程内被访问，用于LRU排序
+
+        Args:
+            path (str): 文件路径
+        """
+        if not path:
+            return
+        with self._lock:
+            self._touched[os.path.abspath(path)] = time.time()
+
+    def is_pinned(self, path: str) -> bool:
+        """判断文件本身或其任一上级目录是否被固定"""
+        key = os.path.abspath(path)
+        with self._lock:
+            if not self._pins:
+                return False
+            for pinned_path in self._pins:
+                if key == pinned_path or key.startswith(pinned_path.rstrip(os.sep) + os.sep):
+                    return True
+        return False
+
+    def collect(self) -> dict:
+        """
+        立即对所有目录执行一次回收
+
+        Returns:
+            dict: 本次回收删除的文件数和字节数
+        """
+        start = time.time()
+        evicted_files = 0
+        evicted_bytes = 0
+
+        with self._lock:
+            budgets = list(self._budgets.values())
+
+        for budget in budgets:
+            try:
+                files, count = self._collect_directory(budget)
+                evicted_files += files
+                evicted_bytes += count
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"回收目录失败: {budget.path} - {str(e)}")
+
+        self._prune_touched()
+
+        self._runs += 1
+        self._total_evicted_files += evicted_files
+        self._total_evicted_bytes += evicted_bytes
+        self._last_duration = time.time() - start
+
+        if evicted_files:
+            logger.info(f"媒体目录回收完成: 删除 {evicted_files} 个文件, 释放 {evicted_bytes / (1024 * 1024):.2f}MB, "
+                        f"耗时 {self._last_duration:.2f}秒")
+        return {'evicted_files': evicted_files, 'evicted_bytes': evicted_bytes}
+
+    def get_stats(self) -> dict:
+        """获取回收统计信息"""
+        with self._lock:
+            directories = [budget.to_dict() for budget in self._budgets.values()]
+            pinned = len(self._pins)
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'interval': self.interval,
+            'runs': self._runs,
+            'evicted_files': self._total_evicted_files,
+            'evicted_bytes': self._total_evicted_bytes,
+            'errors': self._errors,
+            'last_duration': self._last_duration,
+            'pinned_paths': pinned,
+            'directories': directories,
+        }
+
+    def _collect_directory(self, budget: DirectoryBudget):
+        """对单个目录执行回收，返回(删除文件数, 删除字节数)"""
+        now = time.time()
+        entries = self._scan(budget.path, budget.recursive, budget.exclude)
+
+        total_bytes = sum(size for _, size, _ in entries)
+        evicted_files = 0
+        evicted_bytes = 0
+        skipped_pinned = 0
+
+        # 最久未访问的排在最前
+        entries.sort(key=lambda item: item[2])
+        survivors = []
+
+        for path, size, last_access in entries:
+            expired = budget.max_age_seconds is not None and now - last_access > budget.max_age_seconds
+            over_budget = budget.max_bytes is not None and total_bytes > budget.max_bytes
+            if not expired and not over_budget:
+                survivors.append(path)
+                continue
+            if now - last_access < self.grace_seconds:
+                survivors.append(path)
+                continue
+            if self.is_pinned(path):
+                skipped_pinned += 1
+                survivors.append(path)
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Windows下被其他进程占用的文件无法删除，下次再试
+                logger.debug(f"删除文件失败: {path} - {str(e)}")
+                survivors.append(path)
+                continue
+            total_bytes -= size
+            evicted_files += 1
+            evicted_bytes += size
+
+        if evicted_files and budget.recursive:
+            self._remove_empty_dirs(budget.path, budget.exclude)
+
+        budget.last_run = now
+        budget.file_count = len(survivors)
+        budget.total_bytes = total_bytes
+        budget.evicted_files += evicted_files
+        budget.evicted_bytes += evicted_bytes
+        budget.skipped_pinned = skipped_pinned
+        return evicted_files, evicted_bytes
+
+    def _scan(self, directory: str, recursive: bool, exclude: frozenset = frozenset()) -> List[tuple]:
+        """扫描目录，返回[(路径, 大小, 最后访问时间)]"""
+        results = []
+        if not os.path.isdir(directory):
+            return results
+
+        with self._lock:
+            touched = dict(self._touched)
+
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if recursive and os.path.abspath(entry.path) not in exclude:
+                                    stack.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        path = os.path.abspath(entry.path)
+                        last_access = max(st.st_atime, st.st_mtime, touched.get(path, 0))
+                        results.append((path, st.st_size, last_access))
+            except OSError as e:
+                logger.debug(f"扫描目录失败: {current} - {str(e)}")
+        return results
+
+    def _remove_empty_dirs(self, root: str, exclude: frozenset = frozenset()):
+        """删除回收后留下的空子目录，根目录本身和排除的子目录保留"""
+        for current, _, files in os.walk(root, topdown=False):
+            if os.path.abspath(current) == root or files:
+                continue
+            if any(current == path or current.startswith(path + os.sep) for path in exclude):
+                continue
+            if self.is_pinned(current):
+                continue
+            try:
+                # os.walk的子目录列表在删除子目录之前生成，按目录当前的内容判断是否为空
+                if os.listdir(current):
+                    continue
+                os.rmdir(current)
+            except OSError:
+                pass
+
+    def _prune_touched(self):
+        """清理已不存在文件的访问记录，避免内存无限增长"""
+        with self._lock:
+            stale = [path for path in self._touched if not os.path.exists(path)]
+            for path in stale:
+                self._touched.pop(path, None)
+
+    def _run(self):
+        """后台回收循环"""
+        # 启动后稍等片刻再执行第一次回收，避免拖慢服务启动
+        if self._stop_event.wait(min(30, self.interval)):
+            return
+        while not self._stop_event.is_set():
+            try:
+                self.collect()
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"媒体目录回收出错: {str(e)}")
+            if self._stop_event.wait(self.interval):
+                break
+
+
+def download_dirs(save_path: Optional[str] = None) -> List[str]:
+    """
+    下载期间需要固定的路径
+
+    Args:
+        save_path (str, optional): 调用方指定的保存路径
+
+    Returns:
+        list: 指定了save_path时为该路径，否则为wxauto的默认保存目录（已重定向到TEMP_DIR）和未重定向时使用的wxauto文件目录
+    """
+    if save_path:
+        return [save_path]
+    directories = [os.path.join(os.getcwd(), "wxauto文件")]
+    try:
+        from app import config_manager
+        directories.insert(0, str(config_manager.TEMP_DIR))
+    except ImportError:
+        pass
+    return directories
+
+
+# 全局媒体回收器，由create_app按配置添加目录并启动
+media_gc = MediaGarbageCollector()
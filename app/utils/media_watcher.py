@@ -0,0 +1,609 @@
+"""
+媒体文件监听工具
+后台监听图片/文件保存目录，在内存中维护最近创建的媒体文件索引，
+用于替代find_actual_image_path中反复glob + sleep的轮询查找
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 需要索引的媒体文件扩展名
+MEDIA_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp',
+    '.mp4', '.mov', '.avi',
+    '.mp3', '.amr', '.silk', '.wav',
+)
+
+# 索引中保留的最大文件数量
+DEFAULT_MAX_ENTRIES = 5000
+
+# 索引中保留文件的最长时间（秒），超过后即使未被查找也会被淘汰
+DEFAULT_MAX_AGE_SECONDS = 600
+
+# 轮询模式下有等待方时的扫描间隔（秒）
+DEFAULT_POLL_INTERVAL = 0.5
+
+# 轮询模式下没有等待方时的扫描间隔（秒），等待方出现时立即扫描
+DEFAULT_IDLE_POLL_INTERVAL = 30
+
+# 查找时临时加入的目录（例如按月份、按聊天的保存目录）最多同时监听的数量，超过后淘汰最久未使用的目录
+DEFAULT_MAX_EXTRA_DIRECTORIES = 32
+
+# inotify事件常量
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_WATCH_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_MODIFY |
+                  _IN_DELETE | _IN_MOVED_FROM | _IN_DELETE_SELF)
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class MediaFileRecord:
+    """索引中的媒体文件记录"""
+
+    __slots__ = ('name', 'path', 'mtime', 'size', 'seen_at')
+
+    def __init__(self, name: str, path: str, mtime: float, size: int):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.seen_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'path': self.path,
+            'mtime': self.mtime,
+            'size': self.size,
+        }
+
+
+class _PollingBackend:
+    """
+    轮询后端：定期scandir比较目录内容，适用于所有平台
+
+    只有等待方存在时按interval扫描；空闲时按idle_interval扫描，
+    避免在Windows上长期每0.5秒扫描一次文档、图片和下载目录
+    """
+
+    name = 'polling'
+
+    def __init__(self, interval: float = DEFAULT_POLL_INTERVAL,
+                 idle_interval: float = DEFAULT_IDLE_POLL_INTERVAL):
+        self.interval = interval
+        self.idle_interval = max(idle_interval, interval)
+        self.scans = 0
+        # 目录 -> {文件路径: (mtime, size)}
+        self._directories: Dict[str, Dict[str, tuple]] = {}
+        self._active = False
+        self._wake = threading.Event()
+
+    def add_directory(self, directory: str) -> bool:
+        if directory not in self._directories:
+            # 立即建立基线，之后出现的文件都会在扫描时被发现，已有文件由seed阶段负责索引
+            self._directories[directory] = self._scan(directory)
+        return True
+
+    def remove_directory(self, directory: str):
+        self._directories.pop(directory, None)
+
+    @staticmethod
+    def _scan(directory: str) -> Dict[str, tuple]:
+        current = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(MEDIA_EXTENSIONS):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    current[entry.path] = (stat.st_mtime, stat.st_size)
+        except OSError:
+            # 目录不存在或暂时无法访问，下一轮再试
+            pass
+        return current
+
+    def set_active(self, active: bool):
+        """有等待方时切换到快速扫描，并立即扫描一轮"""
+        self._active = active
+        if active:
+            self._wake.set()
+
+    def wake(self):
+        """结束当前的等待，例如停止监听时"""
+        self._wake.set()
+
+    def poll(self, stop_event: threading.Event):
+        """
+        扫描一轮所有目录
+
+        Returns:
+            list: [(事件类型, 完整路径)]，事件类型为'update'或'delete'
+        """
+        if self._active:
+            stop_event.wait(self.interval)
+        else:
+            self._wake.wait(self.idle_interval)
+        self._wake.clear()
+        if stop_event.is_set():
+            return []
+
+        self.scans += 1
+        events = []
+        for directory, known in list(self._directories.items()):
+            current = self._scan(directory)
+            for path, signature in current.items():
+                if known.get(path) != signature:
+                    events.append(('update', path))
+            for path in known.keys() - current.keys():
+                events.append(('delete', path))
+            # 扫描期间目录可能已被移除
+            if directory in self._directories:
+                self._directories[directory] = current
+        return events
+
+    def close(self):
+        self._directories.clear()
+        self._wake.set()
+
+
+class _InotifyBackend:
+    """inotify后端：仅在Linux可用，目录无变化时不产生任何系统调用开销"""
+
+    name = 'inotify'
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1失败: {os.strerror(err)}")
+        self._watches: Dict[int, str] = {}
+        self._pending: Set[str] = set()
+        self._last_retry = 0.0
+
+    def add_directory(self, directory: str) -> bool:
+        if directory in self._watches.values():
+            return True
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _IN_WATCH_MASK)
+        if wd < 0:
+            # 目录尚不存在，稍后重试
+            self._pending.add(directory)
+            return False
+        self._watches[wd] = directory
+        self._pending.discard(directory)
+        return True
+
+    def remove_directory(self, directory: str):
+        self._pending.discard(directory)
+        for wd, watched in list(self._watches.items()):
+            if watched == directory:
+                # 之后收到的IN_IGNORED事件找不到对应目录，直接忽略
+                del self._watches[wd]
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def set_active(self, active: bool):
+        # 内核推送事件，不需要根据等待方调整
+        pass
+
+    def wake(self):
+        pass
+
+    def poll(self, stop_event: threading.Event):
+        events = []
+
+        # 对尚未创建的目录定期重试添加监听
+        if self._pending and time.time() - self._last_retry > 2:
+            self._last_retry = time.time()
+            for directory in list(self._pending):
+                if self.add_directory(directory):
+                    events.append(('rescan', directory))
+
+        try:
+            readable, _, _ = select.select([self._fd], [], [], 0.5)
+        except (OSError, ValueError):
+            return events
+        if not readable:
+            return events
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return events
+            raise
+
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            wd, mask, _cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            raw_name = data[offset + _INOTIFY_EVENT.size:offset + _INOTIFY_EVENT.size + length]
+            offset += _INOTIFY_EVENT.size + length
+
+            if mask & _IN_Q_OVERFLOW:
+                # 事件队列溢出，整体重新扫描
+                for directory in list(self._watches.values()):
+                    events.append(('rescan', directory))
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+
+            if mask & (_IN_DELETE_SELF | _IN_IGNORED):
+                # 被监听的目录本身被删除，转为待重试
+                self._watches.pop(wd, None)
+                self._pending.add(directory)
+                continue
+
+            name = os.fsdecode(raw_name.rstrip(b'\0'))
+            if not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & (_IN_DELETE | _IN_MOVED_FROM):
+                events.append(('delete', path))
+            else:
+                events.append(('update', path))
+        return events
+
+    def close(self):
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        self._watches.clear()
+
+
+def _create_backend(poll_interval: float, idle_poll_interval: float = DEFAULT_IDLE_POLL_INTERVAL):
+    """优先使用inotify，不可用时回退到轮询"""
+    if sys.platform.startswith('linux'):
+        try:
+            return _InotifyBackend()
+        except Exception as e:
+            logger.debug(f"inotify不可用，回退到轮询模式: {str(e)}")
+    return _PollingBackend(poll_interval, idle_poll_interval)
+
+
+class MediaFileWatcher:
+    """
+    媒体文件监听器
+
+    后台线程监听一组目录，把新出现的媒体文件按文件名记录到内存索引中。
+    查找按文件名是O(1)的字典访问；等待文件出现时使用条件变量，
+    文件一旦被索引立即唤醒等待方，不再需要sleep轮询。
+
+    构造时传入的目录一直监听；之后通过watch_directory加入的目录最多保留max_extra_directories个，
+    超过后停止监听最久未使用的目录，长期运行时监听数量不会随按月份、按聊天的保存目录无限增长。
+    """
+
+    def __init__(self, directories: Optional[Iterable[str]] = None,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+                 backend=None, idle_poll_interval: float = DEFAULT_IDLE_POLL_INTERVAL,
+                 max_extra_directories: int = DEFAULT_MAX_EXTRA_DIRECTORIES):
+        self._directories: List[str] = []
+        # 查找时加入的目录，按最近使用排序
+        self._extra_directories: "OrderedDict[str, None]" = OrderedDict()
+        self._max_extra_directories = max(int(max_extra_directories), 1)
+        self._poll_interval = poll_interval
+        self._idle_poll_interval = idle_poll_interval
+        self._max_entries = max_entries
+        self._max_age_seconds = max_age_seconds
+        self._backend = backend
+
+        # 文件名 -> 路径 -> 记录，同名文件可能出现在多个目录中
+        self._index: Dict[str, Dict[str, MediaFileRecord]] = {}
+        # 按索引顺序排列的记录，用于淘汰和模糊匹配
+        self._recent: "OrderedDict[str, MediaFileRecord]" = OrderedDict()
+
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # 正在wait_for中等待的调用方数量，轮询后端据此决定扫描频率
+        self._waiters = 0
+
+        self._stats = {
+            'events': 0,
+            'lookups': 0,
+            'hits': 0,
+            'waits': 0,
+            'wait_timeouts': 0,
+            'evicted_directories': 0,
+        }
+
+        for directory in directories or []:
+            directory = os.path.abspath(directory)
+            if directory not in self._directories:
+                self._directories.append(directory)
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    def start(self):
+        """启动后台监听线程（重复调用无副作用）"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            if self._backend is None:
+                self._backend = _create_backend(self._poll_interval, self._idle_poll_interval)
+            for directory in self._directories + list(self._extra_directories):
+                self._backend.add_directory(directory)
+                self._seed_directory(directory)
+
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="MediaFileWatcher")
+            self._thread.start()
+            logger.info(f"媒体文件监听已启动，模式: {self._backend.name}，目录数: {len(self._directories)}")
+
+    def ensure_started(self):
+        """确保监听线程已运行"""
+        if not self._thread or not self._thread.is_alive():
+            self.start()
+
+    def stop(self):
+        """停止后台监听线程"""
+        self._stop_event.set()
+        if self._backend:
+            self._backend.wake()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+        if self._backend:
+            self._backend.close()
+            self._backend = None
+        with self._cond:
+            self._cond.notify_all()
+
+    def watch_directory(self, directory: str):
+        """
+        添加一个需要监听的目录（目录可以暂时不存在）
+
+        超过max_extra_directories个时停止监听最久未使用的目录，已索引的文件按原有规则淘汰
+        """
+        if not directory:
+            return
+        directory = os.path.abspath(directory)
+        with self._start_lock:
+            if directory in self._directories:
+                return
+            if directory in self._extra_directories:
+                self._extra_directories.move_to_end(directory)
+                return
+            self._extra_directories[directory] = None
+            if self._backend is not None:
+                self._backend.add_directory(directory)
+                self._seed_directory(directory)
+            while len(self._extra_directories) > self._max_extra_directories:
+                evicted, _ = self._extra_directories.popitem(last=False)
+                if self._backend is not None:
+                    self._backend.remove_directory(evicted)
+                self._stats['evicted_directories'] += 1
+                logger.debug(f"停止监听最久未使用的目录: {evicted}")
+
+    # ------------------------------------------------------------------
+    # 查找接口
+    # ------------------------------------------------------------------
+    def lookup(self, name: str, created_after: Optional[float] = None,
+               exclude: Optional[Set[str]] = None) -> Optional[str]:
+        """
+        按文件名查找已索引的文件
+
+        Args:
+            name: 文件名（不含目录）
+            created_after: 文件修改时间必须不早于此时间戳
+            exclude: 需要排除的路径集合
+
+        Returns:
+            str: 文件路径，找不到时返回None
+        """
+        with self._cond:
+            self._stats['lookups'] += 1
+            record = self._find_exact(name, created_after, exclude)
+            if record:
+                self._stats['hits'] += 1
+                return record.path
+            return None
+
+    def wait_for(self, name: str, created_after: Optional[float] = None,
+                 timeout: float = 3, fallback_prefix: Optional[str] = None,
+                 fallback_suffixes: Iterable[str] = (),
+                 exclude: Optional[Set[str]] = None) -> Optional[str]:
+        """
+        等待指定文件名的文件出现
+
+        优先精确匹配文件名；如果指定了fallback_prefix，则在精确匹配失败时
+        返回最近出现的、文件名以该前缀开头且扩展名匹配的文件。
+
+        Args:
+            name: 文件名（不含目录）
+            created_after: 文件修改时间必须不早于此时间戳
+            timeout: 最长等待时间（秒）
+            fallback_prefix: 模糊匹配的文件名前缀，例如"微信图片_"
+            fallback_suffixes: 模糊匹配允许的扩展名
+            exclude: 需要排除的路径集合（例如已分配给其他消息的文件）
+
+        Returns:
+            str: 文件路径，超时返回None
+        """
+        self.ensure_started()
+        suffixes = tuple(s.lower() for s in fallback_suffixes)
+        deadline = time.time() + max(0, timeout)
+
+        with self._cond:
+            self._stats['waits'] += 1
+            self._set_waiting(1)
+            try:
+                while True:
+                    record = self._find_exact(name, created_after, exclude)
+                    if record is None and fallback_prefix:
+                        record = self._find_by_prefix(fallback_prefix, suffixes, created_after, exclude)
+                    if record is not None:
+                        self._stats['hits'] += 1
+                        return record.path
+
+                    remaining = deadline - time.time()
+                    if remaining <= 0 or self._stop_event.is_set():
+                        self._stats['wait_timeouts'] += 1
+                        return None
+                    self._cond.wait(remaining)
+            finally:
+                self._set_waiting(-1)
+
+    def get_recent(self, limit: int = 50) -> List[dict]:
+        """获取最近索引的文件（按时间倒序）"""
+        with self._cond:
+            records = list(self._recent.values())[-limit:]
+        return [record.to_dict() for record in reversed(records)]
+
+    def get_stats(self) -> dict:
+        """获取监听器统计信息"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['indexed_files'] = len(self._recent)
+            stats['waiters'] = self._waiters
+        stats['backend'] = self._backend.name if self._backend else None
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        stats['directories'] = list(self._directories)
+        stats['extra_directories'] = list(self._extra_directories)
+        return stats
+
+    # ------------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------------
+    def _set_waiting(self, delta: int):
+        """调整等待方数量，调用方持有self._cond"""
+        self._waiters += delta
+        backend = self._backend
+        if backend is not None and self._waiters == (1 if delta > 0 else 0):
+            backend.set_active(self._waiters > 0)
+
+    def _find_exact(self, name, created_after, exclude) -> Optional[MediaFileRecord]:
+        candidates = self._index.get(name)
+        if not candidates:
+            return None
+        best = None
+        for record in candidates.values():
+            if created_after is not None and record.mtime < created_after:
+                continue
+            if exclude and record.path in exclude:
+                continue
+            if best is None or record.mtime > best.mtime:
+                best = record
+        return best
+
+    def _find_by_prefix(self, prefix, suffixes, created_after, exclude) -> Optional[MediaFileRecord]:
+        # 从最新的记录往前找，最近的文件最可能是目标
+        for record in reversed(self._recent.values()):
+            if created_after is not None and record.mtime < created_after:
+                continue
+            if not record.name.startswith(prefix):
+                continue
+            if suffixes and not record.name.lower().endswith(suffixes):
+                continue
+            if exclude and record.path in exclude:
+                continue
+            return record
+        return None
+
+    def _seed_directory(self, directory: str):
+        """启动或新增目录时，把最近修改过的文件补充进索引"""
+        threshold = time.time() - self._max_age_seconds
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(MEDIA_EXTENSIONS):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if stat.st_mtime >= threshold and stat.st_size > 0:
+                        self._add_record(entry.name, entry.path, stat.st_mtime, stat.st_size)
+        except OSError:
+            pass
+
+    def _handle_event(self, kind: str, path: str):
+        if kind == 'rescan':
+            self._seed_directory(path)
+            return
+
+        name = os.path.basename(path)
+        if kind == 'delete':
+            with self._cond:
+                self._remove_record(name, path)
+            return
+
+        if not name.lower().endswith(MEDIA_EXTENSIONS):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        # 文件刚创建时大小可能为0，等写入完成的事件再索引
+        if stat.st_size > 0:
+            self._add_record(name, path, stat.st_mtime, stat.st_size)
+
+    def _add_record(self, name: str, path: str, mtime: float, size: int):
+        with self._cond:
+            record = MediaFileRecord(name, path, mtime, size)
+            self._index.setdefault(name, {})[path] = record
+            self._recent.pop(path, None)
+            self._recent[path] = record
+            self._stats['events'] += 1
+            self._evict()
+            self._cond.notify_all()
+
+    def _remove_record(self, name: str, path: str):
+        candidates = self._index.get(name)
+        if candidates:
+            candidates.pop(path, None)
+            if not candidates:
+                del self._index[name]
+        self._recent.pop(path, None)
+
+    def _evict(self):
+        threshold = time.time() - self._max_age_seconds
+        while self._recent:
+            path, record = next(iter(self._recent.items()))
+            if len(self._recent) <= self._max_entries and record.seen_at >= threshold:
+                break
+            self._remove_record(record.name, path)
+
+    def _run(self):
+        backend = self._backend
+        while not self._stop_event.is_set() and backend is not None:
+            try:
+                for kind, path in backend.poll(self._stop_event):
+                    self._handle_event(kind, path)
+                with self._cond:
+                    self._evict()
+            except Exception as e:
+                logger.warning(f"媒体文件监听异常: {str(e)}")
+                self._stop_event.wait(1)
+        logger.debug("媒体文件监听线程已退出")
@@ -1,22 +1,24 @@
 import threading
-import time
 import pythoncom
 from app.unified_logger import logger
 from app.config import Config
 from app.wechat_adapter import wechat_adapter
+from app.health import health_monitor
+from app.accounts import AccountLocal, current_account_id, use_account
 
 class WeChatManager:
     def __init__(self):
         self._instance = None
         self._lock = threading.Lock()
-        self._last_check = 0
-        self._check_interval = Config.WECHAT_CHECK_INTERVAL
-        self._reconnect_delay = Config.WECHAT_RECONNECT_DELAY
         self._max_retry = Config.WECHAT_MAX_RETRY
         self._monitor_thread = None
         self._running = False
-        self._retry_count = 0
-        self._adapter = wechat_adapter
+        self._wake_event = threading.Event()
+        # 按账号创建，适配器和健康状态都属于创建时的账号
+        self._account_id = current_account_id()
+        self._adapter = wechat_adapter.get()
+        # 接口调用连续失败时立即唤醒监控线程探测
+        health_monitor.set_probe_trigger(self._wake_event.set)
 
     def initialize(self):
         """初始化微信实例"""
@@ -26,7 +28,7 @@ def initialize(self):
                 self._instance = self._adapter.get_instance()
                 if Config.WECHAT_AUTO_RECONNECT:
                     self._start_monitor()
-                self._retry_count = 0
+                health_monitor.record_probe(True)
                 # 暂时禁用日志管理器更新，避免递归调用
                 lib_name = self._adapter.get_lib_name()
                 # logger.set_lib_name(lib_name)
@@ -39,14 +41,13 @@ def get_instance(self):
         return self._adapter
 
     def check_connection(self):
-        """检查微信连接状态"""
+        """检查微信连接状态，结果会更新健康状态"""
         if not self._instance:
             return False
 
         try:
             result = self._adapter.check_connection()
-            if result:
-                self._retry_count = 0  # 重置重试计数
+            health_monitor.record_probe(result, None if result else '连接检查失败')
             return result
         except Exception as e:
             error_str = str(e)
@@ -55,33 +56,68 @@ def check_connection(self):
                 logger.debug(f"微信连接检查失败（控件访问异常）: {error_str}")
             else:
                 logger.error(f"微信连接检查失败: {error_str}")
+            health_monitor.record_probe(False, error_str)
             return False
 
     def _monitor_connection(self):
-        """监控微信连接状态"""
+        """
+        监控微信连接状态
+
+        探测间隔由健康状态决定：近期有成功的接口调用时跳过探测，出错后缩短间隔，稳定后逐步放大；
+        断开后按带抖动的指数退避持续重连，不设次数上限
+        """
         # 为监控线程初始化COM环境
         pythoncom.CoInitialize()
 
+        with use_account(self._account_id):
+            self._monitor_loop()
+
+        # 监控线程结束时清理COM环境
+        pythoncom.CoUninitialize()
+
+    def _monitor_loop(self):
         while self._running:
             try:
-                if not self.check_connection():
-                    if self._retry_count < self._max_retry:
-                        logger.warning(f"微信连接已断开，正在尝试重新连接 (尝试 {self._retry_count + 1}/{self._max_retry})...")
-                        self._instance = None
-                        self.initialize()
-                        self._retry_count += 1
-                        time.sleep(self._reconnect_delay)  # 重连等待时间
-                    else:
-                        logger.error("重连次数超过最大限制，停止自动重连")
-                        self._running = False
+                if self._instance and not health_monitor.should_probe():
+                    delay = health_monitor.next_probe_delay()
+                elif self.check_connection():
+                    delay = health_monitor.next_probe_delay()
                 else:
-                    time.sleep(self._check_interval)
+                    delay = self._reconnect()
             except Exception as e:
                 logger.error(f"连接监控异常: {str(e)}")
-                time.sleep(self._check_interval)
+                delay = health_monitor.next_probe_delay()
 
-        # 监控线程结束时清理COM环境
-        pythoncom.CoUninitialize()
+            self._wake_event.wait(delay)
+            self._wake_event.clear()
+
+    def _reconnect(self) -> float:
+        """
+        尝试重新连接一次
+
+        Returns:
+            float: 下一次检查前的等待时间（秒）
+        """
+        attempt = health_monitor.reconnect_attempts + 1
+        if attempt <= self._max_retry:
+            logger.warning(f"微信连接已断开，正在尝试重新连接 (第 {attempt} 次)...")
+        elif attempt == self._max_retry + 1:
+            logger.error(f"已连续重连失败 {self._max_retry} 次，将继续按退避间隔重连")
+        else:
+            logger.debug(f"正在尝试重新连接 (第 {attempt} 次)...")
+
+        self._instance = None
+        try:
+            if self.initialize() and self.check_connection():
+                logger.info("微信重新连接成功")
+                return health_monitor.next_probe_delay()
+        except Exception as e:
+            logger.debug(f"重新连接失败: {str(e)}")
+
+        health_monitor.record_probe(False, '重新连接失败')
+        delay = health_monitor.next_reconnect_delay()
+        logger.info(f"{delay:.1f}秒后再次尝试重新连接")
+        return delay
 
     def _start_monitor(self):
         """启动监控线程"""
@@ -90,7 +126,7 @@ def _start_monitor(self):
             self._monitor_thread = threading.Thread(
                 target=self._monitor_connection,
                 daemon=True,
-                name="WeChatMonitor"
+                name=f"WeChatMonitor-{self._account_id}"
             )
             self._monitor_thread.start()
             logger.info("微信连接监控已启动")
@@ -98,9 +134,10 @@ def _start_monitor(self):
     def stop(self):
         """停止监控"""
         self._running = False
+        self._wake_event.set()
         if self._monitor_thread and self._monitor_thread.is_alive():
             self._monitor_thread.join(timeout=5)
             logger.info("微信连接监控已停止")
 
-# 创建全局WeChat管理器实例
-wechat_manager = WeChatManager()
\ No newline at end of file
+# 创建全局WeChat管理器，每个账号一个实例
+wechat_manager = AccountLocal(WeChatManager, 'wechat_manager')
\ No newline at end of file
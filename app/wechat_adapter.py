@@ -11,6 +11,15 @@
 import pythoncom
 import logging
 from typing import Optional, Union, List, Dict, Any
+from app.directory_cache import DirectoryCache
+from app.group_member_cache import group_member_cache
+from app.name_resolver import name_resolver, clean_group_name
+from app.session_watcher import session_watcher
+from app.health import health_monitor
+from app.metrics import time_ui_call
+from app.adapter_instrumentation import ui_call_recorder
+from app.tracing import tracer
+from app.accounts import AccountLocal, account_registry
 
 
 
@@ -28,15 +37,17 @@
 class WeChatAdapter:
     """微信自动化库适配器，支持wxauto和wxautox"""
 
-    def __init__(self, lib_name: str = 'wxauto', lazy_init: bool = False):
+    def __init__(self, lib_name: str = 'wxauto', lazy_init: bool = False, window_name: Optional[str] = None):
         """
         初始化适配器
 
         Args:
             lib_name: 指定使用的库名称，可选值: 'wxauto', 'wxautox'，默认为'wxauto'
             lazy_init: 是否延迟初始化，如果为True，则不立即导入库
+            window_name: 要连接的微信窗口名（登录的昵称），多开微信时用于区分账号，默认连接找到的第一个窗口
         """
         self._instance = None
+        self._window_name = window_name
         self._lib_name = None
         self._requested_lib_name = lib_name  # 保存请求的库名称
         self._lock = threading.Lock()
@@ -45,6 +56,22 @@ def __init__(self, lib_name: str = 'wxauto', lazy_init: bool = False):
         self._lazy_init = lazy_init
         self._initialized = False
 
+        # 通讯录目录缓存，避免每次请求都滚动整个通讯录界面
+        try:
+            from app.config import Config
+            cache_ttl = Config.DIRECTORY_CACHE_TTL
+            cache_max_stale = Config.DIRECTORY_CACHE_MAX_STALE
+        except (ImportError, AttributeError):
+            cache_ttl, cache_max_stale = 300, 3600
+        # 刷新后同步更新名称解析索引（与适配器属于同一账号）
+        resolver = name_resolver.get()
+        self._directory_caches = {
+            'friends': DirectoryCache('好友列表', self._load_friend_list, cache_ttl, cache_max_stale,
+                                      on_refresh=lambda items, as_of: resolver.update_source('friends', items, as_of)),
+            'groups': DirectoryCache('群聊列表', self._load_group_list, cache_ttl, cache_max_stale,
+                                     on_refresh=lambda items, as_of: resolver.update_source('groups', items, as_of)),
+        }
+
         # 暂时禁用初始化日志，避免递归调用
         # logger.info(f"初始化WeChatAdapter，请求的库名称: {lib_name}，延迟初始化: {lazy_init}")
         # logger.info(f"当前工作目录: {os.getcwd()}")
@@ -185,7 +212,14 @@ def initialize(self) -> bool:
                     # 初始化COM环境
                     pythoncom.CoInitialize()
 
-                    if self._lib_name == "wxautox":
+                    if self._window_name:
+                        # 多账号时按昵称选择微信窗口
+                        if self._lib_name == "wxautox":
+                            from wxautox import WeChat
+                        else:
+                            from wxauto import WeChat
+                        self._instance = WeChat(nickname=self._window_name)
+                    elif self._lib_name == "wxautox":
                         # 直接导入pip安装的wxautox包
                         from wxautox import WeChat
                         self._instance = WeChat()
@@ -230,6 +264,12 @@ def safe_print(*args, **kwargs):
                                 # 如果不是GBK编码错误，重新抛出
                                 raise
 
+                    # 新的微信实例可能登录的是另一个账号，清空通讯录缓存和群成员缓存
+                    self.invalidate_directory_cache()
+                    group_member_cache.clear()
+                    name_resolver.clear()
+                    session_watcher.reset()
+
                     # 尝试获取窗口名称并保存
                     try:
                         # 在初始化时，WeChat类会自动打印窗口名称，我们需要手动获取
@@ -418,6 +458,22 @@ def _safe_get_session_list(self):
                 logger.debug(f"获取会话列表异常: {error_str}")
             return None
 
+    def get_session_snapshot(self):
+        """
+        获取用于快照比较的会话列表
+
+        优先使用只返回名称和未读数的GetSessionList，不支持时退回GetSession
+
+        Returns:
+            会话列表，获取失败时返回None
+        """
+        if not self._instance:
+            return None
+        sessions = self._safe_get_session_list()
+        if sessions is None and hasattr(self._instance, 'GetSession'):
+            sessions = self._instance.GetSession()
+        return sessions
+
     def check_connection(self) -> bool:
         """检查微信连接状态"""
         if not self._instance:
@@ -447,6 +503,8 @@ def check_connection(self) -> bool:
 
                 # 只要能成功调用GetSessionList就认为连接正常，即使返回空列表
                 if sessions is not None:
+                    # 顺便更新会话列表快照，不额外访问界面
+                    session_watcher.observe(sessions)
                     session_count = len(sessions) if isinstance(sessions, (dict, list)) else 0
                     logger.debug(f"微信连接检查成功，窗口名称: {window_name}, 会话数量: {session_count}")
                     return True
@@ -478,10 +536,28 @@ def __getattr__(self, name):
 
         # 直接代理到实际实例，暂时禁用所有特殊处理
         try:
-            return getattr(self._instance, name)
+            attr = getattr(self._instance, name)
         except AttributeError:
             raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
 
+        if callable(attr):
+            return self._wrap_ui_call(name, attr)
+        return attr
+
+    @staticmethod
+    def _wrap_ui_call(name, func):
+        """
+        包装代理的界面方法，由外到内依次为：
+        - 健康状态：熔断时直接失败，并记录调用成败作为被动健康信号
+        - 运行指标：按方法名记录界面操作耗时
+        - 链路追踪：有进行中的请求链路时记录为子span
+        - 界面调用计时：启用时记录每次调用的明细
+        """
+        func = ui_call_recorder.wrap(name, func)
+        func = tracer.wrap(name, func)
+        func = time_ui_call(name, func)
+        return health_monitor.wrap(name, func)
+
     def _handle_ChatWith(self, *args, **kwargs):
         """处理ChatWith方法的差异"""
         if not self._instance:
@@ -805,8 +881,10 @@ def message_callback(msg, chat):
                     chat_name = str(chat) if hasattr(chat, '__str__') else getattr(chat, 'who', str(chat))
 
                     # 清理群名中的人数信息
-                    import re
-                    clean_name = re.sub(r'\s*\(\d+\)$', '', chat_name)
+                    clean_name = clean_group_name(chat_name)
+
+                    # 群人数变化或入群/退群系统消息会使群成员缓存失效
+                    group_member_cache.observe_message(chat_name, msg_type, content)
 
                     # 初始化该聊天的消息列表
                     if clean_name not in self._message_cache:
@@ -1367,37 +1445,88 @@ def _handle_chat_window_method(self, chat_wnd, method_name, *args, **kwargs):
             # 重新抛出异常，让上层处理
             raise
 
-    def get_friend_list(self):
+    def get_friend_list(self, refresh: bool = False):
         """
-        获取好友列表
-        
+        获取好友列表，优先使用通讯录缓存
+
+        Args:
+            refresh (bool): 是否忽略缓存强制重新获取
+
         Returns:
             list: 好友昵称列表
         """
+        return self.get_directory('friends', refresh)[0]
+
+    def get_group_list(self, refresh: bool = False):
+        """
+        获取群聊列表，优先使用通讯录缓存
+
+        Args:
+            refresh (bool): 是否忽略缓存强制重新获取
+
+        Returns:
+            list: 群聊名称列表，每个元素为包含群名称和人数的字典
+        """
+        return self.get_directory('groups', refresh)[0]
+
+    def get_directory(self, kind: str, refresh: bool = False):
+        """
+        从通讯录缓存获取数据
+
+        缓存未过期时直接返回；过期不久时先返回旧数据并在后台刷新；
+        并发请求共享同一次界面获取
+
+        Args:
+            kind (str): 'friends' 或 'groups'
+            refresh (bool): 是否忽略缓存强制重新获取
+
+        Returns:
+            tuple: (数据列表, 数据获取时间戳, 缓存状态hit/stale/miss/refresh)
+        """
         if not self._instance:
             raise AttributeError("微信实例未初始化")
-        
+
+        cache = self._directory_caches.get(kind)
+        if cache is None:
+            raise ValueError(f"未知的通讯录类型: {kind}")
+        return cache.get(force_refresh=refresh)
+
+    def invalidate_directory_cache(self, kind: Optional[str] = None):
+        """
+        清空通讯录缓存
+
+        Args:
+            kind (str, optional): 'friends' 或 'groups'，不指定时清空全部
+        """
+        for name, cache in self._directory_caches.items():
+            if kind is None or name == kind:
+                cache.invalidate()
+
+    def get_directory_cache_stats(self) -> dict:
+        """获取通讯录缓存统计信息"""
+        return {name: cache.get_stats() for name, cache in self._directory_caches.items()}
+
+    def _load_friend_list(self):
+        """从微信界面获取好友列表"""
+        if not self._instance:
+            raise AttributeError("微信实例未初始化")
+
         try:
-            # 使用GetAllFriends方法获取好友详细信息
-            return self._instance.GetAllFriends()
+            # 使用GetAllFriends方法获取好友详细信息，与代理调用一样计入指标和调用轨迹
+            return self._wrap_ui_call('GetAllFriends', self._instance.GetAllFriends)()
         except Exception as e:
             logger.error(f"获取好友列表失败: {str(e)}")
             # 重新抛出异常，让上层处理
             raise
 
-    def get_group_list(self):
-        """
-        获取群聊列表
-        
-        Returns:
-            list: 群聊名称列表，每个元素为包含群名称和人数的字典
-        """
+    def _load_group_list(self):
+        """从微信界面获取群聊列表"""
         if not self._instance:
             raise AttributeError("微信实例未初始化")
         
         try:
             # 使用GetAllGroups方法获取群组详细信息
-            groups_info = self._instance.GetAllGroups()
+            groups_info = self._wrap_ui_call('GetAllGroups', self._instance.GetAllGroups)()
             
             # 提取群聊名称和人数
             group_list = []
@@ -1406,6 +1535,8 @@ def get_group_list(self):
                     'name': group['name'],
                     'member_count': group['member_count']
                 })
+                # 群人数变化时使群成员缓存失效
+                group_member_cache.observe_member_count(group['name'], group['member_count'])
             
             logger.debug(f"获取到 {len(group_list)} 个群聊")
             return group_list
@@ -1571,11 +1702,18 @@ def GetNextNewMessage(self, *args, **kwargs):
             return {} if self._lib_name == "wxautox" else []
 
 
-# 导入配置
-try:
-    from app.config import Config
-    # 创建全局适配器实例（使用延迟初始化避免库冲突）
-    wechat_adapter = WeChatAdapter(lib_name=Config.WECHAT_LIB, lazy_init=True)
-except ImportError as e:
-    # 如果无法导入配置，则使用默认值
-    wechat_adapter = WeChatAdapter(lib_name='wxauto', lazy_init=True)
+def _create_account_adapter() -> WeChatAdapter:
+    """为当前账号创建适配器，账号未指定库时使用配置的库"""
+    account = account_registry.get() or {}
+    try:
+        from app.config import Config
+        lib_name = account.get('lib') or Config.WECHAT_LIB
+    except ImportError:
+        # 如果无法导入配置，则使用默认值
+        lib_name = account.get('lib') or 'wxauto'
+    # 使用延迟初始化避免库冲突
+    return WeChatAdapter(lib_name=lib_name, lazy_init=True, window_name=account.get('window'))
+
+
+# 全局适配器，每个账号一个实例
+wechat_adapter = AccountLocal(_create_account_adapter, 'wechat_adapter')
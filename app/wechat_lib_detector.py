@@ -5,20 +5,123 @@
 
 import sys
 import os
+import json
+import time
+import threading
 import subprocess
 import importlib
 import logging
+from pathlib import Path
 from typing import Dict, Tuple, Optional
 
 logger = logging.getLogger(__name__)
 
+# 持久化检测结果，与config_manager中的数据目录一致
+DETECTION_CACHE_FILE = Path("data") / "api" / "lib_detection_cache.json"
+DETECTION_CACHE_VERSION = 1
+
 
 class WeChatLibDetector:
     """微信自动化库检测器"""
     
-    def __init__(self):
+    def __init__(self, cache_file: Optional[Path] = DETECTION_CACHE_FILE):
         self._detection_cache = {}
         self._is_frozen = getattr(sys, 'frozen', False)
+        # 检测结果按解释器、包版本和安装目录修改时间持久化，重启后无需再次导入或启动子进程
+        self._cache_file = cache_file
+        self._persistent_cache = None
+        self._cache_lock = threading.Lock()
+        self.persistent_hits = 0
+
+    def _fingerprint(self, lib_name: str) -> dict:
+        """
+        计算库的环境指纹，任何一项变化都会使持久化的检测结果失效
+
+        不导入库本身，只读取安装信息
+        """
+        fingerprint = {
+            'executable': os.path.realpath(sys.executable),
+            'python': sys.version,
+            'frozen': self._is_frozen,
+            'version': None,
+            'dist_mtime': None,
+            'origin': None,
+            'origin_mtime': None,
+        }
+        try:
+            from importlib import metadata
+            dist = metadata.distribution(lib_name)
+            fingerprint['version'] = dist.version
+            # 重新安装时dist-info目录会重建，按其中METADATA所在目录的修改时间判断
+            metadata_file = next((path for path in dist.files or () if path.name == 'METADATA'), None)
+            if metadata_file is not None:
+                fingerprint['dist_mtime'] = os.stat(os.path.dirname(dist.locate_file(metadata_file))).st_mtime
+        except Exception:
+            pass
+        try:
+            import importlib.util
+            spec = importlib.util.find_spec(lib_name)
+            if spec is not None and spec.origin and os.path.exists(spec.origin):
+                # 覆盖未通过pip安装、直接放在sys.path中的本地库
+                fingerprint['origin'] = spec.origin
+                fingerprint['origin_mtime'] = os.stat(spec.origin).st_mtime
+        except Exception:
+            pass
+        return fingerprint
+
+    def _load_persistent_cache(self) -> dict:
+        if self._persistent_cache is None:
+            self._persistent_cache = {}
+            if self._cache_file and os.path.exists(self._cache_file):
+                try:
+                    with open(self._cache_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if data.get('version') == DETECTION_CACHE_VERSION:
+                        self._persistent_cache = data.get('entries', {})
+                except (OSError, ValueError) as e:
+                    logger.debug(f"读取库检测缓存失败: {str(e)}")
+        return self._persistent_cache
+
+    def _save_persistent_cache(self):
+        if not self._cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._cache_file) or '.', exist_ok=True)
+            temp_file = f"{self._cache_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': DETECTION_CACHE_VERSION, 'entries': self._persistent_cache},
+                          f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self._cache_file)
+        except OSError as e:
+            logger.debug(f"保存库检测缓存失败: {str(e)}")
+
+    @staticmethod
+    def _cache_key(lib_name: str) -> str:
+        # 同一数据目录可能被不同解释器使用
+        return f"{os.path.realpath(sys.executable)}|{lib_name}"
+
+    def _get_persistent(self, lib_name: str) -> Optional[Tuple[bool, str]]:
+        """读取持久化的检测结果，环境指纹不一致时视为失效"""
+        with self._cache_lock:
+            entry = self._load_persistent_cache().get(self._cache_key(lib_name))
+            if not entry or entry.get('fingerprint') != self._fingerprint(lib_name):
+                return None
+            self.persistent_hits += 1
+            available, details = entry['result']
+            logger.info(f"{lib_name}库检测结果来自缓存（{entry.get('checked_at')}）")
+            return (bool(available), details)
+
+    def _set_persistent(self, lib_name: str, result: Tuple[bool, str]):
+        # 超时通常是暂时性的，不持久化
+        if '超时' in result[1]:
+            return
+        with self._cache_lock:
+            self._load_persistent_cache()[self._cache_key(lib_name)] = {
+                'fingerprint': self._fingerprint(lib_name),
+                'result': list(result),
+                'checked_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self._save_persistent_cache()
         
     def is_frozen_environment(self) -> bool:
         """检查是否为打包环境"""
@@ -33,6 +136,11 @@ def detect_wxauto(self) -> Tuple[bool, str]:
         """
         if 'wxauto' in self._detection_cache:
             return self._detection_cache['wxauto']
+
+        cached = self._get_persistent('wxauto')
+        if cached is not None:
+            self._detection_cache['wxauto'] = cached
+            return cached
         
         try:
             # 方法1: 直接导入检测
@@ -52,6 +160,7 @@ def detect_wxauto(self) -> Tuple[bool, str]:
             logger.error(f"wxauto库检测时出现未知错误: {str(e)}")
         
         self._detection_cache['wxauto'] = result
+        self._set_persistent('wxauto', result)
         return result
     
     def detect_wxautox(self) -> Tuple[bool, str]:
@@ -64,6 +173,11 @@ def detect_wxautox(self) -> Tuple[bool, str]:
         if 'wxautox' in self._detection_cache:
             return self._detection_cache['wxautox']
 
+        cached = self._get_persistent('wxautox')
+        if cached is not None:
+            self._detection_cache['wxautox'] = cached
+            return cached
+
         # 在打包环境中，优先使用直接导入
         if self._is_frozen:
             result = self._detect_wxautox_direct()
@@ -75,6 +189,7 @@ def detect_wxautox(self) -> Tuple[bool, str]:
                 result = self._detect_wxautox_direct()
 
         self._detection_cache['wxautox'] = result
+        self._set_persistent('wxautox', result)
         return result
     
     def _detect_wxautox_direct(self) -> Tuple[bool, str]:
@@ -497,9 +612,25 @@ def get_library_switch_recommendation(self, current_lib: str) -> Optional[str]:
 
         return None
     
+    def get_library_version(self, lib_name: str) -> Optional[str]:
+        """
+        从安装信息中读取库的版本号，不导入库
+
+        Args:
+            lib_name (str): 库名
+
+        Returns:
+            str: 版本号，未通过pip安装时返回None
+        """
+        return self._fingerprint(lib_name)['version']
+
     def clear_cache(self):
-        """清除检测缓存"""
+        """清除检测缓存，包括持久化的检测结果"""
         self._detection_cache.clear()
+        with self._cache_lock:
+            if self._load_persistent_cache():
+                self._persistent_cache.clear()
+                self._save_persistent_cache()
         logger.debug("库检测缓存已清除")
 
     def get_wxautox_detection_strategy(self) -> str:
@@ -0,0 +1,4 @@
+"""
+基准测试
+使用模拟的wxauto/wxautox后端驱动真实的Flask应用，输出吞吐量和延迟分位数，便于跟踪性能回归
+"""
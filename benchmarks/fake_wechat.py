@@ -0,0 +1,591 @@
+"""
+模拟微信后端
+提供与wxauto/wxautox接口一致的假WeChat类，各方法按配置的延迟分布休眠、按失败率抛出异常，
+监听对象由后台消息生成线程按设定速率推送消息。
+
+install_fake_modules()把假模块注册到sys.modules中，WeChatAdapter的导入逻辑
+（import wxauto / from wxautox import WeChat）会直接拿到假实现，不需要Windows微信客户端
+"""
+
+import math
+import random
+import sys
+import threading
+import time
+import types
+from typing import Callable, Dict, List, Optional
+
+# 默认延迟分布，接近真实界面操作的量级
+DEFAULT_LATENCIES = {
+    'ChatWith': 'lognormal:0.12,0.4',
+    'SendMsg': 'lognormal:0.08,0.3',
+    'SendFiles': 'lognormal:0.6,0.5',
+    'GetNextNewMessage': 'uniform:0.02,0.08',
+    'AddListenChat': 'lognormal:0.3,0.3',
+    'RemoveListenChat': 'fixed:0.05',
+    'GetAllFriends': 'lognormal:3.0,0.3',
+    'GetAllGroups': 'lognormal:1.5,0.3',
+    'GetGroupMembers': 'lognormal:1.0,0.4',
+    'GetSessionList': 'uniform:0.02,0.06',
+    'GetSession': 'uniform:0.02,0.06',
+    'GetAllMessage': 'lognormal:0.4,0.4',
+    'ChatGetAllMessage': 'uniform:0.02,0.05',
+    'LoadMoreMessage': 'uniform:0.3,0.6',
+}
+
+MESSAGE_TYPES = ('friend', 'friend', 'friend', 'self', 'sys')
+
+
+class Latency:
+    """
+    延迟分布，格式为"类型:参数"
+
+    - fixed:秒
+    - uniform:最小值,最大值
+    - lognormal:中位数,sigma
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, sep, params = str(spec).partition(':')
+        if not sep:
+            # 只写数字时视为固定延迟
+            kind, params = 'fixed', kind
+        self.kind = kind.strip().lower()
+        try:
+            self.params = [float(p) for p in params.split(',') if p.strip()]
+        except ValueError:
+            raise ValueError(f"延迟分布参数错误: {spec}")
+        expected = {'fixed': 1, 'uniform': 2, 'lognormal': 2}.get(self.kind)
+        if expected is None:
+            raise ValueError(f"未知的延迟分布: {spec}")
+        if len(self.params) != expected:
+            raise ValueError(f"延迟分布参数数量错误: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return rng.uniform(self.params[0], self.params[1])
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+    def __repr__(self):
+        return f"Latency({self.spec!r})"
+
+
+class FakeBackendConfig:
+    """模拟后端配置"""
+
+    def __init__(self, latencies: Optional[Dict[str, str]] = None, default_latency: str = 'fixed:0.01',
+                 failure_rates: Optional[Dict[str, float]] = None, default_failure_rate: float = 0.0,
+                 time_scale: float = 1.0, friends: int = 500, groups: int = 80, members_per_group: int = 200,
+                 sessions: int = 30, message_rate: float = 0.0, seed: Optional[int] = None,
+                 window_name: str = 'BenchmarkUser', message_scan_cost: float = 0.0002, replay=None):
+        """
+        Args:
+            latencies (dict, optional): 方法名 -> 延迟分布，未指定的方法使用DEFAULT_LATENCIES或default_latency
+            default_latency (str): 其他方法的延迟分布
+            failure_rates (dict, optional): 方法名 -> 失败率（0~1）
+            default_failure_rate (float): 其他方法的失败率
+            time_scale (float): 所有延迟乘以该系数，0表示不休眠
+            friends (int): 模拟好友数量
+            groups (int): 模拟群聊数量
+            members_per_group (int): 每个群的成员数量
+            sessions (int): 会话列表长度
+            message_rate (float): 监听对象每秒收到的消息总数
+            seed (int, optional): 随机种子，便于复现
+            window_name (str): 模拟的登录账号窗口名
+            message_scan_cost (float): 聊天窗口GetAllMessage枚举每条消息控件的耗时（秒）
+            replay (ReplayBackend, optional): 回放记录的轨迹，有记录的方法使用记录的耗时、成败和结果大小
+        """
+        merged = dict(DEFAULT_LATENCIES)
+        merged.update(latencies or {})
+        self.latencies = {name: Latency(spec) for name, spec in merged.items()}
+        self.default_latency = Latency(default_latency)
+        self.failure_rates = dict(failure_rates or {})
+        self.default_failure_rate = default_failure_rate
+        self.time_scale = time_scale
+        self.friends = friends
+        self.groups = groups
+        self.members_per_group = members_per_group
+        self.sessions = sessions
+        self.message_rate = message_rate
+        self.seed = seed
+        self.window_name = window_name
+        self.message_scan_cost = message_scan_cost
+        self.replay = replay
+
+    def to_dict(self) -> dict:
+        return {
+            'latencies': {name: latency.spec for name, latency in sorted(self.latencies.items())},
+            'default_latency': self.default_latency.spec,
+            'failure_rates': self.failure_rates,
+            'default_failure_rate': self.default_failure_rate,
+            'time_scale': self.time_scale,
+            'friends': self.friends,
+            'groups': self.groups,
+            'members_per_group': self.members_per_group,
+            'sessions': self.sessions,
+            'message_rate': self.message_rate,
+            'seed': self.seed,
+            'message_scan_cost': self.message_scan_cost,
+            'replay': self.replay.source if self.replay else None,
+        }
+
+
+class SimulatedFailure(Exception):
+    """模拟的界面操作失败"""
+
+
+class _FakeControl:
+    """模拟消息控件，消息被删除后不再存在"""
+
+    __slots__ = ('alive',)
+
+    def __init__(self):
+        self.alive = True
+
+    def Exists(self, maxSearchSeconds=0, searchIntervalSeconds=0):
+        return self.alive
+
+
+class FakeMessage:
+    """模拟消息对象，属性与wxauto/wxautox消息一致"""
+
+    _counter = 0
+    _counter_lock = threading.Lock()
+
+    def __init__(self, chat: str, content: str, sender: str, type: str = 'friend',
+                 source: Optional['FakeChat'] = None):
+        with FakeMessage._counter_lock:
+            FakeMessage._counter += 1
+            seq = FakeMessage._counter
+        self.id = f"fake-{seq}"
+        self.type = type
+        self.mtype = None
+        self.content = content
+        self.sender = sender
+        self.sender_remark = None
+        self.file_path = None
+        self.time = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.chat = chat
+        self.control = _FakeControl()
+        # 所在的聊天窗口，消息操作通过它模拟界面耗时
+        self.source = source
+        # 生成时间，用于计算消息送达延迟
+        self.created_at = time.time()
+
+    def __repr__(self):
+        return f"<FakeMessage {self.id} {self.chat}>"
+
+    # ---- 消息操作 ----
+
+    def _act(self, name: str):
+        if not self.control.alive:
+            raise SimulatedFailure(f"消息控件已失效: {self.id}")
+        if self.source is not None and self.source.owner is not None:
+            self.source.owner._operate(f"Message.{name}")
+
+    def click(self):
+        self._act('click')
+
+    def quote(self, text, *args, **kwargs):
+        self._act('quote')
+
+    def forward(self, targets, *args, **kwargs):
+        self._act('forward')
+
+    def tickle(self):
+        self._act('tickle')
+
+    def delete(self):
+        self._act('delete')
+        self.control.alive = False
+        if self.source is not None:
+            self.source.remove(self)
+
+    def download(self, dir_path=None, *args, **kwargs):
+        self._act('download')
+        return None
+
+    def to_text(self):
+        self._act('to_text')
+        return self.content
+
+    def select_option(self, option):
+        self._act('select_option')
+        return option
+
+
+class FakeChat:
+    """监听对象，保存聊天窗口中已加载的消息"""
+
+    # LoadMoreMessage每次加载的消息数量
+    LOAD_PAGE = 30
+
+    def __init__(self, who: str, callback: Optional[Callable] = None, owner: Optional['FakeWeChat'] = None):
+        self.who = who
+        self.callback = callback
+        self.owner = owner
+        self.history: List[FakeMessage] = []
+        # 尚未加载到窗口中的更早消息，LoadMoreMessage每次从末尾取一页放到history前面
+        self.older: List[FakeMessage] = []
+        self._history_lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<FakeChat {self.who}>"
+
+    def append(self, msg: FakeMessage):
+        msg.source = self
+        with self._history_lock:
+            self.history.append(msg)
+
+    def remove(self, msg: FakeMessage):
+        with self._history_lock:
+            try:
+                self.history.remove(msg)
+            except ValueError:
+                pass
+
+    def seed_history(self, count: int):
+        """预先加载count条历史消息"""
+        for index in range(count):
+            self.append(FakeMessage(self.who, f"历史消息{index}", self.who))
+
+    def seed_older(self, count: int):
+        """预先准备count条尚未加载到窗口中的更早消息"""
+        messages = [FakeMessage(self.who, f"更早的消息{index}", self.who, source=self) for index in range(count)]
+        with self._history_lock:
+            self.older[:0] = messages
+
+    def LoadMoreMessage(self, *args, **kwargs):
+        """向上加载一页更早的消息"""
+        if self.owner is not None:
+            self.owner._operate('LoadMoreMessage')
+        with self._history_lock:
+            page = self.older[-self.LOAD_PAGE:]
+            del self.older[-self.LOAD_PAGE:]
+            self.history[:0] = page
+        return bool(page)
+
+    def GetAllMessage(self, *args, **kwargs):
+        """真实界面逐个枚举消息控件，耗时与已加载的消息数量成正比"""
+        with self._history_lock:
+            messages = list(self.history)
+        if self.owner is not None:
+            self.owner._operate('ChatGetAllMessage', len(messages) * self.owner.config.message_scan_cost)
+        return messages
+
+
+class FakeWeChat:
+    """模拟WeChat类，只实现接口层会用到的方法"""
+
+    # 由install_fake_modules设置
+    backend_config = FakeBackendConfig()
+    instances: List['FakeWeChat'] = []
+
+    def __init__(self, *args, **kwargs):
+        config = type(self).backend_config
+        self.config = config
+        # 多账号时按昵称选择窗口，每个窗口是独立的模拟实例
+        self.window_name = kwargs.get('nickname') or config.window_name
+        self.nickname = self.window_name
+        self.listen: Dict[str, FakeChat] = {}
+        self._rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+        self._ui_lock = threading.Lock()
+        self._current_chat = None
+        self._pending: Dict[str, List[FakeMessage]] = {}
+        self._listening = False
+        self._generator = None
+        self._stop_event = threading.Event()
+
+        self.calls: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+        self.sent_messages = 0
+        self.delivered_messages = 0
+        # 每次监听回调占用监听线程的时间（秒）
+        self.callback_durations: List[float] = []
+
+        self.friends = [self._make_friend(i) for i in range(config.friends)]
+        self.group_names = [f"测试群{i:03d}" for i in range(config.groups)]
+        type(self).instances.append(self)
+
+    # ---- 通用 ----
+
+    @staticmethod
+    def _make_friend(index: int) -> dict:
+        return {'nickname': f"好友{index:04d}", 'remark': f"备注{index:04d}" if index % 3 == 0 else None, 'tags': None}
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _operate(self, name: str, extra_delay: float = 0.0) -> Optional[int]:
+        """
+        模拟一次界面操作：占用界面锁、休眠、按失败率抛出异常
+
+        Args:
+            name (str): 方法名
+            extra_delay (float): 在采样延迟之外追加的耗时（秒），例如按消息数量计算的枚举耗时，回放时不追加
+
+        Returns:
+            int: 回放记录中的结果大小，没有时返回None，由调用方使用默认大小
+        """
+        replayed = self.config.replay.next_call(name) if self.config.replay else None
+        if replayed is not None:
+            delay = replayed.duration * self.config.time_scale
+            failed = not replayed.ok
+        else:
+            latency = self.config.latencies.get(name, self.config.default_latency)
+            with self._rng_lock:
+                delay = latency.sample(self._rng) * self.config.time_scale
+            failure_rate = self.config.failure_rates.get(name, self.config.default_failure_rate)
+            failed = bool(failure_rate) and self._random() < failure_rate
+            delay += extra_delay * self.config.time_scale
+        # 真实界面同一时刻只能执行一个操作
+        with self._ui_lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if delay > 0:
+                time.sleep(delay)
+            if failed:
+                self.failures[name] = self.failures.get(name, 0) + 1
+                reason = replayed.exception if replayed is not None and replayed.exception else '模拟'
+                raise SimulatedFailure(f"{reason}: {name}失败")
+        return replayed.result_size if replayed is not None else None
+
+    def GetWindowName(self):
+        return self.window_name
+
+    def IsOnline(self):
+        return True
+
+    # ---- 聊天 ----
+
+    def ChatWith(self, who, *args, **kwargs):
+        self._operate('ChatWith')
+        self._current_chat = who
+        return who
+
+    def SendMsg(self, msg, who=None, clear=True, at=None, *args, **kwargs):
+        if who:
+            self.ChatWith(who)
+        self._operate('SendMsg')
+        self.sent_messages += 1
+        return True
+
+    def SendTypingText(self, msg, who=None, clear=True, *args, **kwargs):
+        return self.SendMsg(msg, who=who, clear=clear)
+
+    def SendFiles(self, filepath, who=None, *args, **kwargs):
+        if who:
+            self.ChatWith(who)
+        self._operate('SendFiles')
+        return True
+
+    def GetAllMessage(self, *args, **kwargs):
+        size = self._operate('GetAllMessage')
+        chat = self._current_chat or '文件传输助手'
+        return [FakeMessage(chat, f"历史消息{i}", chat) for i in range(20 if size is None else size)]
+
+    def GetNextNewMessage(self, *args, **kwargs):
+        self._operate('GetNextNewMessage')
+        with self._rng_lock:
+            chats = [name for name, messages in self._pending.items() if messages]
+            if not chats:
+                return {}
+            chat = chats[0]
+            messages = self._pending.pop(chat)
+        return {'chat_name': chat, 'chat_type': 'friend', 'msg': messages}
+
+    # ---- 会话和通讯录 ----
+
+    def GetSessionList(self, *args, **kwargs):
+        self._operate('GetSessionList')
+        with self._rng_lock:
+            return {name: len(self._pending.get(name, [])) for name in self._session_names()}
+
+    def GetSession(self, *args, **kwargs):
+        self._operate('GetSession')
+        return list(self._session_names())
+
+    def _session_names(self):
+        names = list(self.listen.keys())
+        pool = [friend['nickname'] for friend in self.friends] + self.group_names
+        for name in pool:
+            if len(names) >= self.config.sessions:
+                break
+            if name not in names:
+                names.append(name)
+        return names
+
+    def GetAllFriends(self, *args, **kwargs):
+        size = self._operate('GetAllFriends')
+        if size is not None and size > len(self.friends):
+            self.friends.extend(self._make_friend(i) for i in range(len(self.friends), size))
+        return [dict(friend) for friend in self.friends[:size]]
+
+    def GetAllGroups(self, *args, **kwargs):
+        size = self._operate('GetAllGroups')
+        if size is not None and size > len(self.group_names):
+            self.group_names.extend(f"测试群{i:03d}" for i in range(len(self.group_names), size))
+        return [{'name': name, 'member_count': self.config.members_per_group} for name in self.group_names[:size]]
+
+    def GetGroupMembers(self, *args, **kwargs):
+        size = self._operate('GetGroupMembers')
+        group = self._current_chat or ''
+        count = self.config.members_per_group if size is None else size
+        return [f"{group}成员{i:03d}" for i in range(count)]
+
+    # ---- 监听 ----
+
+    def AddListenChat(self, nickname=None, callback=None, who=None, *args, **kwargs):
+        who = nickname or who
+        self._operate('AddListenChat')
+        self.listen[who] = FakeChat(who, callback, owner=self)
+        self._ensure_generator()
+        return self.listen[who]
+
+    def RemoveListenChat(self, nickname=None, who=None, *args, **kwargs):
+        who = nickname or who
+        self._operate('RemoveListenChat')
+        return self.listen.pop(who, None) is not None
+
+    def StartListening(self):
+        self._listening = True
+        self._ensure_generator()
+
+    def StopListening(self, *args, **kwargs):
+        self._listening = False
+
+    def GetListenMessage(self, who=None):
+        with self._rng_lock:
+            if who:
+                return self._pending.pop(who, [])
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _ensure_generator(self):
+        if self.config.message_rate <= 0 or (self._generator and self._generator.is_alive()):
+            return
+        self._stop_event.clear()
+        self._generator = threading.Thread(target=self._generate_messages, daemon=True, name="FakeMessageGenerator")
+        self._generator.start()
+
+    def stop(self):
+        """停止消息生成线程"""
+        self._stop_event.set()
+        if self._generator:
+            self._generator.join(timeout=2)
+
+    def _generate_messages(self):
+        """按泊松过程向监听对象推送消息，有回调时调用回调，否则进入待取队列"""
+        while not self._stop_event.is_set():
+            with self._rng_lock:
+                wait = self._rng.expovariate(self.config.message_rate)
+            if self._stop_event.wait(wait):
+                break
+            chats = list(self.listen.values())
+            if not chats:
+                continue
+            with self._rng_lock:
+                chat = self._rng.choice(chats)
+                msg_type = self._rng.choice(MESSAGE_TYPES)
+            msg = FakeMessage(chat.who, f"bench|{time.time():.6f}|{chat.who}", f"{chat.who}的成员", msg_type)
+            chat.append(msg)
+            self.delivered_messages += 1
+            if chat.callback is not None:
+                started = time.perf_counter()
+                try:
+                    chat.callback(msg, chat)
+                except Exception:
+                    pass
+                self.callback_durations.append(time.perf_counter() - started)
+            else:
+                with self._rng_lock:
+                    self._pending.setdefault(chat.who, []).append(msg)
+
+    def get_stats(self) -> dict:
+        return {
+            'calls': dict(self.calls),
+            'failures': dict(self.failures),
+            'sent_messages': self.sent_messages,
+            'generated_messages': self.delivered_messages,
+            'listening': len(self.listen),
+        }
+
+
+def _make_module(name: str) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__version__ = 'benchmark-fake'
+    module.__file__ = __file__
+    module.WeChat = FakeWeChat
+    module.FakeBackendConfig = FakeBackendConfig
+    return module
+
+
+def install_fake_modules(config: Optional[FakeBackendConfig] = None) -> dict:
+    """
+    注册假的wxauto/wxautox模块，必须在导入app之前调用
+
+    pythoncom和winreg只在无法导入时（非Windows环境）注册空实现
+
+    Returns:
+        dict: 被替换的原有模块，可传给uninstall_fake_modules恢复
+    """
+    FakeWeChat.backend_config = config or FakeBackendConfig()
+    replaced = {}
+    for name in ('wxauto', 'wxautox'):
+        replaced[name] = sys.modules.get(name)
+        sys.modules[name] = _make_module(name)
+
+    try:
+        import pythoncom  # noqa: F401
+    except ImportError:
+        fake_com = types.ModuleType('pythoncom')
+        fake_com.CoInitialize = lambda: None
+        fake_com.CoUninitialize = lambda: None
+        replaced['pythoncom'] = None
+        sys.modules['pythoncom'] = fake_com
+
+    try:
+        import winreg  # noqa: F401
+    except ImportError:
+        # 只在检测微信安装路径时使用，访问注册表时按找不到处理
+        fake_winreg = types.ModuleType('winreg')
+        fake_winreg.HKEY_CURRENT_USER = fake_winreg.HKEY_LOCAL_MACHINE = None
+        fake_winreg.KEY_READ = fake_winreg.KEY_WOW64_32KEY = fake_winreg.KEY_WOW64_64KEY = 0
+
+        def _missing(*args, **kwargs):
+            raise FileNotFoundError('模拟环境中没有注册表')
+        fake_winreg.OpenKey = fake_winreg.OpenKeyEx = fake_winreg.QueryValueEx = _missing
+        fake_winreg.EnumKey = fake_winreg.EnumValue = fake_winreg.CloseKey = _missing
+        replaced['winreg'] = None
+        sys.modules['winreg'] = fake_winreg
+    return replaced
+
+
+def uninstall_fake_modules(replaced: dict):
+    """恢复install_fake_modules替换的模块"""
+    for instance in FakeWeChat.instances:
+        instance.stop()
+    FakeWeChat.instances.clear()
+    for name, module in replaced.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+
+
+def current_instance() -> Optional[FakeWeChat]:
+    """默认账号最近创建的模拟微信实例"""
+    return instance_for(FakeWeChat.backend_config.window_name)
+
+
+def instance_for(window_name: str) -> Optional[FakeWeChat]:
+    """指定窗口名的最近创建的模拟微信实例"""
+    for instance in reversed(FakeWeChat.instances):
+        if instance.window_name == window_name:
+            return instance
+    return None
@@ -0,0 +1,317 @@
+"""
+网关基准
+启动若干个桩工作进程（只实现网关会用到的接口，按设定的耗时返回），在本进程中运行网关，
+分别测量直接访问单个工作进程和经过网关访问时的吞吐量与延迟，并检查路由和汇总结果：
+
+- direct：直接向一个工作进程发送，作为基线
+- gateway_hash：经网关发送，按接收方哈希分布到各工作进程
+- gateway_account：经网关按 /accounts/<账号>/ 前缀发送，检查每个工作进程只收到自己账号的请求
+- listen_merge：经网关轮询监听消息，合并所有工作进程的消息
+
+用法:
+    python -m benchmarks.gateway --workers 4 --requests 2000 --output gateway.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.scenarios import HttpDriver, Recorder, run_workers
+
+API_KEY = 'benchmark'
+
+
+# ---- 桩工作进程 ----
+
+class StubWorker:
+    """模拟API工作进程的WSGI应用"""
+
+    def __init__(self, name: str, accounts: List[str], latency: float, messages_per_poll: int):
+        self.name = name
+        self.accounts = set(accounts)
+        self.latency = latency
+        self.messages_per_poll = messages_per_poll
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'sent': 0, 'sent_by_account': {}, 'receivers': 0, 'polls': 0}
+        self._receivers = set()
+
+    def _json(self, start_response, body: dict, status: str = '200 OK'):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(payload)))])
+        return [payload]
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        account = environ.get('HTTP_X_WECHAT_ACCOUNT') or 'default'
+        if path.startswith('/accounts/'):
+            account, _, rest = path[len('/accounts/'):].partition('/')
+            path = '/' + rest
+        if account != 'default' and account not in self.accounts:
+            return self._json(start_response, {'code': 4004, 'message': f'账号不存在: {account}', 'data': None},
+                              '404 NOT FOUND')
+        with self._lock:
+            self.stats['requests'] += 1
+
+        if path == '/health':
+            return self._json(start_response, {'status': 'ok'})
+        if path == '/metrics':
+            text = ('# HELP wxauto_stub_requests_total 请求数\n# TYPE wxauto_stub_requests_total counter\n'
+                    f'wxauto_stub_requests_total{{route="all"}} {self.stats["requests"]}\n')
+            payload = text.encode('utf-8')
+            start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', str(len(payload)))])
+            return [payload]
+        if path == '/api/admin/accounts':
+            accounts = {name: {'id': name} for name in ['default'] + sorted(self.accounts)}
+            return self._json(start_response, {'code': 0, 'message': '获取成功',
+                                               'data': {'default': 'default', 'accounts': accounts}})
+        if path == '/stub/stats':
+            with self._lock:
+                stats = dict(self.stats, sent_by_account=dict(self.stats['sent_by_account']),
+                             receivers=len(self._receivers))
+            return self._json(start_response, {'code': 0, 'message': '获取成功', 'data': stats})
+        if path == '/api/message/send':
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            body = json.loads(environ['wsgi.input'].read(length) or b'{}')
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                self.stats['sent'] += 1
+                self.stats['sent_by_account'][account] = self.stats['sent_by_account'].get(account, 0) + 1
+                self._receivers.add(body.get('receiver'))
+            return self._json(start_response, {'code': 0, 'message': '发送成功', 'data': {'account': account}})
+        if path == '/api/message/listen/get':
+            with self._lock:
+                self.stats['polls'] += 1
+            messages = {f'{self.name}-{account}': [{'content': f'stub {index}'} for index in range(self.messages_per_poll)]}
+            return self._json(start_response, {'code': 0, 'message': '获取消息成功', 'data': {'messages': messages}})
+        return self._json(start_response, {'code': 4004, 'message': '接口不存在', 'data': None}, '404 NOT FOUND')
+
+
+def serve_stub(port: int, accounts: List[str], latency: float, messages_per_poll: int):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', port, StubWorker(str(port), accounts, latency, messages_per_poll), threaded=True)
+    server.serve_forever()
+
+
+# ---- 驱动 ----
+
+class RemoteHttpDriver(HttpDriver):
+    """向已经在运行的服务发送请求，每个线程保持一条长连接"""
+
+    def __init__(self, host: str, port: int, api_key: str = API_KEY):
+        self.api_key = api_key
+        self.host = host
+        self.port = port
+        self._local = threading.local()
+
+    def close(self):
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(port: int, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{timeout}秒内端口 {port} 未就绪")
+
+
+def _stub_stats(ports: List[int]) -> Dict[int, dict]:
+    stats = {}
+    for port in ports:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            conn.request('GET', '/stub/stats')
+            stats[port] = json.loads(conn.getresponse().read())['data']
+        finally:
+            conn.close()
+    return stats
+
+
+def _delta(after: Dict[int, dict], before: Dict[int, dict], key: str) -> Dict[str, int]:
+    return {str(port): after[port][key] - before[port][key] for port in after}
+
+
+# ---- 场景 ----
+
+def run_send(driver, requests: int, concurrency: int, path_for=lambda index: '/api/message/send') -> dict:
+    recorder = Recorder()
+
+    def worker(index):
+        recorder.call(driver, 'send', 'POST', path_for(index),
+                      {'receiver': f'好友{index % 500:04d}', 'message': f'gateway {index}'})
+
+    duration = run_workers(worker, concurrency, total=requests)
+    return recorder.report(duration)
+
+
+def run_benchmark(args) -> dict:
+    from app.gateway import Gateway, GatewayWorker
+    from werkzeug.serving import make_server
+
+    ports = [_free_port() for _ in range(args.workers)]
+    accounts = {port: f'acct{index}' for index, port in enumerate(ports)}
+    processes = [subprocess.Popen([sys.executable, '-m', 'benchmarks.gateway', '--stub-worker', str(port),
+                                   '--account', accounts[port], '--latency', str(args.latency),
+                                   '--messages-per-poll', str(args.messages_per_poll)],
+                                  cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                 for port in ports]
+    gateway = None
+    server = None
+    try:
+        for port in ports:
+            _wait_for(port)
+
+        gateway = Gateway([GatewayWorker('127.0.0.1', port, pool_size=args.concurrency) for port in ports],
+                          api_key=API_KEY, discovery_interval=1.0)
+        gateway.start()
+        server = make_server('127.0.0.1', 0, gateway, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True, name='GatewayServer').start()
+        gateway_driver = RemoteHttpDriver('127.0.0.1', server.server_port)
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'workers': args.workers,
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'latency_s': args.latency,
+            },
+            'results': {},
+        }
+        results = report['results']
+
+        print("[direct] ...", file=sys.stderr)
+        results['direct'] = run_send(RemoteHttpDriver('127.0.0.1', ports[0]), args.requests, args.concurrency)
+
+        print("[gateway_hash] ...", file=sys.stderr)
+        before = _stub_stats(ports)
+        results['gateway_hash'] = run_send(gateway_driver, args.requests, args.concurrency)
+        after = _stub_stats(ports)
+        results['gateway_hash']['distribution'] = _delta(after, before, 'sent')
+
+        print("[gateway_account] ...", file=sys.stderr)
+        before = after
+        results['gateway_account'] = run_send(
+            gateway_driver, args.requests, args.concurrency,
+            lambda index: f'/accounts/{accounts[ports[index % len(ports)]]}/api/message/send')
+        after = _stub_stats(ports)
+        misrouted = {str(port): {account: count - before[port]['sent_by_account'].get(account, 0)
+                                 for account, count in after[port]['sent_by_account'].items()
+                                 if account != accounts[port] and count != before[port]['sent_by_account'].get(account, 0)}
+                     for port in ports}
+        results['gateway_account']['isolation'] = {
+            'distribution': _delta(after, before, 'sent'),
+            'misrouted': {port: counts for port, counts in misrouted.items() if counts},
+            'ok': not any(misrouted.values()),
+        }
+
+        print("[listen_merge] ...", file=sys.stderr)
+        recorder = Recorder()
+        merged = []
+
+        def poll(index):
+            status, data = recorder.call(gateway_driver, 'listen_get', 'GET', '/api/message/listen/get')
+            messages = ((data or {}).get('data') or {}).get('messages') or {}
+            merged.append(len(messages))
+
+        duration = run_workers(poll, args.concurrency, total=max(args.requests // 10, 1))
+        results['listen_merge'] = recorder.report(duration)
+        results['listen_merge']['chats_per_poll'] = round(sum(merged) / len(merged), 3) if merged else 0
+
+        status, health = gateway_driver.request('GET', '/health')
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+        try:
+            conn.request('GET', '/metrics', headers={'X-API-Key': API_KEY})
+            metrics_text = conn.getresponse().read().decode('utf-8')
+        finally:
+            conn.close()
+        report['aggregation'] = {
+            'health_status': (health or {}).get('status'),
+            'workers_up': sum(1 for worker in (health or {}).get('workers', {}).values() if worker['state'] == 'up'),
+            'metrics_workers': sum(1 for line in metrics_text.splitlines()
+                                   if line.startswith('wxauto_stub_requests_total{')),
+        }
+        report['gateway'] = {worker.name: worker.to_dict() for worker in gateway.workers}
+
+        direct = results['direct']['latency'].get('p50_ms')
+        via_gateway = results['gateway_hash']['latency'].get('p50_ms')
+        if direct is not None and via_gateway is not None:
+            report['overhead_p50_ms'] = round(via_gateway - direct, 3)
+        return report
+    finally:
+        if server is not None:
+            server.shutdown()
+        if gateway is not None:
+            gateway.stop()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='API网关基准（桩工作进程）')
+    parser.add_argument('--workers', type=int, default=3, help='桩工作进程数量')
+    parser.add_argument('--requests', type=int, default=1000, help='每个发送场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发客户端线程数')
+    parser.add_argument('--latency', type=float, default=0.005, help='桩工作进程处理发送请求的耗时（秒）')
+    parser.add_argument('--messages-per-poll', type=int, default=2, help='每次轮询每个桩工作进程返回的消息数')
+    parser.add_argument('--output', help='JSON报告输出路径，默认输出到标准输出')
+    parser.add_argument('--stub-worker', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    parser.add_argument('--account', action='append', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.stub_worker:
+        serve_stub(args.stub_worker, args.account or [], args.latency, args.messages_per_poll)
+        return 0
+
+    import logging
+    from app.unified_logger import unified_logger
+    unified_logger.console_enabled = False
+    # 网关在本进程中运行，不输出每个请求的访问日志
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    report = run_benchmark(args)
+    for name, result in report['results'].items():
+        print(f"[{name}] {result['throughput_rps']} req/s, p95 {result['latency'].get('p95_ms')} ms, "
+              f"errors {result['errors']}", file=sys.stderr)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"报告已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
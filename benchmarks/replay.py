@@ -0,0 +1,123 @@
+"""
+界面调用轨迹回放
+读取由/api/admin/ui-timings（trace=true）或UI_TRACE_ENABLED记录的JSONL轨迹，
+模拟后端按方法依次取出记录的耗时、成败和结果大小，同一轨迹多次运行结果一致
+
+用法:
+    python -m benchmarks.replay logs/ui_trace_20250101_120000.jsonl   # 查看轨迹概要
+    python -m benchmarks.run --replay logs/ui_trace_20250101_120000.jsonl
+"""
+
+import json
+import re
+import sys
+import threading
+from typing import Dict, List, Optional
+
+TRACE_FORMAT = 'wxauto-ui-trace'
+SUPPORTED_VERSIONS = (1,)
+
+_SHAPE_PATTERN = re.compile(r'^\w+\[(\d+)\]$')
+
+
+def result_size(shape: Optional[str]) -> Optional[int]:
+    """从结果形状（例如list[37]）中取出长度，无法确定时返回None"""
+    if not shape:
+        return None
+    match = _SHAPE_PATTERN.match(shape)
+    return int(match.group(1)) if match else None
+
+
+class ReplayCall:
+    """一次记录的界面调用"""
+
+    __slots__ = ('method', 'duration', 'ok', 'exception', 'result_size')
+
+    def __init__(self, method: str, duration: float, ok: bool, exception: Optional[str], result_size: Optional[int]):
+        self.method = method
+        self.duration = duration
+        self.ok = ok
+        self.exception = exception
+        self.result_size = result_size
+
+
+class ReplayBackend:
+    """按方法循环回放记录的调用，每个方法维护独立的游标"""
+
+    def __init__(self, calls: Dict[str, List[ReplayCall]], source: Optional[str] = None):
+        self.calls = calls
+        self.source = source
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> 'ReplayBackend':
+        """
+        加载轨迹文件
+
+        Raises:
+            ValueError: 文件格式或版本不支持
+        """
+        calls: Dict[str, List[ReplayCall]] = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline() or '{}')
+            if header.get('format') != TRACE_FORMAT or header.get('version') not in SUPPORTED_VERSIONS:
+                raise ValueError(f"不支持的轨迹文件: {path}")
+            for line_no, line in enumerate(f, start=2):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程异常退出时最后一行可能不完整
+                    print(f"跳过无法解析的第{line_no}行", file=sys.stderr)
+                    continue
+                calls.setdefault(record['m'], []).append(ReplayCall(
+                    record['m'], float(record['d']), bool(record['ok']), record.get('e'), result_size(record.get('r'))))
+        return cls(calls, source=path)
+
+    def next_call(self, method: str) -> Optional[ReplayCall]:
+        """取出该方法的下一条记录，用完后从头开始，没有记录时返回None"""
+        calls = self.calls.get(method)
+        if not calls:
+            return None
+        with self._lock:
+            index = self._cursors.get(method, 0)
+            self._cursors[method] = index + 1
+        return calls[index % len(calls)]
+
+    def reset(self):
+        """游标回到开头"""
+        with self._lock:
+            self._cursors.clear()
+
+    def summary(self) -> dict:
+        """按方法汇总记录的耗时、失败数和结果大小"""
+        result = {}
+        for method, calls in sorted(self.calls.items()):
+            durations = sorted(call.duration for call in calls)
+            sizes = [call.result_size for call in calls if call.result_size is not None]
+            result[method] = {
+                'count': len(calls),
+                'errors': sum(1 for call in calls if not call.ok),
+                'p50_ms': round(durations[len(durations) // 2] * 1000, 3),
+                'p95_ms': round(durations[min(int(len(durations) * 0.95), len(durations) - 1)] * 1000, 3),
+                'max_ms': round(durations[-1] * 1000, 3),
+                'max_result_size': max(sizes) if sizes else None,
+            }
+        return result
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("用法: python -m benchmarks.replay <轨迹文件>", file=sys.stderr)
+        return 2
+    backend = ReplayBackend.load(argv[0])
+    print(json.dumps(backend.summary(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+基准测试入口
+
+用法:
+    python -m benchmarks.run --scenario all --mode both --output benchmark.json
+
+假的wxauto/wxautox模块在导入app之前注册，WeChatAdapter按正常流程导入并初始化，
+所有请求都经过真实的路由、请求队列、缓存和中间件
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# 从项目根目录运行时保证能导入app和benchmarks
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fake_wechat import FakeBackendConfig, current_instance, install_fake_modules, uninstall_fake_modules
+from benchmarks.replay import ReplayBackend
+from benchmarks.scenarios import SCENARIOS, HttpDriver, TestClientDriver
+
+
+def _parse_pairs(values, cast=str) -> dict:
+    """解析"方法=值"形式的参数"""
+    result = {}
+    for value in values or []:
+        name, sep, raw = value.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"参数格式应为 方法=值: {value}")
+        result[name.strip()] = cast(raw.strip())
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='wxauto HTTP API 基准测试（模拟微信后端）')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS) + ['all'],
+                        help='要运行的场景，可重复指定，默认all')
+    parser.add_argument('--mode', choices=['test-client', 'http', 'both'], default='both',
+                        help='请求方式：Flask测试客户端、本地HTTP服务器或两者')
+    parser.add_argument('--lib', choices=['wxauto', 'wxautox'], default='wxautox', help='模拟的微信自动化库')
+    parser.add_argument('--requests', type=int, default=200, help='按次数运行的场景的请求总数')
+    parser.add_argument('--duration', type=float, default=10.0, help='按时长运行的场景的时长（秒）')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发客户端线程数')
+    parser.add_argument('--time-scale', type=float, default=0.1,
+                        help='模拟界面延迟的缩放系数，1为接近真实的延迟，0为不休眠')
+    parser.add_argument('--latency', action='append', metavar='METHOD=SPEC',
+                        help='覆盖方法延迟分布，例如 SendMsg=lognormal:0.1,0.3 或 ChatWith=fixed:0.05')
+    parser.add_argument('--failure-rate', action='append', metavar='METHOD=RATE',
+                        help='方法失败率，例如 ChatWith=0.02')
+    parser.add_argument('--default-failure-rate', type=float, default=0.0, help='其他方法的失败率')
+    parser.add_argument('--friends', type=int, default=500, help='模拟好友数量')
+    parser.add_argument('--groups', type=int, default=80, help='模拟群聊数量')
+    parser.add_argument('--members', type=int, default=200, help='每个群的成员数量')
+    parser.add_argument('--listen-chats', type=int, default=20, help='listen_fan_in场景的监听对象数量')
+    parser.add_argument('--message-rate', type=float, default=50.0, help='listen_fan_in场景每秒生成的消息数')
+    parser.add_argument('--replay', metavar='TRACE',
+                        help='回放界面调用轨迹文件（ui_trace_*.jsonl），有记录的方法按记录的耗时和结果大小模拟')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--output', help='JSON报告输出路径，默认输出到标准输出')
+    parser.add_argument('--verbose', action='store_true', help='保留应用日志输出')
+    return parser
+
+
+def create_benchmark_app(lib: str):
+    """创建关闭限流的Flask应用，并通过接口初始化模拟微信实例"""
+    from app.config import Config
+
+    Config.WECHAT_LIB = lib
+    # 基准测试的请求量远超默认限流
+    Config.RATELIMIT_ENABLED = False
+
+    from app import create_app
+    from app.wechat_adapter import wechat_adapter
+
+    if not wechat_adapter._initialized:
+        wechat_adapter._requested_lib_name = lib
+    app = create_app()
+    api_key = Config.get_api_keys()[0]
+    return app, api_key
+
+
+def run_benchmarks(args) -> dict:
+    config = FakeBackendConfig(
+        latencies=_parse_pairs(args.latency),
+        failure_rates=_parse_pairs(args.failure_rate, float),
+        default_failure_rate=args.default_failure_rate,
+        time_scale=args.time_scale,
+        friends=args.friends,
+        groups=args.groups,
+        members_per_group=args.members,
+        seed=args.seed,
+        replay=ReplayBackend.load(args.replay) if args.replay else None,
+    )
+    replaced = install_fake_modules(config)
+    try:
+        if not args.verbose:
+            logging.disable(logging.INFO)
+        app, api_key = create_benchmark_app(args.lib)
+        if not args.verbose:
+            # 统一日志直接输出到控制台，不经过logging
+            from app.unified_logger import unified_logger
+            unified_logger.console_enabled = False
+
+        names = args.scenario or ['all']
+        names = sorted(SCENARIOS) if 'all' in names else list(dict.fromkeys(names))
+        modes = ['test-client', 'http'] if args.mode == 'both' else [args.mode]
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'revision': _git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'concurrency': args.concurrency,
+                'requests': args.requests,
+                'duration': args.duration,
+                'backend': config.to_dict(),
+            },
+            'results': {},
+        }
+
+        for mode in modes:
+            driver = TestClientDriver(app, api_key) if mode == 'test-client' else HttpDriver(app, api_key)
+            try:
+                status, data = driver.request('POST', '/api/wechat/initialize')
+                if status != 200:
+                    raise RuntimeError(f"模拟微信初始化失败: {status} {data}")
+                from app.wechat_adapter import wechat_adapter
+                report['meta']['lib'] = wechat_adapter.get_lib_name()
+
+                results = report['results'].setdefault(mode, {})
+                for name in names:
+                    scenario_cls = SCENARIOS[name]
+                    kwargs = dict(requests=args.requests, concurrency=args.concurrency,
+                                  duration=args.duration, seed=args.seed)
+                    if name == 'listen_fan_in':
+                        kwargs.update(chats=args.listen_chats, message_rate=args.message_rate)
+                    print(f"[{mode}] {name} ...", file=sys.stderr)
+                    results[name] = scenario_cls(**kwargs).run(driver)
+                    summary = results[name]
+                    print(f"[{mode}] {name}: {summary['throughput_rps']} req/s, "
+                          f"p95 {summary['latency'].get('p95_ms')} ms, errors {summary['errors']}", file=sys.stderr)
+            finally:
+                driver.close()
+
+        fake = current_instance()
+        report['backend_stats'] = fake.get_stats() if fake else None
+        return report
+    finally:
+        logging.disable(logging.NOTSET)
+        uninstall_fake_modules(replaced)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    report = run_benchmarks(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"报告已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
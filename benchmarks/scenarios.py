@@ -0,0 +1,612 @@
+"""
+基准场景
+每个场景通过Driver向真实的Flask应用发送请求（测试客户端或本地HTTP服务器），
+按操作汇总吞吐量和延迟分位数
+"""
+
+import http.client
+import json
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from benchmarks.fake_wechat import current_instance, instance_for
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values: List[float], percent: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(int(len(sorted_values) * percent / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(values: List[float]) -> dict:
+    """延迟汇总，单位为毫秒"""
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    summary = {'count': len(values), 'mean_ms': round(sum(values) / len(values) * 1000, 3)}
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = round(percentile(values, p) * 1000, 3)
+    summary['max_ms'] = round(values[-1] * 1000, 3)
+    return summary
+
+
+# ---- 请求驱动 ----
+
+class TestClientDriver:
+    """通过Flask测试客户端发送请求，每个线程使用独立的客户端"""
+
+    name = 'test-client'
+
+    def __init__(self, app, api_key: str):
+        self.app = app
+        self.api_key = api_key
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, Optional[dict]]:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers={'X-API-Key': self.api_key})
+        try:
+            return response.status_code, response.get_json(silent=True)
+        finally:
+            response.close()
+
+    def close(self):
+        pass
+
+
+class HttpDriver:
+    """在本地端口启动真实的HTTP服务器，每个线程保持一条长连接"""
+
+    name = 'http'
+
+    def __init__(self, app, api_key: str, host: str = '127.0.0.1', port: int = 0):
+        from werkzeug.serving import make_server
+
+        self.api_key = api_key
+        self.server = make_server(host, port, app, threaded=True)
+        self.host = host
+        self.port = self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="BenchmarkHttpServer")
+        self._thread.start()
+        self._local = threading.local()
+
+    def _connection(self, fresh: bool = False) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or fresh:
+            if conn is not None:
+                conn.close()
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        return conn
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, Optional[dict]]:
+        headers = {'X-API-Key': self.api_key}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            conn = self._connection(fresh=attempt > 0)
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+                    self._local.conn = None
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # 服务器关闭了空闲连接时重连一次
+                if attempt:
+                    raise
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        self.server.shutdown()
+        self._thread.join(timeout=5)
+
+
+# ---- 负载执行 ----
+
+class Recorder:
+    """按操作记录延迟和错误"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, int] = {}
+
+    def record(self, operation: str, duration: float, ok: bool, status):
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(duration)
+            if not ok:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    def call(self, driver, operation: str, method: str, path: str, body: Optional[dict] = None):
+        start = time.perf_counter()
+        status, data = None, None
+        try:
+            status, data = driver.request(method, path, body)
+            ok = status == 200 and isinstance(data, dict) and data.get('code') == 0
+        except Exception as e:
+            status, ok = type(e).__name__, False
+        self.record(operation, time.perf_counter() - start, ok, status)
+        return status, data
+
+    def report(self, duration: float) -> dict:
+        total = sum(len(values) for values in self.latencies.values())
+        errors = sum(self.errors.values())
+        all_values = [value for values in self.latencies.values() for value in values]
+        return {
+            'requests': total,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0,
+            'duration_s': round(duration, 3),
+            'throughput_rps': round(total / duration, 3) if duration else 0,
+            'latency': summarize(all_values),
+            'operations': {
+                operation: dict(summarize(values), errors=self.errors.get(operation, 0))
+                for operation, values in sorted(self.latencies.items())
+            },
+            'statuses': dict(sorted(self.statuses.items())),
+        }
+
+
+def run_workers(worker: Callable[[int], bool], concurrency: int, total: Optional[int] = None,
+                duration: Optional[float] = None) -> float:
+    """
+    并发执行worker，直到完成total次调用或达到duration秒
+
+    Args:
+        worker (callable): 接收序号的函数，返回False时该线程提前结束
+        concurrency (int): 并发线程数
+        total (int, optional): 调用总次数
+        duration (float, optional): 最长运行时间（秒）
+
+    Returns:
+        float: 实际耗时（秒）
+    """
+    counter = iter(range(total if total is not None else 1 << 62))
+    counter_lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def loop():
+        while deadline is None or time.perf_counter() < deadline:
+            with counter_lock:
+                index = next(counter, None)
+            if index is None or worker(index) is False:
+                return
+
+    threads = [threading.Thread(target=loop, daemon=True, name=f"BenchmarkWorker-{i}") for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+# ---- 场景 ----
+
+class Scenario:
+    """场景基类"""
+
+    name = ''
+    description = ''
+
+    def __init__(self, requests: int = 200, concurrency: int = 8, duration: float = 10.0, seed: Optional[int] = None):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def choice(self, items):
+        with self.rng_lock:
+            return self.rng.choice(items)
+
+    def random(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def run(self, driver) -> dict:
+        raise NotImplementedError
+
+
+def _friend_names(limit: Optional[int] = None) -> List[str]:
+    fake = current_instance()
+    names = [friend['nickname'] for friend in fake.friends] if fake else ['文件传输助手']
+    return names[:limit] if limit else names
+
+
+def _group_names(limit: Optional[int] = None) -> List[str]:
+    fake = current_instance()
+    names = list(fake.group_names) if fake else []
+    return names[:limit] if limit else names
+
+
+class SendBurstScenario(Scenario):
+    """大量并发发送文本消息，所有请求都经过请求队列串行执行"""
+
+    name = 'send_burst'
+    description = '并发调用/api/message/send'
+
+    def run(self, driver) -> dict:
+        recorder = Recorder()
+        receivers = _friend_names(50) or ['文件传输助手']
+
+        def worker(index):
+            recorder.call(driver, 'send', 'POST', '/api/message/send',
+                          {'receiver': self.choice(receivers), 'message': f'benchmark message {index}'})
+
+        duration = run_workers(worker, self.concurrency, total=self.requests)
+        return recorder.report(duration)
+
+
+class ListenFanInScenario(Scenario):
+    """多个监听对象同时收到消息，客户端并发轮询/api/message/listen/get"""
+
+    name = 'listen_fan_in'
+    description = '监听多个聊天并轮询消息，统计消息送达延迟'
+
+    def __init__(self, *args, chats: int = 20, message_rate: float = 50.0, poll_interval: float = 0.05, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chats = chats
+        self.message_rate = message_rate
+        self.poll_interval = poll_interval
+
+    def run(self, driver) -> dict:
+        recorder = Recorder()
+        fake = current_instance()
+        chats = (_friend_names(self.chats // 2) + _group_names(self.chats - self.chats // 2))[:self.chats]
+
+        # 先添加监听，再开始生成消息
+        fake.config.message_rate = 0
+        for chat in chats:
+            recorder.call(driver, 'listen_add', 'POST', '/api/message/listen/add', {'nickname': chat})
+
+        delivery = []
+        received = [0]
+        delivery_lock = threading.Lock()
+        generated_before = fake.delivered_messages
+        callbacks_before = len(fake.callback_durations)
+        fake.config.message_rate = self.message_rate
+        fake._ensure_generator()
+
+        def worker(index):
+            status, data = recorder.call(driver, 'listen_get', 'GET', '/api/message/listen/get')
+            now = time.time()
+            messages = ((data or {}).get('data') or {}).get('messages') or {}
+            latencies = []
+            for items in messages.values():
+                for msg in items:
+                    parts = str(msg.get('content', '')).split('|')
+                    if len(parts) == 3 and parts[0] == 'bench':
+                        latencies.append(now - float(parts[1]))
+            with delivery_lock:
+                delivery.extend(latencies)
+                received[0] += sum(len(items) for items in messages.values())
+            if not messages and self.poll_interval:
+                time.sleep(self.poll_interval)
+
+        duration = run_workers(worker, self.concurrency, duration=self.duration)
+
+        fake.stop()
+        fake.config.message_rate = 0
+        generated = fake.delivered_messages - generated_before
+        # 等待处理流水线处理完已收到的消息，取走剩余消息，再移除监听
+        from app.message_pipeline import message_pipeline
+        message_pipeline.wait_idle()
+        for _ in range(len(chats) + 1):
+            recorder.call(driver, 'listen_get', 'GET', '/api/message/listen/get')
+        for chat in chats:
+            recorder.call(driver, 'listen_remove', 'POST', '/api/message/listen/remove', {'nickname': chat})
+
+        report = recorder.report(duration)
+        report['messages'] = {
+            'chats': len(chats),
+            'generated': generated,
+            'received_during_run': received[0],
+            'messages_per_second': round(received[0] / duration, 3) if duration else 0,
+            'delivery_latency': summarize(delivery),
+            # 监听回调占用微信库监听线程的时间
+            'callback_blocking': summarize(fake.callback_durations[callbacks_before:]),
+        }
+        return report
+
+
+class DirectoryScrapeScenario(Scenario):
+    """拉取好友、群聊和群成员列表，按比例强制刷新以覆盖缓存命中和未命中"""
+
+    name = 'directory_scrape'
+    description = '好友列表、群列表和群成员列表'
+
+    def __init__(self, *args, refresh_ratio: float = 0.1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_ratio = refresh_ratio
+
+    def run(self, driver) -> dict:
+        recorder = Recorder()
+        groups = _group_names(20) or ['测试群000']
+
+        def worker(index):
+            refresh = '1' if self.random() < self.refresh_ratio else '0'
+            kind = index % 3
+            if kind == 0:
+                recorder.call(driver, 'contact_list', 'GET', f'/api/contact/list?refresh={refresh}')
+            elif kind == 1:
+                recorder.call(driver, 'group_list', 'GET', f'/api/group/list?refresh={refresh}')
+            else:
+                recorder.call(driver, 'group_members', 'POST', '/api/group/get-members',
+                              {'group_name': self.choice(groups), 'refresh': refresh == '1'})
+
+        duration = run_workers(worker, self.concurrency, total=self.requests)
+        return recorder.report(duration)
+
+
+class MixedTrafficScenario(Scenario):
+    """按权重混合发送、轮询、通讯录和状态查询请求"""
+
+    name = 'mixed_traffic'
+    description = '发送、轮询、通讯录、状态查询混合负载'
+
+    WEIGHTS = (
+        ('send', 30),
+        ('listen_get', 25),
+        ('get_next_new', 10),
+        ('contact_list', 10),
+        ('group_list', 5),
+        ('group_members', 5),
+        ('wechat_status', 10),
+        ('health', 5),
+    )
+
+    def run(self, driver) -> dict:
+        recorder = Recorder()
+        receivers = _friend_names(50) or ['文件传输助手']
+        groups = _group_names(20) or ['测试群000']
+        operations = [name for name, weight in self.WEIGHTS for _ in range(weight)]
+
+        def worker(index):
+            operation = self.choice(operations)
+            if operation == 'send':
+                recorder.call(driver, operation, 'POST', '/api/message/send',
+                              {'receiver': self.choice(receivers), 'message': f'mixed {index}'})
+            elif operation == 'listen_get':
+                recorder.call(driver, operation, 'GET', '/api/message/listen/get')
+            elif operation == 'get_next_new':
+                recorder.call(driver, operation, 'GET', '/api/message/get-next-new')
+            elif operation == 'contact_list':
+                recorder.call(driver, operation, 'GET', '/api/contact/list')
+            elif operation == 'group_list':
+                recorder.call(driver, operation, 'GET', '/api/group/list')
+            elif operation == 'group_members':
+                recorder.call(driver, operation, 'POST', '/api/group/get-members', {'group_name': self.choice(groups)})
+            elif operation == 'wechat_status':
+                recorder.call(driver, operation, 'GET', '/api/wechat/status')
+            else:
+                recorder.call(driver, operation, 'GET', '/api/health')
+
+        duration = run_workers(worker, self.concurrency, total=self.requests)
+        return recorder.report(duration)
+
+
+class MultiAccountScenario(Scenario):
+    """注册多个账号，每个账号连接各自的模拟微信窗口，通过路径前缀并发发送，并检查消息没有串到其他账号"""
+
+    name = 'multi_account'
+    description = '多账号并发发送和账号隔离检查'
+
+    def __init__(self, *args, accounts: int = 2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accounts = max(accounts, 1)
+
+    def run(self, driver) -> dict:
+        recorder = Recorder()
+        accounts = [f'bench_{index}' for index in range(self.accounts)]
+        receivers = _friend_names(50) or ['文件传输助手']
+        default_fake = current_instance()
+        default_before = default_fake.sent_messages if default_fake else 0
+
+        for account in accounts:
+            recorder.call(driver, 'account_register', 'POST', '/api/admin/accounts',
+                          {'id': account, 'window': f'Bench-{account}'})
+            recorder.call(driver, 'account_initialize', 'POST', f'/accounts/{account}/api/wechat/initialize')
+
+        fakes = {account: instance_for(f'Bench-{account}') for account in accounts}
+        before = {account: fake.sent_messages if fake else 0 for account, fake in fakes.items()}
+        sent = {account: 0 for account in accounts}
+        sent_lock = threading.Lock()
+
+        def worker(index):
+            account = accounts[index % len(accounts)]
+            status, data = recorder.call(driver, 'send', 'POST', f'/accounts/{account}/api/message/send',
+                                         {'receiver': self.choice(receivers), 'message': f'{account} {index}'})
+            if status == 200 and (data or {}).get('code') == 0:
+                with sent_lock:
+                    sent[account] += 1
+
+        duration = run_workers(worker, self.concurrency, total=self.requests)
+
+        status, data = recorder.call(driver, 'account_stats', 'GET', '/api/admin/accounts')
+        account_stats = ((data or {}).get('data') or {}).get('accounts') or {}
+        for account in accounts:
+            recorder.call(driver, 'account_remove', 'DELETE', f'/api/admin/accounts/{account}')
+
+        # 每个模拟窗口收到的消息数应等于发往该账号的成功请求数，默认账号的窗口不应收到消息
+        delivered = {account: (fake.sent_messages - before[account]) if fake else None
+                     for account, fake in fakes.items()}
+        default_delivered = (default_fake.sent_messages - default_before) if default_fake else 0
+        report = recorder.report(duration)
+        report['isolation'] = {
+            'sent': sent,
+            'delivered': delivered,
+            'default_delivered': default_delivered,
+            'requests_by_account': {account: (account_stats.get(account) or {}).get('requests')
+                                    for account in accounts},
+            'ok': delivered == sent and default_delivered == 0,
+        }
+        return report
+
+
+class MessageOpsScenario(Scenario):
+    """
+    对一个已加载大量历史消息的监听聊天执行引用、转发、下载等消息操作，
+    先关闭消息句柄索引（每次操作都重新获取消息列表），再开启索引，对比两次的吞吐量
+    """
+
+    name = 'message_ops'
+    description = '消息操作按消息ID查找消息（消息句柄索引关闭/开启对比）'
+
+    CHAT = '消息操作基准'
+    OPERATIONS = (
+        ('quote', {'reply_text': '收到'}),
+        ('forward', {'to_friends': ['文件传输助手']}),
+        ('click', {}),
+        ('download', {}),
+        ('select-option', {'option': '复制'}),
+    )
+
+    def __init__(self, *args, history: int = 5000, recent: int = 500, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.history = history
+        self.recent = max(recent, 1)
+
+    def _run_once(self, driver, message_ids: List[str]) -> dict:
+        recorder = Recorder()
+
+        def worker(index):
+            operation, extra = self.OPERATIONS[index % len(self.OPERATIONS)]
+            body = dict(extra, who=self.CHAT, message_id=self.choice(message_ids))
+            recorder.call(driver, operation, 'POST', f'/api/message/{operation}', body)
+
+        duration = run_workers(worker, self.concurrency, total=self.requests)
+        return recorder.report(duration)
+
+    def run(self, driver) -> dict:
+        from app.message_index import message_index
+
+        setup = Recorder()
+        setup.call(driver, 'listen_add', 'POST', '/api/message/listen/add', {'nickname': self.CHAT})
+        fake = current_instance()
+        chat = fake.listen.get(self.CHAT) if fake else None
+        if chat is None:
+            report = setup.report(0)
+            report['error'] = '添加监听失败'
+            return report
+        chat.seed_history(self.history)
+        message_ids = [msg.id for msg in chat.history[-self.recent:]]
+
+        index = message_index.get()
+        enabled = index.enabled
+        results = {}
+        try:
+            for mode, use_index in (('scan', False), ('index', True)):
+                index.enabled = use_index
+                index.clear()
+                scans_before = fake.calls.get('ChatGetAllMessage', 0)
+                results[mode] = self._run_once(driver, message_ids)
+                results[mode]['get_all_message_calls'] = fake.calls.get('ChatGetAllMessage', 0) - scans_before
+            index_stats = index.get_stats()
+        finally:
+            index.enabled = enabled
+            setup.call(driver, 'listen_remove', 'POST', '/api/message/listen/remove', {'nickname': self.CHAT})
+
+        # 顶层指标取开启索引的结果，关闭索引的结果放在comparison中
+        report = results['index']
+        scan_rps = results['scan']['throughput_rps']
+        report['comparison'] = {
+            'history': self.history,
+            'scan': results['scan'],
+            'speedup': round(report['throughput_rps'] / scan_rps, 2) if scan_rps else None,
+            'index_stats': index_stats,
+        }
+        return report
+
+
+class HistorySyncScenario(Scenario):
+    """
+    模拟客户端轮询一个已加载大量历史消息的聊天：每次轮询前到达少量新消息，
+    先用/api/chat/get-all-messages全量拉取，再用/api/chat/sync按水位增量拉取，对比返回的消息数和响应大小
+    """
+
+    name = 'history_sync'
+    description = '聊天记录全量拉取与按水位增量同步对比'
+
+    CHAT = '记录同步基准'
+
+    def __init__(self, *args, history: int = 2000, arrivals: int = 2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.history = history
+        self.arrivals = arrivals
+
+    def _run_once(self, driver, chat, path: str, incremental: bool) -> dict:
+        from benchmarks.fake_wechat import FakeMessage
+
+        recorder = Recorder()
+        returned = {'messages': 0, 'bytes': 0}
+        returned_lock = threading.Lock()
+
+        def worker(index):
+            for _ in range(self.arrivals):
+                chat.append(FakeMessage(self.CHAT, f"新消息{index}", self.CHAT))
+            params = {'who': self.CHAT}
+            if incremental:
+                # 每个线程作为一个consumer，各自保存水位
+                params['consumer'] = threading.current_thread().name
+            status, data = recorder.call(driver, path.rsplit('/', 1)[-1], 'GET', f"{path}?{urlencode(params)}")
+            messages = ((data or {}).get('data') or {}).get('messages') or []
+            with returned_lock:
+                returned['messages'] += len(messages)
+                returned['bytes'] += len(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+        duration = run_workers(worker, self.concurrency, total=self.requests)
+        report = recorder.report(duration)
+        report['messages_per_request'] = round(returned['messages'] / self.requests, 1) if self.requests else 0
+        report['bytes_per_request'] = round(returned['bytes'] / self.requests) if self.requests else 0
+        return report
+
+    def run(self, driver) -> dict:
+        setup = Recorder()
+        setup.call(driver, 'listen_add', 'POST', '/api/message/listen/add', {'nickname': self.CHAT})
+        fake = current_instance()
+        chat = fake.listen.get(self.CHAT) if fake else None
+        if chat is None:
+            report = setup.report(0)
+            report['error'] = '添加监听失败'
+            return report
+        chat.seed_history(self.history)
+
+        try:
+            full = self._run_once(driver, chat, '/api/chat/get-all-messages', incremental=False)
+            report = self._run_once(driver, chat, '/api/chat/sync', incremental=True)
+        finally:
+            setup.call(driver, 'listen_remove', 'POST', '/api/message/listen/remove', {'nickname': self.CHAT})
+
+        # 顶层指标为增量同步的结果，全量拉取的结果放在comparison中
+        report['comparison'] = {
+            'history': self.history,
+            'full': full,
+            'bytes_ratio': round(full['bytes_per_request'] / report['bytes_per_request'], 1)
+            if report['bytes_per_request'] else None,
+        }
+        return report
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (SendBurstScenario, ListenFanInScenario, DirectoryScrapeScenario, MixedTrafficScenario,
+                     MultiAccountScenario, MessageOpsScenario, HistorySyncScenario)
+}
@@ -0,0 +1,227 @@
+"""
+启动耗时基准
+在子进程中用 -X importtime 创建应用，解析各模块的导入耗时，
+并测量从启动进程到/health返回200的时间，分别覆盖普通启动和快速启动两种模式。
+
+用法:
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --baseline startup.json --max-regression 0.2   # 超过基线20%时返回非零
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {'eager': '0', 'fast': '1'}
+
+# 子进程中执行的代码：注册模拟后端后创建应用
+_CREATE_APP = '''
+import sys, time
+start = time.perf_counter()
+from benchmarks.fake_wechat import install_fake_modules
+install_fake_modules()
+from app import create_app
+app = create_app()
+print("CREATE_APP_MS=%.3f" % ((time.perf_counter() - start) * 1000), flush=True)
+'''
+
+_SERVE = _CREATE_APP + '''
+from werkzeug.serving import make_server
+server = make_server("127.0.0.1", int(sys.argv[1]), app, threaded=True)
+server.serve_forever()
+'''
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def parse_importtime(stderr: str) -> List[dict]:
+    """
+    解析 -X importtime 的输出
+
+    Returns:
+        list: [{'module', 'self_us', 'cumulative_us', 'depth'}]，顺序与输出一致（子模块在父模块之前）
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        entries.append({
+            'module': module,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            # 每层嵌套缩进两个空格
+            'depth': max(len(indent) - 1, 0) // 2,
+        })
+    return entries
+
+
+def summarize_imports(entries: List[dict], top: int = 15) -> dict:
+    """汇总导入耗时：总耗时、按包汇总、耗时最多的顶层导入和自身耗时最多的模块"""
+    packages: Dict[str, int] = {}
+    for entry in entries:
+        package = entry['module'].split('.')[0]
+        packages[package] = packages.get(package, 0) + entry['self_us']
+    top_level = [entry for entry in entries if entry['depth'] == 0]
+    return {
+        'modules': len(entries),
+        'total_ms': round(sum(entry['self_us'] for entry in entries) / 1000, 3),
+        'app_modules': sorted(entry['module'] for entry in entries if entry['module'].startswith('app')),
+        'by_package_ms': {name: round(us / 1000, 3) for name, us in
+                          sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]},
+        'top_cumulative': [{'module': entry['module'], 'ms': round(entry['cumulative_us'] / 1000, 3)}
+                           for entry in sorted(top_level, key=lambda e: e['cumulative_us'], reverse=True)[:top]],
+        'top_self': [{'module': entry['module'], 'ms': round(entry['self_us'] / 1000, 3)}
+                     for entry in sorted(entries, key=lambda e: e['self_us'], reverse=True)[:top]],
+    }
+
+
+def _env(fast: str) -> dict:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT_DIR, env.get('PYTHONPATH')]))
+    env['WXAUTO_FAST_STARTUP'] = fast
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_imports(mode: str, workdir: str) -> dict:
+    """在子进程中以 -X importtime 创建应用"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _CREATE_APP], cwd=workdir,
+                            env=_env(MODES[mode]), capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"创建应用失败（{mode}）:\n{result.stderr[-2000:]}")
+    match = re.search(r'CREATE_APP_MS=([\d.]+)', result.stdout)
+    summary = summarize_imports(parse_importtime(result.stderr))
+    summary['create_app_ms'] = float(match.group(1)) if match else None
+    return summary
+
+
+def measure_time_to_health(mode: str, workdir: str, timeout: float = 60.0) -> float:
+    """启动服务进程，返回从启动进程到/health返回200的毫秒数"""
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}/health'
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', _SERVE, str(port)], cwd=workdir, env=_env(MODES[mode]),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"服务进程提前退出（{mode}），返回码 {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.005)
+        raise RuntimeError(f"{timeout}秒内/health未就绪（{mode}）")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run(modes: List[str], repeat: int) -> dict:
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'modes': {},
+    }
+    for mode in modes:
+        # 每次使用新的工作目录，避免配置文件和路由清单缓存影响结果
+        health, create_app, imports = [], [], None
+        for _ in range(repeat):
+            workdir = tempfile.mkdtemp(prefix='wxauto-startup-')
+            try:
+                imports = measure_imports(mode, workdir)
+                create_app.append(imports['create_app_ms'])
+                health.append(measure_time_to_health(mode, workdir))
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+        report['modes'][mode] = {
+            'time_to_health_ms': round(statistics.median(health), 3),
+            'time_to_health_runs_ms': [round(value, 3) for value in health],
+            'create_app_ms': round(statistics.median(create_app), 3) if all(create_app) else None,
+            'imports': imports,
+        }
+        print(f"[{mode}] /health {report['modes'][mode]['time_to_health_ms']} ms, "
+              f"导入 {imports['total_ms']} ms / {imports['modules']} 个模块", file=sys.stderr)
+    return report
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    """与基线比较，返回超过阈值的指标"""
+    regressions = []
+    for mode, current in report['modes'].items():
+        previous = baseline.get('modes', {}).get(mode)
+        if not previous:
+            continue
+        for metric, now, before in (
+                ('time_to_health_ms', current['time_to_health_ms'], previous.get('time_to_health_ms')),
+                ('imports.total_ms', current['imports']['total_ms'], (previous.get('imports') or {}).get('total_ms')),
+                ('imports.modules', current['imports']['modules'], (previous.get('imports') or {}).get('modules'))):
+            if before and now > before * (1 + max_regression):
+                regressions.append(f"{mode} {metric}: {before} -> {now}")
+        new_modules = set(current['imports']['app_modules']) - set((previous.get('imports') or {}).get('app_modules', []))
+        if new_modules and mode == 'fast':
+            # 快速启动时新增的app模块导入通常意味着有模块在启动路径上被提前导入
+            regressions.append(f"{mode} 新增启动时导入的模块: {', '.join(sorted(new_modules))}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='启动耗时基准（模拟微信后端）')
+    parser.add_argument('--mode', choices=['eager', 'fast', 'both'], default='both')
+    parser.add_argument('--repeat', type=int, default=3, help='每种模式的重复次数，取中位数')
+    parser.add_argument('--output', help='JSON报告输出路径，默认输出到标准输出')
+    parser.add_argument('--baseline', help='基线报告，超过阈值时返回码为1')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='允许相对基线增加的比例')
+    args = parser.parse_args(argv)
+
+    modes = list(MODES) if args.mode == 'both' else [args.mode]
+    report = run(modes, max(args.repeat, 1))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"报告已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"回归: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -101,8 +101,10 @@ def main():
 
         # 解析命令行参数
         parser = argparse.ArgumentParser(description="wxauto_http_api")
-        parser.add_argument("--service", choices=["ui", "api", "both"], default="ui",
-                          help="指定要启动的服务类型: ui, api 或 both")
+        parser.add_argument("--service", choices=["ui", "api", "both", "gateway"], default="ui",
+                          help="指定要启动的服务类型: ui, api, both 或 gateway")
+        parser.add_argument("--port", type=int, help="API服务或网关的监听端口，默认使用配置中的端口")
+        parser.add_argument("--workers", help="网关模式下API工作进程的端口，逗号分隔，例如 5001,5002")
         parser.add_argument("--debug", action="store_true", help="启用调试模式")
         parser.add_argument("--no-mutex-check", action="store_true", help="禁用互斥锁检查")
         parser.add_argument("--console", action="store_true", help="在打包环境中显示控制台")
@@ -116,7 +118,7 @@ def main():
             args = parser.parse_args()
 
         # 记录解析后的参数
-        logger.info(f"解析后的参数: service={args.service}, debug={args.debug}, no_mutex_check={args.no_mutex_check}")
+        logger.info(f"解析后的参数: service={args.service}, port={args.port}, debug={args.debug}, no_mutex_check={args.no_mutex_check}")
 
         # 在打包环境中，如果指定了console参数，分配控制台
         if getattr(sys, 'frozen', False) and args.console:
@@ -192,6 +194,8 @@ def main():
         if is_frozen:
             logger.info("打包环境中跳过库检测，避免库冲突")
             logger.info("微信自动化库将在实际使用时进行检测和初始化")
+        elif args.service == "gateway":
+            logger.info("网关只转发请求，跳过微信自动化库检测")
         else:
             logger.info("检查微信自动化库...")
 
@@ -213,6 +217,15 @@ def main():
         logger.error(f"检查微信自动化库时出错: {str(e)}")
         logger.error(traceback.format_exc())
 
+    # 指定端口时覆盖配置，同一台机器可以在不同端口运行多个API工作进程，每个端口由AppMutex端口锁保证只有一个进程
+    if args.port and args.service in ("api", "both"):
+        try:
+            from app.config import Config
+            Config.PORT = args.port
+            logger.info(f"使用命令行指定的端口: {args.port}")
+        except Exception as e:
+            logger.error(f"设置端口失败: {str(e)}")
+
     # 根据服务类型启动相应的服务
     if args.service == "ui":
         logger.info("正在启动UI服务...")
@@ -268,6 +281,24 @@ def main():
             logger.error(f"启动API服务时出错: {str(e)}")
             logger.error(traceback.format_exc())
             sys.exit(1)
+    elif args.service == "gateway":
+        logger.info("正在启动API网关...")
+        try:
+            workers = [int(port) for port in args.workers.split(',') if port.strip()] if args.workers else None
+        except ValueError:
+            logger.error(f"工作进程端口格式错误: {args.workers}")
+            sys.exit(1)
+        try:
+            from app.gateway import start_gateway
+            start_gateway(args.port, workers)
+        except ImportError as e:
+            logger.error(f"导入网关模块失败: {str(e)}")
+            logger.error(traceback.format_exc())
+            sys.exit(1)
+        except Exception as e:
+            logger.error(f"启动网关时出错: {str(e)}")
+            logger.error(traceback.format_exc())
+            sys.exit(1)
     elif args.service == "both":
         logger.info("正在同时启动UI和API服务...")
         import threading
@@ -286,8 +317,15 @@ def start_api_thread():
         api_thread = threading.Thread(target=start_api_thread, daemon=True)
         api_thread.start()
 
-        # 等待API服务启动
-        time.sleep(3)
+        # 等待API服务监听端口并创建应用，不等待微信初始化
+        try:
+            from app.config import Config
+            from app.startup import startup_orchestrator
+            if not startup_orchestrator.wait(['http', 'app'], timeout=Config.STARTUP_READY_TIMEOUT):
+                logger.warning(f"API服务未就绪: {startup_orchestrator.get_status(['http', 'app'])['components']}")
+        except Exception as e:
+            logger.warning(f"等待API服务就绪失败: {str(e)}")
+            time.sleep(3)
 
         # 启动UI服务（在主线程中）
         try:
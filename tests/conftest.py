@@ -0,0 +1,48 @@
+"""
+测试公共夹具
+在导入app之前注册模拟的wxauto/wxautox模块（benchmarks/fake_wechat.py），整个测试会话共用一个Flask应用
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 应用在工作目录下创建data/等目录，测试在临时目录中运行
+os.chdir(tempfile.mkdtemp(prefix='wxauto-tests-'))
+
+from benchmarks.fake_wechat import FakeBackendConfig, install_fake_modules  # noqa: E402
+
+# 不休眠、不自动生成消息，需要消息时由测试直接调用监听回调
+install_fake_modules(FakeBackendConfig(time_scale=0, message_rate=0))
+
+
+@pytest.fixture(scope='session')
+def app_and_key():
+    from app.config import Config
+
+    # 测试中不启动定时发送线程和媒体目录回收，避免写入工作目录
+    Config.SCHEDULER_ENABLED = False
+    Config.MEDIA_GC_ENABLED = False
+
+    from benchmarks.run import create_benchmark_app
+    app, api_key = create_benchmark_app('wxautox')
+
+    from app.unified_logger import unified_logger
+    unified_logger.console_enabled = False
+    return app, api_key
+
+
+@pytest.fixture
+def client(app_and_key):
+    return app_and_key[0].test_client()
+
+
+@pytest.fixture
+def headers(app_and_key):
+    return {'X-API-Key': app_and_key[1]}
@@ -0,0 +1,134 @@
+"""多账号隔离：两个账号各自连接模拟微信窗口，请求队列、监听消息缓存和消息句柄索引互不影响"""
+
+import threading
+
+import pytest
+
+from benchmarks.fake_wechat import FakeMessage, instance_for
+
+ACCOUNTS = ('alpha', 'beta')
+
+
+def _window(account_id):
+    return f'Test-{account_id}'
+
+
+@pytest.fixture
+def accounts(client, headers):
+    for account_id in ACCOUNTS:
+        response = client.post('/api/admin/accounts', headers=headers,
+                               json={'id': account_id, 'window': _window(account_id)})
+        assert response.get_json()['code'] == 0
+    # 一个账号通过请求头初始化，另一个通过路径前缀初始化
+    assert client.post('/api/wechat/initialize',
+                       headers=dict(headers, **{'X-WeChat-Account': 'alpha'})).status_code == 200
+    assert client.post('/accounts/beta/api/wechat/initialize', headers=headers).status_code == 200
+    fakes = {account_id: instance_for(_window(account_id)) for account_id in ACCOUNTS}
+    assert all(fakes.values())
+    yield fakes
+    for account_id in ACCOUNTS:
+        client.delete(f'/api/admin/accounts/{account_id}', headers=headers)
+
+
+def _record_send_threads(fake):
+    """记录模拟窗口的SendMsg在哪个线程中执行"""
+    threads = []
+    original = fake.SendMsg
+
+    def send(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return original(*args, **kwargs)
+    fake.SendMsg = send
+    return threads
+
+
+def test_send_goes_to_account_window_and_queue(client, headers, accounts):
+    threads = {account_id: _record_send_threads(fake) for account_id, fake in accounts.items()}
+    before = {account_id: fake.sent_messages for account_id, fake in accounts.items()}
+
+    response = client.post('/api/message/send', headers=dict(headers, **{'X-WeChat-Account': 'alpha'}),
+                           json={'receiver': '文件传输助手', 'message': 'to alpha'})
+    assert response.get_json()['code'] == 0
+    for _ in range(2):
+        response = client.post('/accounts/beta/api/message/send', headers=headers,
+                               json={'receiver': '文件传输助手', 'message': 'to beta'})
+        assert response.get_json()['code'] == 0
+
+    assert accounts['alpha'].sent_messages - before['alpha'] == 1
+    assert accounts['beta'].sent_messages - before['beta'] == 2
+    # 每个账号的界面操作只在自己的队列线程中执行
+    assert threads['alpha'] and all(name.startswith('QueueProcessor-alpha-') for name in threads['alpha'])
+    assert threads['beta'] and all(name.startswith('QueueProcessor-beta-') for name in threads['beta'])
+
+    stats = client.get('/api/admin/accounts', headers=headers).get_json()['data']['accounts']
+    assert stats['alpha']['queue']['worker_threads'] >= 1
+    assert stats['beta']['queue']['worker_threads'] >= 1
+
+
+def test_listener_store_and_caches_are_per_account(client, headers, accounts):
+    from app.api.routes import listen_message_store
+    from app.message_index import message_index
+    from app.message_pipeline import message_pipeline
+
+    alpha = dict(headers, **{'X-WeChat-Account': 'alpha'})
+    assert client.post('/api/message/listen/add', headers=alpha,
+                       json={'nickname': '共享聊天'}).get_json()['code'] == 0
+    assert client.post('/accounts/beta/api/message/listen/add', headers=headers,
+                       json={'nickname': '共享聊天'}).get_json()['code'] == 0
+
+    for account_id, fake in accounts.items():
+        chat = fake.listen['共享聊天']
+        msg = FakeMessage('共享聊天', f'hello {account_id}', '共享聊天')
+        chat.append(msg)
+        chat.callback(msg, chat)
+    assert message_pipeline.wait_idle()
+
+    received = {}
+    for account_id, response in (
+            ('alpha', client.get('/api/message/listen/get', headers=alpha)),
+            ('beta', client.get('/accounts/beta/api/message/listen/get', headers=headers))):
+        messages = response.get_json()['data']['messages']
+        received[account_id] = [msg['content'] for items in messages.values() for msg in items]
+    assert received == {'alpha': ['hello alpha'], 'beta': ['hello beta']}
+
+    # 默认账号没有收到任何消息
+    default_store = listen_message_store.get('default')
+    assert not default_store.get('共享聊天')
+
+    # 消息句柄索引按账号隔离
+    alpha_id = accounts['alpha'].listen['共享聊天'].history[-1].id
+    assert message_index.get('alpha').get_stats()['messages'] == 1
+    assert message_index.get('beta').get_stats()['messages'] == 1
+    assert message_index.get('alpha')._lookup('共享聊天', alpha_id) is not None
+    assert message_index.get('beta')._lookup('共享聊天', alpha_id) is None
+
+    # 移除一个账号的监听不影响另一个账号
+    client.post('/api/message/listen/remove', headers=alpha, json={'nickname': '共享聊天'})
+    assert '共享聊天' not in accounts['alpha'].listen
+    assert '共享聊天' in accounts['beta'].listen
+
+
+def test_removed_account_releases_state(client, headers, accounts):
+    from app.api_queue import account_queues
+    from app.message_index import message_index
+
+    client.post('/api/message/send', headers=dict(headers, **{'X-WeChat-Account': 'alpha'}),
+                json={'receiver': '文件传输助手', 'message': 'warm up'})
+    message_index.get('alpha')
+    assert 'alpha' in account_queues
+
+    assert client.delete('/api/admin/accounts/alpha', headers=headers).get_json()['code'] == 0
+    assert 'alpha' not in account_queues
+    assert message_index.peek('alpha') is None
+    response = client.post('/accounts/alpha/api/message/send', headers=headers,
+                           json={'receiver': '文件传输助手', 'message': 'gone'})
+    assert response.status_code >= 400
+
+
+def test_proxy_attributes_are_forwarded_to_account_instance():
+    from app.wechat_adapter import wechat_adapter
+
+    # 代理自身的锁不能遮住适配器的初始化锁
+    assert wechat_adapter._lock is wechat_adapter.get()._lock
+    assert wechat_adapter.get('alpha-lock') is not wechat_adapter.get()
+    wechat_adapter.discard('alpha-lock')
@@ -0,0 +1,104 @@
+"""上传存储：分块上传中的会话不被媒体回收器回收，过期会话的.part和.json一起删除，写入失败的分块不计入哈希"""
+
+import builtins
+import errno
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+from app.utils import blob_store as blob_store_module
+from app.utils.blob_store import CHUNK_SIZE, UPLOADS_DIR_NAME, BlobStore
+from app.utils.media_gc import MediaGarbageCollector
+
+
+def _age(paths, seconds):
+    old = time.time() - seconds
+    for path in paths:
+        os.utime(path, (old, old))
+
+
+def _paused_session(store):
+    session = store.create_session('report.pdf', total_size=10)
+    store.append_chunk(session['upload_id'], 0, io.BytesIO(b'12345'))
+    upload_id = session['upload_id']
+    return upload_id, [store._part_path(upload_id), store._session_path(upload_id)]
+
+
+def test_media_gc_skips_upload_sessions(tmp_path):
+    store = BlobStore(str(tmp_path))
+    blob = store.put_stream(io.BytesIO(b'done'), 'done.txt')
+    upload_id, session_files = _paused_session(store)
+    _age(session_files + [blob['path']], 3600)
+
+    gc = MediaGarbageCollector(grace_seconds=0)
+    gc.add_directory(store.root, max_age_seconds=60, exclude=(UPLOADS_DIR_NAME,))
+    gc.collect()
+
+    # 已完成的文件按保留时间回收，暂停中的上传会话保持完整，可以继续上传
+    assert not os.path.exists(blob['path'])
+    assert all(os.path.exists(path) for path in session_files)
+    store.append_chunk(upload_id, 5, io.BytesIO(b'67890'))
+    assert store.complete_session(upload_id)['size'] == 10
+
+
+def test_expire_sessions_removes_part_and_json_together(tmp_path):
+    store = BlobStore(str(tmp_path))
+    stale_id, stale_files = _paused_session(store)
+    active_id, active_files = _paused_session(store)
+    _age(stale_files, 2 * 3600)
+
+    assert store.expire_sessions(3600) == 1
+    assert not any(os.path.exists(path) for path in stale_files)
+    assert all(os.path.exists(path) for path in active_files)
+    assert store.get_session(active_id)['offset'] == 5
+    assert store.get_stats()['expired_sessions'] == 1
+
+
+class _DiskFull:
+    """写入limit字节后只写入部分数据并抛出ENOSPC的文件"""
+
+    def __init__(self, f, limit):
+        self._f = f
+        self._room = limit
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._f.close()
+
+    def write(self, data):
+        if len(data) > self._room:
+            self._f.write(data[:self._room])
+            self._f.flush()
+            raise OSError(errno.ENOSPC, 'No space left on device')
+        self._room -= len(data)
+        return self._f.write(data)
+
+
+def test_failed_chunk_write_is_rolled_back(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path))
+    head, body = b'12345', os.urandom(3 * CHUNK_SIZE)
+    session = store.create_session('big.bin', total_size=len(head) + len(body))
+    upload_id = session['upload_id']
+    store.append_chunk(upload_id, 0, io.BytesIO(head))
+
+    def disk_full_open(path, mode='r', *args, **kwargs):
+        f = builtins.open(path, mode, *args, **kwargs)
+        return _DiskFull(f, CHUNK_SIZE + CHUNK_SIZE // 2) if mode == 'ab' else f
+
+    with monkeypatch.context() as patch:
+        patch.setattr(blob_store_module, 'open', disk_full_open, raising=False)
+        with pytest.raises(OSError):
+            store.append_chunk(upload_id, 5, io.BytesIO(body))
+
+    # 已写入的部分被截断，调用方从原offset重试
+    assert store.get_session(upload_id)['offset'] == len(head)
+    store.append_chunk(upload_id, 5, io.BytesIO(body))
+    result = store.complete_session(upload_id)
+    assert result['blob_id'] == hashlib.sha256(head + body).hexdigest()
+    with open(result['path'], 'rb') as f:
+        assert f.read() == head + body
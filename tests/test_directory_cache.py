@@ -0,0 +1,86 @@
+"""通讯录目录缓存：并发请求只加载一次，过期数据先返回再后台刷新"""
+
+import threading
+import time
+
+from app.directory_cache import DirectoryCache
+
+
+class _Loader:
+    """记录调用次数的加载函数，release之前一直阻塞"""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return [f'好友{self.calls}']
+
+
+def test_concurrent_misses_share_one_load():
+    loader = _Loader()
+    loader.release.clear()
+    cache = DirectoryCache('好友列表', loader)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get(timeout=5))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 2
+    while cache.get_stats()['misses'] < 5 and time.time() < deadline:
+        time.sleep(0.01)
+    loader.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert loader.calls == 1
+    assert [value for value, _, _ in results] == [['好友1']] * 5
+    assert {status for _, _, status in results} == {'miss'}
+
+    value, _, status = cache.get()
+    assert (value, status) == (['好友1'], 'hit')
+    assert loader.calls == 1
+
+
+def test_stale_value_returned_while_refreshing_in_background():
+    loader = _Loader()
+    cache = DirectoryCache('好友列表', loader, ttl=0.05, max_stale=60)
+    first, first_as_of, _ = cache.get()
+    time.sleep(0.1)
+
+    # 过期后立即返回旧数据，刷新在后台进行
+    loader.release.clear()
+    loader.started.clear()
+    started = time.time()
+    value, as_of, status = cache.get()
+    assert (value, as_of, status) == (first, first_as_of, 'stale')
+    assert time.time() - started < 1
+    assert loader.started.wait(2)
+
+    # 后台刷新进行中再次读取，不会启动第二次刷新
+    assert cache.get()[2] == 'stale'
+    loader.release.set()
+    deadline = time.time() + 2
+    while cache.get_stats()['refreshing'] and time.time() < deadline:
+        time.sleep(0.01)
+
+    value, as_of, status = cache.get()
+    assert (value, status) == (['好友2'], 'hit')
+    assert as_of > first_as_of
+    assert loader.calls == 2
+    assert cache.get_stats()['background_refreshes'] == 1
+
+
+def test_data_older_than_max_stale_is_reloaded_synchronously():
+    loader = _Loader()
+    cache = DirectoryCache('群聊列表', loader, ttl=0.01, max_stale=0.05)
+    cache.get()
+    time.sleep(0.1)
+
+    value, _, status = cache.get()
+    assert (value, status) == (['好友2'], 'miss')
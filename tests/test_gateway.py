@@ -0,0 +1,75 @@
+"""网关汇总接口：/health按后台探测结果回答，账号信息和/metrics需要API密钥，并发转发后inflight归零"""
+
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+from werkzeug.test import Client
+
+from app.gateway import Gateway, GatewayWorker
+from benchmarks.gateway import StubWorker
+
+API_KEY = 'gateway-test'
+
+
+@pytest.fixture
+def gateway():
+    stubs, servers = [], []
+    for index in range(2):
+        stub = StubWorker(str(index), [f'acct{index}'], latency=0, messages_per_poll=1)
+        server = make_server('127.0.0.1', 0, stub, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stubs.append(stub)
+        servers.append(server)
+    gateway = Gateway([GatewayWorker('127.0.0.1', server.server_port) for server in servers],
+                      api_key=API_KEY, discovery_interval=60)
+    gateway.discover()
+    yield gateway, stubs
+    gateway.stop()
+    for server in servers:
+        server.shutdown()
+
+
+def test_health_uses_cached_state_and_hides_accounts(gateway):
+    gateway, stubs = gateway
+    client = Client(gateway)
+    before = [stub.stats['requests'] for stub in stubs]
+
+    response = client.get('/health')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['workers'] == {'up': 2, 'total': 2}
+    assert 'accounts' not in body
+
+    body = client.get('/health', headers={'X-API-Key': API_KEY}).get_json()
+    assert sorted(body['accounts']) == ['acct0', 'acct1']
+    # 健康检查不再同步探测工作进程
+    assert [stub.stats['requests'] for stub in stubs] == before
+
+
+def test_metrics_requires_api_key(gateway):
+    gateway, _ = gateway
+    client = Client(gateway)
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'X-API-Key': 'wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'X-API-Key': API_KEY})
+    assert response.status_code == 200
+    assert 'wxauto_stub_requests_total{worker=' in response.get_data(as_text=True)
+
+
+def test_inflight_returns_to_zero_after_concurrent_requests(gateway):
+    gateway, _ = gateway
+
+    def send(index):
+        client = Client(gateway)
+        for i in range(20):
+            response = client.post('/api/message/send', json={'receiver': f'好友{index}-{i}', 'message': 'hi'},
+                                   headers={'X-API-Key': API_KEY})
+            assert response.status_code == 200
+
+    threads = [threading.Thread(target=send, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [worker.inflight for worker in gateway.workers] == [0, 0]
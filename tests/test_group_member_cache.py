@@ -0,0 +1,78 @@
+"""群成员缓存：入群、退群按版本号返回增量差异，系统消息和人数变化使缓存失效"""
+
+from app.group_member_cache import GroupMemberCache
+
+
+class _Group:
+    """可修改成员的群，记录加载次数"""
+
+    def __init__(self, *members):
+        self.members = list(members)
+        self.loads = 0
+
+    def load(self, group):
+        self.loads += 1
+        return list(self.members)
+
+
+def test_join_and_leave_diffs():
+    cache = GroupMemberCache()
+    group = _Group('张三', '李四')
+    first = cache.get_members('测试群', group.load)
+    assert first['members'] == ['张三', '李四'] and not first['cached']
+    assert cache.get_members('测试群', group.load)['cached']
+    assert group.loads == 1
+
+    # 王五入群
+    group.members.append('王五')
+    second = cache.get_members('测试群', group.load, refresh=True)
+    diff = cache.diff_since('测试群', first['version'])
+    assert diff == {'version': second['version'], 'added': ['王五'], 'removed': [], 'full': False, 'stale': False}
+
+    # 李四退群
+    group.members.remove('李四')
+    third = cache.get_members('测试群', group.load, refresh=True)
+    assert cache.diff_since('测试群', second['version'])['removed'] == ['李四']
+
+    # 跨多个版本的差异合并为最终变化
+    merged = cache.diff_since('测试群', first['version'])
+    assert (merged['added'], merged['removed'], merged['version']) == (['王五'], ['李四'], third['version'])
+    assert cache.diff_since('测试群', third['version'])['added'] == []
+
+
+def test_join_then_leave_cancels_out():
+    cache = GroupMemberCache()
+    group = _Group('张三')
+    first = cache.get_members('测试群', group.load)
+    group.members.append('临时成员')
+    cache.get_members('测试群', group.load, refresh=True)
+    group.members.remove('临时成员')
+    cache.get_members('测试群', group.load, refresh=True)
+
+    diff = cache.diff_since('测试群', first['version'])
+    assert diff['added'] == [] and diff['removed'] == []
+
+
+def test_unknown_version_returns_full_member_list():
+    cache = GroupMemberCache()
+    group = _Group('张三', '李四')
+    cache.get_members('测试群', group.load)
+
+    diff = cache.diff_since('测试群', 999)
+    assert diff['full'] and diff['members'] == ['张三', '李四']
+    assert cache.diff_since('未加载的群', 0) is None
+
+
+def test_system_message_and_count_change_invalidate():
+    cache = GroupMemberCache()
+    group = _Group('张三', '李四')
+    cache.get_members('测试群', group.load)
+
+    cache.observe_message('测试群', 'sys', '"王五"加入了群聊')
+    assert not cache.get_members('测试群', group.load)['cached']
+    assert group.loads == 2
+
+    cache.observe_member_count('测试群', 2)
+    cache.observe_message('测试群 (3)', 'friend', '大家好')
+    assert not cache.get_members('测试群', group.load)['cached']
+    assert group.loads == 3
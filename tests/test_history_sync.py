@@ -0,0 +1,112 @@
+"""聊天记录增量同步：按水位返回新消息、回填向上加载不遗漏不重复、重置删除服务端水位"""
+
+import itertools
+
+import pytest
+
+from benchmarks.fake_wechat import FakeMessage, current_instance
+
+_chat_names = (f'同步聊天{index}' for index in itertools.count())
+
+
+@pytest.fixture
+def chat(client, headers):
+    """监听中的模拟聊天窗口，每个测试使用不同的聊天名称，服务端水位互不影响"""
+    assert client.post('/api/wechat/initialize', headers=headers).status_code == 200
+    who = next(_chat_names)
+    assert client.post('/api/message/listen/add', headers=headers, json={'nickname': who}).get_json()['code'] == 0
+    yield current_instance().listen[who]
+    client.post('/api/message/listen/remove', headers=headers, json={'nickname': who})
+
+
+def _sync(client, headers, chat, **params):
+    response = client.get('/api/chat/sync', headers=headers, query_string=dict(params, who=chat.who))
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def _backfill(client, headers, chat, **body):
+    response = client.post('/api/chat/sync/backfill', headers=headers, json=dict(body, who=chat.who))
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def _contents(data):
+    return [msg['content'] for msg in data['messages']]
+
+
+def _append(chat, *contents):
+    for content in contents:
+        chat.append(FakeMessage(chat.who, content, chat.who))
+
+
+def test_delta_since_watermark_returns_only_new_messages(client, headers, chat):
+    chat.seed_history(5)
+    first = _sync(client, headers, chat)
+    assert first['watermark_found'] is None
+    assert _contents(first) == [f'历史消息{index}' for index in range(5)]
+
+    _append(chat, 'new-1', 'new-2')
+    second = _sync(client, headers, chat)
+    assert second['watermark_found'] is True
+    assert second['previous_watermark'] == first['watermark']
+    assert _contents(second) == ['new-1', 'new-2']
+
+    # 没有新消息时返回空列表，水位不变
+    third = _sync(client, headers, chat)
+    assert _contents(third) == []
+    assert third['watermark'] == second['watermark']
+
+    # 客户端指定的水位优先于服务端保存的水位
+    since = first['messages'][2]['id']
+    explicit = _sync(client, headers, chat, since=since)
+    assert _contents(explicit) == ['历史消息3', '历史消息4', 'new-1', 'new-2']
+
+
+def test_backfill_pages_backward_without_gaps_or_duplicates(client, headers, chat):
+    chat.seed_older(75)
+    chat.seed_history(10)
+    expected = [f'更早的消息{index}' for index in range(75)] + [f'历史消息{index}' for index in range(10)]
+
+    # 水位在窗口之外：向上加载到重新看到水位为止
+    target = chat.older[20]
+    data = _backfill(client, headers, chat, since=target.id)
+    assert data['watermark_found'] is True
+    assert data['reason'] == 'watermark'
+    assert data['loads'] == 2
+    assert _contents(data) == expected[21:]
+
+    # 按数量回填：加载更多页后返回的消息是之前结果向前延伸的连续区间
+    shallow = _backfill(client, headers, chat, depth=30)
+    deep = _backfill(client, headers, chat, depth=80)
+    assert _contents(shallow) == expected[-30:]
+    assert _contents(deep) == expected[-80:]
+    assert _contents(deep)[-30:] == _contents(shallow)
+    ids = [msg['id'] for msg in deep['messages']]
+    assert len(ids) == len(set(ids))
+
+    # 到达最早的消息后停止
+    everything = _backfill(client, headers, chat, depth=500)
+    assert everything['reason'] == 'exhausted'
+    assert _contents(everything) == expected
+
+
+def test_reset_clears_watermark(client, headers, chat):
+    chat.seed_history(3)
+    _sync(client, headers, chat)
+    _sync(client, headers, chat, consumer='other')
+    assert _contents(_sync(client, headers, chat)) == []
+
+    response = client.post('/api/chat/sync/reset', headers=headers, json={'who': chat.who, 'consumer': 'default'})
+    assert response.get_json()['data']['removed'] == 1
+
+    # 重置后的下一次同步没有水位，返回窗口中的全部消息
+    data = _sync(client, headers, chat)
+    assert data['watermark_found'] is None
+    assert data['previous_watermark'] is None
+    assert len(data['messages']) == 3
+    # 其他consumer的水位不受影响
+    assert _contents(_sync(client, headers, chat, consumer='other')) == []
+
+    response = client.post('/api/chat/sync/reset', headers=headers, json={'who': chat.who})
+    assert response.get_json()['data']['removed'] == 2
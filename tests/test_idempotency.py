@@ -0,0 +1,138 @@
+"""幂等键：并发的重复请求共用同一个任务，请求超时后重试返回任务的结果，任务只执行一次"""
+
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify, request
+
+from app import idempotency
+from app.api_queue import queue_task
+from app.idempotency import IdempotencyCache, idempotent
+
+
+class _Backend:
+    """记录执行次数的发送任务，release之前一直阻塞"""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def send(self, message):
+        self.started.set()
+        self.release.wait(5)
+        self.calls.append(message)
+        return {'response': {'code': 0, 'message': '发送成功', 'data': {'message': message}}, 'status_code': 200}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = IdempotencyCache()
+    monkeypatch.setattr(idempotency, 'idempotency_cache', cache)
+    return cache
+
+
+@pytest.fixture
+def backend():
+    backend = _Backend()
+    yield backend
+    backend.release.set()
+
+
+@pytest.fixture
+def app(cache, backend):
+    app = Flask(__name__)
+
+    # 与发送接口一致：队列任务超时后返回500，任务继续执行
+    @queue_task(timeout=0.2)
+    def _send_task(message):
+        return backend.send(message)
+
+    def send():
+        try:
+            result = _send_task(request.get_json()['message'])
+            return jsonify(result['response']), result['status_code']
+        except Exception as e:
+            return jsonify({'code': 3001, 'message': f'处理请求失败: {str(e)}', 'data': None}), 500
+
+    app.add_url_rule('/send', 'send', idempotent(send), methods=['POST'])
+    app.add_url_rule('/chat-window/send', 'chat_window_send', idempotent(send), methods=['POST'])
+    return app
+
+
+def _post(app, key, body, path='/send'):
+    return app.test_client().post(path, json=body, headers={'X-API-Key': 'test', 'Idempotency-Key': key})
+
+
+def test_concurrent_duplicates_join_inflight_job(app, backend, cache):
+    responses = []
+
+    def post():
+        responses.append(_post(app, 'join-1', {'message': 'hi'}))
+
+    first = threading.Thread(target=post)
+    first.start()
+    assert backend.started.wait(2)
+    duplicates = [threading.Thread(target=post) for _ in range(3)]
+    for thread in duplicates:
+        thread.start()
+    deadline = time.time() + 2
+    while cache.get_stats()['joined'] < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    backend.release.set()
+    for thread in [first] + duplicates:
+        thread.join(5)
+
+    assert backend.calls == ['hi']
+    assert sorted(response.status_code for response in responses) == [200] * 4
+    assert sum(1 for response in responses if response.headers.get('Idempotent-Replayed')) == 3
+    assert cache.get_stats()['joined'] == 3
+
+
+def test_retry_after_queue_timeout_replays_result(app, backend, cache):
+    # 任务一直阻塞，请求在0.2秒后超时
+    response = _post(app, 'timeout-1', {'message': 'hi'})
+    assert response.status_code == 500
+    assert cache.get_stats()['pending'] == 1
+
+    retry = []
+    thread = threading.Thread(target=lambda: retry.append(_post(app, 'timeout-1', {'message': 'hi'})))
+    thread.start()
+    deadline = time.time() + 2
+    while cache.get_stats()['joined'] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+    backend.release.set()
+    thread.join(5)
+
+    assert retry[0].status_code == 200
+    assert retry[0].headers['Idempotent-Replayed'] == 'true'
+    assert retry[0].get_json()['data'] == {'message': 'hi'}
+    assert _post(app, 'timeout-1', {'message': 'hi'}).status_code == 200
+    assert backend.calls == ['hi']
+    assert cache.get_stats()['deferred_completed'] == 1
+
+
+def test_different_body_or_path_is_not_deduplicated(app, backend):
+    backend.release.set()
+    assert _post(app, 'body-1', {'message': 'a'}).status_code == 200
+    assert _post(app, 'body-1', {'message': 'b'}).status_code == 200
+    assert _post(app, 'body-1', {'message': 'a'}, path='/chat-window/send').status_code == 200
+    assert backend.calls == ['a', 'b', 'a']
+
+    replayed = _post(app, 'body-1', {'message': 'a'})
+    assert replayed.headers['Idempotent-Replayed'] == 'true'
+    assert backend.calls == ['a', 'b', 'a']
+
+
+def test_cached_entry_expires_after_ttl(app, backend, cache):
+    backend.release.set()
+    cache.ttl = 0.1
+    assert _post(app, 'ttl-1', {'message': 'hi'}).status_code == 200
+    assert _post(app, 'ttl-1', {'message': 'hi'}).headers['Idempotent-Replayed'] == 'true'
+    time.sleep(0.15)
+
+    response = _post(app, 'ttl-1', {'message': 'hi'})
+    assert response.status_code == 200
+    assert 'Idempotent-Replayed' not in response.headers
+    assert backend.calls == ['hi', 'hi']
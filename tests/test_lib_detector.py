@@ -0,0 +1,59 @@
+"""库检测结果持久化：环境指纹不变时重启后直接使用缓存，库升级后缓存失效并重新检测"""
+
+import os
+import sys
+
+import pytest
+
+from app.wechat_lib_detector import WeChatLibDetector
+
+
+def _write_dist(site, version):
+    dist_info = site / 'wxauto-0.dist-info'
+    dist_info.mkdir(exist_ok=True)
+    (dist_info / 'METADATA').write_text(f'Metadata-Version: 2.1\nName: wxauto\nVersion: {version}\n',
+                                        encoding='utf-8')
+    (dist_info / 'RECORD').write_text('wxauto-0.dist-info/METADATA,,\nwxauto-0.dist-info/RECORD,,\n',
+                                      encoding='utf-8')
+    return dist_info
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    """只包含wxauto安装信息的目录，库本身使用模拟模块"""
+    site = tmp_path / 'site'
+    site.mkdir()
+    monkeypatch.setattr(sys, 'path', [str(site)] + sys.path)
+    return site
+
+
+def test_fingerprint_reads_dist_info(tmp_path, site):
+    dist_info = _write_dist(site, '1.0')
+    fingerprint = WeChatLibDetector(tmp_path / 'cache.json')._fingerprint('wxauto')
+    assert fingerprint['version'] == '1.0'
+    assert fingerprint['dist_mtime'] == os.stat(dist_info).st_mtime
+
+
+def test_persisted_result_reused_until_fingerprint_changes(tmp_path, site):
+    cache_file = tmp_path / 'cache.json'
+    _write_dist(site, '1.0')
+
+    first = WeChatLibDetector(cache_file)
+    assert first.detect_wxauto()[0]
+    assert first.persistent_hits == 0
+    assert cache_file.exists()
+
+    # 重启后环境未变化，直接使用持久化的结果
+    restarted = WeChatLibDetector(cache_file)
+    assert restarted.detect_wxauto() == first.detect_wxauto()
+    assert restarted.persistent_hits == 1
+
+    # 升级库后指纹变化，重新检测并更新缓存
+    _write_dist(site, '2.0')
+    upgraded = WeChatLibDetector(cache_file)
+    assert upgraded.detect_wxauto()[0]
+    assert upgraded.persistent_hits == 0
+
+    again = WeChatLibDetector(cache_file)
+    again.detect_wxauto()
+    assert again.persistent_hits == 1
@@ -0,0 +1,54 @@
+"""长轮询：NaN、inf等非有限等待时间返回参数错误，不会进入空转等待；快照重置后之前的调用方拿到完整快照"""
+
+import pytest
+
+from app.session_watcher import SessionWatcher
+from app.startup import readiness
+
+BAD_WAITS = ['nan', 'inf', '-inf', 'abc']
+
+
+@pytest.mark.parametrize('timeout', [float('nan'), float('inf')])
+def test_wait_for_changes_rejects_non_finite_timeout(timeout):
+    with pytest.raises(ValueError):
+        SessionWatcher().wait_for_changes(0, timeout)
+
+
+@pytest.mark.parametrize('wait', BAD_WAITS)
+def test_readiness_rejects_bad_wait(wait):
+    body, status = readiness({'wait': wait})
+    assert status == 400
+    assert body['code'] == 1002
+
+
+@pytest.mark.parametrize('wait', BAD_WAITS)
+def test_session_changes_rejects_bad_wait(client, headers, wait):
+    assert client.post('/api/wechat/initialize', headers=headers).status_code == 200
+    response = client.get(f'/api/wechat/session-changes?wait={wait}', headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['code'] == 1002
+
+
+def _sessions(*names):
+    return [{'name': name, 'content': f'{name}的消息', 'time': '10:00', 'unread': 0} for name in names]
+
+
+def test_reset_forces_full_snapshot_for_earlier_versions():
+    watcher = SessionWatcher()
+    watcher.observe(_sessions('A', 'B'))
+    version = watcher.observe(_sessions('C', 'A', 'B'))
+    assert not watcher.changes_since(version - 1)['full']
+
+    # 切换账号后会话列表完全不同，之前读取过的调用方不能只拿到空的差异
+    watcher.reset()
+    watcher.observe(_sessions('X', 'Y'))
+    for since in (version - 1, version):
+        result = watcher.changes_since(since)
+        assert result['full']
+        assert [session['name'] for session in result['sessions']] == ['X', 'Y']
+
+    # 之后的读取恢复为差异
+    latest = watcher.observe(_sessions('Z', 'X', 'Y'))
+    result = watcher.changes_since(latest - 1)
+    assert not result['full']
+    assert [change['name'] for change in result['changes']] == ['Z']
@@ -0,0 +1,46 @@
+"""媒体目录回收：回收后逐级删除空目录，未指定保存路径的下载固定默认保存目录"""
+
+import os
+import time
+
+from app.utils.media_gc import MediaGarbageCollector, download_dirs
+
+
+def _old_file(path, seconds=3600):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x')
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_nested_empty_dirs_are_removed(tmp_path):
+    _old_file(str(tmp_path / 'a' / 'b' / 'c' / 'old.jpg'))
+    _old_file(str(tmp_path / 'keep' / 'sub' / 'old.jpg'))
+    os.makedirs(tmp_path / 'keep' / 'sub' / 'pinned')
+
+    gc = MediaGarbageCollector(grace_seconds=0)
+    gc.add_directory(str(tmp_path), max_age_seconds=60)
+    with gc.pinned(str(tmp_path / 'keep' / 'sub' / 'pinned')):
+        assert gc.collect()['evicted_files'] == 2
+
+    # 删除c之后b和a也变为空目录，同一轮回收中一起删除
+    assert not (tmp_path / 'a').exists()
+    # 固定的目录保留，其上级目录因此不为空
+    assert (tmp_path / 'keep' / 'sub' / 'pinned').is_dir()
+    assert tmp_path.is_dir()
+
+
+def test_download_without_save_path_pins_default_dirs(tmp_path):
+    from app import config_manager
+
+    assert download_dirs(str(tmp_path)) == [str(tmp_path)]
+    defaults = download_dirs(None)
+    assert str(config_manager.TEMP_DIR) in defaults
+    assert os.path.join(os.getcwd(), 'wxauto文件') in defaults
+
+    gc = MediaGarbageCollector(grace_seconds=0)
+    downloaded = os.path.join(str(config_manager.TEMP_DIR), 'download.jpg')
+    with gc.pinned(*defaults):
+        assert gc.is_pinned(downloaded)
+    assert not gc.is_pinned(downloaded)
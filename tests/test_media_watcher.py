@@ -0,0 +1,138 @@
+"""媒体文件监听：新文件进入索引后可以查找，等待方被立即唤醒，轮询后端只在有等待方时快速扫描"""
+
+import threading
+import time
+
+import pytest
+
+from app.utils import media_watcher as media_watcher_module
+from app.utils.media_watcher import MediaFileWatcher, _PollingBackend
+
+
+def _write(path, data=b'\xff\xd8\xff'):
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def make_watcher():
+    watchers = []
+
+    def make(directory, **kwargs):
+        watcher = MediaFileWatcher([str(directory)], **kwargs)
+        watcher.start()
+        watchers.append(watcher)
+        return watcher
+
+    yield make
+    for watcher in watchers:
+        watcher.stop()
+
+
+@pytest.mark.parametrize('backend', ['default', 'polling'])
+def test_created_file_can_be_looked_up(tmp_path, make_watcher, backend):
+    kwargs = {'backend': _PollingBackend(0.05)} if backend == 'polling' else {}
+    watcher = make_watcher(tmp_path, **kwargs)
+    started = time.time() - 1
+    path = _write(tmp_path / 'a.jpg')
+
+    assert watcher.wait_for('a.jpg', created_after=started, timeout=5) == path
+    assert watcher.lookup('a.jpg') == path
+    assert watcher.lookup('missing.jpg') is None
+
+
+def test_existing_files_are_seeded(tmp_path, make_watcher):
+    path = _write(tmp_path / 'old.png')
+    watcher = make_watcher(tmp_path, backend=_PollingBackend(0.05))
+    assert watcher.lookup('old.png') == path
+
+
+@pytest.mark.parametrize('backend', ['default', 'polling'])
+def test_waiter_is_woken_when_file_appears(tmp_path, make_watcher, backend):
+    kwargs = {'backend': _PollingBackend(0.05)} if backend == 'polling' else {}
+    watcher = make_watcher(tmp_path, **kwargs)
+    result = {}
+
+    def wait():
+        result['path'] = watcher.wait_for('b.jpg', timeout=10)
+        result['at'] = time.time()
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.2)
+    created_at = time.time()
+    path = _write(tmp_path / 'b.jpg')
+    waiter.join(timeout=10)
+
+    assert result['path'] == path
+    assert result['at'] - created_at < 2
+    assert watcher.get_stats()['waiters'] == 0
+
+
+def test_prefix_fallback(tmp_path, make_watcher):
+    watcher = make_watcher(tmp_path, backend=_PollingBackend(0.05))
+    path = _write(tmp_path / '微信图片_20250101.jpg')
+    assert watcher.wait_for('other.jpg', timeout=5, fallback_prefix='微信图片_',
+                            fallback_suffixes=('.jpg',)) == path
+
+
+def test_polling_fallback_when_inotify_unavailable(monkeypatch):
+    monkeypatch.setattr(media_watcher_module.sys, 'platform', 'win32')
+    backend = media_watcher_module._create_backend(0.1, 7)
+    assert isinstance(backend, _PollingBackend)
+    assert (backend.interval, backend.idle_interval) == (0.1, 7)
+
+
+def test_polling_backend_idles_without_waiters(tmp_path, make_watcher):
+    backend = _PollingBackend(0.05, idle_interval=60)
+    watcher = make_watcher(tmp_path, backend=backend)
+    time.sleep(0.5)
+    # 添加目录时已建立基线，没有等待方时不再扫描
+    assert backend.scans == 0
+
+    # 空闲期间创建的文件在等待方出现后立即被发现
+    path = _write(tmp_path / 'c.jpg')
+    started = time.time()
+    assert watcher.wait_for('c.jpg', timeout=5) == path
+    assert time.time() - started < 2
+
+    # 等待结束后最多再完成正在进行的一轮扫描
+    time.sleep(0.2)
+    scans = backend.scans
+    time.sleep(0.5)
+    assert backend.scans == scans
+
+    started = time.time()
+    watcher.stop()
+    assert time.time() - started < 1
+
+
+@pytest.mark.parametrize('backend', ['default', 'polling'])
+def test_extra_directories_are_capped(tmp_path, make_watcher, backend):
+    kwargs = {'backend': _PollingBackend(0.05)} if backend == 'polling' else {}
+    root = tmp_path / 'root'
+    root.mkdir()
+    watcher = make_watcher(root, max_extra_directories=2, **kwargs)
+    extra = []
+    for index in range(3):
+        directory = tmp_path / f'extra{index}'
+        directory.mkdir()
+        extra.append(directory)
+    watcher.watch_directory(str(extra[0]))
+    watcher.watch_directory(str(extra[1]))
+    # extra0再次被查找后移到最近使用，超过上限时淘汰的是extra1
+    watcher.watch_directory(str(extra[0]))
+    watcher.watch_directory(str(extra[2]))
+
+    stats = watcher.get_stats()
+    assert stats['extra_directories'] == [str(extra[0]), str(extra[2])]
+    assert stats['evicted_directories'] == 1
+    assert stats['directories'] == [str(root)]
+
+    # 停止监听的目录中的新文件不再被索引，仍在监听的目录和构造时的目录不受影响
+    _write(extra[1] / 'gone.jpg')
+    kept = _write(extra[2] / 'kept.jpg')
+    rooted = _write(root / 'root.jpg')
+    assert watcher.wait_for('kept.jpg', timeout=5) == kept
+    assert watcher.wait_for('root.jpg', timeout=5) == rooted
+    assert watcher.wait_for('gone.jpg', timeout=0.5) is None
@@ -0,0 +1,125 @@
+"""消息句柄索引：命中不重新获取、失效的句柄重新获取、同一聊天只重新获取一次、未找到的ID短时间内不重复获取"""
+
+import threading
+import time
+
+import pytest
+
+from app.message_index import MessageIndex
+from benchmarks.fake_wechat import FakeMessage, current_instance
+
+
+class _Window:
+    """记录GetAllMessage调用次数的聊天窗口"""
+
+    def __init__(self, messages=(), delay=0.0):
+        self.messages = list(messages)
+        self.delay = delay
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        time.sleep(self.delay)
+        return list(self.messages)
+
+
+def test_hit_does_not_fetch():
+    index = MessageIndex()
+    msg = FakeMessage('聊天', 'hello', '聊天')
+    window = _Window([msg])
+    index.add('聊天', msg)
+
+    assert index.find('聊天', msg.id, window.fetch) is msg
+    assert window.fetches == 0
+    assert index.get_stats()['hits'] == 1
+
+
+def test_stale_handle_is_rescanned():
+    index = MessageIndex()
+    stale = FakeMessage('聊天', 'hello', '聊天')
+    index.add('聊天', stale)
+    # 窗口重新加载后同一条消息是新的控件，旧句柄已失效
+    stale.control.alive = False
+    fresh = FakeMessage('聊天', 'hello', '聊天')
+    fresh.id = stale.id
+    window = _Window([fresh])
+
+    assert index.find('聊天', stale.id, window.fetch) is fresh
+    assert window.fetches == 1
+    assert index.get_stats()['stale'] == 1
+    # 重新获取的结果写回索引，之后直接命中
+    assert index.find('聊天', stale.id, window.fetch) is fresh
+    assert window.fetches == 1
+
+
+def test_invalidate_forces_rescan():
+    index = MessageIndex()
+    msg = FakeMessage('聊天', 'hello', '聊天')
+    window = _Window([msg])
+    index.add('聊天', msg)
+
+    index.invalidate('聊天', msg.id)
+    assert index.find('聊天', msg.id, window.fetch) is msg
+    assert window.fetches == 1
+
+
+def test_concurrent_misses_fetch_once():
+    index = MessageIndex()
+    msg = FakeMessage('聊天', 'hello', '聊天')
+    window = _Window([msg], delay=0.1)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(index.find('聊天', msg.id, window.fetch)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [msg] * 5
+    assert window.fetches == 1
+
+
+def test_negative_cache_expires():
+    index = MessageIndex(negative_ttl=0.1)
+    window = _Window([FakeMessage('聊天', 'hello', '聊天')])
+
+    assert index.find('聊天', 'missing', window.fetch) is None
+    assert index.find('聊天', 'missing', window.fetch) is None
+    assert window.fetches == 1
+    assert index.get_stats()['negative_hits'] == 1
+
+    time.sleep(0.15)
+    assert index.find('聊天', 'missing', window.fetch) is None
+    assert window.fetches == 2
+
+    # 之后收到的消息立即可以找到，不受未找到记录影响
+    late = FakeMessage('聊天', 'late', '聊天')
+    late.id = 'missing'
+    index.add('聊天', late)
+    assert index.find('聊天', 'missing', window.fetch) is late
+
+
+@pytest.fixture
+def listened_chat(client, headers):
+    assert client.post('/api/wechat/initialize', headers=headers).status_code == 200
+    assert client.post('/api/message/listen/add', headers=headers,
+                       json={'nickname': '索引聊天'}).get_json()['code'] == 0
+    yield current_instance().listen['索引聊天']
+    client.post('/api/message/listen/remove', headers=headers, json={'nickname': '索引聊天'})
+
+
+def test_failed_operation_invalidates_handle(client, headers, listened_chat):
+    from app.message_index import message_index
+
+    msg = FakeMessage('索引聊天', 'hello', '索引聊天')
+    listened_chat.append(msg)
+    message_index.get().add('索引聊天', msg)
+
+    def fail():
+        raise RuntimeError('控件已失效')
+    msg.click = fail
+
+    response = client.post('/api/message/click', headers=headers, json={'who': '索引聊天', 'message_id': msg.id})
+    assert response.status_code == 500
+    assert message_index.get()._lookup('索引聊天', msg.id) is None
@@ -0,0 +1,113 @@
+"""监听消息处理流水线：同一聊天按顺序处理、按消息ID去重、交接队列已满时丢弃计数、移除监听后不再写入缓存"""
+
+import threading
+
+import pytest
+
+from app.message_pipeline import STAGES, ListenContext, MessagePipeline
+from benchmarks.fake_wechat import FakeMessage
+
+STAGES_UNDER_TEST = ('normalize', 'dedup', 'archive')
+
+
+def _context(*chats):
+    return ListenContext('default', {chat: [] for chat in chats}, None, None)
+
+
+def test_per_chat_order_across_shards():
+    chats = [f'聊天{index}' for index in range(8)]
+    context = _context(*chats)
+    pipeline = MessagePipeline(workers=4, stages=STAGES_UNDER_TEST)
+
+    for index in range(50):
+        for chat in chats:
+            assert pipeline.submit(context, chat, FakeMessage(chat, f'{chat}-{index}', chat))
+    assert pipeline.wait_idle()
+
+    for chat in chats:
+        assert [msg['content'] for msg in context.message_cache[chat]] == [f'{chat}-{index}' for index in range(50)]
+    stats = pipeline.get_stats()
+    assert stats['processed'] == 400 and stats['dropped'] == 0
+
+
+def test_duplicate_message_ids_are_filtered():
+    context = _context('聊天')
+    pipeline = MessagePipeline(workers=2, stages=STAGES_UNDER_TEST)
+    msg = FakeMessage('聊天', 'hello', '聊天')
+
+    for _ in range(3):
+        pipeline.submit(context, '聊天', msg)
+    assert pipeline.wait_idle()
+
+    assert [item['id'] for item in context.message_cache['聊天']] == [msg.id]
+    stats = pipeline.get_stats()
+    assert stats['processed'] == 1
+    assert stats['filtered'] == 2
+    assert stats['stages']['dedup']['filtered'] == 2
+
+
+def test_full_handoff_queue_drops_and_counts(monkeypatch):
+    entered, release = threading.Event(), threading.Event()
+
+    def block(pipeline, item):
+        entered.set()
+        release.wait(5)
+
+    monkeypatch.setitem(STAGES, 'block', block)
+    context = _context('聊天')
+    pipeline = MessagePipeline(workers=1, queue_size=2, stages=('block',) + STAGES_UNDER_TEST)
+    try:
+        # 第一条被工作线程取走并阻塞，之后队列只能放下两条
+        assert pipeline.submit(context, '聊天', FakeMessage('聊天', '0', '聊天'))
+        assert entered.wait(2)
+        results = [pipeline.submit(context, '聊天', FakeMessage('聊天', str(index), '聊天')) for index in range(1, 5)]
+        assert results == [True, True, False, False]
+        assert pipeline.get_stats()['dropped'] == 2
+        assert pipeline.depth() == 2
+    finally:
+        release.set()
+    assert pipeline.wait_idle()
+    assert [msg['content'] for msg in context.message_cache['聊天']] == ['0', '1', '2']
+    stats = pipeline.get_stats()
+    assert stats['submitted'] == 3 and stats['processed'] == 3
+
+
+def test_removed_chat_is_not_recreated():
+    context = _context('聊天')
+    pipeline = MessagePipeline(workers=1, stages=STAGES_UNDER_TEST)
+    del context.message_cache['聊天']
+
+    pipeline.submit(context, '聊天', FakeMessage('聊天', 'late', '聊天'))
+    assert pipeline.wait_idle()
+
+    assert '聊天' not in context.message_cache
+    assert pipeline.get_stats()['stages']['archive']['filtered'] == 1
+
+
+@pytest.fixture
+def initialized(client, headers):
+    assert client.post('/api/wechat/initialize', headers=headers).status_code == 200
+    from benchmarks.fake_wechat import current_instance
+    return current_instance()
+
+
+def test_listen_remove_drops_queued_messages(client, headers, initialized):
+    from app.api.routes import listen_message_store
+    from app.message_index import message_index
+    from app.message_pipeline import message_pipeline
+
+    assert client.post('/api/message/listen/add', headers=headers,
+                       json={'nickname': '移除的聊天'}).get_json()['code'] == 0
+    chat = initialized.listen['移除的聊天']
+    assert client.post('/api/message/listen/remove', headers=headers,
+                       json={'nickname': '移除的聊天'}).get_json()['code'] == 0
+
+    # 移除前已交给流水线的消息在移除后才处理
+    msg = FakeMessage('移除的聊天', 'late', '移除的聊天')
+    chat.callback(msg, chat)
+    assert message_pipeline.wait_idle()
+
+    assert '移除的聊天' not in listen_message_store.get()
+    assert message_index.get()._lookup('移除的聊天', msg.id) is None
+    messages = client.get('/api/message/listen/get', headers=headers).get_json()['data']['messages']
+    assert '移除的聊天' not in messages
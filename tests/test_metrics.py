@@ -0,0 +1,35 @@
+"""运行指标：短生命周期线程的分片在写入路径上合并，/metrics默认需要API密钥"""
+
+import threading
+
+from app.metrics import MIN_SHARDS_BEFORE_FOLD, Counter, Histogram
+
+
+def _run_threads(func, count):
+    for _ in range(count):
+        thread = threading.Thread(target=func)
+        thread.start()
+        thread.join()
+
+
+def test_dead_thread_shards_are_folded_without_scrape():
+    counter = Counter('test_requests_total', '测试', ('route',))
+    histogram = Histogram('test_duration_seconds', '测试', ('route',))
+
+    def record():
+        counter.inc('/a')
+        histogram.observe(0.01, '/a')
+
+    _run_threads(record, 2000)
+    # 没有调用render()，分片数量仍保持在很小的范围内
+    assert len(counter._store._live) <= MIN_SHARDS_BEFORE_FOLD
+    assert len(histogram._store._live) <= MIN_SHARDS_BEFORE_FOLD
+    assert counter._store.collect() == {('/a',): 2000}
+    assert histogram._store.collect()[('/a',)][-1] == 2000
+
+
+def test_metrics_requires_api_key(client, headers):
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers=headers)
+    assert response.status_code == 200
+    assert 'wxauto_http_requests_total' in response.get_data(as_text=True)
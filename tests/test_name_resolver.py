@@ -0,0 +1,38 @@
+"""名称解析：发送前只按精确或规范化匹配替换接收人，备注和昵称不替换；limit参数错误返回1002"""
+
+import pytest
+
+from app.name_resolver import NameResolver
+
+
+@pytest.fixture
+def resolver():
+    resolver = NameResolver()
+    resolver.update_source('friends', [{'nickname': '张三', 'remark': '老张'}])
+    resolver.update_source('groups', ['Test Group (5)'])
+    return resolver
+
+
+def test_receiver_substituted_for_exact_and_normalized_matches(resolver):
+    assert resolver.resolve_receiver('Test Group (5)') == 'Test Group'
+    assert resolver.resolve_receiver('test  group') == 'Test Group'
+    assert resolver.resolve_receiver('老张') == '老张'
+
+
+def test_receiver_not_substituted_for_alias_matches(resolver):
+    # 昵称仍能解析出候选，但发送时保留调用方的接收人，由ChatWith和发送前的核对按原名称处理
+    assert resolver.resolve('张三')['name'] == '老张'
+    assert resolver.resolve_receiver('张三') == '张三'
+
+
+def test_resolve_contacts_rejects_bad_limit(client, headers):
+    response = client.post('/api/contacts/resolve', headers=headers, json={'names': ['张三'], 'limit': 'abc'})
+    assert response.status_code == 400
+    assert response.get_json()['code'] == 1002
+
+    response = client.get('/api/contacts/resolve?names=张三&limit=abc', headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['code'] == 1002
+
+    response = client.post('/api/contacts/resolve', headers=headers, json={'names': ['张三'], 'limit': '3'})
+    assert response.status_code == 200
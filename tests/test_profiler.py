@@ -0,0 +1,46 @@
+"""采样分析器：对合成的忙循环采样，拒绝非有限的采样时长和频率"""
+
+import threading
+
+import pytest
+
+from app.profiler import sampling_profiler
+
+
+def _synthetic_busy_loop(stop):
+    total = 0
+    while not stop.is_set():
+        for i in range(1000):
+            total += i * i
+    return total
+
+
+def test_profile_finds_busy_loop():
+    stop = threading.Event()
+    worker = threading.Thread(target=_synthetic_busy_loop, args=(stop,), daemon=True, name='BusyLoop-test')
+    worker.start()
+    try:
+        result = sampling_profiler.profile(0.5, 200, thread_prefix='BusyLoop')
+    finally:
+        stop.set()
+        worker.join()
+
+    assert result.samples > 0
+    assert set(result.thread_samples) == {'BusyLoop-test'}
+    top = result.top_frames(1)[0]
+    assert top['thread'] == 'BusyLoop-test'
+    assert top['frame'].startswith('_synthetic_busy_loop ')
+    assert '_synthetic_busy_loop' in result.collapsed()
+
+
+@pytest.mark.parametrize('seconds, hz', [(float('nan'), 100), (1, float('nan')), (float('inf'), 100)])
+def test_profile_rejects_non_finite_values(seconds, hz):
+    with pytest.raises(ValueError):
+        sampling_profiler.profile(seconds, hz)
+
+
+@pytest.mark.parametrize('query', ['seconds=nan', 'hz=nan', 'seconds=inf', 'seconds=abc'])
+def test_profile_route_rejects_bad_values(client, headers, query):
+    response = client.get(f'/api/admin/profile?{query}', headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['code'] == 1002
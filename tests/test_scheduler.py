@@ -0,0 +1,45 @@
+"""定时发送：长时间停止后重复任务的补发次数有上限，默认策略只补发一次"""
+
+import heapq
+import time
+
+from app.scheduler import Scheduler
+
+
+def _drain(scheduler, now):
+    """与定时线程相同：取出所有到期的条目，返回需要发送的次数"""
+    due = []
+    with scheduler._cond:
+        while scheduler._heap and scheduler._heap[0][0] <= now:
+            entry = heapq.heappop(scheduler._heap)
+            if not scheduler._is_stale(entry):
+                due.extend(scheduler._plan(scheduler._items[entry[3]], now))
+    return due
+
+
+def _create_missed(scheduler, **spec):
+    # 每10秒发送一次，服务停止了约1小时，共错过361次
+    now = time.time()
+    item = scheduler.create(dict({'receiver': '文件传输助手', 'message': '提醒',
+                                  'run_at': now - 3605, 'interval': 10}, **spec))
+    return item, now
+
+
+def test_default_policy_collapses_missed_runs():
+    scheduler = Scheduler()
+    item, now = _create_missed(scheduler)
+    assert item['misfire'] == 'collapse'
+    assert len(_drain(scheduler, now)) == 1
+    assert scheduler.get_stats()['collapsed'] == 360
+
+
+def test_late_policy_catches_up_at_most_max_catchup_runs():
+    scheduler = Scheduler(max_catchup=5)
+    item, now = _create_missed(scheduler, misfire='late')
+    due = _drain(scheduler, now)
+    assert len(due) == 5
+    # 补发的是最近的5次，之后按原间隔继续
+    assert [scheduled_at for _, scheduled_at, _ in due] == [item['next_run_at'] + (356 + i) * 10
+                                                            for i in range(5)]
+    assert scheduler.get_stats()['missed'] == 356
+    assert scheduler._items[item['id']]['next_run_at'] > now
@@ -0,0 +1,100 @@
+"""慢请求记录：超过阈值时看门狗抓取处理线程和队列线程的调用栈，JSONL文件按大小轮转"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from app import slow_requests
+from app.slow_requests import SlowRequestRecorder
+
+
+@pytest.fixture
+def make_recorder(monkeypatch):
+    monkeypatch.setattr(slow_requests, 'WATCHDOG_INTERVAL', 0.02)
+    recorders = []
+
+    def make(**kwargs):
+        recorder = SlowRequestRecorder(**kwargs)
+        recorders.append(recorder)
+        return recorder
+
+    yield make
+    for recorder in recorders:
+        recorder._running = False
+
+
+def _wait_in_worker(recorder, request_ident, release):
+    recorder.attach_worker(request_ident)
+    release.wait(5)
+    recorder.detach_worker(request_ident)
+
+
+def test_stack_captured_after_threshold(make_recorder):
+    recorder = make_recorder(threshold=0.1)
+    release = threading.Event()
+    recorder.begin('POST', '/api/message/send', '/api/message/send')
+    worker = threading.Thread(target=_wait_in_worker, args=(recorder, threading.get_ident(), release),
+                              name='QueueProcessor-test')
+    worker.start()
+    time.sleep(0.3)
+    release.set()
+    worker.join(5)
+    record = recorder.end(200, request_bytes=10, response_bytes=20)
+
+    assert record is not None
+    assert record['duration'] >= 0.1 and record['threshold'] == 0.1
+    assert record['stack_captured_at'] is not None and record['stack_captured_at'] >= 0.1
+    # 抓取的是超过阈值时刻的调用栈：请求线程停在sleep，队列线程停在等待
+    assert any('test_stack_captured_after_threshold' in line for line in record['stack'])
+    assert any('_wait_in_worker' in line for line in record['worker_stack'])
+    assert (record['request_bytes'], record['response_bytes']) == (10, 20)
+    assert recorder.get_records()[0] is record
+    assert recorder.get_stats()['slow_requests'] == 1
+
+
+def test_fast_and_excluded_routes_not_recorded(make_recorder):
+    recorder = make_recorder(threshold=0.1, route_thresholds={'/api/message/poll': None})
+    recorder.begin('GET', '/api/message/get-history', '/api/message/get-history')
+    assert recorder.end(200) is None
+
+    # 阈值为None的路由（长轮询）不跟踪
+    recorder.begin('GET', '/api/message/poll', '/api/message/poll')
+    time.sleep(0.15)
+    assert recorder.end(200) is None
+
+    stats = recorder.get_stats()
+    assert (stats['requests'], stats['slow_requests'], stats['in_flight']) == (1, 0, 0)
+
+
+def test_route_threshold_overrides_default(make_recorder):
+    recorder = make_recorder(threshold=10, route_thresholds={'/api/chat/show': 0.05})
+    recorder.begin('POST', '/api/chat/show', '/api/chat/show')
+    time.sleep(0.1)
+    record = recorder.end(200)
+    assert record is not None and record['threshold'] == 0.05
+    assert recorder.get_records(route='/api/other') == []
+    assert 'stack' not in recorder.get_records(include_stacks=False)[0]
+
+
+def test_jsonl_rotation(tmp_path, make_recorder):
+    log_file = tmp_path / 'slow_requests.jsonl'
+    recorder = make_recorder(threshold=0, log_file=str(log_file), max_file_bytes=2000, backup_count=2)
+    for index in range(20):
+        recorder.begin('POST', '/api/message/send', f'/api/message/send?n={index}')
+        recorder.end(200)
+
+    files = [log_file, tmp_path / 'slow_requests.jsonl.1', tmp_path / 'slow_requests.jsonl.2']
+    assert all(path.exists() for path in files)
+    assert not (tmp_path / 'slow_requests.jsonl.3').exists()
+    assert all(path.stat().st_size <= 2000 for path in files)
+
+    # 当前文件保存最新记录，轮转文件依次更旧，超出数量的最旧文件被删除
+    paths = [[json.loads(line)['path'] for line in path.read_text(encoding='utf-8').splitlines()]
+             for path in reversed(files)]
+    flat = [path for chunk in paths for path in chunk]
+    assert flat == sorted(flat, key=lambda path: int(path.rsplit('=', 1)[1]))
+    assert flat[-1] == '/api/message/send?n=19'
+    assert len(flat) < 20
+    assert recorder.get_stats()['write_errors'] == 0
@@ -0,0 +1,71 @@
+"""请求链路追踪：traceparent的trace id随任务传入请求队列，队列线程中的span挂在请求的根span下"""
+
+import threading
+
+import pytest
+
+from app.api_queue import queue_task
+from app.tracing import tracer
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_SPAN_ID = '00f067aa0ba902b7'
+TRACEPARENT = f'00-{TRACE_ID}-{PARENT_SPAN_ID}-01'
+
+
+@pytest.fixture
+def keep_all(monkeypatch):
+    monkeypatch.setattr(tracer, 'sample_rate', 1.0)
+    return tracer
+
+
+def _spans(trace_id):
+    trace = tracer.get_trace(trace_id)
+    assert trace is not None
+    return {span['name']: span for span in trace['spans']}
+
+
+def test_traceparent_propagates_through_queue_task(keep_all):
+    @queue_task(timeout=5)
+    def _traced_task():
+        with tracer.span('ui.SendMsg'):
+            return tracer.current_trace_id(), threading.current_thread().name
+
+    root = tracer.start_request('POST /test', TRACEPARENT)
+    try:
+        trace_id, thread_name = _traced_task()
+    finally:
+        tracer.end_request(200)
+
+    assert trace_id == TRACE_ID
+    assert thread_name.startswith('QueueProcessor')
+    # 请求线程的上下文不受队列线程影响
+    assert tracer.current_span() is None
+
+    spans = _spans(TRACE_ID)
+    assert spans['POST /test']['parent_span_id'] == PARENT_SPAN_ID
+    assert spans['queue.wait']['parent_span_id'] == root.span_id
+    assert spans['queue._traced_task']['parent_span_id'] == root.span_id
+    assert spans['queue._traced_task']['thread'] == thread_name
+    assert spans['ui.SendMsg']['parent_span_id'] == spans['queue._traced_task']['span_id']
+
+
+def test_invalid_traceparent_starts_new_trace(keep_all):
+    tracer.start_request('POST /test', '00-not-a-trace-01')
+    trace_id = tracer.current_trace_id()
+    tracer.end_request(200)
+    assert trace_id and len(trace_id) == 32 and trace_id != TRACE_ID
+
+
+def test_send_request_trace_includes_queue_and_ui_spans(client, headers, keep_all):
+    assert client.post('/api/wechat/initialize', headers=headers).status_code == 200
+    trace_id = 'aaaabbbbccccddddeeeeffff00001111'
+    response = client.post('/api/message/send', headers=dict(headers, traceparent=f'00-{trace_id}-{PARENT_SPAN_ID}-01'),
+                           json={'receiver': '文件传输助手', 'message': 'traced'})
+    assert response.status_code == 200
+    assert response.headers['X-Trace-Id'] == trace_id
+
+    spans = _spans(trace_id)
+    task = spans['queue._send_message_task']
+    assert spans['ui.ChatWith']['parent_span_id'] == task['span_id']
+    assert spans['ui.SendMsg']['parent_span_id'] == task['span_id']
+    assert spans['ui.ChatWith']['thread'].startswith('QueueProcessor')
@@ -0,0 +1,84 @@
+"""界面调用轨迹：记录器写出的JSONL轨迹可由benchmarks.replay加载，并在模拟后端中按记录回放"""
+
+import json
+
+import pytest
+
+from app.adapter_instrumentation import UiCallRecorder
+from benchmarks.fake_wechat import FakeBackendConfig, FakeWeChat, SimulatedFailure
+from benchmarks.replay import ReplayBackend
+
+
+def _get_all_friends():
+    return [{'nickname': f'好友{i}'} for i in range(37)]
+
+
+def _send_msg(msg, who=None):
+    raise TimeoutError('发送超时')
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    """记录两次GetAllFriends和一次失败的SendMsg"""
+    path = tmp_path / 'ui_trace.jsonl'
+    recorder = UiCallRecorder()
+    recorder.start_trace(str(path))
+    friends = recorder.wrap('GetAllFriends', _get_all_friends)
+    send = recorder.wrap('SendMsg', _send_msg)
+    friends()
+    with pytest.raises(TimeoutError):
+        send('不应写入轨迹的消息内容', who='文件传输助手')
+    friends()
+    assert recorder.stop_trace()['records'] == 3
+    return path
+
+
+def test_trace_round_trip(trace_file):
+    # 轨迹只记录形状，不包含消息内容
+    content = trace_file.read_text(encoding='utf-8')
+    assert '不应写入轨迹的消息内容' not in content and '文件传输助手' not in content
+    assert json.loads(content.splitlines()[2])['a'] == {'args': ['str[11]'], 'kwargs': {'who': 'str[6]'}}
+
+    backend = ReplayBackend.load(str(trace_file))
+    assert sorted(backend.calls) == ['GetAllFriends', 'SendMsg']
+
+    send = backend.next_call('SendMsg')
+    assert (send.ok, send.exception, send.result_size) == (False, 'TimeoutError', None)
+
+    # 按方法循环取出记录，重置后从头开始
+    first, second = backend.next_call('GetAllFriends'), backend.next_call('GetAllFriends')
+    assert first is not second and first.result_size == second.result_size == 37
+    assert backend.next_call('GetAllFriends') is first
+    backend.reset()
+    assert backend.next_call('GetAllFriends') is first
+    assert backend.next_call('ChatWith') is None
+
+    summary = backend.summary()
+    assert (summary['GetAllFriends']['count'], summary['GetAllFriends']['max_result_size']) == (2, 37)
+    assert summary['SendMsg']['errors'] == 1
+
+
+def test_fake_backend_replays_recorded_calls(trace_file, monkeypatch):
+    backend = ReplayBackend.load(str(trace_file))
+    monkeypatch.setattr(FakeWeChat, 'backend_config', FakeBackendConfig(time_scale=0, friends=5, replay=backend))
+    monkeypatch.setattr(FakeWeChat, 'instances', [])
+    wx = FakeWeChat()
+
+    # 有记录的方法使用记录的结果大小和成败
+    assert len(wx.GetAllFriends()) == 37
+    with pytest.raises(SimulatedFailure, match='TimeoutError'):
+        wx.SendMsg('hello')
+    # 没有记录的方法使用模拟分布
+    assert wx.ChatWith('文件传输助手') == '文件传输助手'
+    assert wx.calls == {'GetAllFriends': 1, 'SendMsg': 1, 'ChatWith': 1}
+
+
+def test_truncated_last_line_and_unknown_format(tmp_path, trace_file):
+    with open(trace_file, 'a', encoding='utf-8') as f:
+        f.write('{"t":1.0,"m":"GetAllFr')
+    assert sum(len(calls) for calls in ReplayBackend.load(str(trace_file)).calls.values()) == 3
+
+    other = tmp_path / 'other.jsonl'
+    other.write_text('{"format":"chrome-trace","version":1}\n', encoding='utf-8')
+    with pytest.raises(ValueError):
+        ReplayBackend.load(str(other))
@@ -0,0 +1,47 @@
+"""熔断：接口和队列任务中抛出的WeChatUnavailableError返回503和Retry-After，而不是操作失败的500"""
+
+import pytest
+
+from app.health import WeChatUnavailableError
+from app.wechat import wechat_manager
+
+
+@pytest.fixture
+def unavailable(client, headers, monkeypatch):
+    assert client.post('/api/wechat/initialize', headers=headers).status_code == 200
+    instance = wechat_manager.get_instance()
+
+    def fail(*args, **kwargs):
+        raise WeChatUnavailableError('微信连接不可用，已暂停调用 ChatWith', 7)
+
+    monkeypatch.setattr(instance, 'ChatWith', fail)
+    return instance
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/message/send', {'receiver': '文件传输助手', 'message': 'hi'}),
+    ('/api/message/send-typing', {'receiver': '文件传输助手', 'message': 'hi'}),
+    ('/api/message/send-file', {'receiver': '文件传输助手', 'file_paths': [__file__]}),
+])
+def test_unavailable_inside_task_returns_503(client, headers, unavailable, path, body):
+    response = client.post(path, headers=headers, json=body)
+    assert response.status_code == 503
+    assert response.get_json()['code'] == 2003
+    assert response.headers['Retry-After'] == '7'
+
+
+def test_idempotent_retry_sees_503(client, headers, unavailable):
+    request_headers = dict(headers, **{'Idempotency-Key': 'unavailable-1'})
+    body = {'receiver': '文件传输助手', 'message': 'hi'}
+    assert client.post('/api/message/send', headers=request_headers, json=body).status_code == 503
+    # 失败的响应不缓存，重试重新执行
+    assert client.post('/api/message/send', headers=request_headers, json=body).status_code == 503
+
+
+@pytest.mark.parametrize('path', ['/api/wechat/chat-with', '/api/chat/show'])
+def test_unavailable_in_ui_route_returns_503(client, headers, unavailable, path):
+    # 非发送接口的通用异常处理不把熔断转换为500
+    response = client.post(path, headers=headers, json={'who': '文件传输助手'})
+    assert response.status_code == 503
+    assert response.get_json()['code'] == 2003
+    assert response.headers['Retry-After'] == '7'